@@ -1,17 +1,165 @@
 # 硬件配置
-VIDEO_DEV="/dev/video0"
+VIDEO_DEV="/dev/video0"  # 也可以是 dir:/video:/raw:/synthetic: 开头的回放来源，见 core/frame_source.py
+CAMERA_CONTINUOUS = False  # 是否启用后台连续采集模式
+CAMERA_BUFFER_SIZE = 4  # 连续采集环形缓冲区帧数
+CAMERA_DEVICES = None  # 多摄像头设备，{camera_id: device} 或设备列表；为 None 时只使用 VIDEO_DEV
 
 # OpenAI API 配置
+import json
 import os
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "sk-cc8ad3c0dae048beafd7e89094230468")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+OPENAI_SHARED_CLIENT = True  # 各 Action 共用同一端点的连接池
+OPENAI_MAX_CONNECTIONS = 20  # 每个端点的最大连接数
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 10  # 保持空闲的最大连接数
+OPENAI_KEEPALIVE_EXPIRY = 60.0  # 空闲连接保持时间（秒）
+OPENAI_HTTP2 = False  # 是否启用 HTTP/2（需要安装 h2）
+OPENAI_WARM_UP = True  # 启动时预热连接
+OPENAI_COALESCE = True  # 合并进行中的相同请求（对话、视觉、TTS）
 
 # 模型配置
 QWEN_MAX_MODEL = "qwen-max"  # 任务决策推理模型
 QWEN_VL_MODEL = "qwen-vl-plus"  # 视觉理解模型
+QWEN_VL_LITE_MODEL = "qwen2.5-vl-7b-instruct"  # 预算接近上限时降级使用的视觉模型
 QWEN_OMNI_MODEL = "qwen-omni-flash"  # 多模态交互模型
 
+# 限流配置
+OPENAI_RATE_LIMIT = True  # 按模型限流（请求速率、token 速率、并发），429 按 Retry-After 降速重试
+OPENAI_RATE_LIMIT_DEFAULT = {"rps": 10.0, "tpm": 1000000, "concurrency": 8}  # 未单独配置的模型
+OPENAI_RATE_LIMITS = {  # 各模型限额，参数见 core/client/rate_limit.py 中的 ModelGovernor
+    QWEN_MAX_MODEL: {"rps": 5.0, "tpm": 1000000, "concurrency": 4},
+    QWEN_VL_MODEL: {"rps": 5.0, "tpm": 1000000, "concurrency": 4},
+    QWEN_OMNI_MODEL: {"rps": 5.0, "tpm": 1000000, "concurrency": 4},
+}
+
+# 熔断配置
+OPENAI_CIRCUIT_BREAKER = True  # 端点连续失败时熔断，熔断期间请求立即失败，WatchAction 改为仅本地分析
+CIRCUIT_FAILURE_THRESHOLD = 3  # 连续失败（连接错误、超时、5xx）多少次后熔断
+CIRCUIT_RECOVERY_TIMEOUT = 30.0  # 熔断后多久进入半开状态并探测（秒）
+CIRCUIT_MAX_RECOVERY_TIMEOUT = 300.0  # 探测连续失败时等待时间翻倍的上限（秒）
+CIRCUIT_PROBE_TIMEOUT = 5.0  # 半开状态主动探测（GET /models）的超时（秒）
+
+# 用量与预算配置
+OPENAI_PRICES = {  # 各模型 (输入, 输出) 单价（元/千 token），以控制台价格为准；未列出的模型费用按 0 计
+    QWEN_MAX_MODEL: (0.0024, 0.0096),
+    QWEN_VL_MODEL: (0.0015, 0.0045),
+    QWEN_VL_LITE_MODEL: (0.002, 0.005),
+    QWEN_OMNI_MODEL: (0.0004, 0.0016),
+}
+USAGE_BUDGETS = {"hour": 2.0, "day": 20.0}  # 滚动窗口（hour / day）的费用预算（元），为空时不限制
+USAGE_DEGRADATION = [  # 预算使用率达到 at 时的降级策略，取满足条件的最高一级，见 core/client/usage.py
+    {"at": 0.6, "patrol_interval_scale": 2.0},
+    {"at": 0.8, "patrol_interval_scale": 4.0, "image_scale": 0.5},
+    {"at": 0.95, "patrol_interval_scale": 8.0, "image_scale": 0.5, "vision_model": QWEN_VL_LITE_MODEL},
+]
+
 # Agent 配置
+AGENT_NAME = "robot"  # 代理名称，用量统计按此归属
 PATROL_INTERVAL = 30.0  # 巡逻间隔（秒）
-ACTION_TIMEOUT = 10.0  # Action 默认超时（秒）
\ No newline at end of file
+PATROL_MODE = "interval"  # 巡逻模式：interval（固定间隔）/ motion（运动触发，需连续采集）
+PATROL_HEARTBEAT_INTERVAL = 120.0  # 运动触发模式下没有运动时的巡检间隔（秒）
+MOTION_THRESHOLD = 0.01  # 运动前景像素占比阈值
+MOTION_PIXEL_THRESHOLD = 25  # 运动检测单像素灰度差阈值（0-255）
+MOTION_COOLDOWN = 5.0  # 两次运动触发之间的最短间隔（秒）
+MOTION_SAMPLE_INTERVAL = 0.1  # 运动检测取帧间隔（秒）
+ACTION_TIMEOUT = 10.0  # Action 默认超时（秒）
+
+# 场景变化检测配置
+SCENE_CHANGE_ENABLED = True  # 画面无变化时复用上次视觉分析结果
+SCENE_CHANGE_THRESHOLD = 0.02  # 变化像素占比阈值
+SCENE_CHANGE_PIXEL_THRESHOLD = 25  # 单像素灰度差阈值（0-255）
+SCENE_CHANGE_MAX_REUSE_AGE = 300.0  # 分析结果最长复用时间（秒）
+
+# 视觉结果缓存配置
+VISION_CACHE_ENABLED = True  # 按感知哈希缓存视觉分析结果
+VISION_CACHE_MAX_BYTES = 1024 * 1024  # 缓存总容量（字节）
+VISION_CACHE_TTL = 600.0  # 缓存记录有效期（秒）
+VISION_CACHE_NEGATIVE_TTL = 30.0  # 未发现紧急情况的结果的有效期（秒），避免旧结论掩盖新出现的小火苗/烟雾
+VISION_CACHE_MAX_DISTANCE = 4  # 命中允许的最大汉明距离（64 位哈希）
+VISION_CACHE_PATH = os.getenv("VISION_CACHE_PATH")  # 持久化文件路径，为空时不落盘
+
+# 上传图像预处理配置
+IMAGE_MAX_LONG_EDGE = 1280  # 上传图像长边上限（像素）
+IMAGE_FORMAT = "jpeg"  # 上传图像格式（jpeg / webp）
+IMAGE_QUALITY = 85  # 编码质量上限
+IMAGE_MIN_QUALITY = 30  # 自动调节允许的最低质量
+IMAGE_BYTE_BUDGET = 200 * 1024  # 每帧字节预算，为 None 时按固定质量编码
+IMAGE_ROI = None  # 感兴趣区域 (x, y, w, h)，取值为 0-1 比例
+
+# 视觉请求内存优化配置
+VISION_ZERO_COPY = True  # 使用复用缓冲区直接构造视觉请求体
+VISION_PROFILE_MEMORY = False  # 统计每个巡检周期的峰值内存（tracemalloc，有性能开销）
+VISION_STREAMING = True  # 流式接收视觉结果，emergency 字段到达即可提前报警
+VISION_RESPONSE_FORMAT = "json_object"  # 结构化输出：json_object（JSON 模式）/ json_schema / None；模型不支持时自动退回普通文本
+VISION_ENDPOINTS = None  # 备用视觉端点，如 [{"model": "qwen-vl-max"}, {"model": QWEN_VL_MODEL, "base_url": "...", "api_key": "..."}]；为 None 时只用主端点
+VISION_HEDGE_QUANTILE = 0.95  # 首选端点超过该延迟分位数仍未返回时发出对冲请求
+VISION_HEDGE_DEFAULT_DELAY = 8.0  # 延迟样本不足时的对冲等待时间（秒）
+VISION_HEDGE_MIN_DELAY = 1.0  # 对冲等待时间下限（秒）
+VISION_HEDGE_MAX_DELAY = 10.0  # 对冲等待时间上限（秒）
+VISION_HEDGE_MIN_SAMPLES = 20  # 使用延迟分位数所需的最少样本数
+
+# 语音合成缓存配置
+TTS_CACHE_ENABLED = True  # 按 (模型, 音色, 语速, 文本) 在磁盘缓存合成的音频
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "robot-agent", "tts"))  # 缓存目录
+TTS_CACHE_MAX_BYTES = 50 * 1024 * 1024  # 缓存音频总容量（字节），超出时按 LRU 淘汰
+TTS_EMERGENCY_PHRASE = "检测到紧急情况"  # 紧急播报的固定开头，先播放（命中缓存时无需等待合成）再播报详细描述
+TTS_PREWARM_PHRASES = [  # 启动时预先合成并缓存的语句
+    TTS_EMERGENCY_PHRASE,
+    "请注意安全，立即撤离该区域",
+    "警报已解除",
+    "巡检开始",
+]
+
+# 语音播放配置
+TTS_STREAMING = True  # 边合成边播放：收到第一块音频即开始播放
+TTS_STREAM_CHUNK_BYTES = 4096  # 流式读取合成音频的分块大小（字节）
+TTS_PLAYBACK_QUEUE_CHUNKS = 8  # 合成与播放之间的有界队列容量（块），播放跟不上时合成端等待
+AUDIO_SINK = os.getenv("AUDIO_SINK", "device")  # 音频输出：device（扬声器，需要 sounddevice）/ wav（写文件）/ null（丢弃）
+AUDIO_WAV_DIR = os.getenv("AUDIO_WAV_DIR", "speech")  # wav 输出目录，每次播报一个文件
+AUDIO_SAMPLE_RATE = 16000  # 非 WAV 音频（裸 PCM）按此采样率播放
+TTS_SEGMENTED = True  # 长文本按句切分后并行合成、按顺序播放
+TTS_SEGMENT_CONCURRENCY = 3  # 同时合成的片段数上限
+TTS_SEGMENT_MIN_CHARS = 6  # 片段最少字符数，更短的并入相邻片段
+TTS_SEGMENT_MAX_CHARS = 80  # 超过此长度的句子再按逗号切分
+TTS_DEDUP_WINDOW = 10.0  # 相同文本在此时间内（秒）重复播报时抑制，0 表示不抑制
+
+# 语音监听配置
+AUDIO_SOURCE = os.getenv("AUDIO_SOURCE", "mic")  # 音频输入：mic[:设备] / wav:<文件> / synthetic:<片段>，格式见 core/audio/source.py
+LISTEN_BLOCK_MS = 100  # 每次从音频输入读取的时长（毫秒）
+VAD_FRAME_MS = 30  # 语音检测帧长（毫秒）
+VAD_ENERGY_MARGIN_DB = 12.0  # 能量高于噪声底多少 dB 判为语音
+VAD_MIN_ENERGY_DB = -50.0  # 能量低于此值（dBFS）一律视为静音
+VAD_ZCR_THRESHOLD = 0.25  # 能量略低但过零率高于此值时判为清音
+VAD_MIN_SPEECH_MS = 150  # 语音不足此时长的片段丢弃（咔哒声等）
+VAD_HANGOVER_MS = 300  # 语音后静音持续多久判定一句结束
+VAD_PRE_ROLL_MS = 150  # 片段开头保留的静音，避免截掉起音
+VAD_MAX_SEGMENT_S = 15.0  # 单个语音片段的最长时长（秒），超过时切断
+
+# 本地一级检测级联配置
+CASCADE_ENABLED = False  # 调用视觉模型前先做本地检测，正常画面不上传
+CASCADE_PERSON_DETECTION = True  # 是否运行 HOG 行人检测
+CASCADE_FIRE_THRESHOLD = 0.005  # 火焰颜色像素占比相对基线的增量阈值
+CASCADE_SMOKE_THRESHOLD = 0.05  # 烟雾颜色像素占比相对基线的增量阈值
+CASCADE_CHANGE_THRESHOLD = 0.15  # 帧差得分超过该值时升级
+CASCADE_MAX_SKIP_AGE = 300.0  # 最长连续不调用视觉模型的时间（秒）
+VISION_LOCAL_FALLBACK = True  # 视觉模型端点熔断时改用本地检测结果，巡逻不中断
+
+# MCP 服务配置
+MCP_SERVERS = json.loads(os.getenv("MCP_SERVERS", "{}"))  # {名称: {"command": [程序, 参数...]} 或 {"url": "http://127.0.0.1:8765/sse"}}；为空时应急调用为模拟
+MCP_EMERGENCY_TOOL = "emergency_call"  # 应急调用使用的工具名（自动查找提供该工具的服务）
+MCP_CALL_TIMEOUT = 10.0  # 工具调用超时时间（秒），包括等待重连
+MCP_CONNECT_TIMEOUT = 5.0  # 建立连接和握手的超时时间（秒）
+MCP_TOOLS_CACHE_TTL = 300.0  # 工具列表缓存有效期（秒），服务通知变更时立即失效
+MCP_RECONNECT_BASE_DELAY = 0.5  # 断线重连等待时间初值（秒），连续失败时翻倍
+MCP_RECONNECT_MAX_DELAY = 30.0  # 断线重连等待时间上限（秒）
+
+# 告警投递配置
+ALERT_OUTBOX_ENABLED = True  # 告警先写入本地预写日志再投递，投递失败或进程退出后重试（至少投递一次）
+ALERT_OUTBOX_PATH = os.getenv("ALERT_OUTBOX_PATH", os.path.join(os.path.expanduser("~"), ".local", "state", "robot-agent", "alerts.log"))  # 预写日志文件
+ALERT_OUTBOX_FSYNC_INTERVAL = 0.005  # 组提交等待时间（秒），期间追加的告警合并为一次 fsync
+ALERT_OUTBOX_COMPACT_BYTES = 1024 * 1024  # 日志超过此大小且有已投递记录时压缩（字节）
+ALERT_BATCH_SIZE = 50  # 每批投递的最大告警数
+ALERT_RETRY_BASE_DELAY = 0.5  # 投递失败后的重试等待时间初值（秒），连续失败时翻倍
+ALERT_RETRY_MAX_DELAY = 30.0  # 投递重试等待时间上限（秒）
+ALERT_DELIVERY_WAIT = 5.0  # AlertAction 等待投递完成的时间（秒），超时后在后台继续投递
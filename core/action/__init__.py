@@ -13,6 +13,7 @@ from core.action.base import (
 from core.action.watch_action import WatchAction
 from core.action.speak_action import SpeakAction
 from core.action.alert_action import AlertAction
+from core.action.listen_action import ListenAction
 
 __all__ = [
     "BaseAction",
@@ -22,4 +23,5 @@ __all__ = [
     "WatchAction",
     "SpeakAction",
     "AlertAction",
+    "ListenAction",
 ]
@@ -5,21 +5,26 @@
 """
 
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from core.action.base import BaseAction, ActionContext, ActionResult, ActionMetadata
+from core.alert_outbox import AlertOutbox
 from core.mcp_manager import McpManager
+import config
 
 
 class AlertAction(BaseAction):
     """应急调用 Action
     
-    检测到紧急情况时调用应急服务
+    检测到紧急情况时调用应急服务。启用发件箱时告警先写入本地预写日志，
+    再由后台按批投递并重试，投递失败或进程退出都不会丢失告警。
     """
     
     def __init__(self):
         """初始化 AlertAction"""
         super().__init__()
         self.mcp_manager: McpManager = None
+        self.outbox: Optional[AlertOutbox] = None
+        self.delivery_wait = config.ALERT_DELIVERY_WAIT
     
     def get_metadata(self) -> ActionMetadata:
         """获取 Action 元信息"""
@@ -37,12 +42,36 @@ class AlertAction(BaseAction):
         
         Args:
             config_dict: 配置参数
+                - mcp_servers: MCP 服务配置，格式见 config.MCP_SERVERS
+                - emergency_tool: 应急调用使用的工具名
+                - call_timeout: 工具调用超时时间（秒）
+                - outbox: 是否经预写日志投递
+                - outbox_path: 预写日志文件路径
+                - batch_size: 每批投递的最大告警数
+                - delivery_wait: 执行时等待投递完成的时间（秒）
         """
         try:
             print("[AlertAction] Initializing...")
             
-            # 初始化 MCP Manager
-            self.mcp_manager = McpManager()
+            # 初始化 MCP Manager（连接在首次调用或 Agent 启动时建立）
+            self.mcp_manager = McpManager(
+                servers=config_dict.get("mcp_servers"),
+                call_timeout=config_dict.get("call_timeout"),
+                emergency_tool=config_dict.get("emergency_tool")
+            )
+            
+            # 初始化告警发件箱（重放上次未投递的告警）
+            if config_dict.get("outbox", config.ALERT_OUTBOX_ENABLED):
+                self.outbox = AlertOutbox(
+                    config_dict.get("outbox_path", config.ALERT_OUTBOX_PATH),
+                    self.mcp_manager.deliver_alerts,
+                    batch_size=config_dict.get("batch_size", config.ALERT_BATCH_SIZE),
+                    fsync_interval=config.ALERT_OUTBOX_FSYNC_INTERVAL,
+                    retry_base_delay=config_dict.get("retry_base_delay", config.ALERT_RETRY_BASE_DELAY),
+                    retry_max_delay=config.ALERT_RETRY_MAX_DELAY,
+                    compact_bytes=config.ALERT_OUTBOX_COMPACT_BYTES
+                )
+            self.delivery_wait = config_dict.get("delivery_wait", self.delivery_wait)
             
             self._initialized = True
             print("[AlertAction] Initialization complete")
@@ -58,6 +87,7 @@ class AlertAction(BaseAction):
             context: Action 执行上下文
                 - input_data: 紧急事件详情
                 - shared_data.last_vision_result: 视觉分析结果
+                - config.delivery_wait: 等待投递完成的时间（秒，可选）
                 
         Returns:
             ActionResult: 包含调用结果的 ActionResult
@@ -84,22 +114,32 @@ class AlertAction(BaseAction):
             
             print(f"[AlertAction] Calling emergency service for: {event_details}")
             
-            # 调用应急服务
-            success = await self.mcp_manager.call_emergency_service(event_details)
+            if self.outbox is not None:
+                # 先落盘再投递：等待一段时间，未完成时告警留在发件箱中继续重试
+                entry = await self.outbox.append(event_details)
+                wait = context.config.get("delivery_wait", self.delivery_wait)
+                delivered = await self.outbox.wait_delivered(entry.id, wait)
+                success = True
+                output = {"service_called": delivered, "queued": not delivered, "alert_id": entry.id}
+            else:
+                # 调用应急服务
+                success = await self.mcp_manager.call_emergency_service(event_details)
+                output = {"service_called": success}
             
             elapsed_time = time.time() - start_time
             print(f"[AlertAction] Execution complete in {elapsed_time:.2f}s, success={success}")
             
+            metadata = {
+                "elapsed_time": elapsed_time,
+                "emergency_type": event_details.get("type", "unknown"),
+                "mcp": self.mcp_manager.stats()
+            }
+            if self.outbox is not None:
+                metadata["outbox"] = self.outbox.stats()
             return ActionResult(
                 success=success,
-                output={
-                    "service_called": success,
-                    "event_details": event_details
-                },
-                metadata={
-                    "elapsed_time": elapsed_time,
-                    "emergency_type": event_details.get("type", "unknown")
-                }
+                output={**output, "event_details": event_details},
+                metadata=metadata
             )
             
         except Exception as e:
@@ -115,6 +155,12 @@ class AlertAction(BaseAction):
         """清理资源"""
         print("[AlertAction] Cleaning up...")
         
-        self.mcp_manager = None
+        if self.outbox:
+            self.outbox.close()
+            self.outbox = None
+        
+        if self.mcp_manager:
+            self.mcp_manager.close()
+            self.mcp_manager = None
         self._initialized = False
         print("[AlertAction] Cleanup complete")
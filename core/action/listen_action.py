@@ -0,0 +1,254 @@
+# core/action/listen_action.py
+"""ListenAction - 语音监听 Action
+
+从音频输入读取声音，本地检测语音片段后只上传语音部分进行识别
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+from core.action.base import BaseAction, ActionContext, ActionResult, ActionMetadata
+from core.audio.source import AudioSource, open_audio_source
+from core.audio.vad import EnergyVAD, SpeechSegment, SpeechSegmenter
+from core.client.openai_client import OpenAIClient
+from core.client.rate_limit import ROUTINE
+from core.client.registry import get_client_registry
+import config
+
+
+class ListenAction(BaseAction):
+    """语音监听 Action
+    
+    按块读取音频并在本地做语音活动检测（能量 + 过零率），一句话结束（静音持续一段时间）
+    即把这一段编码为 WAV 上传识别，不必等待整段音频结束，也不上传静音部分。
+    识别出的文本依次回调 on_transcript（如加入 Agent 的任务队列）。
+    """
+    
+    def __init__(self):
+        """初始化 ListenAction"""
+        super().__init__()
+        self.openai_client: OpenAIClient = None
+        self.source: Optional[AudioSource] = None
+        self.model_name = config.QWEN_OMNI_MODEL
+        self.language = "zh"
+        self.block_ms = config.LISTEN_BLOCK_MS
+        self.on_transcript: Optional[Callable[[str, SpeechSegment], Any]] = None
+        self._vad_options: Dict[str, Any] = {}
+    
+    def get_metadata(self) -> ActionMetadata:
+        """获取 Action 元信息"""
+        return ActionMetadata(
+            name="listen",
+            version="1.0.0",
+            description="语音监听 Action，本地检测语音后上传识别",
+            dependencies=["openai_api", "audio_input"],
+            capabilities=["asr", "vad", "voice_command"],
+            author="Robot Agent Team"
+        )
+    
+    def initialize(self, config_dict: Dict[str, Any]) -> None:
+        """初始化 ListenAction
+        
+        Args:
+            config_dict: 配置参数
+                - api_key: OpenAI API 密钥
+                - base_url: API 端点 URL
+                - model_name: 使用的语音识别模型
+                - language: 识别语言
+                - audio_source: 音频输入（AudioSource 实例或设备描述，格式见 core/audio/source.py）
+                - block_ms: 每次读取的时长（毫秒）
+                - on_transcript: 识别出文本时的回调 (文本, 语音片段)，可以是协程函数
+                - vad_energy_margin_db / vad_min_energy_db / vad_zcr_threshold: 语音检测阈值
+                - vad_min_speech_ms / vad_hangover_ms / vad_pre_roll_ms / vad_max_segment_s: 片段切分参数
+                - shared_client: 是否使用进程级共享连接池
+                - usage_tracker: 用量与预算统计，默认使用进程级统计器
+        """
+        try:
+            print("[ListenAction] Initializing...")
+            
+            # 初始化 OpenAI 客户端
+            api_key = config_dict.get("api_key") or config.OPENAI_API_KEY
+            base_url = config_dict.get("base_url") or config.OPENAI_BASE_URL
+            
+            if not api_key:
+                print("[ListenAction] Warning: No API key provided, using mock mode")
+                self.openai_client = None
+            else:
+                self.openai_client = OpenAIClient(
+                    api_key=api_key,
+                    base_url=base_url,
+                    registry=get_client_registry() if config_dict.get("shared_client", config.OPENAI_SHARED_CLIENT) else None,
+                    coalesce=False,
+                    rate_limit=config_dict.get("rate_limit", config.OPENAI_RATE_LIMIT),
+                    usage_tracker=config_dict.get("usage_tracker")
+                )
+            
+            # 更新配置参数
+            self.model_name = config_dict.get("model_name", self.model_name)
+            self.language = config_dict.get("language", self.language)
+            self.block_ms = config_dict.get("block_ms", self.block_ms)
+            self.on_transcript = config_dict.get("on_transcript", self.on_transcript)
+            self._vad_options = {
+                "energy_margin_db": config_dict.get("vad_energy_margin_db", config.VAD_ENERGY_MARGIN_DB),
+                "min_energy_db": config_dict.get("vad_min_energy_db", config.VAD_MIN_ENERGY_DB),
+                "zcr_threshold": config_dict.get("vad_zcr_threshold", config.VAD_ZCR_THRESHOLD),
+                "min_speech_ms": config_dict.get("vad_min_speech_ms", config.VAD_MIN_SPEECH_MS),
+                "hangover_ms": config_dict.get("vad_hangover_ms", config.VAD_HANGOVER_MS),
+                "pre_roll_ms": config_dict.get("vad_pre_roll_ms", config.VAD_PRE_ROLL_MS),
+                "max_segment_s": config_dict.get("vad_max_segment_s", config.VAD_MAX_SEGMENT_S),
+            }
+            
+            # 初始化音频输入
+            self.source = open_audio_source(config_dict.get("audio_source", config.AUDIO_SOURCE))
+            
+            self._initialized = True
+            print("[ListenAction] Initialization complete")
+        
+        except Exception as e:
+            print(f"[ListenAction] Initialization failed: {e}")
+            raise
+    
+    def _segmenter(self) -> SpeechSegmenter:
+        options = self._vad_options
+        vad = EnergyVAD(
+            self.source.sample_rate,
+            frame_ms=config.VAD_FRAME_MS,
+            energy_margin_db=options["energy_margin_db"],
+            min_energy_db=options["min_energy_db"],
+            zcr_threshold=options["zcr_threshold"]
+        )
+        return SpeechSegmenter(
+            vad,
+            min_speech_ms=options["min_speech_ms"],
+            hangover_ms=options["hangover_ms"],
+            pre_roll_ms=options["pre_roll_ms"],
+            max_segment_s=options["max_segment_s"]
+        )
+    
+    async def execute(self, context: ActionContext) -> ActionResult:
+        """监听一段时间并识别其中的语音
+        
+        Args:
+            context: Action 执行上下文
+                - config.duration: 监听时长（秒，可选；默认读到音频输入结束）
+                - config.max_utterances: 识别到多少句后停止（可选）
+                - config.priority: 限流排队优先级（可选）
+        
+        Returns:
+            ActionResult: 按时间顺序排列的识别结果
+        """
+        start_time = time.time()
+        
+        try:
+            print("[ListenAction] Executing...")
+            
+            if not self._initialized:
+                raise RuntimeError("ListenAction not initialized")
+            
+            duration = context.config.get("duration")
+            max_utterances = context.config.get("max_utterances")
+            priority = context.config.get("priority", ROUTINE)
+            
+            segmenter = self._segmenter()
+            block = max(1, int(self.source.sample_rate * self.block_ms / 1000))
+            listen_start = self.source.position
+            transcriptions: List[asyncio.Task] = []
+            uploaded_bytes = 0
+            
+            # 读取音频，每结束一句立即开始识别（与后续读取并行）
+            while duration is None or self.source.position - listen_start < duration:
+                samples = await self.source.read(block)
+                segments = segmenter.feed(samples) if samples is not None else segmenter.flush()
+                for segment in segments:
+                    wav = segment.to_wav()
+                    uploaded_bytes += len(wav)
+                    transcriptions.append(asyncio.create_task(self._transcribe(segment, wav, priority)))
+                if samples is None or (max_utterances and len(transcriptions) >= max_utterances):
+                    break
+            else:
+                for segment in segmenter.flush():
+                    wav = segment.to_wav()
+                    uploaded_bytes += len(wav)
+                    transcriptions.append(asyncio.create_task(self._transcribe(segment, wav, priority)))
+            
+            utterances = [u for u in await asyncio.gather(*transcriptions) if u["text"]]
+            if utterances:
+                context.shared_data["last_transcript"] = utterances[-1]["text"]
+            
+            audio_seconds = self.source.position - listen_start
+            speech_seconds = sum(u["end"] - u["start"] for u in utterances)
+            elapsed_time = time.time() - start_time
+            print(f"[ListenAction] {len(utterances)} utterances from {audio_seconds:.1f}s of audio in {elapsed_time:.2f}s")
+            
+            return ActionResult(
+                success=True,
+                output={
+                    "text": " ".join(u["text"] for u in utterances),
+                    "utterances": utterances
+                },
+                metadata={
+                    "elapsed_time": elapsed_time,
+                    "audio_seconds": audio_seconds,
+                    "speech_seconds": speech_seconds,
+                    "uploaded_bytes": uploaded_bytes,
+                    "audio_bytes": int(audio_seconds * self.source.sample_rate * 2),
+                    "asr_requests": len(transcriptions),
+                    "vad": segmenter.stats(),
+                    "model": self.model_name
+                }
+            )
+        
+        except Exception as e:
+            elapsed_time = time.time() - start_time
+            print(f"[ListenAction] Execution failed: {e}")
+            return ActionResult(
+                success=False,
+                error=e,
+                metadata={"elapsed_time": elapsed_time}
+            )
+    
+    async def _transcribe(self, segment: SpeechSegment, wav: bytes, priority: str) -> Dict[str, Any]:
+        """上传一个语音片段识别，识别出文本后回调 on_transcript"""
+        closed_at = time.perf_counter()
+        if self.openai_client is None:
+            # Mock 模式：不识别
+            text = ""
+        else:
+            text = await self.openai_client.asr_completion(
+                model=self.model_name,
+                audio=wav,
+                language=self.language,
+                filename="speech.wav",
+                priority=priority
+            )
+        text = text.strip()
+        utterance = {
+            "text": text,
+            "start": segment.start,
+            "end": segment.end,
+            "truncated": segment.truncated,
+            "asr_latency": time.perf_counter() - closed_at
+        }
+        if text and self.on_transcript is not None:
+            try:
+                result = self.on_transcript(text, segment)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"[ListenAction] on_transcript callback failed: {e}")
+        return utterance
+    
+    def cleanup(self) -> None:
+        """清理资源"""
+        print("[ListenAction] Cleaning up...")
+        
+        if self.source:
+            self.source.close()
+            self.source = None
+        
+        if self.openai_client:
+            self.openai_client.close()
+            self.openai_client = None
+        
+        self._initialized = False
+        print("[ListenAction] Cleanup complete")
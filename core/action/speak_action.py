@@ -4,10 +4,28 @@
 负责将文本转换为语音输出
 """
 
+import asyncio
 import time
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from core.action.base import BaseAction, ActionContext, ActionResult, ActionMetadata
+from core.audio import (
+    AudioSink,
+    NullSink,
+    PlaybackStats,
+    SpeechPreempted,
+    SpeechRequest,
+    SpeechScheduler,
+    StreamingPlayback,
+    concat_wav,
+    create_sink,
+    parse_wav_header,
+    split_sentences,
+    strip_wav_header,
+)
 from core.client.openai_client import OpenAIClient
+from core.client.rate_limit import ROUTINE
+from core.client.registry import get_client_registry
+from core.client.tts_cache import TTSAudioCache
 import config
 
 
@@ -25,6 +43,15 @@ class SpeakAction(BaseAction):
         self.voice = "default"
         self.speed = 1.0
         self.auto_play = True
+        self.prewarm_phrases: List[str] = list(config.TTS_PREWARM_PHRASES)
+        self.streaming = config.TTS_STREAMING
+        self.playback_queue_chunks = config.TTS_PLAYBACK_QUEUE_CHUNKS
+        self.sink: Optional[AudioSink] = None
+        self.segmented = config.TTS_SEGMENTED
+        self.segment_concurrency = config.TTS_SEGMENT_CONCURRENCY
+        self.segment_min_chars = config.TTS_SEGMENT_MIN_CHARS
+        self.segment_max_chars = config.TTS_SEGMENT_MAX_CHARS
+        self.scheduler: Optional[SpeechScheduler] = None
     
     def get_metadata(self) -> ActionMetadata:
         """获取 Action 元信息"""
@@ -48,6 +75,19 @@ class SpeakAction(BaseAction):
                 - voice: 音色类型
                 - speed: 语速倍率
                 - auto_play: 是否自动播放
+                - shared_client: 是否使用进程级共享连接池
+                - usage_tracker: 用量与预算统计，默认使用进程级统计器
+                - tts_cache: 是否启用磁盘音频缓存
+                - tts_cache_dir: 音频缓存目录
+                - tts_cache_max_bytes: 音频缓存总容量（字节）
+                - prewarm_phrases: 启动时预先合成的语句
+                - streaming: 是否边合成边播放
+                - playback_queue_chunks: 合成与播放之间的队列容量（块）
+                - audio_sink: 音频输出（AudioSink 实例或 device / wav / null）
+                - wav_dir: audio_sink 为 wav 时的输出目录
+                - segmented: 长文本是否按句切分后并行合成
+                - segment_concurrency: 同时合成的片段数上限
+                - dedup_window: 相同文本在多少秒内重复播报时抑制
         """
         try:
             print("[SpeakAction] Initializing...")
@@ -60,13 +100,47 @@ class SpeakAction(BaseAction):
                 print("[SpeakAction] Warning: No API key provided, using mock mode")
                 self.openai_client = None
             else:
-                self.openai_client = OpenAIClient(api_key=api_key, base_url=base_url)
+                tts_cache = None
+                if config_dict.get("tts_cache", config.TTS_CACHE_ENABLED):
+                    tts_cache = TTSAudioCache(
+                        directory=config_dict.get("tts_cache_dir", config.TTS_CACHE_DIR),
+                        max_bytes=config_dict.get("tts_cache_max_bytes", config.TTS_CACHE_MAX_BYTES)
+                    )
+                self.openai_client = OpenAIClient(
+                    api_key=api_key,
+                    base_url=base_url,
+                    tts_cache=tts_cache,
+                    registry=get_client_registry() if config_dict.get("shared_client", config.OPENAI_SHARED_CLIENT) else None,
+                    coalesce=config_dict.get("coalesce", config.OPENAI_COALESCE),
+                    rate_limit=config_dict.get("rate_limit", config.OPENAI_RATE_LIMIT),
+                    usage_tracker=config_dict.get("usage_tracker")
+                )
             
             # 更新配置参数
             self.model_name = config_dict.get("model_name", self.model_name)
             self.voice = config_dict.get("voice", self.voice)
             self.speed = config_dict.get("speed", self.speed)
             self.auto_play = config_dict.get("auto_play", self.auto_play)
+            self.prewarm_phrases = config_dict.get("prewarm_phrases", self.prewarm_phrases)
+            self.streaming = config_dict.get("streaming", self.streaming)
+            self.playback_queue_chunks = config_dict.get("playback_queue_chunks", self.playback_queue_chunks)
+            self.segmented = config_dict.get("segmented", self.segmented)
+            self.segment_concurrency = config_dict.get("segment_concurrency", self.segment_concurrency)
+            
+            # 初始化播报队列
+            self.scheduler = SpeechScheduler(
+                self._speak, dedup_window=config_dict.get("dedup_window", config.TTS_DEDUP_WINDOW)
+            )
+            
+            # 初始化音频输出
+            sink = config_dict.get("audio_sink", config.AUDIO_SINK)
+            if isinstance(sink, AudioSink):
+                self.sink = sink
+            elif self.auto_play and self.openai_client is None:
+                # Mock 模式的模拟数据不是音频，不写入扬声器或文件
+                self.sink = NullSink()
+            elif self.auto_play:
+                self.sink = create_sink(sink, config_dict.get("wav_dir", config.AUDIO_WAV_DIR))
             
             self._initialized = True
             print("[SpeakAction] Initialization complete")
@@ -78,10 +152,15 @@ class SpeakAction(BaseAction):
     async def execute(self, context: ActionContext) -> ActionResult:
         """执行语音合成
         
+        播报经调度器排队：同一时间只播放一条，紧急播报打断正在播放的日常播报，
+        窗口时间内重复的文本被抑制。
+        
         Args:
             context: Action 执行上下文
                 - input_data: 要转换为语音的文本
                 - config.voice: 音色选择（可选）
+                - config.priority: 播报和限流排队优先级（emergency / routine，可选）
+                - config.wait: 是否等待播放结束（可选，默认 True；为 False 时入队后立即返回）
                 
         Returns:
             ActionResult: 包含音频数据的 ActionResult
@@ -106,25 +185,88 @@ class SpeakAction(BaseAction):
             # 获取音色配置
             voice = context.config.get("voice", self.voice)
             speed = context.config.get("speed", self.speed)
+            priority = context.config.get("priority", ROUTINE)
             
+            # 提交到播报队列
+            suppressed_before = self.scheduler.suppressed
+            future = self.scheduler.submit(text, priority, voice=voice, speed=speed)
+            suppressed = self.scheduler.suppressed > suppressed_before
+            
+            if not context.config.get("wait", True):
+                return ActionResult(
+                    success=True,
+                    output={"text": text, "queued": not suppressed},
+                    metadata={
+                        "elapsed_time": time.time() - start_time,
+                        "suppressed": suppressed,
+                        "speech_queue": self.scheduler.stats()
+                    }
+                )
+            
+            result = await asyncio.shield(future)
+            return ActionResult(
+                success=result.success,
+                output=result.output,
+                error=result.error,
+                metadata={
+                    **result.metadata,
+                    "elapsed_time": time.time() - start_time,
+                    "suppressed": suppressed,
+                    "speech_queue": self.scheduler.stats()
+                }
+            )
+            
+        except SpeechPreempted as e:
+            print(f"[SpeakAction] {e}")
+            return ActionResult(
+                success=False,
+                error=e,
+                metadata={"elapsed_time": time.time() - start_time, "preempted": True}
+            )
+        except Exception as e:
+            elapsed_time = time.time() - start_time
+            print(f"[SpeakAction] Execution failed: {e}")
+            return ActionResult(
+                success=False,
+                error=e,
+                metadata={"elapsed_time": elapsed_time}
+            )
+    
+    async def _speak(self, request: SpeechRequest) -> ActionResult:
+        """合成并播放一条播报（由调度器依次调用，被打断时以 CancelledError 结束）
+        
+        Args:
+            request: 播报请求
+        
+        Returns:
+            ActionResult: 包含音频数据的 ActionResult
+        """
+        start_time = time.time()
+        queue_wait = self.scheduler.clock() - request.enqueued_at
+        text = request.text
+        voice = request.options.get("voice", self.voice)
+        speed = request.options.get("speed", self.speed)
+        
+        try:
             # 调用 TTS 模型
+            playback = None
+            segments = [text]
             if self.openai_client is None:
                 # Mock 模式：返回模拟数据
                 print("[SpeakAction] Using mock mode (no API key)")
                 audio_bytes = b"mock_audio_data"
                 duration = len(text) * 0.1  # 模拟音频时长
             else:
-                audio_bytes = await self.openai_client.tts_completion(
-                    model=self.model_name,
-                    text=text,
-                    voice=voice,
-                    speed=speed
-                )
-                duration = len(audio_bytes) / 16000.0  # 假设 16kHz 采样率
+                if self.segmented:
+                    segments = split_sentences(text, self.segment_min_chars, self.segment_max_chars) or [text]
+                audio_bytes, playback = await self._speak_segments(segments, voice, speed, request.priority)
+                duration = self._audio_duration(audio_bytes)
             
-            # 播放音频（如果启用自动播放）
-            if self.auto_play and len(audio_bytes) > 0:
-                await self._play_audio(audio_bytes)
+            # 播放音频（启用自动播放时合成过程中已开始播放，这里只处理 Mock 模式的模拟音频）
+            if self.auto_play and playback is None and len(audio_bytes) > 0:
+                playback = await self._play_audio(audio_bytes)
+            if playback is not None:
+                print(f"[SpeakAction] Time to first audio: {playback.time_to_first_audio}")
             
             elapsed_time = time.time() - start_time
             print(f"[SpeakAction] Execution complete in {elapsed_time:.2f}s")
@@ -137,51 +279,179 @@ class SpeakAction(BaseAction):
                     "text": text
                 },
                 metadata={
-                    "elapsed_time": elapsed_time,
+                    "speak_time": elapsed_time,
+                    "queue_wait": queue_wait,
+                    "priority": request.priority,
                     "audio_size": len(audio_bytes),
                     "model": self.model_name,
-                    "voice": voice
+                    "voice": voice,
+                    "segments": len(segments),
+                    "tts_cache": self._tts_cache_stats(),
+                    "playback": playback.to_dict() if playback is not None else None
                 }
             )
             
         except Exception as e:
-            elapsed_time = time.time() - start_time
             print(f"[SpeakAction] Execution failed: {e}")
             return ActionResult(
                 success=False,
                 error=e,
-                metadata={"elapsed_time": elapsed_time}
+                metadata={"speak_time": time.time() - start_time}
             )
     
-    async def _play_audio(self, audio_bytes: bytes) -> None:
-        """播放音频
+    async def _speak_segments(
+        self,
+        segments: List[str],
+        voice: str,
+        speed: float,
+        priority: str
+    ) -> Tuple[bytes, Optional[PlaybackStats]]:
+        """合成并播放（启用自动播放时）
+        
+        多个片段时并行合成、按顺序播放。播放计时从开始合成算起，
+        因此首音延迟包含合成等待时间。
+        
+        Args:
+            segments: 按顺序排列的文本片段
+            voice: 音色类型
+            speed: 语速倍率
+            priority: 限流排队优先级
+        
+        Returns:
+            Tuple: (拼接后的完整音频, 播放统计；未自动播放时为 None)
+        """
+        if not self.auto_play or self.sink is None:
+            parts = await self._synthesize_segments(segments, voice, speed, priority, None)
+            return concat_wav(parts), None
+        async with StreamingPlayback(self.sink, self.playback_queue_chunks) as playback:
+            parts = await self._synthesize_segments(segments, voice, speed, priority, playback)
+        return concat_wav(parts), playback.stats
+    
+    async def _synthesize_segments(
+        self,
+        segments: List[str],
+        voice: str,
+        speed: float,
+        priority: str,
+        playback: Optional[StreamingPlayback]
+    ) -> List[bytes]:
+        """最多 segment_concurrency 段同时合成，每段合成完且之前各段都已送入播放队列后再送入
+        
+        启用流式播放时第一段边合成边播放；其余各段合成完整后去掉 WAV 头，接在前一段之后播放。
+        """
+        semaphore = asyncio.Semaphore(max(1, self.segment_concurrency))
+        stream_first = playback is not None and self.streaming
+        
+        async def synthesize(index: int, segment: str) -> bytes:
+            async with semaphore:
+                if index == 0 and stream_first:
+                    return await self.openai_client.tts_stream(
+                        model=self.model_name,
+                        text=segment,
+                        on_chunk=playback.feed,
+                        voice=voice,
+                        speed=speed,
+                        priority=priority,
+                        chunk_size=config.TTS_STREAM_CHUNK_BYTES
+                    )
+                return await self.openai_client.tts_completion(
+                    model=self.model_name,
+                    text=segment,
+                    voice=voice,
+                    speed=speed,
+                    priority=priority
+                )
+        
+        tasks = [asyncio.create_task(synthesize(i, segment)) for i, segment in enumerate(segments)]
+        parts = []
+        try:
+            for index, task in enumerate(tasks):
+                audio = await task
+                parts.append(audio)
+                if playback is None or not audio or (index == 0 and stream_first):
+                    continue
+                # 播放队列中已有 WAV 头时只送入音频数据
+                header_sent = playback.stats.time_to_first_chunk is not None
+                await playback.feed(strip_wav_header(audio) if header_sent else audio)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return parts
+    
+    async def warm_up(self, phrases: Optional[List[str]] = None) -> Dict[str, int]:
+        """预先合成常用语句并写入音频缓存（已缓存的跳过），播报时无需等待合成
+        
+        Args:
+            phrases: 要预热的语句，默认使用 prewarm_phrases
+        
+        Returns:
+            Dict: 新合成、已缓存和失败的语句数
+        """
+        cache = self.openai_client.tts_cache if self.openai_client is not None else None
+        result = {"synthesized": 0, "cached": 0, "failed": 0}
+        if cache is None:
+            return result
+        
+        pending = []
+        for text in phrases if phrases is not None else self.prewarm_phrases:
+            if (self.model_name, self.voice, self.speed, text) in cache:
+                result["cached"] += 1
+            else:
+                pending.append(text)
+        
+        audio_list = await asyncio.gather(*(
+            self.openai_client.tts_completion(model=self.model_name, text=text, voice=self.voice, speed=self.speed)
+            for text in pending
+        ))
+        for audio in audio_list:
+            result["synthesized" if audio else "failed"] += 1
+        print(f"[SpeakAction] TTS warm-up complete: {result}")
+        return result
+    
+    def _tts_cache_stats(self) -> Dict[str, Any]:
+        """获取音频缓存统计，未启用缓存时返回空字典"""
+        if self.openai_client is None or self.openai_client.tts_cache is None:
+            return {}
+        return self.openai_client.tts_cache.stats()
+    
+    async def _play_audio(self, audio_bytes: bytes) -> Optional[PlaybackStats]:
+        """播放已合成好的整段音频
         
         Args:
             audio_bytes: 音频数据
+        
+        Returns:
+            PlaybackStats: 播放统计，没有音频输出或播放失败时为 None
         """
+        if self.sink is None:
+            return None
         try:
             print(f"[SpeakAction] Playing audio ({len(audio_bytes)} bytes)...")
-            
-            # TODO: 实际实现音频播放逻辑
-            # 可以使用 pyaudio、sounddevice 或其他音频库
-            # 这里只是占位实现
-            
-            # 示例：使用 subprocess 调用系统播放器
-            # import subprocess
-            # import tempfile
-            # with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
-            #     f.write(audio_bytes)
-            #     subprocess.run(['ffplay', '-nodisp', '-autoexit', f.name])
-            
-            print("[SpeakAction] Audio playback simulated (not implemented)")
+            async with StreamingPlayback(self.sink, self.playback_queue_chunks) as playback:
+                await playback.feed(audio_bytes)
+            return playback.stats
             
         except Exception as e:
             print(f"[SpeakAction] Audio playback failed: {e}")
+            return None
+    
+    @staticmethod
+    def _audio_duration(audio_bytes: bytes) -> float:
+        """按 WAV 头计算音频时长（秒），不是 WAV 时按 16kHz 16 位单声道估算"""
+        wav = parse_wav_header(audio_bytes[:4096])
+        if wav is None:
+            return len(audio_bytes) / (config.AUDIO_SAMPLE_RATE * 2)
+        frame_bytes = wav.channels * wav.sample_width * wav.sample_rate
+        return (len(audio_bytes) - wav.data_offset) / frame_bytes if frame_bytes else 0.0
     
     def cleanup(self) -> None:
         """清理资源"""
         print("[SpeakAction] Cleaning up...")
         
+        if self.scheduler:
+            self.scheduler.close()
+            self.scheduler = None
+        
         if self.openai_client:
             self.openai_client.close()
             self.openai_client = None
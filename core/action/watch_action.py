@@ -5,10 +5,22 @@
 """
 
 import time
-from typing import Dict, Any
+import asyncio
+import functools
+from typing import Dict, Any, List, Optional
 from core.action.base import BaseAction, ActionContext, ActionResult, ActionMetadata
 from core.camera import CameraSensor
+from core.camera_group import CameraGroup, CameraFrame
+from core.vision import SceneChangeDetector, ImagePreprocessor, DetectorCascade, VisionAnalysis, response_format
 from core.client.openai_client import OpenAIClient
+from core.client.circuit_breaker import HALF_OPEN, CircuitOpenError
+from core.client.json_extract import ParseStats
+from core.client.hedging import Endpoint, HedgedRouter
+from core.client.rate_limit import EMERGENCY, ROUTINE
+from core.client.usage import Degradation, UsageTracker, get_usage_tracker
+from core.client.vision_cache import VisionResultCache
+from core.client.registry import get_client_registry
+from core.profiling import CycleMemoryProfiler
 import config
 
 
@@ -23,22 +35,43 @@ class WatchAction(BaseAction):
 2. 是否存在异常情况（火灾、烟雾、未授权人员等）
 3. 环境状态评估
 
-以 JSON 格式返回结果，包含字段：
-- objects_detected: 检测到的物体列表（数组）
+以 JSON 格式返回结果，按以下顺序输出字段：
 - emergency: 是否存在紧急情况（布尔值）
+- objects_detected: 检测到的物体列表（数组）
 - confidence: 分析置信度（0-1之间的浮点数）
 - description: 场景描述文本（字符串）
+"""
+    
+    MULTI_CAMERA_PROMPT = """
+本次共提供 {count} 张图像，依次来自摄像头：{camera_ids}。
+请综合所有图像给出上述字段，并额外返回字段：
+- cameras: 对象，键为摄像头 ID，值包含该摄像头画面的 objects_detected、emergency、description
 """
     
     def __init__(self):
         """初始化 WatchAction"""
         super().__init__()
         self.camera: CameraSensor = None
+        self.camera_group: CameraGroup = None
         self.openai_client: OpenAIClient = None
+        self.vision_router: Optional[HedgedRouter] = None
+        self.scene_detector: SceneChangeDetector = None
+        self.preprocessor: ImagePreprocessor = None
+        self.cascade: DetectorCascade = None
+        self.fallback_cascade: Optional[DetectorCascade] = None  # 端点熔断时使用的本地检测
+        self._probe_task: Optional[asyncio.Task] = None
+        self.memory_profiler: CycleMemoryProfiler = None
+        self.usage_tracker: UsageTracker = None
+        self._base_long_edge: Optional[int] = None  # 未降级时的上传图像长边上限
+        self._frame_buffer = None  # 单摄像头时复用的帧缓冲区
         self.model_name = config.QWEN_VL_MODEL
         self.prompt_template = self.DEFAULT_PROMPT
         self.max_tokens = 500
         self.temperature = 0.7
+        self.streaming = config.VISION_STREAMING
+        self.response_format = config.VISION_RESPONSE_FORMAT
+        self.invalid_results = 0  # 未通过结构校验的结果数
+        self.local_only_cycles = 0  # 因端点熔断只做本地分析的周期数
     
     def get_metadata(self) -> ActionMetadata:
         """获取 Action 元信息"""
@@ -62,12 +95,102 @@ class WatchAction(BaseAction):
                 - prompt_template: 提示词模板
                 - max_tokens: 最大生成 token 数
                 - temperature: 生成温度
+                - stream_vision: 是否流式接收视觉结果（emergency 字段到达即可提前通知）
+                - continuous_capture: 是否启用摄像头连续采集模式
+                - frame_buffer_size: 连续采集环形缓冲区帧数
+                - camera_devices: 多摄像头设备，{camera_id: device} 或设备列表
+                - change_detection: 是否启用场景变化检测
+                - change_threshold: 变化像素占比阈值
+                - change_pixel_threshold: 单像素灰度差阈值
+                - change_max_reuse_age: 分析结果最长复用时间（秒）
+                - vision_cache: 是否启用感知哈希结果缓存
+                - vision_cache_max_bytes: 缓存总容量（字节）
+                - vision_cache_ttl: 缓存记录有效期（秒）
+                - vision_cache_negative_ttl: 未发现紧急情况的结果的有效期（秒）
+                - vision_cache_max_distance: 命中允许的最大汉明距离
+                - vision_cache_path: 缓存持久化文件路径
+                - image_max_long_edge: 上传图像长边上限（像素）
+                - image_roi: 感兴趣区域 (x, y, w, h)，0-1 比例
+                - image_format: 上传图像格式（jpeg / webp）
+                - image_quality: 编码质量上限
+                - image_min_quality: 自动调节允许的最低质量
+                - image_byte_budget: 每帧字节预算
+                - cascade: 是否启用本地一级检测级联
+                - cascade_person_detection: 是否运行 HOG 行人检测
+                - cascade_fire_threshold: 火焰颜色占比相对基线的增量阈值
+                - cascade_smoke_threshold: 烟雾颜色占比相对基线的增量阈值
+                - cascade_change_threshold: 帧差得分升级阈值
+                - cascade_max_skip_age: 最长连续不调用视觉模型的时间（秒）
+                - local_fallback: 视觉模型端点熔断时是否改用本地检测结果
+                - zero_copy: 是否使用复用缓冲区直接构造视觉请求体
+                - shared_client: 是否使用进程级共享连接池
+                - profile_memory: 是否统计每个周期的峰值内存
+                - usage_tracker: 用量与预算统计，默认使用进程级统计器；预算接近上限时
+                  按其降级策略降低上传分辨率或换用更便宜的视觉模型
         """
         try:
             print("[WatchAction] Initializing...")
             
-            # 初始化摄像头
-            self.camera = CameraSensor()
+            # 初始化摄像头（配置多个设备时使用摄像头组）
+            # 运动触发巡逻需要后台连续采集的画面
+            continuous = config_dict.get(
+                "continuous_capture",
+                config.CAMERA_CONTINUOUS or config.PATROL_MODE == "motion"
+            )
+            buffer_size = config_dict.get("frame_buffer_size", config.CAMERA_BUFFER_SIZE)
+            devices = config_dict.get("camera_devices", config.CAMERA_DEVICES)
+            if devices and len(devices) > 1:
+                self.camera_group = CameraGroup(
+                    devices,
+                    continuous=continuous,
+                    buffer_size=buffer_size
+                )
+                self.camera_group.start()
+                print(f"[WatchAction] Using camera group: {self.camera_group.camera_ids}")
+            else:
+                device = None
+                if devices:
+                    device = next(iter(devices.values())) if isinstance(devices, dict) else devices[0]
+                self.camera = CameraSensor(
+                    continuous=continuous,
+                    buffer_size=buffer_size,
+                    device=device
+                )
+                self.camera.start()
+            
+            # 初始化场景变化检测器
+            if config_dict.get("change_detection", config.SCENE_CHANGE_ENABLED):
+                self.scene_detector = SceneChangeDetector(
+                    threshold=config_dict.get("change_threshold", config.SCENE_CHANGE_THRESHOLD),
+                    pixel_threshold=config_dict.get("change_pixel_threshold", config.SCENE_CHANGE_PIXEL_THRESHOLD),
+                    max_reuse_age=config_dict.get("change_max_reuse_age", config.SCENE_CHANGE_MAX_REUSE_AGE)
+                )
+            else:
+                self.scene_detector = None
+            
+            # 初始化本地一级检测级联
+            if config_dict.get("cascade", config.CASCADE_ENABLED):
+                self.cascade = self._build_cascade(config_dict)
+            else:
+                self.cascade = None
+            
+            # 端点熔断时的本地检测（已启用级联时直接复用）
+            if config_dict.get("local_fallback", config.VISION_LOCAL_FALLBACK):
+                self.fallback_cascade = self.cascade or self._build_cascade(config_dict)
+            else:
+                self.fallback_cascade = None
+            
+            # 初始化上传图像预处理流水线
+            self.preprocessor = ImagePreprocessor(
+                max_long_edge=config_dict.get("image_max_long_edge", config.IMAGE_MAX_LONG_EDGE),
+                roi=config_dict.get("image_roi", config.IMAGE_ROI),
+                image_format=config_dict.get("image_format", config.IMAGE_FORMAT),
+                quality=config_dict.get("image_quality", config.IMAGE_QUALITY),
+                min_quality=config_dict.get("image_min_quality", config.IMAGE_MIN_QUALITY),
+                byte_budget=config_dict.get("image_byte_budget", config.IMAGE_BYTE_BUDGET)
+            )
+            self._base_long_edge = self.preprocessor.max_long_edge
+            self.usage_tracker = config_dict.get("usage_tracker") or get_usage_tracker()
             
             # 初始化 OpenAI 客户端
             api_key = config_dict.get("api_key") or config.OPENAI_API_KEY
@@ -77,13 +200,41 @@ class WatchAction(BaseAction):
                 print("[WatchAction] Warning: No API key provided, using mock mode")
                 self.openai_client = None
             else:
-                self.openai_client = OpenAIClient(api_key=api_key, base_url=base_url)
+                vision_cache = None
+                if config_dict.get("vision_cache", config.VISION_CACHE_ENABLED):
+                    vision_cache = VisionResultCache(
+                        max_bytes=config_dict.get("vision_cache_max_bytes", config.VISION_CACHE_MAX_BYTES),
+                        ttl=config_dict.get("vision_cache_ttl", config.VISION_CACHE_TTL),
+                        negative_ttl=config_dict.get("vision_cache_negative_ttl", config.VISION_CACHE_NEGATIVE_TTL),
+                        max_distance=config_dict.get("vision_cache_max_distance", config.VISION_CACHE_MAX_DISTANCE),
+                        persist_path=config_dict.get("vision_cache_path", config.VISION_CACHE_PATH)
+                    )
+                self.openai_client = OpenAIClient(
+                    api_key=api_key,
+                    base_url=base_url,
+                    vision_cache=vision_cache,
+                    zero_copy=config_dict.get("zero_copy", config.VISION_ZERO_COPY),
+                    registry=get_client_registry() if config_dict.get("shared_client", config.OPENAI_SHARED_CLIENT) else None,
+                    coalesce=config_dict.get("coalesce", config.OPENAI_COALESCE),
+                    rate_limit=config_dict.get("rate_limit", config.OPENAI_RATE_LIMIT),
+                    usage_tracker=self.usage_tracker
+                )
+            
+            self.memory_profiler = CycleMemoryProfiler(
+                enabled=config_dict.get("profile_memory", config.VISION_PROFILE_MEMORY)
+            )
             
             # 更新配置参数
             self.model_name = config_dict.get("model_name", self.model_name)
             self.prompt_template = config_dict.get("prompt_template", self.prompt_template)
             self.max_tokens = config_dict.get("max_tokens", self.max_tokens)
             self.temperature = config_dict.get("temperature", self.temperature)
+            self.streaming = config_dict.get("stream_vision", self.streaming)
+            self.response_format = config_dict.get("response_format", self.response_format)
+            
+            endpoints = config_dict.get("vision_endpoints", config.VISION_ENDPOINTS)
+            if self.openai_client is not None and endpoints:
+                self.vision_router = self._build_vision_router(endpoints, config_dict)
             
             self._initialized = True
             print("[WatchAction] Initialization complete")
@@ -97,6 +248,7 @@ class WatchAction(BaseAction):
         
         Args:
             context: Action 执行上下文
+                - config.on_emergency: 流式接收到 emergency=true 时的回调，参数为已到达的字段
             
         Returns:
             ActionResult: 包含分析结果的 ActionResult
@@ -109,16 +261,119 @@ class WatchAction(BaseAction):
             if not self._initialized:
                 raise RuntimeError("WatchAction not initialized")
             
-            # 1. 捕获图像
-            image_bytes = await self.camera.capture_image()
-            if image_bytes is None:
+            self.memory_profiler.start()
+            allocations_before = self._buffer_allocations()
+            
+            # 1. 捕获图像（多摄像头时并发采集并按时间戳对齐）
+            frames = await self._capture_frames()
+            source = self._frame_source
+            frame_age = source.frame_age if source.continuous else None
+            if not frames:
                 return ActionResult(
                     success=False,
                     error=Exception("Failed to capture image"),
                     metadata={"elapsed_time": time.time() - start_time}
                 )
+            camera_ids = [f.camera_id for f in frames]
+            
+            # 2. 场景变化检测：画面未变化时复用上次的分析结果
+            change_score = None
+            thumb = None
+            last_result = context.shared_data.get("last_vision_result")
+            if self.scene_detector is not None:
+                if len(frames) == 1:
+                    changed, change_score, thumb = self.scene_detector.check(frames[0].frame)
+                else:
+                    changed, change_score, thumb = self.scene_detector.check_many([f.frame for f in frames])
+                if not changed and last_result is not None:
+                    self.scene_detector.mark_skipped()
+                    analysis_result = dict(last_result)
+                    analysis_result["reused"] = True
+                    
+                    elapsed_time = time.time() - start_time
+                    print(f"[WatchAction] Scene unchanged (score={change_score:.4f}), "
+                          f"reusing last result in {elapsed_time:.3f}s")
+                    
+                    return ActionResult(
+                        success=True,
+                        output=analysis_result,
+                        metadata={
+                            "elapsed_time": elapsed_time,
+                            "model": self.model_name,
+                            "frame_age": frame_age,
+                            "frames_dropped": source.frames_dropped,
+                            "vision_reused": True,
+                            "change_score": change_score,
+                            **self.scene_detector.stats(),
+                            "memory": self._memory_metadata(allocations_before)
+                        },
+                        next_actions=[]
+                    )
+            
+            # 3. 本地一级检测：明显正常的画面直接返回本地结果，不调用视觉模型
+            evidence_prompt = ""
+            cascade_metadata = {}
+            cascade_results = None
+            reasons = []
+            if self.cascade is not None:
+                cascade_results = dict(zip(camera_ids, await asyncio.gather(*(
+                    asyncio.to_thread(self.cascade.evaluate, f.frame, change_score, f.camera_id)
+                    for f in frames
+                ))))
+                escalate, reasons = self.cascade.decide(list(cascade_results.values()))
+                cascade_metadata = self._cascade_metadata(escalate, reasons, cascade_results)
+                
+                if not escalate:
+                    analysis_result = self.cascade.benign_result()
+                    analysis_result["reused"] = False
+                    context.shared_data["last_vision_result"] = analysis_result
+                    if self.scene_detector is not None:
+                        self.scene_detector.update_reference(thumb)
+                    
+                    elapsed_time = time.time() - start_time
+                    print(f"[WatchAction] Local cascade found nothing suspicious, "
+                          f"skipping vision model ({elapsed_time:.3f}s)")
+                    
+                    return ActionResult(
+                        success=True,
+                        output=analysis_result,
+                        metadata={
+                            "elapsed_time": elapsed_time,
+                            "model": None,
+                            "cameras": camera_ids,
+                            "frame_age": frame_age,
+                            "frames_dropped": source.frames_dropped,
+                            "vision_reused": False,
+                            "change_score": change_score,
+                            **(self.scene_detector.stats() if self.scene_detector else {}),
+                            "cascade": cascade_metadata,
+                            "memory": self._memory_metadata(allocations_before)
+                        },
+                        next_actions=[]
+                    )
+                
+                print(f"[WatchAction] Local cascade escalating: {', '.join(reasons)}")
+                evidence_prompt = self.cascade.evidence_prompt(cascade_results, reasons)
+            
+            # 4. 视觉模型端点熔断：只做本地分析，不等待超时，巡逻保持原有节奏
+            if self._vision_unavailable():
+                return await self._local_only_result(
+                    frames, change_score, cascade_results, start_time, allocations_before
+                )
+            
+            # 5. 预处理：裁剪、缩放并按字节预算编码（预算降级时先调整分辨率）
+            degradation = self._apply_degradation()
+            model = degradation.vision_model or self.model_name
+            stream_info = {"emergency_latency": None}
+            prepared_list = await asyncio.gather(
+                *(asyncio.to_thread(self.preprocessor.process, f.frame, f.camera_id) for f in frames)
+            )
+            image_size = sum(len(p.data) for p in prepared_list)
+            for camera_id, prepared in zip(camera_ids, prepared_list):
+                print(f"[WatchAction] Preprocessed image ({camera_id}): {prepared.width}x{prepared.height}, "
+                      f"{len(prepared.data)} bytes, quality={prepared.quality}")
             
-            # 2. 调用视觉模型分析
+            # 6. 调用视觉模型分析
             if self.openai_client is None:
                 # Mock 模式：返回模拟数据
                 print("[WatchAction] Using mock mode (no API key)")
@@ -132,27 +387,71 @@ class WatchAction(BaseAction):
                 # 获取自定义提示词（如果有）
                 prompt = context.config.get("prompt", self.prompt_template)
                 
-                # 调用 OpenAI API
-                analysis_result = await self.openai_client.vision_completion(
-                    model=self.model_name,
-                    image=image_bytes,
-                    prompt=prompt,
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens
-                )
+                # 多摄像头：所有画面放在同一个请求中
+                if len(frames) > 1:
+                    prompt += self.MULTI_CAMERA_PROMPT.format(
+                        count=len(frames),
+                        camera_ids="、".join(camera_ids)
+                    )
+                    image = [p.data for p in prepared_list]
+                    mime_type = [p.mime_type for p in prepared_list]
+                else:
+                    image = prepared_list[0].data
+                    mime_type = prepared_list[0].mime_type
+                
+                # 附加本地检测证据
+                prompt += evidence_prompt
+                
+                # 本地已发现火焰或烟雾时以紧急优先级排队，优先于其他巡检请求
+                priority = context.config.get("priority")
+                if priority is None:
+                    priority = EMERGENCY if {"fire", "smoke"} & set(reasons) else ROUTINE
+                
+                # 调用 OpenAI API（配置了备用端点时以对冲方式调用；
+                # 预算降级换用便宜模型时不再对冲，对冲请求本身会增加费用）
+                vision_start = time.time()
+                if self.vision_router is not None and degradation.vision_model is None:
+                    vision_call = self.vision_router.vision_completion
+                else:
+                    vision_call = functools.partial(self.openai_client.vision_completion, model=model)
+                request_format = response_format(self.response_format)
+                if request_format is not None:
+                    vision_call = functools.partial(vision_call, response_format=request_format)
+                try:
+                    analysis_result = await vision_call(
+                        image=image,
+                        prompt=prompt,
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        mime_type=mime_type,
+                        on_field=self._field_callback(context, vision_start, stream_info) if self.streaming else None,
+                        priority=priority
+                    )
+                except Exception as e:
+                    # 本次请求触发了熔断（或发出前已熔断）：本周期改用本地结果
+                    if not (isinstance(e, CircuitOpenError) or self._vision_unavailable()):
+                        raise
+                    print(f"[WatchAction] Vision endpoint unavailable ({e}), falling back to local analysis")
+                    return await self._local_only_result(
+                        frames, change_score, cascade_results, start_time, allocations_before
+                    )
+                if self.cascade is not None:
+                    self.cascade.record_cloud_latency(time.time() - vision_start)
+            
+            # 7. 按结果结构校验并规整字段类型
+            analysis = VisionAnalysis.from_dict(analysis_result)
+            if not analysis.valid:
+                self.invalid_results += 1
+                print(f"[WatchAction] Warning: vision result failed validation: {analysis.errors}")
+            analysis_result = analysis.to_dict()
+            if len(frames) > 1:
+                self._map_camera_results(analysis_result, camera_ids)
+            analysis_result["reused"] = False
             
-            # 3. 确保结果包含必要字段
-            if "objects_detected" not in analysis_result:
-                analysis_result["objects_detected"] = []
-            if "emergency" not in analysis_result:
-                analysis_result["emergency"] = False
-            if "confidence" not in analysis_result:
-                analysis_result["confidence"] = 0.0
-            if "description" not in analysis_result:
-                analysis_result["description"] = "无描述"
-            
-            # 4. 更新共享数据
+            # 8. 更新共享数据和场景参考帧
             context.shared_data["last_vision_result"] = analysis_result
+            if self.scene_detector is not None:
+                self.scene_detector.update_reference(thumb)
             
             elapsed_time = time.time() - start_time
             print(f"[WatchAction] Execution complete in {elapsed_time:.2f}s")
@@ -164,8 +463,27 @@ class WatchAction(BaseAction):
                 output=analysis_result,
                 metadata={
                     "elapsed_time": elapsed_time,
-                    "image_size": len(image_bytes),
-                    "model": self.model_name
+                    "image_size": image_size,
+                    "model": model,
+                    "cameras": camera_ids,
+                    "frame_skew": self.camera_group.last_skew if self.camera_group else 0.0,
+                    "frame_age": frame_age,
+                    "frames_dropped": source.frames_dropped,
+                    "vision_reused": False,
+                    "change_score": change_score,
+                    **(self.scene_detector.stats() if self.scene_detector else {}),
+                    "vision_cache": self._vision_cache_stats(),
+                    "coalescing": self._coalescing_stats(),
+                    "timing": self._request_timing(),
+                    "endpoints": self.vision_router.stats() if self.vision_router is not None else {},
+                    "parse": self._parse_stats(),
+                    "budget": degradation.to_dict(),
+                    "local_only": False,
+                    "circuit": self._circuit_stats(),
+                    "preprocess": self._preprocess_metadata(camera_ids, prepared_list),
+                    "cascade": cascade_metadata,
+                    "emergency_latency": stream_info["emergency_latency"],
+                    "memory": self._memory_metadata(allocations_before)
                 },
                 next_actions=[]  # 由决策模型决定后续 Action
             )
@@ -179,14 +497,330 @@ class WatchAction(BaseAction):
                 metadata={"elapsed_time": elapsed_time}
             )
     
+    async def _local_only_result(
+        self,
+        frames: List[CameraFrame],
+        change_score: Optional[float],
+        cascade_results: Optional[Dict[str, Any]],
+        start_time: float,
+        allocations_before: int
+    ) -> ActionResult:
+        """视觉模型端点熔断时仅凭本地检测返回结果，并在熔断器半开时后台探测端点
+        
+        不更新场景参考帧和 last_vision_result，端点恢复后的第一个周期重新由视觉模型分析。
+        """
+        self.local_only_cycles += 1
+        self._schedule_probe()
+        camera_ids = [f.camera_id for f in frames]
+        if cascade_results is None:
+            cascade_results = dict(zip(camera_ids, await asyncio.gather(*(
+                asyncio.to_thread(self.fallback_cascade.evaluate, f.frame, change_score, f.camera_id)
+                for f in frames
+            ))))
+        analysis_result = DetectorCascade.local_result(cascade_results)
+        analysis_result["reused"] = False
+        
+        elapsed_time = time.time() - start_time
+        print(f"[WatchAction] Vision endpoint circuit open, local-only result in {elapsed_time:.3f}s: "
+              f"emergency={analysis_result['emergency']}")
+        
+        source = self._frame_source
+        return ActionResult(
+            success=True,
+            output=analysis_result,
+            metadata={
+                "elapsed_time": elapsed_time,
+                "model": None,
+                "cameras": camera_ids,
+                "frame_age": source.frame_age if source.continuous else None,
+                "frames_dropped": source.frames_dropped,
+                "vision_reused": False,
+                "change_score": change_score,
+                "local_only": True,
+                "local_only_cycles": self.local_only_cycles,
+                "circuit": self._circuit_stats(),
+                "cascade": {camera_id: r.to_metadata() for camera_id, r in cascade_results.items()},
+                "memory": self._memory_metadata(allocations_before)
+            },
+            next_actions=[]
+        )
+    
+    def _vision_clients(self) -> List[OpenAIClient]:
+        """视觉请求可能使用的客户端（配置了备用端点时为各端点的客户端）"""
+        if self.vision_router is not None:
+            return [endpoint.client for endpoint in self.vision_router.endpoints]
+        return [self.openai_client] if isinstance(self.openai_client, OpenAIClient) else []
+    
+    def _vision_unavailable(self) -> bool:
+        """所有视觉端点都已熔断（且启用了本地兜底）"""
+        if self.fallback_cascade is None:
+            return False
+        clients = self._vision_clients()
+        return bool(clients) and not any(client.endpoint_available for client in clients)
+    
+    def _schedule_probe(self) -> None:
+        """熔断器进入半开状态时在后台探测端点，探测成功后下个周期恢复调用视觉模型"""
+        if self._probe_task is not None and not self._probe_task.done():
+            return
+        due = [client for client in self._vision_clients() if client.breaker.state == HALF_OPEN]
+        if due:
+            self._probe_task = asyncio.create_task(self._probe_endpoints(due))
+    
+    @staticmethod
+    async def _probe_endpoints(clients: List[OpenAIClient]) -> None:
+        results = await asyncio.gather(*(client.probe_endpoint() for client in clients))
+        if any(results):
+            print("[WatchAction] Vision endpoint reachable again, resuming cloud analysis")
+    
+    def _circuit_stats(self) -> Dict[str, Any]:
+        """获取视觉端点的熔断器统计"""
+        return {client.base_url: client.circuit_stats() for client in self._vision_clients()}
+    
+    @staticmethod
+    def _field_callback(context: ActionContext, vision_start: float, stream_info: Dict[str, Any]):
+        """生成流式字段回调：记录 emergency 到达的耗时，为 true 时立即通知调用方"""
+        on_emergency = context.config.get("on_emergency")
+        fields = {}
+        
+        def on_field(key: str, value: Any):
+            fields[key] = value
+            if key != "emergency":
+                return None
+            stream_info["emergency_latency"] = time.time() - vision_start
+            print(f"[WatchAction] emergency={value} received after {stream_info['emergency_latency']:.2f}s")
+            if value is True and on_emergency is not None:
+                return on_emergency(dict(fields))
+            return None
+        
+        return on_field
+    
+    @property
+    def _frame_source(self):
+        """当前使用的图像来源（摄像头组或单个摄像头）"""
+        return self.camera_group if self.camera_group is not None else self.camera
+    
+    @property
+    def camera_sensors(self) -> Dict[str, CameraSensor]:
+        """当前使用的各路摄像头 {camera_id: CameraSensor}，供运动触发等后台监视使用"""
+        if self.camera_group is not None:
+            return dict(self.camera_group.cameras)
+        if self.camera is not None:
+            return {"default": self.camera}
+        return {}
+    
+    async def _capture_frames(self) -> Optional[List[CameraFrame]]:
+        """采集一组画面，单摄像头时返回只含一帧的列表"""
+        if self.camera_group is not None:
+            return await self.camera_group.capture_frames()
+        
+        frame = await self.camera.capture_frame(out=self._frame_buffer)
+        if frame is None:
+            return None
+        self._frame_buffer = frame
+        return [CameraFrame(camera_id="default", frame=frame, timestamp=time.time())]
+    
+    @staticmethod
+    def _map_camera_results(analysis_result: Dict[str, Any], camera_ids: List[str]) -> None:
+        """将多图分析结果映射回各个摄像头
+        
+        模型可能以对象（按摄像头 ID）或数组（按图像顺序）返回 cameras 字段，
+        缺失的摄像头使用整体结果兜底；任一摄像头紧急即整体紧急。
+        """
+        raw = analysis_result.get("cameras")
+        if isinstance(raw, list):
+            raw = {camera_id: item for camera_id, item in zip(camera_ids, raw)}
+        if not isinstance(raw, dict):
+            raw = {}
+        
+        cameras = {}
+        for camera_id in camera_ids:
+            item = raw.get(camera_id)
+            if not isinstance(item, dict):
+                item = {}
+            cameras[camera_id] = {
+                "objects_detected": item.get("objects_detected", []),
+                "emergency": bool(item.get("emergency", False)),
+                "description": item.get("description", ""),
+            }
+        
+        analysis_result["cameras"] = cameras
+        if any(c["emergency"] for c in cameras.values()):
+            analysis_result["emergency"] = True
+        if not analysis_result["objects_detected"]:
+            objects = []
+            for c in cameras.values():
+                objects.extend(o for o in c["objects_detected"] if o not in objects)
+            analysis_result["objects_detected"] = objects
+    
+    @staticmethod
+    def _preprocess_metadata(camera_ids: List[str], prepared_list: List[Any]) -> Dict[str, Any]:
+        """汇总预处理统计，多摄像头时按摄像头分别列出"""
+        if len(prepared_list) == 1:
+            return prepared_list[0].to_metadata()
+        return {
+            "output_bytes": sum(len(p.data) for p in prepared_list),
+            "cameras": {
+                camera_id: prepared.to_metadata()
+                for camera_id, prepared in zip(camera_ids, prepared_list)
+            },
+        }
+    
+    def _cascade_metadata(
+        self,
+        escalate: bool,
+        reasons: List[str],
+        results: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """汇总本地级联的判定、各摄像头证据和累计效果报告"""
+        if len(results) == 1:
+            metadata = next(iter(results.values())).to_metadata()
+        else:
+            metadata = {"cameras": {camera_id: r.to_metadata() for camera_id, r in results.items()}}
+        metadata["escalate"] = escalate
+        metadata["reasons"] = reasons
+        metadata["report"] = self.cascade.report()
+        return metadata
+    
+    def _buffer_allocations(self) -> int:
+        """帧、缩放和请求体缓冲区的累计分配次数，前后相减即为单个周期的分配次数"""
+        count = self.preprocessor.buffer_allocations
+        source = self._frame_source
+        count += getattr(source, "buffer_allocations", 0)
+        if isinstance(self.openai_client, OpenAIClient) and self.openai_client.payload_pool is not None:
+            count += self.openai_client.payload_pool.buffer_allocations
+        return count
+    
+    def _memory_metadata(self, allocations_before: int) -> Dict[str, Any]:
+        """结束内存统计周期，汇总峰值内存和本周期的缓冲区分配次数"""
+        return {
+            **self.memory_profiler.stop(),
+            "buffer_allocations": self._buffer_allocations() - allocations_before
+        }
+    
+    @staticmethod
+    def _build_cascade(config_dict: Dict[str, Any]) -> DetectorCascade:
+        """按配置创建本地检测级联"""
+        return DetectorCascade(
+            person_enabled=config_dict.get("cascade_person_detection", config.CASCADE_PERSON_DETECTION),
+            fire_threshold=config_dict.get("cascade_fire_threshold", config.CASCADE_FIRE_THRESHOLD),
+            smoke_threshold=config_dict.get("cascade_smoke_threshold", config.CASCADE_SMOKE_THRESHOLD),
+            change_threshold=config_dict.get("cascade_change_threshold", config.CASCADE_CHANGE_THRESHOLD),
+            max_skip_age=config_dict.get("cascade_max_skip_age", config.CASCADE_MAX_SKIP_AGE)
+        )
+    
+    def _apply_degradation(self) -> Degradation:
+        """按预算使用率调整上传图像长边上限，返回当前降级策略"""
+        degradation = self.usage_tracker.degradation()
+        long_edge = self._base_long_edge
+        if long_edge and degradation.image_scale != 1.0:
+            long_edge = max(1, int(long_edge * degradation.image_scale))
+        if long_edge != self.preprocessor.max_long_edge:
+            print(f"[WatchAction] Budget degradation level {degradation.level}, "
+                  f"max long edge {self.preprocessor.max_long_edge} -> {long_edge}")
+            self.preprocessor.max_long_edge = long_edge
+        return degradation
+    
+    def _vision_cache_stats(self) -> Dict[str, Any]:
+        """获取视觉结果缓存统计，未启用缓存时返回空字典"""
+        if self.openai_client is None or self.openai_client.vision_cache is None:
+            return {}
+        return self.openai_client.vision_cache.stats()
+    
+    def _coalescing_stats(self) -> Dict[str, Any]:
+        """获取请求合并统计，未初始化客户端时返回空字典"""
+        if not isinstance(self.openai_client, OpenAIClient):
+            return {}
+        return self.openai_client.coalescing_stats()
+    
+    def _request_timing(self) -> Dict[str, Any]:
+        """获取本次视觉请求的排队耗时和 API 耗时（分开统计），未发出请求时返回空字典"""
+        client = self.openai_client
+        if self.vision_router is not None:
+            # 对冲调用时取胜出端点的耗时；调用失败时没有胜出端点
+            endpoint = self.vision_router.last_endpoint
+            if endpoint is None:
+                return {}
+            return {**endpoint.client.last_timing, "endpoint": endpoint.name}
+        if not isinstance(client, OpenAIClient):
+            return {}
+        return dict(client.last_timing)
+    
+    def _parse_stats(self) -> Dict[str, Any]:
+        """汇总视觉结果的 JSON 提取方式、失败率和结构校验失败次数"""
+        clients = [self.openai_client]
+        if self.vision_router is not None:
+            clients = [endpoint.client for endpoint in self.vision_router.endpoints]
+        merged = ParseStats.combine([c.parse_stats for c in clients if isinstance(c, OpenAIClient)])
+        merged.invalid = self.invalid_results
+        return merged.stats()
+    
+    def _build_vision_router(self, endpoints: List[Dict[str, Any]], config_dict: Dict[str, Any]) -> HedgedRouter:
+        """以当前客户端为主端点、按配置追加备用端点，构造对冲路由
+        
+        备用端点未指定 base_url / api_key 时沿用主端点的设置，并共用视觉结果缓存、
+        用量统计（预算降级计入对冲和切换的调用）和熔断开关。
+        """
+        primary = self.openai_client
+        routes = [Endpoint(f"{self.model_name}@{primary.base_url}", primary, self.model_name)]
+        for spec in endpoints:
+            base_url = spec.get("base_url", primary.base_url)
+            client = OpenAIClient(
+                api_key=spec.get("api_key", primary.api_key),
+                base_url=base_url,
+                vision_cache=primary.vision_cache,
+                zero_copy=primary.zero_copy,
+                registry=primary.registry,
+                coalesce=primary.coalesce,
+                rate_limit=primary.rate_limit,
+                usage_tracker=self.usage_tracker,
+                circuit_breaker=primary.circuit_breaker
+            )
+            routes.append(Endpoint(spec.get("name", f"{spec['model']}@{base_url}"), client, spec["model"]))
+        print(f"[WatchAction] Vision endpoints: {[route.name for route in routes]}")
+        return HedgedRouter(
+            routes,
+            quantile=config_dict.get("hedge_quantile", config.VISION_HEDGE_QUANTILE),
+            default_delay=config_dict.get("hedge_default_delay", config.VISION_HEDGE_DEFAULT_DELAY),
+            min_delay=config_dict.get("hedge_min_delay", config.VISION_HEDGE_MIN_DELAY),
+            max_delay=config_dict.get("hedge_max_delay", config.VISION_HEDGE_MAX_DELAY),
+            min_samples=config_dict.get("hedge_min_samples", config.VISION_HEDGE_MIN_SAMPLES)
+        )
+    
     def cleanup(self) -> None:
         """清理资源"""
         print("[WatchAction] Cleaning up...")
         
         if self.camera:
-            # CameraSensor 的清理由其 __del__ 方法处理
+            # 停止后台采集线程并释放设备
+            self.camera.stop()
             self.camera = None
         
+        if self.camera_group:
+            self.camera_group.stop()
+            self.camera_group = None
+        
+        self.scene_detector = None
+        self.preprocessor = None
+        self._frame_buffer = None
+        
+        if self.cascade:
+            print(f"[WatchAction] Cascade report: {self.cascade.report()}")
+            self.cascade = None
+        self.fallback_cascade = None
+        
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        
+        if self.memory_profiler:
+            self.memory_profiler.close()
+            self.memory_profiler = None
+        
+        if self.vision_router:
+            print(f"[WatchAction] Vision endpoint report: {self.vision_router.stats()}")
+            self.vision_router.close(keep=self.openai_client)
+            self.vision_router = None
+        
         if self.openai_client:
             self.openai_client.close()
             self.openai_client = None
@@ -15,7 +15,12 @@ from core.action import (
     WatchAction,
     SpeakAction,
     AlertAction,
+    ListenAction,
 )
+from core.motion_trigger import MotionTrigger
+from core.client.rate_limit import EMERGENCY
+from core.client.registry import get_client_registry
+from core.client.usage import UsageTracker, get_usage_tracker, usage_scope
 import config
 
 class AgentState(Enum):
@@ -41,15 +46,32 @@ class RobotAgent:
     通过 Actions 插槽机制实现能力的灵活扩展
     """
     
-    def __init__(self, patrol_interval: float = None):
+    def __init__(
+        self,
+        patrol_interval: float = None,
+        patrol_mode: str = None,
+        heartbeat_interval: float = None,
+        name: str = None,
+        usage_tracker: Optional[UsageTracker] = None
+    ):
         """
         初始化机器人代理
         
         Args:
             patrol_interval: 巡逻间隔时间(秒)
+            patrol_mode: 巡逻模式，interval（固定间隔）或 motion（运动触发）
+            heartbeat_interval: 运动触发模式下没有运动时的巡检间隔(秒)
+            name: 代理名称，用量统计按此归属
+            usage_tracker: 用量与预算统计，为 None 时使用进程级默认统计器；
+                预算接近上限时按其降级策略拉长巡逻间隔
         """
         self.state = AgentState.IDLE
         self.patrol_interval = patrol_interval or config.PATROL_INTERVAL
+        self.patrol_mode = patrol_mode or config.PATROL_MODE
+        self.heartbeat_interval = heartbeat_interval or config.PATROL_HEARTBEAT_INTERVAL
+        self.motion_trigger: Optional[MotionTrigger] = None
+        self.name = name or config.AGENT_NAME
+        self.usage_tracker = usage_tracker or get_usage_tracker()
         
         # Actions 插槽
         self.actions: Dict[str, BaseAction] = {}
@@ -63,6 +85,9 @@ class RobotAgent:
         # 运行控制
         self._patrol_task: Optional[asyncio.Task] = None
         self._task_manager_task: Optional[asyncio.Task] = None
+        self._warm_up_task: Optional[asyncio.Task] = None
+        self._tts_warm_up_task: Optional[asyncio.Task] = None
+        self._mcp_connect_task: Optional[asyncio.Task] = None
         
         print("[Agent] Robot agent initialized in IDLE state")
         print("[Agent] Using action-based architecture")
@@ -70,12 +95,37 @@ class RobotAgent:
     def start(self):
         """启动代理"""
         print("[Agent] Starting robot agent...")
+        
+        # 预热各 Action 共享的 API 连接，首个巡检周期不再等待握手
+        registry = get_client_registry()
+        if config.OPENAI_WARM_UP and len(registry):
+            self._warm_up_task = asyncio.create_task(registry.warm_up())
+        
+        # 预先合成常用播报语句，紧急播报开头无需等待合成
+        speak = self.actions.get("speak")
+        if isinstance(speak, SpeakAction):
+            self._tts_warm_up_task = asyncio.create_task(speak.warm_up())
+        
+        # 预先连接 MCP 服务，首次应急调用无需等待启动和握手
+        alert = self.actions.get("alert")
+        if isinstance(alert, AlertAction) and alert.mcp_manager.servers:
+            self._mcp_connect_task = asyncio.create_task(alert.mcp_manager.start())
+        
+        # 投递上次运行中未送达的告警
+        if isinstance(alert, AlertAction) and alert.outbox is not None:
+            alert.outbox.start()
+        
         self.set_state(AgentState.PATROLLING)
     
     def stop(self):
         """停止代理"""
         print("[Agent] Stopping robot agent...")
         
+        # 预合成任务使用 speak 的客户端，先于 Action 清理取消
+        if self._tts_warm_up_task:
+            self._tts_warm_up_task.cancel()
+            self._tts_warm_up_task = None
+        
         # 清理所有 Actions
         for action_name in list(self.actions.keys()):
             self.unregister_action(action_name)
@@ -89,6 +139,14 @@ class RobotAgent:
         if self._task_manager_task:
             self._task_manager_task.cancel()
             
+        if self._warm_up_task:
+            self._warm_up_task.cancel()
+            self._warm_up_task = None
+            
+        if self._mcp_connect_task:
+            self._mcp_connect_task.cancel()
+            self._mcp_connect_task = None
+            
         # 取消所有正在运行的任务
         for task in self.running_tasks.values():
             task.cancel()
@@ -107,6 +165,9 @@ class RobotAgent:
             # 初始化 Action
             if config_dict is None:
                 config_dict = {}
+            if isinstance(action, ListenAction) and "on_transcript" not in config_dict:
+                # 识别出的语音指令加入任务队列
+                config_dict = {**config_dict, "on_transcript": self.add_voice_command}
             action.initialize(config_dict)
             
             # 存储 Action 和元信息
@@ -128,6 +189,11 @@ class RobotAgent:
         if name in self.actions:
             print(f"[Agent] Unregistering action: {name}")
             
+            if name == "watch" and self.motion_trigger:
+                # 运动触发器引用的是该 Action 的摄像头
+                self.motion_trigger.stop()
+                self.motion_trigger = None
+            
             action = self.actions[name]
             action.cleanup()
             
@@ -163,9 +229,10 @@ class RobotAgent:
                 config=config_dict or {}
             )
             
-            # 执行 Action
+            # 执行 Action（期间发出的 API 请求计入该 Action 和本代理的用量）
             action = self.actions[name]
-            result = await action.execute(context)
+            with usage_scope(action=name, agent=self.name):
+                result = await action.execute(context)
             
             return result
             
@@ -225,6 +292,10 @@ class RobotAgent:
     
     def _stop_patrol_routine(self):
         """停止巡逻例程"""
+        if self.motion_trigger:
+            self.motion_trigger.stop()
+            self.motion_trigger = None
+            
         if self._patrol_task:
             self._patrol_task.cancel()
             self._patrol_task = None
@@ -239,57 +310,190 @@ class RobotAgent:
         """巡逻主循环（使用 Action 机制）"""
         try:
             print("[Agent] Entering patrol loop (action-based)")
+            trigger = "start"
             while True:
                 if self.state == AgentState.PATROLLING:
                     # 执行 watch Action 进行图像理解
                     if "watch" in self.actions:
-                        result = await self.execute_action("watch")
+                        self.shared_context["patrol_trigger"] = trigger
+                        early_alert: Dict[str, asyncio.Task] = {}
+                        result = await self.execute_action(
+                            "watch",
+                            config_dict={"on_emergency": self._early_alert_callback(early_alert)}
+                        )
                         
                         if result.success:
                             # 根据分析结果采取行动
                             analysis_result = result.output
-                            await self._handle_analysis_result(analysis_result)
+                            await self._handle_analysis_result(analysis_result, early_alert.get("alert"))
                         else:
                             print(f"[Agent] Watch action failed: {result.error}")
+                            await self._settle_early_alert(early_alert.get("alert"), "watch action failed")
                     else:
                         print("[Agent] Warning: 'watch' action not registered")
                 
                 # 等待下次巡逻
-                await asyncio.sleep(self.patrol_interval)
+                trigger = await self._wait_next_patrol()
                 
         except asyncio.CancelledError:
             print("[Agent] Patrol loop cancelled")
         except Exception as e:
             print(f"[Agent] Error in patrol loop: {e}")
     
-    async def _handle_analysis_result(self, result: Dict[str, Any]):
-        """处理图像分析结果"""
+    async def _wait_next_patrol(self) -> str:
+        """等待下一次巡逻时机
+        
+        固定间隔模式下休眠 patrol_interval；运动触发模式下等待运动唤醒，
+        没有运动时按心跳间隔巡检。预算降级时两种间隔都按降级倍率拉长。
+        
+        Returns:
+            str: 触发原因（interval / motion / heartbeat）
+        """
+        # 预算接近上限时按降级策略拉长间隔
+        scale = self.usage_tracker.degradation().patrol_interval_scale
+        if scale != 1.0:
+            print(f"[Agent] Budget degradation active, patrol interval x{scale:g}")
+        
+        if self.patrol_mode == "motion":
+            trigger = self._ensure_motion_trigger()
+            if trigger is not None:
+                reason = await trigger.wait(self.heartbeat_interval * scale)
+                if reason == MotionTrigger.MOTION:
+                    self.shared_context["motion_latency"] = time.time() - trigger.motion_at
+                    print(f"[Agent] Woken by motion on {trigger.motion_camera}")
+                return reason
+        
+        await asyncio.sleep(self.patrol_interval * scale)
+        return "interval"
+    
+    def _ensure_motion_trigger(self) -> Optional[MotionTrigger]:
+        """按需创建运动触发器，watch 没有连续采集的摄像头时返回 None（退回固定间隔）"""
+        if self.motion_trigger is None:
+            watch = self.actions.get("watch")
+            cameras = getattr(watch, "camera_sensors", {})
+            if not cameras or not all(camera.continuous for camera in cameras.values()):
+                print("[Agent] Motion patrol requires continuous capture, falling back to interval mode")
+                self.patrol_mode = "interval"
+                return None
+            self.motion_trigger = MotionTrigger(
+                cameras,
+                cooldown=config.MOTION_COOLDOWN,
+                sample_interval=config.MOTION_SAMPLE_INTERVAL,
+                threshold=config.MOTION_THRESHOLD,
+                pixel_threshold=config.MOTION_PIXEL_THRESHOLD
+            )
+        self.motion_trigger.start()
+        return self.motion_trigger
+    
+    def _early_alert_callback(self, early_alert: Dict[str, asyncio.Task]) -> Callable:
+        """生成流式视觉结果的 emergency 回调
+        
+        视觉模型一输出 emergency=true 就启动 alert Action，不等待后续描述生成完毕；
+        启动的任务记录在 early_alert["alert"] 中，由 _handle_emergency 等待其结果并补发最终分析；
+        最终结果不是紧急情况或 watch 失败时由 _settle_early_alert 等待并记录。
+        """
+        def on_emergency(fields: Dict[str, Any]) -> None:
+            if "alert" not in self.actions or "alert" in early_alert:
+                return
+            print("[Agent] Emergency flagged while streaming, starting alert early")
+            event_details = {
+                "type": "vision_emergency",
+                "description": fields.get("description", "视觉模型判定存在紧急情况（详细描述生成中）"),
+                "confidence": fields.get("confidence", 0.0),
+                "objects_detected": fields.get("objects_detected", []),
+                "early": True
+            }
+            early_alert["alert"] = asyncio.create_task(
+                self.execute_action("alert", input_data=event_details)
+            )
+        
+        return on_emergency
+    
+    async def _handle_analysis_result(self, result: Dict[str, Any], early_alert: Optional[asyncio.Task] = None):
+        """处理图像分析结果
+        
+        Args:
+            result: 视觉分析结果
+            early_alert: 流式接收时已提前启动的 alert 任务
+        """
         print(f"[Agent] Handling analysis result: {result}")
         
         if result.get("emergency", False):
             # 处理紧急情况
-            await self._handle_emergency(result)
+            await self._handle_emergency(result, early_alert)
         else:
             # 继续正常巡逻
             print("[Agent] No emergency detected, continuing patrol")
+            await self._settle_early_alert(early_alert, "final analysis found no emergency")
+    
+    async def _settle_early_alert(self, early_alert: Optional[asyncio.Task], reason: str) -> None:
+        """等待没有进入紧急处理的提前报警完成，并记录结果
+        
+        告警可能已经送达应急服务，因此不取消，只记录其与最终结果不一致
+        
+        Args:
+            early_alert: 流式接收时已提前启动的 alert 任务
+            reason: 没有进入紧急处理的原因
+        """
+        if early_alert is None:
+            return
+        result = await early_alert
+        print(f"[Agent] Early alert {self._alert_status(result)}, but {reason}")
+    
+    @staticmethod
+    def _alert_status(result: ActionResult) -> str:
+        """描述 alert Action 的结果：已送达、仍在发件箱中等待投递或失败"""
+        output = result.output or {}
+        if not result.success:
+            return f"failed ({result.error})"
+        if output.get("service_called"):
+            return "sent"
+        if output.get("queued"):
+            return f"queued in outbox as {output.get('alert_id')}, delivery continues in background"
+        return "not delivered"
     
-    async def _handle_emergency(self, emergency_data: Dict[str, Any]):
+    async def _handle_emergency(self, emergency_data: Dict[str, Any], early_alert: Optional[asyncio.Task] = None):
         """处理紧急情况（使用 Action 机制）"""
         print(f"[Agent] Emergency detected: {emergency_data}")
         self.set_state(AgentState.ALERT)
         
-        # 执行 alert Action
-        if "alert" in self.actions:
-            result = await self.execute_action("alert", input_data=emergency_data)
-            if result.success:
-                print("[Agent] Emergency service called successfully")
-            else:
-                print(f"[Agent] Failed to call emergency service: {result.error}")
+        # 执行 alert Action（流式接收时已提前启动），不等它投递完成就开始播报
+        alert_task = early_alert
+        if alert_task is None and "alert" in self.actions:
+            alert_task = asyncio.create_task(self.execute_action("alert", input_data=emergency_data))
         
-        # 执行 speak Action 进行语音播报
+        # 执行 speak Action 进行语音播报：先播放已预热的固定开头，再播报详细描述
+        # 紧急播报打断正在进行的日常播报；只入队不等待播放结束
         if "speak" in self.actions:
-            alert_text = f"检测到紧急情况：{emergency_data.get('description', '未知异常')}"
-            await self.execute_action("speak", input_data=alert_text)
+            speak_config = {"priority": EMERGENCY, "wait": False}
+            await self.execute_action("speak", input_data=config.TTS_EMERGENCY_PHRASE, config_dict=speak_config)
+            alert_text = emergency_data.get('description', '未知异常')
+            await self.execute_action("speak", input_data=alert_text, config_dict=speak_config)
+        
+        if alert_task is not None:
+            result = await alert_task
+            started = " (started early)" if alert_task is early_alert else ""
+            output = result.output or {}
+            if result.success and output.get("service_called"):
+                print(f"[Agent] Emergency service called successfully{started}")
+            elif result.success and output.get("queued"):
+                # 未在等待时间内送达，告警留在发件箱中由后台继续投递
+                print(f"[Agent] Emergency alert {self._alert_status(result)}{started}")
+            else:
+                print(f"[Agent] Failed to call emergency service: {result.error or 'not delivered'}")
+            
+            # 提前报警只带有流式输出中已生成的字段，补发完整的最终分析
+            if alert_task is early_alert and "alert" in self.actions:
+                follow_up = {
+                    "type": "vision_emergency",
+                    "description": emergency_data.get("description", "未知紧急情况"),
+                    "confidence": emergency_data.get("confidence", 0.0),
+                    "objects_detected": emergency_data.get("objects_detected", []),
+                    "follow_up_of": output.get("alert_id")
+                }
+                result = await self.execute_action("alert", input_data=follow_up)
+                if not result.success:
+                    print(f"[Agent] Failed to send final analysis to emergency service: {result.error}")
         
         # 切换到响应状态
         self.set_state(AgentState.RESPONDING)
@@ -382,6 +586,34 @@ class RobotAgent:
         """添加新任务到队列"""
         print(f"[Agent] Adding task to queue: {task.name} ({task.id})")
         self.task_queue.append(task)
+    
+    def add_voice_command(self, text: str, segment: Any = None) -> Task:
+        """把识别出的语音指令作为任务加入队列
+        
+        任务执行时把指令记录到共享上下文 voice_commands 中，供后续 Action 处理
+        
+        Args:
+            text: 识别出的文本
+            segment: 对应的语音片段（可选）
+        """
+        heard_at = time.time()
+        
+        async def record(task: Task) -> None:
+            self.shared_context.setdefault("voice_commands", []).append({
+                "text": text,
+                "heard_at": heard_at,
+                "start": getattr(segment, "start", None),
+            })
+            task.status = "completed"
+        
+        task = Task(
+            id=f"voice-{int(heard_at * 1000)}-{len(self.task_queue)}",
+            name=f"voice_command: {text}",
+            callback=record,
+            created_at=heard_at
+        )
+        self.add_task(task)
+        return task
 
 # 示例：使用 Action 机制的 main 函数
 async def main():
@@ -0,0 +1,365 @@
+# core/alert_outbox.py
+"""告警发件箱
+
+告警先追加到本地只追加日志（每行一条 JSON 记录），落盘后才交给后台投递，
+投递失败或进程中途退出都不会丢失告警（至少投递一次）：
+- 组提交：同一时间窗口内追加的告警合并为一次 write + fsync，调用方等待落盘后返回
+- 后台投递：按追加顺序分批投递，失败的告警按指数退避（带抖动）重试
+- 幂等键：每条告警的 id 随投递一起发送，重试或重放导致的重复投递由接收方去重
+- 重放：启动时读取日志，未确认投递的告警重新进入投递队列；末尾写了一半的记录被截掉
+- 压缩：已确认的记录累计超过阈值时，把仍未投递的告警重写为新日志并原子替换
+
+日志记录：
+    {"op": "append", "id": ..., "created_at": ..., "event": {...}}
+    {"op": "ack", "ids": [...]}
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from core.client.hedging import LatencyHistogram
+from core.client.registry import close_later
+
+
+@dataclass
+class OutboxEntry:
+    """一条待投递的告警"""
+    id: str  # 幂等键
+    event: Dict[str, Any]
+    created_at: float  # 追加时间（时间戳）
+    attempts: int = 0  # 已失败的投递次数
+    queued_at: float = 0.0  # 进入投递队列的时间（单调时钟，不落盘）
+    durable: bool = False  # 追加记录是否已落盘（落盘前不投递）
+
+
+Deliver = Callable[[List[OutboxEntry]], Awaitable[Iterable[str]]]
+
+
+class AlertOutbox:
+    """基于预写日志的告警发件箱"""
+    
+    def __init__(
+        self,
+        path: str,
+        deliver: Deliver,
+        batch_size: int = 50,
+        fsync_interval: float = 0.005,
+        fsync: bool = True,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 30.0,
+        compact_bytes: int = 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """初始化发件箱，重放日志中未确认投递的告警
+        
+        Args:
+            path: 日志文件路径，所在目录不存在时创建
+            deliver: 投递一批告警的协程函数，返回投递成功的告警 id（抛出异常视为全部失败）
+            batch_size: 每批投递的最大告警数
+            fsync_interval: 组提交等待时间（秒），期间追加的告警合并为一次 fsync
+            fsync: 是否 fsync（关闭后只保证写入操作系统缓存）
+            retry_base_delay: 投递失败后的重试等待时间初值（秒），连续失败时翻倍
+            retry_max_delay: 重试等待时间上限（秒）
+            compact_bytes: 日志超过此大小且有已确认记录时压缩
+            clock: 单调时钟（测试时可替换）
+        """
+        self.path = path
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.fsync = fsync
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.compact_bytes = compact_bytes
+        self.clock = clock
+        
+        self._pending: "OrderedDict[str, OutboxEntry]" = OrderedDict()  # 按追加顺序
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._buffer: List[bytes] = []
+        self._commit: Optional[asyncio.Future] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._acked_bytes = 0  # 日志中已确认可以丢弃的字节数（估算）
+        self._failures = 0  # 连续投递失败的批次数
+        self.latency = LatencyHistogram(window=10000)  # 进入队列到确认投递的延迟
+        
+        # 统计计数
+        self.appended = 0
+        self.delivered = 0
+        self.retries = 0
+        self.failed_batches = 0
+        self.fsyncs = 0
+        self.compactions = 0
+        self.replayed = 0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._replay()
+        self._file = open(path, "ab")
+    
+    def _replay(self) -> None:
+        """读取日志恢复未确认投递的告警，截掉末尾不完整的记录"""
+        if not os.path.exists(self.path):
+            return
+        entries: "OrderedDict[str, OutboxEntry]" = OrderedDict()
+        acked = 0
+        good = 0  # 最后一条完整记录的结束位置
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # 写了一半时进程退出
+            good += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"[AlertOutbox] Skipping corrupt record in {self.path}")
+                continue
+            if record.get("op") == "append":
+                entries[record["id"]] = OutboxEntry(record["id"], record.get("event", {}), record.get("created_at", 0.0))
+            elif record.get("op") == "ack":
+                for entry_id in record.get("ids", []):
+                    if entries.pop(entry_id, None) is not None:
+                        acked += 1
+        if good < len(data):
+            print(f"[AlertOutbox] Truncating {len(data) - good} bytes of incomplete record")
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+        
+        now = self.clock()
+        for entry in entries.values():
+            entry.queued_at = now
+            entry.durable = True
+        self._pending = entries
+        self.replayed = len(entries)
+        if acked:
+            self._rewrite(list(entries.values()))
+        if entries:
+            print(f"[AlertOutbox] Replaying {len(entries)} undelivered alerts from {self.path}")
+    
+    @staticmethod
+    def _encode(record: Dict[str, Any]) -> bytes:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+    
+    def _rewrite(self, entries: List[OutboxEntry]) -> None:
+        """只保留未确认的告警，写入临时文件后原子替换日志"""
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as f:
+            for entry in entries:
+                f.write(self._encode({"op": "append", "id": entry.id, "created_at": entry.created_at, "event": entry.event}))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(temp, self.path)
+        self._acked_bytes = 0
+    
+    # ---- 预写日志 ----
+    
+    async def append(self, event: Dict[str, Any], key: Optional[str] = None) -> OutboxEntry:
+        """追加一条告警，落盘后返回（之后由后台投递）
+        
+        Args:
+            event: 告警内容
+            key: 幂等键，默认生成随机 id；同一键已在队列中时直接返回已有条目
+        """
+        if key is not None and key in self._pending:
+            return self._pending[key]
+        entry = OutboxEntry(key or uuid.uuid4().hex, event, time.time())
+        # 落盘前就加入队列（压缩日志时不会漏掉），但投递要等落盘之后
+        self._pending[entry.id] = entry
+        try:
+            await self._write(self._encode({"op": "append", "id": entry.id, "created_at": entry.created_at, "event": event}))
+        except BaseException:
+            self._pending.pop(entry.id, None)
+            raise
+        entry.durable = True
+        entry.queued_at = self.clock()
+        self.appended += 1
+        self.start()
+        self._wakeup.set()
+        return entry
+    
+    def _write(self, line: bytes) -> asyncio.Future:
+        """把记录放入当前提交组，返回该组落盘时完成的 future"""
+        self._buffer.append(line)
+        if self._commit is None:
+            self._commit = asyncio.get_running_loop().create_future()
+        commit = self._commit
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        return commit
+    
+    async def _flush(self) -> None:
+        """组提交：等待一个窗口收集记录，一次写入并 fsync"""
+        if self.fsync_interval:
+            await asyncio.sleep(self.fsync_interval)
+        while self._buffer:
+            data, self._buffer = b"".join(self._buffer), []
+            commit, self._commit = self._commit, None
+            try:
+                await asyncio.to_thread(self._write_sync, data)
+            except Exception as e:
+                print(f"[AlertOutbox] Failed to write log: {e}")
+                commit.set_exception(e)
+                commit.exception()  # 只写确认记录的调用方不等待结果
+            else:
+                commit.set_result(None)
+            if self._acked_bytes and self._acked_bytes * 2 >= self.compact_bytes and self._file.tell() >= self.compact_bytes:
+                await asyncio.to_thread(self._compact_sync, list(self._pending.values()))
+    
+    def _write_sync(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+    
+    def _compact_sync(self, entries: List[OutboxEntry]) -> None:
+        self._file.close()
+        try:
+            self._rewrite(entries)
+            self.compactions += 1
+        finally:
+            self._file = open(self.path, "ab")
+    
+    # ---- 投递 ----
+    
+    def start(self) -> None:
+        """启动后台投递（包括重放的告警），需要在事件循环中调用"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+            self._idle = asyncio.Event()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        if self._pending:
+            self._wakeup.set()
+    
+    async def _run(self) -> None:
+        while True:
+            batch = []
+            for entry in self._pending.values():
+                # 未落盘的告警都在队列末尾
+                if not entry.durable or len(batch) >= self.batch_size:
+                    break
+                batch.append(entry)
+            if not batch:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._idle.clear()
+            
+            try:
+                delivered = set(await self.deliver(batch))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[AlertOutbox] Delivery of {len(batch)} alerts failed: {type(e).__name__}: {e}")
+                delivered = set()
+            
+            done = [entry for entry in batch if entry.id in delivered]
+            if done:
+                self._acknowledge(done)
+            failed = [entry for entry in batch if entry.id not in delivered]
+            if not failed:
+                self._failures = 0
+                continue
+            
+            # 整批按序重试，不让失败的告警被后来的告警越过
+            for entry in failed:
+                entry.attempts += 1
+            self.retries += len(failed)
+            self.failed_batches += 1
+            self._failures += 1
+            delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (self._failures - 1))
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+    
+    def _acknowledge(self, entries: List[OutboxEntry]) -> None:
+        now = self.clock()
+        for entry in entries:
+            self._pending.pop(entry.id, None)
+            self.latency.observe(now - entry.queued_at)
+            waiter = self._waiters.pop(entry.id, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(True)
+        self.delivered += len(entries)
+        # 确认记录不必等待落盘：丢失时重放会以相同幂等键重复投递
+        line = self._encode({"op": "ack", "ids": [entry.id for entry in entries]})
+        self._acked_bytes += len(line) + 64 * len(entries)
+        self._write(line)
+    
+    async def wait_delivered(self, entry_id: str, timeout: Optional[float] = None) -> bool:
+        """等待告警投递成功，超时返回 False（告警仍在后台继续投递）"""
+        if entry_id not in self._pending:
+            return True
+        waiter = self._waiters.get(entry_id)
+        if waiter is None:
+            waiter = self._waiters[entry_id] = asyncio.get_running_loop().create_future()
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            return False
+    
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """等待队列中的告警全部投递，超时返回 False"""
+        if not self._pending:
+            return True
+        self.start()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return not self._pending
+    
+    @property
+    def pending(self) -> int:
+        """未确认投递的告警数"""
+        return len(self._pending)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "pending": self.pending,
+            "appended": self.appended,
+            "delivered": self.delivered,
+            "replayed": self.replayed,
+            "retries": self.retries,
+            "failed_batches": self.failed_batches,
+            "fsyncs": self.fsyncs,
+            "compactions": self.compactions,
+            "log_bytes": self._file.tell() if not self._file.closed else 0,
+            "delivery_latency": self.latency.stats(),
+        }
+    
+    async def aclose(self) -> None:
+        """停止投递并把缓冲的记录写入日志"""
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        if self._flusher is not None:
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        for waiter in self._waiters.values():
+            if not waiter.done():
+                waiter.set_result(False)
+        self._waiters.clear()
+        self._file.close()
+    
+    def close(self) -> None:
+        """在同步上下文中关闭发件箱"""
+        if not self._file.closed:
+            close_later(self.aclose())
@@ -0,0 +1,52 @@
+# core/audio/__init__.py
+"""音频模块
+
+导出语音播放流水线、音频输出和输入、语音活动检测
+"""
+
+from core.audio.sink import (
+    AudioSink,
+    NullSink,
+    WavFileSink,
+    DeviceSink,
+    create_sink,
+    parse_wav_header,
+    strip_wav_header,
+    concat_wav,
+)
+from core.audio.playback import StreamingPlayback, PlaybackStats
+from core.audio.segment import split_sentences
+from core.audio.scheduler import SpeechScheduler, SpeechRequest, SpeechPreempted
+from core.audio.source import (
+    AudioSource,
+    WavFileSource,
+    SyntheticSpeechSource,
+    MicrophoneSource,
+    open_audio_source,
+)
+from core.audio.vad import EnergyVAD, SpeechSegment, SpeechSegmenter
+
+__all__ = [
+    "AudioSink",
+    "NullSink",
+    "WavFileSink",
+    "DeviceSink",
+    "create_sink",
+    "parse_wav_header",
+    "strip_wav_header",
+    "concat_wav",
+    "StreamingPlayback",
+    "PlaybackStats",
+    "split_sentences",
+    "SpeechScheduler",
+    "SpeechRequest",
+    "SpeechPreempted",
+    "AudioSource",
+    "WavFileSource",
+    "SyntheticSpeechSource",
+    "MicrophoneSource",
+    "open_audio_source",
+    "EnergyVAD",
+    "SpeechSegment",
+    "SpeechSegmenter",
+]
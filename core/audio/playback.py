@@ -0,0 +1,140 @@
+# core/audio/playback.py
+"""边合成边播放
+
+合成端每收到一块音频就放入有界队列，播放任务依次取出写入音频输出：
+- 收到第一块即开始播放，不等待整段音频合成完
+- 播放跟不上时队列写满，合成端等待（反压），内存占用不超过队列容量
+- 记录首块到达时间和首块开始播放时间（time to first audio）
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from core.audio.sink import AudioSink
+
+_END = None  # 队列结束标记
+
+
+@dataclass
+class PlaybackStats:
+    """一次播报的播放统计"""
+    chunks: int = 0
+    bytes: int = 0
+    time_to_first_chunk: Optional[float] = None  # 开始到收到第一块音频（秒）
+    time_to_first_audio: Optional[float] = None  # 开始到第一块写入音频输出（秒）
+    elapsed: float = 0.0  # 开始到播放结束（秒）
+    max_queue_depth: int = 0  # 队列中最多积压的块数
+    error: Optional[str] = None  # 播放失败的原因
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+            "time_to_first_chunk": self.time_to_first_chunk,
+            "time_to_first_audio": self.time_to_first_audio,
+            "elapsed": self.elapsed,
+            "max_queue_depth": self.max_queue_depth,
+            "error": self.error,
+        }
+
+
+class StreamingPlayback:
+    """合成到播放的流水线
+    
+    用法：
+        async with StreamingPlayback(sink) as playback:
+            await client.tts_stream(..., on_chunk=playback.feed)
+        print(playback.stats.time_to_first_audio)
+    """
+    
+    def __init__(
+        self,
+        sink: AudioSink,
+        max_queued_chunks: int = 8,
+        clock: Callable[[], float] = time.perf_counter
+    ):
+        """初始化
+        
+        Args:
+            sink: 音频输出
+            max_queued_chunks: 队列容量（块）
+            clock: 计时函数（测试时可替换）
+        """
+        self.sink = sink
+        self.clock = clock
+        self.stats = PlaybackStats()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_queued_chunks))
+        self._task: Optional[asyncio.Task] = None
+        self._start = 0.0
+    
+    async def start(self) -> None:
+        """打开音频输出并启动播放任务，首块计时从此开始"""
+        self._start = self.clock()
+        await self.sink.open()
+        self._task = asyncio.create_task(self._drain())
+    
+    async def feed(self, chunk: bytes) -> None:
+        """放入一块音频，队列满时等待播放任务取走"""
+        if not chunk:
+            return
+        if self.stats.time_to_first_chunk is None:
+            self.stats.time_to_first_chunk = self.clock() - self._start
+        await self._queue.put(chunk)
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self._queue.qsize())
+    
+    async def finish(self) -> PlaybackStats:
+        """合成结束：等待队列中的音频播放完并关闭输出"""
+        await self._queue.put(_END)
+        try:
+            await self._task
+        finally:
+            await self._close()
+        return self.stats
+    
+    async def abort(self) -> None:
+        """合成失败或被取消：丢弃未播放的音频并关闭输出"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self._close(abort=True)
+    
+    async def _drain(self) -> None:
+        while True:
+            chunk = await self._queue.get()
+            if chunk is _END:
+                return
+            if self.stats.error is not None:
+                continue  # 输出已失败，继续取走音频以免合成端阻塞
+            try:
+                if self.stats.time_to_first_audio is None:
+                    self.stats.time_to_first_audio = self.clock() - self._start
+                await self.sink.write(chunk)
+            except Exception as e:
+                print(f"[Playback] Audio output failed: {e}")
+                self.stats.error = str(e)
+                continue
+            self.stats.chunks += 1
+            self.stats.bytes += len(chunk)
+    
+    async def _close(self, abort: bool = False) -> None:
+        try:
+            await (self.sink.abort() if abort else self.sink.close())
+        except Exception as e:
+            print(f"[Playback] Failed to close audio output: {e}")
+            self.stats.error = self.stats.error or str(e)
+        self.stats.elapsed = self.clock() - self._start
+    
+    async def __aenter__(self) -> "StreamingPlayback":
+        await self.start()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.finish()
+        else:
+            await self.abort()
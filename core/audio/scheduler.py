@@ -0,0 +1,213 @@
+# core/audio/scheduler.py
+"""播报调度
+
+所有播报经过同一个调度器，同一时间只播放一条：
+- 按优先级分道排队（emergency 先于 routine），同一优先级先进先出
+- 紧急播报到达时打断正在播放的低优先级播报（被打断的不再补播）
+- 窗口时间内重复的文本直接抑制（更高优先级的重复不抑制）
+- 调用方可以只入队不等待播放结束
+"""
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from core.client.rate_limit import PRIORITIES, ROUTINE
+
+
+@dataclass
+class SpeechRequest:
+    """一条待播报的语句"""
+    text: str
+    priority: str = ROUTINE
+    options: Dict[str, Any] = field(default_factory=dict)  # 音色、语速等
+    enqueued_at: float = 0.0
+    seq: int = 0
+    future: Optional[asyncio.Future] = None  # 播报结果
+
+
+class SpeechPreempted(Exception):
+    """播报被更高优先级的播报打断"""
+
+
+class SpeechScheduler:
+    """按优先级排队、可抢占的播报调度器"""
+    
+    def __init__(
+        self,
+        speak: Callable[[SpeechRequest], Awaitable[Any]],
+        dedup_window: float = 10.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """初始化
+        
+        Args:
+            speak: 执行一条播报（合成并播放）的协程函数，返回值作为播报结果
+            dedup_window: 相同文本在多少秒内重复提交时抑制，0 表示不抑制
+            clock: 单调时钟（测试时可替换）
+        """
+        self.speak = speak
+        self.dedup_window = dedup_window
+        self.clock = clock
+        
+        self._lanes: Dict[str, Deque[SpeechRequest]] = {name: deque() for name in PRIORITIES}
+        self._recent: Dict[str, SpeechRequest] = {}  # 文本 -> 最近一次接受的请求
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._current: Optional[SpeechRequest] = None
+        self._current_task: Optional[asyncio.Task] = None
+        
+        # 统计计数
+        self.submitted = 0
+        self.started = 0
+        self.spoken = 0
+        self.failed = 0
+        self.suppressed = 0
+        self.preempted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def submit(self, text: str, priority: str = ROUTINE, **options) -> asyncio.Future:
+        """提交一条播报并立即返回，future 在播报结束后得到结果
+        
+        被抑制的重复播报返回已有请求的 future；被打断的播报以 SpeechPreempted 结束，
+        之后可以重新提交相同文本。
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        now = self.clock()
+        duplicate = self._recent.get(text)
+        if (
+            duplicate is not None
+            and now - duplicate.enqueued_at < self.dedup_window
+            and PRIORITIES[priority] >= PRIORITIES[duplicate.priority]
+            and not self._interrupted(duplicate)
+        ):
+            self.suppressed += 1
+            print(f"[SpeechScheduler] Suppressed duplicate announcement: {text}")
+            return duplicate.future
+        
+        request = SpeechRequest(
+            text=text,
+            priority=priority,
+            options=options,
+            enqueued_at=now,
+            seq=next(self._seq),
+            future=asyncio.get_running_loop().create_future()
+        )
+        self._recent[text] = request
+        self._lanes[priority].append(request)
+        self.submitted += 1
+        self._prune_recent(now)
+        
+        # 正在播放低优先级播报时打断
+        current = self._current
+        if current is not None and PRIORITIES[priority] < PRIORITIES[current.priority] and self._current_task.cancel():
+            print(f"[SpeechScheduler] Preempting {current.priority} announcement for {priority}")
+            self.preempted += 1
+        
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return request.future
+    
+    async def speak_now(self, text: str, priority: str = ROUTINE, **options) -> Any:
+        """提交一条播报并等待其播放结束"""
+        return await asyncio.shield(self.submit(text, priority, **options))
+    
+    def _next(self) -> Optional[SpeechRequest]:
+        for lane in sorted(self._lanes, key=PRIORITIES.get):
+            if self._lanes[lane]:
+                return self._lanes[lane].popleft()
+        return None
+    
+    async def _run(self) -> None:
+        while True:
+            request = self._next()
+            if request is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            wait = self.clock() - request.enqueued_at
+            self.started += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            
+            self._current = request
+            task = self._current_task = asyncio.create_task(self.speak(request))
+            try:
+                # asyncio.wait 不会把调度器自身的取消传给播报任务，也不会因播报被打断而抛出
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                request.future.cancel()
+                raise
+            finally:
+                self._current = None
+                self._current_task = None
+            
+            if task.cancelled():
+                self._settle(request, exception=SpeechPreempted(f"Preempted: {request.text}"))
+            elif task.exception() is not None:
+                self.failed += 1
+                self._settle(request, exception=task.exception())
+            else:
+                self.spoken += 1
+                self._settle(request, result=task.result())
+    
+    @staticmethod
+    def _settle(request: SpeechRequest, result: Any = None, exception: Optional[BaseException] = None) -> None:
+        if request.future.done():
+            return
+        if exception is not None:
+            request.future.set_exception(exception)
+            # 只入队不等待的调用方不会取结果，避免未取异常的警告
+            request.future.exception()
+        else:
+            request.future.set_result(result)
+    
+    @staticmethod
+    def _interrupted(request: SpeechRequest) -> bool:
+        """播报是否被打断、取消或失败（这样的播报允许重新提交）"""
+        future = request.future
+        return future.done() and (future.cancelled() or future.exception() is not None)
+    
+    def _prune_recent(self, now: float) -> None:
+        expired = [text for text, request in self._recent.items() if now - request.enqueued_at >= self.dedup_window]
+        for text in expired:
+            del self._recent[text]
+    
+    @property
+    def depth(self) -> Dict[str, int]:
+        """各优先级排队中的播报数"""
+        return {name: len(lane) for name, lane in self._lanes.items()}
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "depth": self.depth,
+            "speaking": self._current.priority if self._current is not None else None,
+            "submitted": self.submitted,
+            "spoken": self.spoken,
+            "failed": self.failed,
+            "suppressed": self.suppressed,
+            "preempted": self.preempted,
+            "avg_wait": self.total_wait / self.started if self.started else 0.0,
+            "max_wait": self.max_wait,
+        }
+    
+    def close(self) -> None:
+        """停止调度，未播放的播报以 CancelledError 结束"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for lane in self._lanes.values():
+            while lane:
+                request = lane.popleft()
+                if not request.future.done():
+                    request.future.cancel()
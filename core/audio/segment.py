@@ -0,0 +1,71 @@
+# core/audio/segment.py
+"""播报文本分句
+
+长文本整段合成时，要等全部合成完（或第一块流式音频）才能开始播放。
+按中英文句末标点把文本切成若干段后可以并行合成、按顺序播放：
+- 句末标点（。！？；!?; …）和换行处切分，英文句点只在其后为空白时切分（避免切开小数）
+- 超过 max_chars 的长句再按逗号、顿号、冒号切分
+- 过短的片段并入相邻片段，避免过多的小请求
+"""
+
+import re
+from typing import List
+
+_SENTENCE_END = re.compile(r"[。！？；!?;…]+[”’\"'）)]*|\.(?=\s|$)|\n+")
+_CLAUSE_END = re.compile(r"[，,、：:]+")
+
+
+def _cut(text: str, pattern: re.Pattern) -> List[str]:
+    pieces = []
+    start = 0
+    for match in pattern.finditer(text):
+        pieces.append(text[start:match.end()])
+        start = match.end()
+    pieces.append(text[start:])
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+
+def _join(left: str, right: str) -> str:
+    # 英文单词之间保留空格，中文直接拼接
+    separator = " " if left[-1].isascii() and right[0].isascii() else ""
+    return left + separator + right
+
+
+def split_sentences(text: str, min_chars: int = 6, max_chars: int = 80) -> List[str]:
+    """把播报文本切分为适合分段合成的片段
+    
+    Args:
+        text: 播报文本
+        min_chars: 片段最少字符数，更短的并入相邻片段
+        max_chars: 超过此长度的句子再按分句标点切分
+    
+    Returns:
+        List[str]: 按原顺序排列的片段，拼接后与原文内容一致（空白除外）
+    """
+    pieces = []
+    for sentence in _cut(text, _SENTENCE_END):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        # 长句按分句标点切开后再贪心合并，每段不超过 max_chars
+        current = ""
+        for clause in _cut(sentence, _CLAUSE_END):
+            if current and len(current) + len(clause) > max_chars:
+                pieces.append(current)
+                current = clause
+            else:
+                current = _join(current, clause) if current else clause
+        if current:
+            pieces.append(current)
+    
+    segments: List[str] = []
+    for piece in pieces:
+        if segments and len(segments[-1]) < min_chars:
+            segments[-1] = _join(segments[-1], piece)
+        else:
+            segments.append(piece)
+    # 末尾过短的片段并入前一段
+    if len(segments) > 1 and len(segments[-1]) < min_chars:
+        last = segments.pop()
+        segments[-1] = _join(segments[-1], last)
+    return segments
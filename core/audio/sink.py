@@ -0,0 +1,230 @@
+# core/audio/sink.py
+"""音频输出
+
+播放流水线把合成的音频块依次写入输出（sink），每次播报对应一次 open → write... → close：
+- DeviceSink：写入扬声器（需要 sounddevice），按 WAV 头确定采样格式
+- WavFileSink：每次播报写入一个 WAV 文件，用于无声卡环境和测试
+- NullSink：只统计字节数
+"""
+
+import asyncio
+import os
+import struct
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple, Optional
+
+import config
+
+try:
+    import sounddevice
+    SOUNDDEVICE_AVAILABLE = True
+except (ImportError, OSError):
+    # 未安装 sounddevice 或系统缺少 PortAudio
+    sounddevice = None
+    SOUNDDEVICE_AVAILABLE = False
+
+
+class WavFormat(NamedTuple):
+    """WAV 头中的采样格式"""
+    channels: int
+    sample_width: int  # 每个采样的字节数
+    sample_rate: int
+    data_offset: int  # 音频数据在文件中的起始位置
+
+
+def parse_wav_header(data: bytes) -> Optional[WavFormat]:
+    """解析 WAV 头，数据不足或不是 WAV 时返回 None"""
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        (size,) = struct.unpack_from("<I", data, offset + 4)
+        if chunk_id == b"data":
+            if fmt is None:
+                return None
+            channels, sample_rate, bits = fmt
+            return WavFormat(channels, bits // 8, sample_rate, offset + 8)
+        if chunk_id == b"fmt ":
+            if offset + 24 > len(data):
+                return None
+            _, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", data, offset + 8)
+            fmt = (channels, sample_rate, bits)
+        offset += 8 + size + (size & 1)
+    return None
+
+
+def strip_wav_header(audio: bytes) -> bytes:
+    """去掉 WAV 头，只保留音频数据；不是 WAV 时原样返回"""
+    wav = parse_wav_header(audio[:4096])
+    return audio[wav.data_offset:] if wav is not None else audio
+
+
+def concat_wav(parts: List[bytes]) -> bytes:
+    """拼接格式相同的多段 WAV：保留第一段的头并按总长度修正其中的长度字段"""
+    parts = [part for part in parts if part]
+    if len(parts) <= 1:
+        return parts[0] if parts else b""
+    wav = parse_wav_header(parts[0][:4096])
+    if wav is None:
+        return b"".join(parts)
+    audio = bytearray(parts[0])
+    for part in parts[1:]:
+        audio += strip_wav_header(part)
+    struct.pack_into("<I", audio, 4, len(audio) - 8)
+    struct.pack_into("<I", audio, wav.data_offset - 4, len(audio) - wav.data_offset)
+    return bytes(audio)
+
+
+class AudioSink(ABC):
+    """音频输出基类"""
+    
+    async def open(self) -> None:
+        """开始一次播报"""
+    
+    @abstractmethod
+    async def write(self, chunk: bytes) -> None:
+        """写入一块音频（第一块包含 WAV 头）"""
+    
+    async def close(self) -> None:
+        """结束本次播报，等待缓冲的音频播放完"""
+    
+    async def abort(self) -> None:
+        """中止本次播报（被打断），默认与 close 相同"""
+        await self.close()
+
+
+class NullSink(AudioSink):
+    """丢弃音频，只统计字节数"""
+    
+    def __init__(self):
+        self.bytes_written = 0
+        self.utterances = 0
+    
+    async def open(self) -> None:
+        self.utterances += 1
+    
+    async def write(self, chunk: bytes) -> None:
+        self.bytes_written += len(chunk)
+
+
+class WavFileSink(AudioSink):
+    """每次播报写入 directory 下的一个 WAV 文件（utterance-0001.wav ...）"""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.paths: List[str] = []  # 已写入的文件
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+    
+    async def open(self) -> None:
+        path = os.path.join(self.directory, f"utterance-{len(self.paths) + 1:04d}.wav")
+        self._file = open(path, "wb")
+        self.paths.append(path)
+    
+    async def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+    
+    async def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self._fix_sizes(self.paths[-1])
+    
+    @staticmethod
+    def _fix_sizes(path: str) -> None:
+        """流式响应的 WAV 头中长度可能是占位值，写完后按实际长度修正"""
+        with open(path, "r+b") as f:
+            head = f.read(4096)
+            wav = parse_wav_header(head)
+            if wav is None:
+                return
+            total = f.seek(0, os.SEEK_END)
+            f.seek(4)
+            f.write(struct.pack("<I", total - 8))
+            f.seek(wav.data_offset - 4)
+            f.write(struct.pack("<I", total - wav.data_offset))
+
+
+class DeviceSink(AudioSink):
+    """写入扬声器
+    
+    从第一块的 WAV 头中取采样格式（不是 WAV 时按 16 位单声道裸 PCM 处理），
+    写入在线程中执行，设备缓冲区满时阻塞，从而对播放流水线形成反压。
+    """
+    
+    DTYPES = {1: "uint8", 2: "int16", 4: "int32"}
+    
+    def __init__(self, device: Optional[str] = None, sample_rate: int = config.AUDIO_SAMPLE_RATE):
+        if not SOUNDDEVICE_AVAILABLE:
+            raise RuntimeError("sounddevice is not available")
+        self.device = device
+        self.sample_rate = sample_rate
+        self._stream = None
+        self._head = b""
+        self._remainder = b""
+        self._frame_bytes = 2
+    
+    async def open(self) -> None:
+        self._stream = None
+        self._head = b""
+        self._remainder = b""
+    
+    async def write(self, chunk: bytes) -> None:
+        if self._stream is None:
+            self._head += chunk
+            wav = parse_wav_header(self._head)
+            if wav is None and self._head[:4] == b"RIFF" and len(self._head) < 4096:
+                return  # WAV 头还没收全
+            if wav is None:
+                wav = WavFormat(1, 2, self.sample_rate, 0)
+            chunk = self._head[wav.data_offset:]
+            self._frame_bytes = wav.channels * wav.sample_width
+            self._stream = await asyncio.to_thread(self._open_stream, wav)
+        
+        # 只写入完整的帧，余下的字节与下一块拼接
+        data = self._remainder + chunk
+        end = len(data) - len(data) % self._frame_bytes
+        self._remainder = data[end:]
+        if end:
+            await asyncio.to_thread(self._stream.write, data[:end])
+    
+    def _open_stream(self, wav: WavFormat):
+        stream = sounddevice.RawOutputStream(
+            samplerate=wav.sample_rate,
+            channels=wav.channels,
+            dtype=self.DTYPES.get(wav.sample_width, "int16"),
+            device=self.device
+        )
+        stream.start()
+        return stream
+    
+    async def close(self) -> None:
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            # stop 会等待缓冲区中的音频播放完
+            await asyncio.to_thread(stream.stop)
+            await asyncio.to_thread(stream.close)
+    
+    async def abort(self) -> None:
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            # abort 丢弃缓冲区中尚未播放的音频，立即停止
+            await asyncio.to_thread(stream.abort)
+            await asyncio.to_thread(stream.close)
+
+
+def create_sink(kind: str = config.AUDIO_SINK, wav_dir: str = config.AUDIO_WAV_DIR) -> AudioSink:
+    """按名称创建音频输出，扬声器不可用时退回 NullSink"""
+    if kind == "wav":
+        return WavFileSink(wav_dir)
+    if kind == "null":
+        return NullSink()
+    if kind != "device":
+        raise ValueError(f"Unknown audio sink: {kind}")
+    if not SOUNDDEVICE_AVAILABLE:
+        print("[Audio] Warning: sounddevice not available, audio output disabled")
+        return NullSink()
+    return DeviceSink()
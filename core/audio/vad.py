@@ -0,0 +1,266 @@
+# core/audio/vad.py
+"""本地语音活动检测（VAD）
+
+把音频切成固定时长的帧，一次向量化计算每帧的能量（dBFS）和过零率：
+- 能量高于噪声底 energy_margin_db 以上判为语音（浊音）
+- 能量略低但过零率高的帧也判为语音（清音，如 s、sh）
+- 噪声底跟踪每批帧中较安静部分的能量：遇到更安静的帧立即下降，环境变吵时缓慢上升
+
+SpeechSegmenter 在逐块输入的音频上维护状态，语音结束（静音持续 hangover_ms）
+时立即产出一个语音片段，只有这些片段需要上传识别。
+"""
+
+import io
+import wave
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import config
+
+
+@dataclass
+class FrameFeatures:
+    """一批帧的特征和判定结果"""
+    energy_db: np.ndarray
+    zcr: np.ndarray
+    speech: np.ndarray  # bool 数组
+
+
+class EnergyVAD:
+    """能量 + 过零率语音检测"""
+    
+    def __init__(
+        self,
+        sample_rate: int = config.AUDIO_SAMPLE_RATE,
+        frame_ms: int = 30,
+        energy_margin_db: float = 12.0,
+        min_energy_db: float = -50.0,
+        unvoiced_margin_db: float = 6.0,
+        zcr_threshold: float = 0.25,
+        noise_adapt: float = 0.005
+    ):
+        """初始化
+        
+        Args:
+            sample_rate: 采样率
+            frame_ms: 帧长（毫秒）
+            energy_margin_db: 浊音判定：能量高于噪声底的 dB 数
+            min_energy_db: 能量低于此值（dBFS）的帧一律视为静音
+            unvoiced_margin_db: 清音判定：能量高于噪声底的 dB 数（同时要求过零率高）
+            zcr_threshold: 清音判定的过零率下限（每个采样的过零次数）
+            noise_adapt: 噪声底上升速度（每帧的指数平均系数）
+        """
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.frame_ms = frame_ms
+        self.energy_margin_db = energy_margin_db
+        self.min_energy_db = min_energy_db
+        self.unvoiced_margin_db = unvoiced_margin_db
+        self.zcr_threshold = zcr_threshold
+        self.noise_adapt = noise_adapt
+        self.noise_floor_db = min_energy_db  # 初始假定为安静环境
+    
+    @classmethod
+    def from_config(cls, sample_rate: int = config.AUDIO_SAMPLE_RATE) -> "EnergyVAD":
+        """按 config 中的参数创建"""
+        return cls(
+            sample_rate,
+            frame_ms=config.VAD_FRAME_MS,
+            energy_margin_db=config.VAD_ENERGY_MARGIN_DB,
+            min_energy_db=config.VAD_MIN_ENERGY_DB,
+            zcr_threshold=config.VAD_ZCR_THRESHOLD
+        )
+    
+    def features(self, frames: np.ndarray) -> FrameFeatures:
+        """计算一批帧（形状为 帧数 × 帧长 的 int16 数组）的特征并判定
+        
+        Args:
+            frames: 帧数组
+        
+        Returns:
+            FrameFeatures: 每帧的能量、过零率和是否为语音
+        """
+        x = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(x * x, axis=1))
+        energy_db = 20.0 * np.log10(np.maximum(rms, 1e-6))
+        signs = np.signbit(x)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(1, frames.shape[1] - 1)
+        
+        floor = self.noise_floor_db
+        audible = energy_db > self.min_energy_db
+        voiced = energy_db > floor + self.energy_margin_db
+        unvoiced = (energy_db > floor + self.unvoiced_margin_db) & (zcr >= self.zcr_threshold)
+        speech = audible & (voiced | unvoiced)
+        
+        # 更新噪声底：不依赖语音判定，环境持续变吵（所有帧都被判为语音）时也能跟上
+        if len(energy_db):
+            level = max(float(np.percentile(energy_db, 10)), self.min_energy_db)
+            if level < floor:
+                self.noise_floor_db = level
+            else:
+                alpha = 1.0 - (1.0 - self.noise_adapt) ** len(energy_db)
+                self.noise_floor_db = floor + alpha * (level - floor)
+        return FrameFeatures(energy_db, zcr, speech)
+    
+    def reset(self) -> None:
+        """重置噪声底"""
+        self.noise_floor_db = self.min_energy_db
+
+
+@dataclass
+class SpeechSegment:
+    """一段检测到的语音"""
+    samples: np.ndarray
+    sample_rate: int
+    start: float  # 在音频流中的开始时间（秒，含前导缓冲）
+    end: float  # 结束时间（秒）
+    truncated: bool = False  # 因超过最长时长被强制切断
+    
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+    
+    def to_wav(self) -> bytes:
+        """编码为 16 位单声道 WAV"""
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(self.samples.astype("<i2").tobytes())
+        return buffer.getvalue()
+
+
+class SpeechSegmenter:
+    """在连续输入的音频上切分语音片段"""
+    
+    def __init__(
+        self,
+        vad: EnergyVAD,
+        min_speech_ms: int = 150,
+        hangover_ms: int = 300,
+        pre_roll_ms: int = 150,
+        max_segment_s: float = 15.0
+    ):
+        """初始化
+        
+        Args:
+            vad: 语音检测器
+            min_speech_ms: 语音帧累计不足此时长的片段丢弃（咔哒声、碰撞声）
+            hangover_ms: 语音后静音持续多久判定片段结束
+            pre_roll_ms: 片段开头额外保留的静音（避免截掉起音）
+            max_segment_s: 片段最长时长，超过时强制切断
+        """
+        self.vad = vad
+        self.sample_rate = vad.sample_rate
+        frame_ms = vad.frame_ms
+        self.min_speech_frames = max(1, round(min_speech_ms / frame_ms))
+        self.hangover_frames = max(1, round(hangover_ms / frame_ms))
+        self.pre_roll_frames = round(pre_roll_ms / frame_ms)
+        self.max_segment_frames = max(1, int(max_segment_s * 1000 / frame_ms))
+        
+        self._remainder = np.zeros(0, dtype=np.int16)
+        self._frame_index = 0  # 已处理的帧数
+        self._history: List[np.ndarray] = []  # 最近的非语音帧（前导缓冲）
+        self._segment: List[np.ndarray] = []
+        self._segment_start = 0
+        self._speech_frames = 0
+        self._silence_run = 0
+        
+        # 统计计数
+        self.frames = 0
+        self.speech_frames = 0
+        self.segments = 0
+        self.dropped = 0
+    
+    def feed(self, samples: np.ndarray) -> List[SpeechSegment]:
+        """输入一块采样，返回这块音频中结束的语音片段"""
+        data = np.concatenate([self._remainder, samples]) if len(self._remainder) else samples
+        size = self.vad.frame_size
+        count = len(data) // size
+        self._remainder = data[count * size:].copy()
+        if count == 0:
+            return []
+        
+        frames = data[:count * size].reshape(count, size)
+        decisions = self.vad.features(frames).speech
+        self.frames += count
+        self.speech_frames += int(np.count_nonzero(decisions))
+        
+        closed = []
+        for frame, is_speech in zip(frames, decisions):
+            segment = self._step(frame, bool(is_speech))
+            if segment is not None:
+                closed.append(segment)
+            self._frame_index += 1
+        return closed
+    
+    def _step(self, frame: np.ndarray, is_speech: bool) -> Optional[SpeechSegment]:
+        if not self._segment:
+            if not is_speech:
+                self._history.append(frame)
+                if len(self._history) > self.pre_roll_frames:
+                    del self._history[0]
+                return None
+            # 语音开始：带上前导缓冲
+            self._segment = self._history + [frame]
+            self._segment_start = self._frame_index - len(self._history)
+            self._history = []
+            self._speech_frames = 1
+            self._silence_run = 0
+            return None
+        
+        self._segment.append(frame)
+        if is_speech:
+            self._speech_frames += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+        if self._silence_run >= self.hangover_frames:
+            return self._close(truncated=False)
+        if len(self._segment) >= self.max_segment_frames:
+            return self._close(truncated=True)
+        return None
+    
+    def _close(self, truncated: bool) -> Optional[SpeechSegment]:
+        frames, speech_frames = self._segment, self._speech_frames
+        # 去掉结尾的静音，只保留与前导缓冲等长的一段
+        if not truncated:
+            trailing = max(0, self._silence_run - self.pre_roll_frames)
+            frames = frames[:len(frames) - trailing]
+        self._segment = []
+        self._speech_frames = 0
+        self._silence_run = 0
+        if speech_frames < self.min_speech_frames:
+            self.dropped += 1
+            return None
+        self.segments += 1
+        frame_seconds = self.vad.frame_size / self.sample_rate
+        start = self._segment_start * frame_seconds
+        return SpeechSegment(
+            samples=np.concatenate(frames),
+            sample_rate=self.sample_rate,
+            start=start,
+            end=start + len(frames) * frame_seconds,
+            truncated=truncated
+        )
+    
+    def flush(self) -> List[SpeechSegment]:
+        """音频结束：把进行中的片段作为结束的片段返回"""
+        if not self._segment:
+            return []
+        segment = self._close(truncated=False)
+        return [segment] if segment is not None else []
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "frames": self.frames,
+            "speech_frames": self.speech_frames,
+            "speech_ratio": self.speech_frames / self.frames if self.frames else 0.0,
+            "segments": self.segments,
+            "dropped": self.dropped,
+            "noise_floor_db": self.vad.noise_floor_db,
+        }
@@ -1,16 +1,65 @@
 import cv2
+import time
 import asyncio
+import threading
 import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
 from config import VIDEO_DEV
+from core.frame_source import open_frame_source
 class CameraSensor:
-    """摄像头传感器模拟类"""
+    """摄像头传感器模拟类
     
-    def __init__(self):
-        """初始化摄像头"""
+    支持两种采集模式：
+    - 按需模式（默认）：每次 capture_image 时在线程池中打开设备读取一帧
+    - 连续模式：后台采集线程持续读取设备，把最新帧写入预分配的环形缓冲区，
+      capture_image 直接取最新帧，避免线程池切换和设备内部缓存的旧帧
+    
+    device 也可以是图片目录、视频文件、原始帧转储或合成画面（见 core.frame_source），
+    用于在没有摄像头的机器上回放录制的巡检画面。
+    """
+    
+    def __init__(
+        self,
+        continuous: bool = False,
+        buffer_size: int = 4,
+        device: Any = None,
+        jpeg_quality: int = 85
+    ):
+        """初始化摄像头
+        
+        Args:
+            continuous: 是否启用连续采集模式
+            buffer_size: 环形缓冲区帧数（至少 2）
+            device: 摄像头设备、帧来源描述字符串或 FrameSource 实例，默认使用 config.VIDEO_DEV
+            jpeg_quality: JPEG 编码质量
+        """
         self.cap = None
+        self.device = device if device is not None else VIDEO_DEV
+        self.jpeg_quality = jpeg_quality
+        self.continuous = continuous
+        self.buffer_size = max(2, buffer_size)
+        
+        # 连续模式的环形缓冲区（首帧到达后按分辨率预分配）
+        self._ring: List[np.ndarray] = []
+        self._timestamps = np.zeros(self.buffer_size, dtype=np.float64)
+        self._latest_slot = -1
+        self._latest_consumed = True
+        self._lock = threading.Lock()
+        self._first_frame = threading.Event()
+        self._stop_event = threading.Event()
+        self._grabber: Optional[threading.Thread] = None
+        
+        # 统计计数
+        self.frames_captured = 0
+        self.frames_read = 0  # 读取方取走的最新帧数
+        self.frames_dropped = 0  # 未被读取就被新帧取代的帧数（见 stats）
+        self.read_failures = 0
+        self.buffer_allocations = 0
+        self._grab_started_at = 0.0
     
     def __del__(self):
         """释放摄像头"""
+        self._stop_event.set()
         if self.cap is not None:
             self.cap.release()
     
@@ -18,8 +67,13 @@ class CameraSensor:
         """捕获图像数据"""
         print("[Camera] Capturing image...")
         
-        # 新开线程执行摄像头操作，避免堵塞
-        image_bytes = await asyncio.to_thread(self._capture_sync)
+        if self.continuous:
+            frame = await self.capture_frame()
+            # JPEG 编码同样放到线程中，不阻塞事件循环
+            image_bytes = await asyncio.to_thread(self.encode_frame, frame) if frame is not None else None
+        else:
+            # 新开线程执行摄像头操作，避免堵塞
+            image_bytes = await asyncio.to_thread(self._capture_sync)
         
         if image_bytes is None:
             print("[Camera] Failed to capture image.")
@@ -28,30 +82,284 @@ class CameraSensor:
         print("[Camera] Image captured successfully.")
         return image_bytes
     
-    def _capture_sync(self) -> bytes:
-        """同步方式捕获图像"""
+    async def capture_frame(
+        self,
+        timeout: float = 5.0,
+        out: Optional[np.ndarray] = None
+    ) -> Optional[np.ndarray]:
+        """捕获原始帧（BGR ndarray）
+        
+        连续模式下直接从环形缓冲区取最新帧；首帧尚未到达时最多等待 timeout 秒。
+        
+        Args:
+            timeout: 连续模式下等待首帧的超时时间（秒）
+            out: 可复用的输出数组，尺寸匹配时直接写入，避免每次分配新帧
+        
+        Returns:
+            np.ndarray: 最新帧（out 可用时即为 out），失败返回 None
+        """
+        if not self.continuous:
+            return await asyncio.to_thread(self._read_frame_sync, out)
+        
+        if not await self.wait_for_frame(timeout):
+            return None
+        
+        frame, _ = self.get_latest_frame(out)
+        return frame
+    
+    async def wait_for_frame(self, timeout: float = 5.0) -> bool:
+        """启动后台采集并等待首帧到达（仅连续模式）
+        
+        Args:
+            timeout: 等待超时时间（秒）
+        
+        Returns:
+            bool: 缓冲区中是否已有可用帧
+        """
+        self.start()
+        if not self._first_frame.is_set():
+            deadline = time.monotonic() + timeout
+            while not self._first_frame.is_set():
+                if time.monotonic() >= deadline or not self.is_running:
+                    return False
+                await asyncio.sleep(0.01)
+        return True
+    
+    def get_latest_frame(
+        self,
+        out: Optional[np.ndarray] = None,
+        consume: bool = True
+    ) -> Tuple[Optional[np.ndarray], float]:
+        """获取环形缓冲区中最新的一帧
+        
+        Args:
+            out: 可复用的输出数组
+            consume: 是否计为已读取；运动检测等旁路采样传 False，不影响读取和丢帧统计
+        
+        Returns:
+            Tuple: (帧拷贝, 采集时间戳)，无可用帧时返回 (None, 0.0)
+        """
+        with self._lock:
+            if self._latest_slot < 0:
+                return None, 0.0
+            # 采集线程只会写 latest_slot 之后的槽位，持锁期间最新槽位不会被覆盖
+            frame = self._copy_out(self._ring[self._latest_slot], out)
+            timestamp = float(self._timestamps[self._latest_slot])
+            if consume:
+                self._mark_consumed()
+        return frame, timestamp
+    
+    def get_frame_near(
+        self,
+        timestamp: float,
+        out: Optional[np.ndarray] = None
+    ) -> Tuple[Optional[np.ndarray], float]:
+        """获取环形缓冲区中采集时间最接近指定时间戳的帧（用于多摄像头对齐）
+        
+        Args:
+            timestamp: 目标时间戳
+            out: 可复用的输出数组
+        
+        Returns:
+            Tuple: (帧拷贝, 采集时间戳)，无可用帧时返回 (None, 0.0)
+        """
+        with self._lock:
+            if self._latest_slot < 0:
+                return None, 0.0
+            valid = self._timestamps > 0
+            distance = np.where(valid, np.abs(self._timestamps - timestamp), np.inf)
+            slot = int(np.argmin(distance))
+            frame = self._copy_out(self._ring[slot], out)
+            frame_timestamp = float(self._timestamps[slot])
+            if slot == self._latest_slot:
+                self._mark_consumed()
+        return frame, frame_timestamp
+    
+    def _mark_consumed(self) -> None:
+        """记录最新帧已被读取（调用方持有锁）"""
+        if not self._latest_consumed:
+            self._latest_consumed = True
+            self.frames_read += 1
+    
+    def _copy_out(self, source: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        """将帧拷贝到可复用数组，尺寸不匹配时才分配新数组"""
+        if out is None or out.shape != source.shape or out.dtype != source.dtype:
+            self.buffer_allocations += 1
+            return source.copy()
+        np.copyto(out, source)
+        return out
+    
+    def encode_frame(self, frame: np.ndarray) -> Optional[bytes]:
+        """将帧编码为 JPEG 字节数据"""
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            print("[Camera] Failed to encode frame")
+            return None
+        return buffer.tobytes()
+    
+    @property
+    def latest_timestamp(self) -> float:
+        """最新帧的采集时间戳，无可用帧时为 0.0"""
+        with self._lock:
+            if self._latest_slot < 0:
+                return 0.0
+            return float(self._timestamps[self._latest_slot])
+    
+    @property
+    def frame_age(self) -> Optional[float]:
+        """最新帧的年龄（秒），无可用帧时为 None"""
+        with self._lock:
+            if self._latest_slot < 0:
+                return None
+            return time.time() - float(self._timestamps[self._latest_slot])
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取采集统计信息
+        
+        frames_dropped 是未被读取就被新帧取代的帧数。连续模式只保留最新帧，
+        读取间隔（如巡逻间隔）远大于采集间隔时它接近 frames_captured - frames_read，
+        这是预期行为而不是故障；读取方是否总拿到新帧要看 frames_read 与读取次数是否接近。
+        
+        Returns:
+            Dict: 包含已采集帧数、已读取帧数、丢弃帧数、读取失败次数、
+                最新帧年龄和平均采集帧率
+        """
+        elapsed = time.time() - self._grab_started_at if self._grab_started_at else 0.0
+        return {
+            "continuous": self.continuous,
+            "running": self.is_running,
+            "frames_captured": self.frames_captured,
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "read_failures": self.read_failures,
+            "buffer_allocations": self.buffer_allocations,
+            "frame_age": self.frame_age,
+            "fps": self.frames_captured / elapsed if elapsed > 0 else 0.0,
+        }
+    
+    @property
+    def is_running(self) -> bool:
+        """后台采集线程是否在运行"""
+        return self._grabber is not None and self._grabber.is_alive()
+    
+    def start(self) -> None:
+        """启动后台采集线程（仅连续模式，重复调用无副作用）"""
+        if not self.continuous or self.is_running:
+            return
+        self._stop_event.clear()
+        self._grab_started_at = time.time()
+        self._grabber = threading.Thread(
+            target=self._grab_loop, name="camera-grabber", daemon=True
+        )
+        self._grabber.start()
+        print(f"[Camera] Continuous capture started on {self.device}")
+    
+    def stop(self) -> None:
+        """停止后台采集线程并释放设备"""
+        self._stop_event.set()
+        if self._grabber is not None:
+            self._grabber.join(timeout=2.0)
+            self._grabber = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+    
+    def _open_device(self) -> bool:
+        """打开摄像头设备"""
+        if self.cap is None:
+            self.cap = open_frame_source(self.device) or cv2.VideoCapture(self.device)
+            if not self.cap.isOpened():
+                print(f"[Camera] Cannot open camera device {self.device}")
+                return False
+        return True
+    
+    def _grab_loop(self) -> None:
+        """后台采集循环：持续读取设备并写入环形缓冲区"""
+        try:
+            if not self._open_device():
+                return
+            
+            while not self._stop_event.is_set():
+                with self._lock:
+                    slot = (self._latest_slot + 1) % self.buffer_size
+                    # 写入期间将槽位标记为无效，避免按时间戳取帧时读到半写入的数据
+                    self._timestamps[slot] = 0.0
+                target = self._ring[slot] if self._ring else None
+                
+                # 直接读入预分配的槽位，避免每帧分配新数组
+                ret, frame = self.cap.read(target) if target is not None else self.cap.read()
+                if not ret or frame is None:
+                    if getattr(self.cap, "exhausted", False):
+                        # 回放来源已读完且不循环：保留缓冲区中的最后几帧
+                        print("[Camera] Frame source exhausted")
+                        break
+                    self.read_failures += 1
+                    self._stop_event.wait(0.01)
+                    continue
+                
+                if target is None or frame is not target:
+                    # 首帧或分辨率变化：按新尺寸重新分配整个环形缓冲区
+                    with self._lock:
+                        self._ring = [np.empty_like(frame) for _ in range(self.buffer_size)]
+                        self.buffer_allocations += self.buffer_size
+                        self._timestamps[:] = 0.0
+                        self._latest_slot = -1
+                        slot = 0
+                    np.copyto(self._ring[slot], frame)
+                
+                with self._lock:
+                    if not self._latest_consumed:
+                        self.frames_dropped += 1
+                    self._timestamps[slot] = time.time()
+                    self._latest_slot = slot
+                    self._latest_consumed = False
+                    self.frames_captured += 1
+                self._first_frame.set()
+        
+        except Exception as e:
+            print(f"[Camera] Error in grabber thread: {e}")
+        finally:
+            print("[Camera] Continuous capture stopped")
+    
+    def _read_frame_sync(self, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """同步方式读取一帧原始图像
+        
+        Args:
+            out: 可复用的输出数组，尺寸匹配时 OpenCV 直接写入
+        """
         try:
             # 初始化摄像头
-            if self.cap is None:
-                self.cap = cv2.VideoCapture(VIDEO_DEV)
-                if not self.cap.isOpened():
-                    print(f"[Camera] Cannot open camera device {VIDEO_DEV}")
-                    return None
+            if not self._open_device():
+                return None
             
             # 设置摄像头参数
             # self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
             # self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
             
             # 捕获帧
-            ret, frame = self.cap.read()
+            ret, frame = self.cap.read(out) if out is not None else self.cap.read()
             if not ret:
                 print("[Camera] Cannot read frame from camera")
                 return None
+            if frame is not out:
+                self.buffer_allocations += 1
+            return frame
+        
+        except Exception as e:
+            print(f"[Camera] Error capturing image: {e}")
+            return None
+    
+    def _capture_sync(self) -> bytes:
+        """同步方式捕获图像"""
+        try:
+            frame = self._read_frame_sync()
+            if frame is None:
+                return None
             
             # 将图像转换为 JPEG 格式的字节数据
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
             return buffer.tobytes()
-            
+        
         except Exception as e:
             print(f"[Camera] Error capturing image: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,161 @@
+# core/camera_group.py
+"""多摄像头采集组
+
+并发采集多路摄像头画面并按时间戳对齐，供一次多图视觉请求使用
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from core.camera import CameraSensor
+
+
+@dataclass
+class CameraFrame:
+    """带来源和时间戳的单帧"""
+    camera_id: str
+    frame: np.ndarray
+    timestamp: float
+
+
+class CameraGroup:
+    """多摄像头采集组
+    
+    连续模式下各路摄像头以最新帧中最早的时间戳为基准，从各自的环形缓冲区
+    中挑选最接近的帧，尽量让多路画面对应同一时刻。
+    """
+    
+    def __init__(
+        self,
+        devices: Union[Dict[str, Any], List[Any]],
+        continuous: bool = False,
+        buffer_size: int = 4,
+        max_skew: float = 0.2
+    ):
+        """初始化摄像头组
+        
+        Args:
+            devices: 摄像头设备，{camera_id: device} 或设备列表（以 cam0、cam1… 命名）
+            continuous: 是否启用连续采集模式
+            buffer_size: 每路环形缓冲区帧数
+            max_skew: 允许的最大帧间时间差（秒），超出时打印警告
+        """
+        if not isinstance(devices, dict):
+            devices = {f"cam{i}": device for i, device in enumerate(devices)}
+        if not devices:
+            raise ValueError("CameraGroup requires at least one device")
+        
+        self.cameras: Dict[str, CameraSensor] = {
+            camera_id: CameraSensor(continuous=continuous, buffer_size=buffer_size, device=device)
+            for camera_id, device in devices.items()
+        }
+        self.continuous = continuous
+        self.max_skew = max_skew
+        self.last_skew = 0.0
+        self.last_missing: List[str] = []
+        
+        # 各路可复用的输出帧，下一轮采集直接覆盖写入
+        self._buffers: Dict[str, np.ndarray] = {}
+    
+    @property
+    def camera_ids(self) -> List[str]:
+        """摄像头 ID 列表"""
+        return list(self.cameras.keys())
+    
+    @property
+    def frames_dropped(self) -> int:
+        """各路摄像头丢弃帧数之和"""
+        return sum(camera.frames_dropped for camera in self.cameras.values())
+    
+    @property
+    def buffer_allocations(self) -> int:
+        """各路摄像头帧缓冲区分配次数之和"""
+        return sum(camera.buffer_allocations for camera in self.cameras.values())
+    
+    @property
+    def frame_age(self) -> Optional[float]:
+        """各路最新帧中最老的一帧的年龄（秒）"""
+        ages = [camera.frame_age for camera in self.cameras.values()]
+        ages = [age for age in ages if age is not None]
+        return max(ages) if ages else None
+    
+    def start(self) -> None:
+        """启动所有摄像头的后台采集"""
+        for camera in self.cameras.values():
+            camera.start()
+    
+    def stop(self) -> None:
+        """停止所有摄像头并释放设备"""
+        for camera in self.cameras.values():
+            camera.stop()
+    
+    async def _capture_one(self, camera_id: str, camera: CameraSensor) -> Optional[CameraFrame]:
+        """按需模式下采集单路画面"""
+        frame = await camera.capture_frame(out=self._buffers.get(camera_id))
+        if frame is None:
+            return None
+        self._buffers[camera_id] = frame
+        return CameraFrame(camera_id=camera_id, frame=frame, timestamp=time.time())
+    
+    async def capture_frames(self) -> Optional[List[CameraFrame]]:
+        """并发采集所有摄像头并按时间戳对齐
+        
+        返回的帧写入组内复用的缓冲区，下一次采集时会被覆盖，调用方需在此之前用完。
+        
+        Returns:
+            List[CameraFrame]: 按摄像头注册顺序排列的帧，全部失败时返回 None
+        """
+        if self.continuous:
+            frames = await self._capture_aligned()
+        else:
+            results = await asyncio.gather(
+                *(self._capture_one(camera_id, camera) for camera_id, camera in self.cameras.items())
+            )
+            frames = [f for f in results if f is not None]
+        
+        captured = {f.camera_id for f in frames}
+        self.last_missing = [camera_id for camera_id in self.cameras if camera_id not in captured]
+        for camera_id in self.last_missing:
+            print(f"[CameraGroup] Camera {camera_id} failed to capture")
+        
+        if not frames:
+            return None
+        
+        timestamps = [f.timestamp for f in frames]
+        self.last_skew = max(timestamps) - min(timestamps)
+        if self.last_skew > self.max_skew:
+            print(f"[CameraGroup] Warning: frame skew {self.last_skew * 1000:.1f}ms exceeds limit")
+        return frames
+    
+    async def _capture_aligned(self) -> List[CameraFrame]:
+        """连续模式：以各路最新帧中最早的时间戳为基准，从各自缓冲区选取最接近的帧"""
+        ready = await asyncio.gather(
+            *(camera.wait_for_frame() for camera in self.cameras.values())
+        )
+        cameras = {
+            camera_id: camera
+            for (camera_id, camera), ok in zip(self.cameras.items(), ready) if ok
+        }
+        if not cameras:
+            return []
+        
+        reference = min(camera.latest_timestamp for camera in cameras.values())
+        frames = []
+        for camera_id, camera in cameras.items():
+            frame, timestamp = camera.get_frame_near(reference, out=self._buffers.get(camera_id))
+            if frame is not None:
+                self._buffers[camera_id] = frame
+                frames.append(CameraFrame(camera_id=camera_id, frame=frame, timestamp=timestamp))
+        return frames
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取各路采集统计和最近一次的帧间时间差"""
+        return {
+            "cameras": {camera_id: camera.stats() for camera_id, camera in self.cameras.items()},
+            "last_skew": self.last_skew,
+            "last_missing": list(self.last_missing),
+        }
@@ -5,7 +5,12 @@
 """
 
 from core.client.openai_client import OpenAIClient
+from core.client.vision_cache import VisionResultCache
+from core.client.registry import ClientRegistry, get_client_registry
 
 __all__ = [
     "OpenAIClient",
+    "VisionResultCache",
+    "ClientRegistry",
+    "get_client_registry",
 ]
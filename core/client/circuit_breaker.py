@@ -0,0 +1,175 @@
+# core/client/circuit_breaker.py
+"""按端点的熔断器
+
+端点不可达时每个请求都要等满超时和重试才失败。熔断器按端点统计连续失败：
+- closed（闭合）：正常放行，连续失败达到阈值后断开
+- open（断开）：请求立即以 CircuitOpenError 失败，不再等待超时
+- half_open（半开）：断开一段时间后只放行一个探测请求，成功则闭合，
+  失败则重新断开并把等待时间翻倍（不超过上限）
+
+只有连接错误、超时和 5xx 计为失败；4xx（包括 429）说明端点可达，按成功处理。
+"""
+
+import time
+from typing import Any, Callable, Dict
+
+import httpx
+import openai
+
+import config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断期间拒绝的请求"""
+    
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit open for {name}, next probe in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """异常是否说明端点不可用（连接错误、超时、5xx）"""
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return True
+    response = getattr(error, "response", None)
+    status = response.status_code if isinstance(response, httpx.Response) else getattr(error, "status_code", None)
+    return status is not None and status >= 500
+
+
+class CircuitBreaker:
+    """熔断器"""
+    
+    def __init__(
+        self,
+        name: str = "",
+        failure_threshold: int = 3,
+        recovery_timeout: float = 30.0,
+        max_recovery_timeout: float = 300.0,
+        probe_timeout: float = 5.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """初始化熔断器
+        
+        Args:
+            name: 端点名称（用于日志）
+            failure_threshold: 连续失败多少次后断开
+            recovery_timeout: 断开后多久进入半开状态（秒）
+            max_recovery_timeout: 探测连续失败时等待时间翻倍的上限（秒）
+            probe_timeout: 主动探测请求的超时时间（秒）
+            clock: 单调时钟（测试时可替换）
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+        
+        self._state = CLOSED
+        self._failures = 0  # 连续失败次数
+        self._opened_at = 0.0
+        self._timeout = recovery_timeout  # 本次断开的等待时间
+        self._probing = False  # 半开状态下是否已有探测请求在进行
+        
+        # 统计计数
+        self.opened = 0
+        self.recovered = 0
+        self.rejected = 0
+        self.probes = 0
+        self.probe_failures = 0
+        self.failures = 0
+    
+    @classmethod
+    def from_config(cls, name: str = "") -> "CircuitBreaker":
+        """按 config 中的阈值创建"""
+        return cls(
+            name,
+            failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=config.CIRCUIT_RECOVERY_TIMEOUT,
+            max_recovery_timeout=config.CIRCUIT_MAX_RECOVERY_TIMEOUT,
+            probe_timeout=config.CIRCUIT_PROBE_TIMEOUT
+        )
+    
+    @property
+    def state(self) -> str:
+        """当前状态，断开时间到期后转为半开"""
+        if self._state == OPEN and self.clock() - self._opened_at >= self._timeout:
+            self._state = HALF_OPEN
+        return self._state
+    
+    @property
+    def retry_in(self) -> float:
+        """距离进入半开状态的剩余时间（秒），未断开时为 0"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self._timeout - self.clock())
+    
+    def allow(self) -> bool:
+        """是否放行一个请求；半开状态下只放行一个探测请求"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            self.probes += 1
+            return True
+        self.rejected += 1
+        return False
+    
+    def check(self) -> None:
+        """放行检查，拒绝时抛出 CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in)
+    
+    def record_success(self) -> None:
+        """记录一次成功（端点可达），半开或断开时恢复闭合"""
+        if self.state != CLOSED:
+            self.recovered += 1
+            print(f"[CircuitBreaker] {self.name} recovered, closing circuit")
+        self._state = CLOSED
+        self._failures = 0
+        self._timeout = self.recovery_timeout
+        self._probing = False
+    
+    def record_failure(self) -> None:
+        """记录一次端点失败"""
+        self.failures += 1
+        state = self.state
+        if state == HALF_OPEN:
+            self.probe_failures += 1
+            self._trip(min(self.max_recovery_timeout, self._timeout * 2))
+        elif state == CLOSED:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._trip(self.recovery_timeout)
+    
+    def release(self) -> None:
+        """请求被取消或结果不能说明端点状态时归还探测名额"""
+        self._probing = False
+    
+    def _trip(self, timeout: float) -> None:
+        self._state = OPEN
+        self._opened_at = self.clock()
+        self._timeout = timeout
+        self._probing = False
+        self.opened += 1
+        print(f"[CircuitBreaker] {self.name} circuit open, probing again in {timeout:.1f}s")
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_in": self.retry_in,
+            "opened": self.opened,
+            "recovered": self.recovered,
+            "rejected": self.rejected,
+            "probes": self.probes,
+            "probe_failures": self.probe_failures,
+            "failures": self.failures,
+        }
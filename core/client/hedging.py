@@ -0,0 +1,287 @@
+# core/client/hedging.py
+"""多端点对冲请求与故障切换
+
+同一能力（如视觉理解）可配置多个端点或模型别名：
+- 按滚动 EWMA 延迟为端点排序，最快的作为本次调用的首选
+- 首选端点超过其 p95 延迟仍未返回时，向下一个端点发出对冲请求，先返回者胜出，其余取消
+- 端点出错时立即切换到下一个端点
+- 熔断中的端点不参与排名（全部熔断时仍按排名调用，由熔断器立即拒绝或放行探测）
+- 记录每个端点的延迟直方图
+"""
+
+import asyncio
+import bisect
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from core.client.openai_client import OpenAIClient
+
+
+class LatencyHistogram:
+    """延迟直方图：固定分桶计数 + 最近样本窗口（用于分位数）"""
+    
+    BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)  # 桶上界（秒）
+    
+    def __init__(self, window: int = 200):
+        """初始化直方图
+        
+        Args:
+            window: 计算分位数使用的最近样本数
+        """
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._recent: deque = deque(maxlen=window)
+    
+    def observe(self, seconds: float) -> None:
+        """记录一次延迟"""
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self._recent.append(seconds)
+    
+    @property
+    def samples(self) -> int:
+        """窗口内的样本数"""
+        return len(self._recent)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """最近样本的分位数，没有样本时返回 None"""
+        if not self._recent:
+            return None
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        def ms(value: Optional[float]) -> Optional[float]:
+            return value * 1000 if value is not None else None
+        
+        labels = [f"<={b:g}s" for b in self.BUCKETS] + [f">{self.BUCKETS[-1]:g}s"]
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+@dataclass
+class Endpoint:
+    """一个可调用的端点：客户端 + 模型"""
+    name: str
+    client: OpenAIClient
+    model: str
+    ewma: Optional[float] = None  # 滚动 EWMA 延迟（秒）
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    calls: int = 0
+    wins: int = 0
+    errors: int = 0
+    hedged: int = 0  # 作为对冲请求发出的次数
+    cancelled: int = 0  # 落败被取消的次数
+    
+    def update_ewma(self, seconds: float, alpha: float) -> None:
+        self.ewma = seconds if self.ewma is None else self.ewma + alpha * (seconds - self.ewma)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "model": self.model,
+            "base_url": self.client.base_url,
+            "ewma_ms": self.ewma * 1000 if self.ewma is not None else None,
+            "calls": self.calls,
+            "wins": self.wins,
+            "errors": self.errors,
+            "hedged": self.hedged,
+            "cancelled": self.cancelled,
+            "latency": self.histogram.stats(),
+        }
+
+
+class HedgedRouter:
+    """多端点对冲路由"""
+    
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        quantile: float = 0.95,
+        default_delay: float = 8.0,
+        min_delay: float = 1.0,
+        max_delay: float = 10.0,
+        min_samples: int = 20,
+        alpha: float = 0.2
+    ):
+        """初始化路由
+        
+        Args:
+            endpoints: 端点列表，按偏好排列（没有延迟样本时按此顺序排序）
+            quantile: 对冲等待时间取首选端点延迟的分位数
+            default_delay: 样本不足时的对冲等待时间（秒）
+            min_delay: 对冲等待时间下限（秒）
+            max_delay: 对冲等待时间上限（秒），同时作为出错端点的 EWMA 惩罚值
+            min_samples: 使用分位数所需的最少样本数
+            alpha: EWMA 平滑系数
+        """
+        if not endpoints:
+            raise ValueError("HedgedRouter requires at least one endpoint")
+        self.endpoints = endpoints
+        self.quantile = quantile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.alpha = alpha
+        
+        self.last_endpoint: Optional[Endpoint] = None  # 最近一次调用胜出的端点，调用失败时为 None
+        
+        # 统计计数
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.circuit_skips = 0  # 因熔断跳过端点的次数
+    
+    def ranked(self) -> List[Endpoint]:
+        """按 EWMA 延迟排序的端点，没有样本的端点排在后面并保持配置顺序"""
+        order = {id(endpoint): i for i, endpoint in enumerate(self.endpoints)}
+        return sorted(
+            self.endpoints,
+            key=lambda e: (e.ewma if e.ewma is not None else float("inf"), order[id(e)])
+        )
+    
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        """端点的对冲等待时间：样本足够时取延迟分位数，否则取默认值"""
+        delay = self.default_delay
+        if endpoint.histogram.samples >= self.min_samples:
+            delay = endpoint.histogram.quantile(self.quantile)
+        return min(self.max_delay, max(self.min_delay, delay))
+    
+    async def vision_completion(
+        self,
+        image: Any,
+        prompt: str,
+        on_field: Optional[Callable[[str, Any], Any]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """对冲方式调用图像理解，参数同 OpenAIClient.vision_completion（模型由端点决定）"""
+        async def request(endpoint: Endpoint, callback: Optional[Callable]) -> Dict[str, Any]:
+            return await endpoint.client.vision_completion(
+                model=endpoint.model, image=image, prompt=prompt, on_field=callback, **kwargs
+            )
+        
+        return await self.call(request, on_field)
+    
+    async def call(
+        self,
+        request: Callable[[Endpoint, Optional[Callable]], Awaitable[Any]],
+        on_field: Optional[Callable[[str, Any], Any]] = None
+    ) -> Any:
+        """按排名依次发起请求，超过对冲等待时间或出错时启用下一个端点，返回最先成功的结果
+        
+        Args:
+            request: request(端点, 字段回调) 发送一次请求
+            on_field: 流式字段回调；多个请求同时流式返回时只转发最先输出字段的那一个
+        
+        Returns:
+            最先成功的请求结果；所有端点都失败时抛出最后一个异常
+        """
+        self.calls += 1
+        self.last_endpoint = None  # 本次失败时不保留上一次胜出的端点
+        ranked = self.ranked()
+        available = [endpoint for endpoint in ranked if endpoint.client.endpoint_available]
+        if available and len(available) < len(ranked):
+            self.circuit_skips += len(ranked) - len(available)
+            ranked = available
+        pending: Dict[asyncio.Task, tuple] = {}
+        stream_owner: List[Endpoint] = []
+        last_error: Optional[BaseException] = None
+        next_index = 0
+        hedge_at = 0.0
+        
+        def callback_for(endpoint: Endpoint) -> Optional[Callable]:
+            if on_field is None:
+                return None
+            
+            async def callback(key: str, value: Any) -> None:
+                if not stream_owner:
+                    stream_owner.append(endpoint)
+                if stream_owner[0] is endpoint:
+                    await OpenAIClient._notify(on_field, key, value)
+            return callback
+        
+        def launch(hedge: bool = False) -> None:
+            nonlocal next_index, hedge_at
+            endpoint = ranked[next_index]
+            next_index += 1
+            endpoint.calls += 1
+            if hedge:
+                endpoint.hedged += 1
+            task = asyncio.create_task(request(endpoint, callback_for(endpoint)))
+            pending[task] = (endpoint, time.perf_counter(), hedge)
+            hedge_at = time.monotonic() + self.hedge_delay(endpoint)
+        
+        launch()
+        try:
+            while pending:
+                can_hedge = next_index < len(ranked)
+                timeout = max(0.0, hedge_at - time.monotonic()) if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                if not done:
+                    self.hedges += 1
+                    print(f"[HedgedRouter] {ranked[next_index - 1].name} slow, hedging to {ranked[next_index].name}")
+                    launch(hedge=True)
+                    continue
+                
+                for task in done:
+                    endpoint, started, hedge = pending.pop(task)
+                    elapsed = time.perf_counter() - started
+                    error = task.exception()
+                    if error is None:
+                        endpoint.histogram.observe(elapsed)
+                        endpoint.update_ewma(elapsed, self.alpha)
+                        endpoint.wins += 1
+                        if hedge:
+                            self.hedge_wins += 1
+                        self.last_endpoint = endpoint
+                        return task.result()
+                    
+                    # 出错的端点按上限延迟计入 EWMA，排名随之下降
+                    endpoint.errors += 1
+                    endpoint.update_ewma(max(elapsed, self.max_delay), self.alpha)
+                    last_error = error
+                    print(f"[HedgedRouter] {endpoint.name} failed: {error}")
+                
+                if not pending and next_index < len(ranked):
+                    self.failovers += 1
+                    launch()
+            raise last_error
+        finally:
+            for task, (endpoint, started, _) in pending.items():
+                task.cancel()
+                endpoint.cancelled += 1
+                # 落败请求的真实延迟至少为已等待的时间，只在会拉高 EWMA 时计入
+                elapsed = time.perf_counter() - started
+                if endpoint.ewma is None or elapsed > endpoint.ewma:
+                    endpoint.update_ewma(elapsed, self.alpha)
+    
+    def close(self, keep: Optional[OpenAIClient] = None) -> None:
+        """关闭各端点的客户端（keep 指定的客户端由调用方自行关闭）"""
+        for endpoint in self.endpoints:
+            if endpoint.client is not keep:
+                endpoint.client.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "circuit_skips": self.circuit_skips,
+            "endpoints": {endpoint.name: endpoint.stats() for endpoint in self.endpoints},
+        }
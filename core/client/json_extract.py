@@ -0,0 +1,119 @@
+# core/client/json_extract.py
+"""容错 JSON 提取
+
+模型即使被要求输出 JSON，也常常包上 ```json 代码块、在前后附加说明文字，
+或因 max_tokens 截断只输出一部分。按以下顺序尝试：
+1. 整段文本直接解析
+2. Markdown 代码块中的内容
+3. 文本中第一个 { 到最后一个 } 之间的内容
+4. 增量解析截断的对象，保留已完整的顶层字段
+
+安装了 orjson 时使用 orjson 解析，否则使用标准库 json。
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.client.json_stream import IncrementalJSONParser
+
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+DIRECT = "direct"
+FENCED = "fenced"
+EMBEDDED = "embedded"
+PARTIAL = "partial"
+FAILED = "failed"
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+
+
+def loads(text: str) -> Any:
+    """解析 JSON 文本（优先使用 orjson），失败时抛出 ValueError"""
+    return _loads(text)
+
+
+def _try_loads(text: str) -> Tuple[bool, Any]:
+    try:
+        return True, _loads(text)
+    except ValueError:
+        return False, None
+
+
+def extract_json(text: str) -> Tuple[Optional[Any], str]:
+    """从模型输出中提取 JSON 值
+    
+    Returns:
+        Tuple: (解析结果, 提取方式)；提取方式为 direct / fenced / embedded / partial，
+            无法提取时为 (None, failed)
+    """
+    stripped = text.strip()
+    ok, value = _try_loads(stripped)
+    if ok:
+        return value, DIRECT
+    
+    match = _FENCE.search(stripped)
+    if match:
+        ok, value = _try_loads(match.group(1).strip())
+        if ok:
+            return value, FENCED
+    
+    start = stripped.find("{")
+    end = stripped.rfind("}")
+    if start != -1 and end > start:
+        ok, value = _try_loads(stripped[start:end + 1])
+        if ok:
+            return value, EMBEDDED
+    
+    if start != -1:
+        # 截断的对象：保留已经完整到达的顶层字段
+        parser = IncrementalJSONParser()
+        parser.feed(stripped[start:])
+        if parser.fields:
+            return dict(parser.fields), PARTIAL
+    
+    return None, FAILED
+
+
+class ParseStats:
+    """解析结果统计"""
+    
+    def __init__(self):
+        self.counts: Dict[str, int] = {DIRECT: 0, FENCED: 0, EMBEDDED: 0, PARTIAL: 0, FAILED: 0}
+        self.invalid = 0  # 解析成功但未通过结构校验的次数（由调用方在校验后填入）
+    
+    def record(self, method: str) -> None:
+        """记录一次提取方式"""
+        self.counts[method] = self.counts.get(method, 0) + 1
+    
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+    
+    @classmethod
+    def combine(cls, items: List["ParseStats"]) -> "ParseStats":
+        """合并多个统计（如对冲路由中各端点的客户端）"""
+        merged = cls()
+        for item in items:
+            for method, count in item.counts.items():
+                merged.counts[method] = merged.counts.get(method, 0) + count
+            merged.invalid += item.invalid
+        return merged
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        total = self.total
+        return {
+            **self.counts,
+            "total": total,
+            "invalid": self.invalid,
+            "failure_rate": self.counts[FAILED] / total if total else 0.0,
+            "repair_rate": (self.counts[FENCED] + self.counts[EMBEDDED] + self.counts[PARTIAL]) / total if total else 0.0,
+            "backend": JSON_BACKEND,
+        }
@@ -0,0 +1,100 @@
+# core/client/json_stream.py
+"""增量 JSON 解析
+
+流式接收模型输出时逐块扫描顶层 JSON 对象，每当一个顶层字段的值完整到达就立即
+解析并返回，不必等待整个对象结束。对象之前的任意文本（如 ```json 代码块标记）会被跳过。
+"""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+
+class IncrementalJSONParser:
+    """顶层 JSON 对象的增量字段解析器"""
+    
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"  # key / colon / value
+        self._key_start = -1
+        self._key = None
+        self._value_start = -1
+    
+    @property
+    def text(self) -> str:
+        """已接收的全部文本"""
+        return self._buffer
+    
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """输入一段文本
+        
+        Args:
+            chunk: 新到达的文本片段
+        
+        Returns:
+            List: 本次新解析出的 (字段名, 值) 列表
+        """
+        self._buffer += chunk
+        completed = []
+        text = self._buffer
+        i = self._pos
+        
+        while i < len(text) and not self.done:
+            c = text[i]
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == "key":
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._expect = "colon"
+                i += 1
+                continue
+            
+            if self._depth == 0:
+                # 跳过对象之前的文本
+                if c == "{":
+                    self._depth = 1
+                    self._expect = "key"
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect == "key":
+                    self._key_start = i
+            elif c == ":" and self._depth == 1 and self._expect == "colon":
+                self._expect = "value"
+                self._value_start = i + 1
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete(text[self._value_start:i], completed)
+                    self.done = True
+            elif c == "," and self._depth == 1:
+                self._complete(text[self._value_start:i], completed)
+                self._expect = "key"
+            i += 1
+        
+        self._pos = i
+        return completed
+    
+    def _complete(self, raw: str, completed: List[Tuple[str, Any]]) -> None:
+        """解析一个完整的字段值"""
+        if self._expect != "value" or self._key is None:
+            return
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+        self._key = None
@@ -9,20 +9,46 @@
 
 import asyncio
 import base64
+import copy
+import hashlib
+import inspect
 import json
-from typing import Dict, List, Any, Optional
+import time
+from typing import Awaitable, Callable, Dict, List, Any, Optional, Sequence, Tuple, Union
+import httpx
+import openai
 from openai import AsyncOpenAI
+from core.client.circuit_breaker import CLOSED, OPEN, CircuitBreaker, is_endpoint_failure
+from core.client.json_extract import FAILED, PARTIAL, ParseStats, extract_json, loads as fast_loads
+from core.client.json_stream import IncrementalJSONParser
+from core.client.payload import PayloadBufferPool
+from core.client.rate_limit import EMERGENCY, ROUTINE, RateLimiter, parse_retry_after
+from core.client.registry import ClientRegistry, SharedClient, close_later
+from core.client.single_flight import SingleFlight
+from core.client.tts_cache import TTSAudioCache
+from core.client.usage import UsageTracker, get_usage_tracker
+from core.client.vision_cache import VisionResultCache
 
 
 class OpenAIClient:
     """OpenAI API 统一客户端"""
     
+    IMAGE_TOKENS = 1000  # 限流预扣时每张图像按此 token 数估算
+    
     def __init__(
         self,
         api_key: str,
         base_url: str = "https://dashscope.aliyuncs.com/compatible-mode/v1",
         timeout: int = 30,
-        max_retries: int = 3
+        max_retries: int = 3,
+        vision_cache: Optional[VisionResultCache] = None,
+        zero_copy: bool = False,
+        registry: Optional[ClientRegistry] = None,
+        coalesce: bool = True,
+        rate_limit: bool = True,
+        usage_tracker: Optional[UsageTracker] = None,
+        circuit_breaker: bool = True,
+        tts_cache: Optional[TTSAudioCache] = None
     ):
         """初始化客户端
         
@@ -31,19 +57,64 @@ class OpenAIClient:
             base_url: API 基础 URL
             timeout: 请求超时时间（秒）
             max_retries: 失败重试次数
+            vision_cache: 视觉结果缓存，为 None 时不缓存
+            zero_copy: 视觉请求是否使用预分配缓冲区直接构造请求体
+                （绕过 SDK 的 JSON 序列化，图像数据只编码一次）
+            registry: 共享客户端注册表；提供时复用注册表中同一端点的连接池，
+                close 时归还而不是各自持有连接
+            coalesce: 是否合并进行中的相同请求（对话、视觉、TTS）；使用注册表时
+                同一端点的所有客户端共享合并器
+            rate_limit: 是否按模型限流（令牌桶 + 并发上限）；启用时 SDK 不再自行重试，
+                429 由限流器按 Retry-After 暂停并降速后重试，其他可重试错误按指数退避重试
+            usage_tracker: 记录 token 用量和费用的统计器，为 None 时使用进程级默认统计器
+            circuit_breaker: 是否启用端点熔断；端点连续不可用时请求立即以 CircuitOpenError 失败，
+                使用注册表时同一端点的所有客户端共享熔断器
+            tts_cache: 语音合成音频缓存，为 None 时不缓存
         """
         self.api_key = api_key
         self.base_url = base_url
         self.timeout = timeout
         self.max_retries = max_retries
+        self.vision_cache = vision_cache
+        self.tts_cache = tts_cache
+        self.zero_copy = zero_copy
+        self.coalesce = coalesce
+        self.rate_limit = rate_limit
+        self.circuit_breaker = circuit_breaker
+        # SDK 的重试不区分 429，启用限流时由 _governed 接管
+        sdk_retries = 0 if rate_limit else max_retries
         
-        # 初始化 OpenAI 客户端
-        self.client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            timeout=timeout,
-            max_retries=max_retries
-        )
+        self.registry = registry
+        self._shared: Optional[SharedClient] = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.payload_pool = PayloadBufferPool() if zero_copy else None
+        
+        if registry is not None:
+            # 使用注册表中的共享连接池，按本客户端的超时和重试设置派生 SDK 实例
+            self._shared = registry.acquire(api_key, base_url)
+            self.http_client = self._shared.http_client
+            self.client = self._shared.openai.with_options(timeout=timeout, max_retries=sdk_retries)
+        else:
+            # 零拷贝模式下自行持有 httpx 客户端，与 SDK 共用同一连接池
+            if zero_copy:
+                self.http_client = httpx.AsyncClient(timeout=timeout)
+            
+            # 初始化 OpenAI 客户端
+            self.client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=timeout,
+                max_retries=sdk_retries,
+                http_client=self.http_client
+            )
+        
+        self.single_flight = self._shared.single_flight if self._shared is not None else SingleFlight()
+        self.rate_limiter = self._shared.rate_limiter if self._shared is not None else RateLimiter.from_config()
+        self.breaker = self._shared.breaker if self._shared is not None else CircuitBreaker.from_config(base_url)
+        self.last_timing: Dict[str, Any] = {}  # 本客户端最近一次请求的排队和 API 耗时
+        self.parse_stats = ParseStats()
+        self.usage_tracker = usage_tracker or get_usage_tracker()
+        self.unsupported_response_format: set = set()  # 拒绝 response_format 参数的模型
         
         print(f"[OpenAI Client] Initialized with base_url: {base_url}")
     
@@ -53,6 +124,7 @@ class OpenAIClient:
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        priority: str = ROUTINE,
         **kwargs
     ) -> str:
         """文本对话/推理
@@ -62,6 +134,7 @@ class OpenAIClient:
             messages: 消息列表
             temperature: 生成温度
             max_tokens: 最大生成 token 数
+            priority: 限流排队优先级（emergency / routine）
             **kwargs: 其他参数
             
         Returns:
@@ -70,15 +143,24 @@ class OpenAIClient:
         try:
             print(f"[OpenAI Client] Calling chat_completion with model: {model}")
             
-            response = await self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                **kwargs
-            )
+            async def create() -> Any:
+                return await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **kwargs
+                )
             
-            result = response.choices[0].message.content
+            async def request() -> str:
+                estimate = self._estimate_tokens([m.get("content") for m in messages], max_tokens)
+                response = await self._governed(model, priority, estimate, create, usage=self._usage_tokens)
+                return response.choices[0].message.content
+            
+            key = self._flight_key("chat", model, {
+                "messages": messages, "temperature": temperature, "max_tokens": max_tokens, **kwargs
+            })
+            result = await self._coalesced(key, request)
             print(f"[OpenAI Client] Chat completion success, length: {len(result)}")
             return result
             
@@ -89,20 +171,29 @@ class OpenAIClient:
     async def vision_completion(
         self,
         model: str,
-        image: bytes,
+        image: Union[bytes, List[bytes]],
         prompt: str,
         temperature: float = 0.7,
         max_tokens: int = 500,
+        mime_type: Union[str, List[str]] = "image/jpeg",
+        on_field: Optional[Callable[[str, Any], Union[None, Awaitable[None]]]] = None,
+        priority: str = ROUTINE,
         **kwargs
     ) -> Dict[str, Any]:
         """图像理解
         
+        传入 on_field 时以流式方式请求，边接收边增量解析 JSON，每个顶层字段
+        （如 emergency）的值一到达就回调，调用方不必等待整段描述生成完毕。
+        
         Args:
             model: 模型名称（如 qwen-vl-plus）
-            image: 图像字节数据
+            image: 图像数据（bytes 或 memoryview）；传入列表时作为多个 image_url 放在同一条消息中
             prompt: 提示词
             temperature: 生成温度
             max_tokens: 最大生成 token 数
+            mime_type: 图像 MIME 类型，多图时可传入与 image 等长的列表
+            on_field: 字段回调 on_field(字段名, 值)，可以是协程函数；缓存命中时依次回调缓存结果的字段
+            priority: 限流排队优先级（emergency / routine）
             **kwargs: 其他参数
             
         Returns:
@@ -110,28 +201,160 @@ class OpenAIClient:
         """
         try:
             print(f"[OpenAI Client] Calling vision_completion with model: {model}")
+            self.last_timing = {}
             
-            # 将图像编码为 base64
-            image_base64 = base64.b64encode(image).decode('utf-8')
-            image_url = f"data:image/jpeg;base64,{image_base64}"
-            
-            # 构造消息
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": image_url}
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }
-            ]
+            # 查询感知哈希缓存（仅单图请求）；解码计算哈希放到线程中，不阻塞事件循环
+            # 紧急优先级（本地检测已发现火焰/烟雾等）必须重新分析，不查缓存，结果仍写入缓存
+            image_hash = None
+            if self.vision_cache is not None and not isinstance(image, list):
+                image_hash = await asyncio.to_thread(self.vision_cache.hash_image, image)
+                if image_hash is not None and priority != EMERGENCY:
+                    cached = self.vision_cache.get(model, prompt, image_hash)
+                    if cached is not None:
+                        print("[OpenAI Client] Vision cache hit")
+                        if on_field is not None:
+                            for key, value in cached.items():
+                                await self._notify(on_field, key, value)
+                        return cached
             
+            images = image if isinstance(image, list) else [image]
+            mime_types = mime_type if isinstance(mime_type, list) else [mime_type] * len(images)
+            
+            async def request() -> Dict[str, Any]:
+                return await self._vision_request(
+                    model, images, mime_types, prompt, temperature, max_tokens, on_field, image_hash, priority, **kwargs
+                )
+            
+            key = self._flight_key("vision", model, {
+                "prompt": prompt, "mime_types": mime_types,
+                "temperature": temperature, "max_tokens": max_tokens, **kwargs
+            }, images)
+            result, shared = await self._coalesced(key, request, with_shared=True)
+            if shared and on_field is not None and isinstance(result, dict):
+                # 加入他人发起的请求时收不到增量字段：结果到达后依次回调
+                for field_name, value in result.items():
+                    await self._notify(on_field, field_name, value)
+            # 每个调用方拿到独立副本，各自修改结果互不影响
+            return copy.deepcopy(result)
+            
+        except Exception as e:
+            print(f"[OpenAI Client] Error in vision_completion: {e}")
+            raise
+    
+    async def _vision_request(
+        self,
+        model: str,
+        images: List[Any],
+        mime_types: List[str],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        on_field: Optional[Callable[[str, Any], Union[None, Awaitable[None]]]],
+        image_hash: Optional[str],
+        priority: str = ROUTINE,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """发送一次视觉请求并解析结果，可解析为完整 JSON 对象时写入缓存
+        
+        kwargs 中带 response_format 而模型不支持（返回 400）时，记住该模型并去掉该参数重试一次。
+        """
+        if model in self.unsupported_response_format:
+            kwargs.pop("response_format", None)
+        
+        # 流式模式：每段增量文本送入解析器，字段完整后立即回调
+        parser = None
+        on_delta = None
+        if on_field is not None:
+            parser = IncrementalJSONParser()
+            
+            async def on_delta(text: str) -> None:
+                for key, value in parser.feed(text):
+                    await self._notify(on_field, key, value)
+        
+        # 响应中的 usage 写入 usage_out（视觉请求返回的是文本，用量单独取出）
+        usage_out: Dict[str, Any] = {}
+        
+        async def send() -> str:
+            usage_out.clear()
+            if self.zero_copy:
+                params = {"temperature": temperature, "max_tokens": max_tokens, **kwargs}
+                return await self._post_vision_payload(
+                    model, images, mime_types, prompt, params, on_delta=on_delta, usage_out=usage_out
+                )
+            return await self._create_vision_completion(
+                model, images, mime_types, prompt, temperature, max_tokens,
+                on_delta=on_delta, usage_out=usage_out, **kwargs
+            )
+        
+        def usage(_: str) -> Optional[Tuple[int, int]]:
+            return self._usage_tokens(usage_out.get("usage"))
+        
+        estimate = self._estimate_tokens([prompt], max_tokens, len(images))
+        try:
+            result_text = await self._governed(
+                model, priority, estimate, send, usage=usage,
+                # 已经回调过增量内容时不能重试，否则字段会重复送达
+                retryable=lambda: parser is None or not parser.text
+            )
+        except (openai.BadRequestError, httpx.HTTPStatusError) as e:
+            status, _ = self._error_response(e)
+            if status != 400 or "response_format" not in kwargs:
+                raise
+            print(f"[OpenAI Client] {model} rejected response_format, retrying without it")
+            self.unsupported_response_format.add(model)
+            kwargs.pop("response_format")
+            result_text = await self._governed(model, priority, estimate, send, usage=usage)
+        
+        print(f"[OpenAI Client] Vision completion success, result: {result_text[:100]}...")
+        
+        # 容错提取 JSON：代码块、前后说明文字、截断的对象
+        result_dict, method = extract_json(result_text)
+        self.parse_stats.record(method)
+        if method == FAILED:
+            print("[OpenAI Client] Warning: vision result is not JSON")
+            return {"description": result_text, "raw_response": True}
+        if image_hash is not None and method != PARTIAL and isinstance(result_dict, dict):
+            self.vision_cache.put(model, prompt, image_hash, result_dict)
+        return result_dict
+    
+    async def _create_vision_completion(
+        self,
+        model: str,
+        images: List[Any],
+        mime_types: List[str],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+        usage_out: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> str:
+        """通过 SDK 发送视觉请求，提供 on_delta 时以流式方式接收，响应中的 usage 写入 usage_out"""
+        if usage_out is None:
+            usage_out = {}
+        # 将图像编码为 base64
+        content = []
+        for data, mime in zip(images, mime_types):
+            image_base64 = base64.b64encode(data).decode('utf-8')
+            image_url = f"data:{mime};base64,{image_base64}"
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": image_url}
+            })
+        content.append({
+            "type": "text",
+            "text": prompt
+        })
+        
+        # 构造消息
+        messages = [
+            {
+                "role": "user",
+                "content": content
+            }
+        ]
+        
+        if on_delta is None:
             response = await self.client.chat.completions.create(
                 model=model,
                 messages=messages,
@@ -139,21 +362,339 @@ class OpenAIClient:
                 max_tokens=max_tokens,
                 **kwargs
             )
-            
-            result_text = response.choices[0].message.content
-            print(f"[OpenAI Client] Vision completion success, result: {result_text[:100]}...")
-            
-            # 尝试解析为 JSON
+            usage_out["usage"] = response.usage
+            return response.choices[0].message.content
+        
+        # 流式响应默认不带 usage，要求在最后一个分块中返回
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **kwargs
+        )
+        parts = []
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                usage_out["usage"] = usage
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                parts.append(text)
+                await on_delta(text)
+        return "".join(parts)
+    
+    async def _post_vision_payload(
+        self,
+        model: str,
+        images: List[Any],
+        mime_types: List[str],
+        prompt: str,
+        params: Dict[str, Any],
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+        usage_out: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """零拷贝模式：把请求体写入复用缓冲区后按块直接发送，提供 on_delta 时以 SSE 流式接收
+        
+        响应中的 usage 写入 usage_out。
+        """
+        if usage_out is None:
+            usage_out = {}
+        if on_delta is not None:
+            params = {"stream_options": {"include_usage": True}, **params, "stream": True}
+        payload = self.payload_pool.build_vision_body(model, images, mime_types, prompt, params)
+        url = f"{self.base_url.rstrip('/')}/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Content-Length": str(payload.length),
+        }
+        # 启用限流时由 _governed 统一重试（同时计入熔断器），这里只发送一次
+        attempts = 1 if self.rate_limit else self.max_retries + 1
+        try:
+            for attempt in range(attempts):
+                retry = attempt < attempts - 1
+                received = []
+                try:
+                    async with self.http_client.stream(
+                        "POST", url, content=payload.stream(), headers=headers, timeout=self.timeout
+                    ) as response:
+                        if retry and (response.status_code == 429 or response.status_code >= 500):
+                            print(f"[OpenAI Client] Vision request got HTTP {response.status_code}, retrying...")
+                        else:
+                            if response.status_code >= 400:
+                                await response.aread()
+                            response.raise_for_status()
+                            if on_delta is None:
+                                await response.aread()
+                                body = response.json()
+                                usage_out["usage"] = body.get("usage")
+                                return body["choices"][0]["message"]["content"]
+                            return await self._read_sse(response, on_delta, received, usage_out)
+                except httpx.TransportError:
+                    # 已经回调过增量内容时不能重试，否则字段会重复送达
+                    if not retry or received:
+                        raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        finally:
+            payload.release()
+    
+    @staticmethod
+    async def _read_sse(
+        response: httpx.Response,
+        on_delta: Callable[[str], Awaitable[None]],
+        received: List[str],
+        usage_out: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """读取 chat/completions 的 SSE 流，逐段回调增量文本，最后一个分块中的 usage 写入 usage_out"""
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = fast_loads(data)
+            if chunk.get("usage") and usage_out is not None:
+                usage_out["usage"] = chunk["usage"]
+            choices = chunk.get("choices") or []
+            text = choices[0].get("delta", {}).get("content") if choices else None
+            if text:
+                received.append(text)
+                await on_delta(text)
+        return "".join(received)
+    
+    @staticmethod
+    async def _notify(callback: Callable[[str, Any], Any], key: str, value: Any) -> None:
+        """调用字段回调，兼容普通函数和协程函数"""
+        result = callback(key, value)
+        if inspect.isawaitable(result):
+            await result
+    
+    @staticmethod
+    def _flight_key(kind: str, model: str, params: Dict[str, Any], blobs: Sequence[Any] = ()) -> Tuple[str, str, str]:
+        """生成单飞合并键：请求类型、模型和参数（含图像数据）的摘要"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps(params, sort_keys=True, ensure_ascii=False, default=repr).encode("utf-8"))
+        for blob in blobs:
+            digest.update(blob)
+        return kind, model, digest.hexdigest()
+    
+    async def _coalesced(self, key: Tuple[str, str, str], request: Callable[[], Awaitable[Any]], with_shared: bool = False) -> Any:
+        """通过单飞合并器执行请求，未启用合并时直接执行
+        
+        Returns:
+            请求结果；with_shared 为 True 时返回 (结果, 是否加入了进行中的请求)
+        """
+        if not self.coalesce:
+            result, shared = await request(), False
+        else:
+            result, shared = await self.single_flight.do(key, request)
+            if shared:
+                print(f"[OpenAI Client] Joined in-flight {key[0]} request")
+        return (result, shared) if with_shared else result
+    
+    async def _governed(
+        self,
+        model: str,
+        priority: str,
+        estimate: float,
+        request: Callable[[], Awaitable[Any]],
+        usage: Optional[Callable[[Any], Optional[int]]] = None,
+        retryable: Optional[Callable[[], bool]] = None
+    ) -> Any:
+        """经模型限流器排队后执行请求，并处理 429 和可重试错误
+        
+        Args:
+            model: 模型名称
+            priority: 排队优先级（emergency / routine）
+            estimate: 预扣的 token 数
+            request: 发送请求的协程函数
+            usage: 从结果中取实际 (输入, 输出) token 用量的函数，用于校正 TPM 令牌桶和记录费用；
+                取不到时按估算值记录
+            retryable: 失败后是否还能重试（如流式请求已收到部分内容时不能重试）
+        
+        Returns:
+            request 的返回值；排队和 API 耗时记录在 last_timing 中
+        
+        Raises:
+            CircuitOpenError: 端点已熔断（未等待超时即失败）
+        """
+        if not self.rate_limit:
+            self._admit()
+            start = time.perf_counter()
+            try:
+                result = await request()
+            except BaseException as e:
+                self._record_outcome(e)
+                raise
+            self._record_outcome(None)
+            self.last_timing = {"model": model, "queue_delay": 0.0, "api_latency": time.perf_counter() - start}
+            self._record_usage(model, estimate, usage(result) if usage else None)
+            return result
+        
+        governor = self.rate_limiter.governor(model)
+        queue_total = 0.0
+        attempt = 0
+        while True:
+            # 已熔断时不必排队，直接失败
+            if self.circuit_breaker and self.breaker.state == OPEN:
+                self.breaker.check()
+            queue_total += await governor.acquire(estimate, priority)
+            try:
+                self._admit()
+            except Exception:
+                governor.release(estimate, actual_tokens=0)
+                raise
+            start = time.perf_counter()
             try:
-                result_dict = json.loads(result_text)
-                return result_dict
-            except json.JSONDecodeError:
-                # 如果不是 JSON，返回原始文本
-                return {"description": result_text, "raw_response": True}
+                result = await request()
+            except asyncio.CancelledError:
+                # 被取消（如对冲落败）时归还并发名额和探测名额
+                governor.release(estimate)
+                self._record_outcome(None, cancelled=True)
+                raise
+            except Exception as e:
+                status, headers = self._error_response(e)
+                retry_after = parse_retry_after(headers) if status == 429 else None
+                governor.release(estimate, rate_limited=status == 429, retry_after=retry_after)
+                self._record_outcome(e)
+                if attempt >= self.max_retries or (retryable is not None and not retryable()):
+                    raise
+                if self.circuit_breaker and self.breaker.state != CLOSED:
+                    # 本次失败触发了熔断，不再重试
+                    raise
+                if status == 429:
+                    # 等待时间由限流器的暂停控制，重新排队即可
+                    print(f"[OpenAI Client] {model} rate limited (retry-after={retry_after}), requeueing...")
+                elif isinstance(e, (openai.APIConnectionError, httpx.TransportError)) or (status or 0) >= 500:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                else:
+                    raise
+                attempt += 1
+                continue
             
-        except Exception as e:
-            print(f"[OpenAI Client] Error in vision_completion: {e}")
+            latency = time.perf_counter() - start
+            tokens = usage(result) if usage else None
+            governor.release(estimate, actual_tokens=sum(tokens) if tokens else None, latency=latency)
+            self._record_outcome(None)
+            self._record_usage(model, estimate, tokens)
+            self.last_timing = {
+                "model": model,
+                "priority": priority,
+                "queue_delay": queue_total,
+                "api_latency": latency,
+                "attempts": attempt + 1,
+            }
+            return result
+    
+    def _admit(self) -> None:
+        """熔断检查，已熔断时抛出 CircuitOpenError（半开状态下只放行一个探测请求）"""
+        if self.circuit_breaker:
+            self.breaker.check()
+    
+    def _record_outcome(self, error: Optional[BaseException], cancelled: bool = False) -> None:
+        """把请求结果计入熔断器：端点失败计为失败，取消不计，其他结果说明端点可达"""
+        if not self.circuit_breaker:
+            return
+        if cancelled or isinstance(error, asyncio.CancelledError):
+            self.breaker.release()
+        elif error is not None and is_endpoint_failure(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+    
+    @property
+    def endpoint_available(self) -> bool:
+        """端点熔断器是否闭合（未启用熔断时总为 True）"""
+        return not self.circuit_breaker or self.breaker.state == CLOSED
+    
+    async def probe_endpoint(self) -> bool:
+        """用轻量请求（GET /models）探测端点是否恢复
+        
+        熔断器半开时占用探测名额，结果计入熔断器；尚未到探测时间或已有探测在进行时直接返回 False。
+        
+        Returns:
+            bool: 端点是否可达
+        """
+        if self.circuit_breaker and not self.breaker.allow():
+            return False
+        try:
+            await self.client.with_options(timeout=self.breaker.probe_timeout, max_retries=0).models.list()
+        except asyncio.CancelledError:
+            self._record_outcome(None, cancelled=True)
             raise
+        except Exception as e:
+            self._record_outcome(e)
+            if is_endpoint_failure(e):
+                print(f"[OpenAI Client] Probe of {self.base_url} failed: {e}")
+                return False
+            return True
+        self._record_outcome(None)
+        return True
+    
+    @staticmethod
+    def _error_response(error: Exception) -> Tuple[Optional[int], Optional[httpx.Headers]]:
+        """取出异常对应的 HTTP 状态码和响应头"""
+        response = getattr(error, "response", None)
+        if isinstance(response, httpx.Response):
+            return response.status_code, response.headers
+        return getattr(error, "status_code", None), None
+    
+    @classmethod
+    def _estimate_tokens(cls, texts: List[Any], max_tokens: int = 0, images: int = 0) -> float:
+        """粗略估算请求的 token 数：文本按每 2 个字符 1 个 token，加上输出上限和图像"""
+        chars = sum(
+            len(text) if isinstance(text, str) else len(json.dumps(text, ensure_ascii=False))
+            for text in texts if text
+        )
+        return chars / 2 + max_tokens + images * cls.IMAGE_TOKENS
+    
+    @staticmethod
+    def _usage_tokens(usage: Any) -> Optional[Tuple[int, int]]:
+        """取出 usage 中的 (输入, 输出) token 数
+        
+        Args:
+            usage: SDK 响应、SDK 的 usage 对象或 JSON 中的 usage 字典
+        """
+        usage = getattr(usage, "usage", usage)
+        if isinstance(usage, dict):
+            prompt, completion = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        else:
+            prompt, completion = getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+        if prompt is None and completion is None:
+            return None
+        return int(prompt or 0), int(completion or 0)
+    
+    def _record_usage(self, model: str, estimate: float, tokens: Optional[Tuple[int, int]]) -> None:
+        """记录一次成功请求的用量，响应中没有 usage 时按预扣的估算值计入输入 token"""
+        if tokens is None:
+            self.usage_tracker.record(model, int(estimate), 0, estimated=True)
+        else:
+            self.usage_tracker.record(model, *tokens)
+    
+    def usage_stats(self) -> Dict[str, Any]:
+        """获取 token 用量、费用和预算统计（进程级默认统计器为所有客户端的合计）"""
+        return self.usage_tracker.stats()
+    
+    def rate_limit_stats(self) -> Dict[str, Any]:
+        """获取各模型的限流统计（使用注册表时为同一端点所有客户端的合计）"""
+        return self.rate_limiter.stats()
+    
+    def circuit_stats(self) -> Dict[str, Any]:
+        """获取端点熔断器统计（使用注册表时同一端点的所有客户端共享）"""
+        stats = self.breaker.stats()
+        stats["enabled"] = self.circuit_breaker
+        return stats
+    
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """获取请求合并统计（使用注册表时为同一端点所有客户端的合计）"""
+        stats = self.single_flight.stats()
+        stats["enabled"] = self.coalesce
+        return stats
     
     async def tts_completion(
         self,
@@ -161,6 +702,7 @@ class OpenAIClient:
         text: str,
         voice: str = "default",
         speed: float = 1.0,
+        priority: str = ROUTINE,
         **kwargs
     ) -> bytes:
         """文本转语音
@@ -170,6 +712,7 @@ class OpenAIClient:
             text: 要转换的文本
             voice: 音色类型
             speed: 语速倍率
+            priority: 限流排队优先级（emergency / routine）
             **kwargs: 其他参数
             
         Returns:
@@ -179,19 +722,34 @@ class OpenAIClient:
             print(f"[OpenAI Client] Calling tts_completion with model: {model}")
             print(f"[OpenAI Client] Text to speak: {text}")
             
-            # 注意：此处为示例实现，实际 TTS API 可能不同
-            # 需要根据实际的 Qwen API 文档调整
-            response = await self.client.audio.speech.create(
-                model=model,
-                input=text,
-                voice=voice,
-                speed=speed,
-                **kwargs
-            )
+            # 查询音频缓存
+            if self.tts_cache is not None:
+                cached = self.tts_cache.get(model, voice, speed, text)
+                if cached is not None:
+                    print(f"[OpenAI Client] TTS cache hit, audio size: {len(cached)} bytes")
+                    return cached
+            
+            async def create() -> Any:
+                # 注意：此处为示例实现，实际 TTS API 可能不同
+                # 需要根据实际的 Qwen API 文档调整
+                return await self.client.audio.speech.create(
+                    model=model,
+                    input=text,
+                    voice=voice,
+                    speed=speed,
+                    **kwargs
+                )
             
-            # 读取音频数据
-            audio_bytes = response.content
+            async def request() -> bytes:
+                response = await self._governed(model, priority, self._estimate_tokens([text]), create)
+                # 读取音频数据
+                return response.content
+            
+            key = self._flight_key("tts", model, {"text": text, "voice": voice, "speed": speed, **kwargs})
+            audio_bytes = await self._coalesced(key, request)
             print(f"[OpenAI Client] TTS completion success, audio size: {len(audio_bytes)} bytes")
+            if self.tts_cache is not None and not kwargs:
+                self.tts_cache.put(model, voice, speed, text, audio_bytes)
             return audio_bytes
             
         except Exception as e:
@@ -200,11 +758,80 @@ class OpenAIClient:
             print(f"[OpenAI Client] Warning: TTS API might not be available, returning mock data")
             return b""  # 返回空字节，避免崩溃
     
+    async def tts_stream(
+        self,
+        model: str,
+        text: str,
+        on_chunk: Callable[[bytes], Awaitable[None]],
+        voice: str = "default",
+        speed: float = 1.0,
+        priority: str = ROUTINE,
+        chunk_size: int = 4096,
+        **kwargs
+    ) -> bytes:
+        """流式文本转语音：音频块到达即回调 on_chunk（可在其中直接开始播放）
+        
+        音频缓存命中时整段音频一次回调。每个调用方都要收到自己的分块回调，因此不合并相同请求；
+        已回调过音频块后失败不再重试，以免重复播放。
+        
+        Args:
+            model: 模型名称
+            text: 要转换的文本
+            on_chunk: 收到音频块时调用的协程函数
+            voice: 音色类型
+            speed: 语速倍率
+            priority: 限流排队优先级（emergency / routine）
+            chunk_size: 读取响应的分块大小（字节）
+            **kwargs: 其他参数
+        
+        Returns:
+            bytes: 完整的音频数据，失败时为空
+        """
+        try:
+            print(f"[OpenAI Client] Calling tts_stream with model: {model}")
+            
+            if self.tts_cache is not None:
+                cached = self.tts_cache.get(model, voice, speed, text)
+                if cached is not None:
+                    print(f"[OpenAI Client] TTS cache hit, audio size: {len(cached)} bytes")
+                    await on_chunk(cached)
+                    return cached
+            
+            received: List[bytes] = []
+            
+            async def request() -> bytes:
+                async with self.client.audio.speech.with_streaming_response.create(
+                    model=model,
+                    input=text,
+                    voice=voice,
+                    speed=speed,
+                    stream_format="audio",
+                    **kwargs
+                ) as response:
+                    async for chunk in response.iter_bytes(chunk_size):
+                        received.append(chunk)
+                        await on_chunk(chunk)
+                return b"".join(received)
+            
+            audio_bytes = await self._governed(
+                model, priority, self._estimate_tokens([text]), request, retryable=lambda: not received
+            )
+            print(f"[OpenAI Client] TTS stream complete, {len(received)} chunks, audio size: {len(audio_bytes)} bytes")
+            if self.tts_cache is not None and not kwargs:
+                self.tts_cache.put(model, voice, speed, text, audio_bytes)
+            return audio_bytes
+            
+        except Exception as e:
+            print(f"[OpenAI Client] Error in tts_stream: {e}")
+            return b""
+    
     async def asr_completion(
         self,
         model: str,
         audio: bytes,
         language: str = "zh",
+        filename: str = "audio.wav",
+        priority: str = ROUTINE,
         **kwargs
     ) -> str:
         """语音转文本
@@ -213,6 +840,8 @@ class OpenAIClient:
             model: 模型名称（如 qwen-omni-flash）
             audio: 音频字节数据
             language: 语言代码
+            filename: 上传时使用的文件名（服务端据扩展名判断音频格式）
+            priority: 限流排队优先级（emergency / routine）
             **kwargs: 其他参数
             
         Returns:
@@ -223,12 +852,16 @@ class OpenAIClient:
             
             # 注意：此处为示例实现，实际 ASR API 可能不同
             # 需要根据实际的 Qwen API 文档调整
-            response = await self.client.audio.transcriptions.create(
-                model=model,
-                file=audio,
-                language=language,
-                **kwargs
-            )
+            async def create() -> Any:
+                return await self.client.audio.transcriptions.create(
+                    model=model,
+                    file=(filename, audio),
+                    language=language,
+                    **kwargs
+                )
+            
+            # 按 16kHz 16 位音频每秒约 25 个 token 预扣
+            response = await self._governed(model, priority, len(audio) / 1280, create)
             
             result = response.text
             print(f"[OpenAI Client] ASR completion success: {result}")
@@ -240,7 +873,25 @@ class OpenAIClient:
             return ""  # 返回空字符串，避免崩溃
     
     def close(self):
-        """关闭客户端连接"""
+        """关闭客户端连接
+        
+        使用注册表时归还共享连接（最后一个使用者归还时由注册表关闭），
+        否则关闭自身持有的连接池。
+        """
         print("[OpenAI Client] Closing client")
-        # AsyncOpenAI 客户端会自动管理连接
-        pass
+        if self.vision_cache is not None:
+            self.vision_cache.save()
+        
+        if self._shared is not None:
+            self.registry.release(self._shared)
+            self._shared = None
+        elif self.client is not None:
+            close_later(self.client.close())
+        self.client = None
+    
+    async def aclose(self):
+        """在事件循环中关闭客户端连接，关闭完成后返回"""
+        if self._shared is None and self.client is not None:
+            client, self.client = self.client, None
+            await client.close()
+        self.close()
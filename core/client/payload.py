@@ -0,0 +1,150 @@
+# core/client/payload.py
+"""视觉请求体构造
+
+把图像以 base64 data URL 的形式直接写入可复用的预分配缓冲区，一次性拼出
+完整的 JSON 请求体，避免 tobytes → b64encode → decode → f-string → json.dumps
+逐层产生的整帧拷贝。
+"""
+
+import binascii
+import json
+import threading
+from typing import Any, AsyncIterator, Dict, List, Sequence
+
+# 每次 base64 编码的输入块大小（3 的倍数），临时对象大小以此为上限
+_B64_CHUNK = 48 * 1024
+# 发送请求体时每次交给 HTTP 层的块大小
+_SEND_CHUNK = 64 * 1024
+
+
+def base64_length(size: int) -> int:
+    """计算 base64 编码后的长度"""
+    return (size + 2) // 3 * 4
+
+
+class VisionPayload:
+    """从缓冲池借出的请求体，发送完成后需调用 release 归还"""
+    
+    def __init__(self, pool: "PayloadBufferPool", buffer: bytearray, length: int):
+        self._pool = pool
+        self._buffer = buffer
+        self.length = length
+    
+    @property
+    def view(self) -> memoryview:
+        """请求体内容（不拷贝）"""
+        return memoryview(self._buffer)[:self.length]
+    
+    async def stream(self) -> AsyncIterator[memoryview]:
+        """按块输出请求体，供 httpx 以流的方式发送"""
+        view = self.view
+        for start in range(0, self.length, _SEND_CHUNK):
+            yield view[start:start + _SEND_CHUNK]
+    
+    def release(self) -> None:
+        """归还缓冲区"""
+        if self._buffer is not None:
+            self._pool.release(self._buffer)
+            self._buffer = None
+
+
+class PayloadBufferPool:
+    """可复用的请求体缓冲池
+    
+    并发请求各自借出一块缓冲区；缓冲区只增不减，稳态下每个周期不再分配。
+    """
+    
+    def __init__(self, max_idle: int = 4):
+        """初始化缓冲池
+        
+        Args:
+            max_idle: 最多保留的空闲缓冲区数量
+        """
+        self.max_idle = max_idle
+        self._idle: List[bytearray] = []
+        self._lock = threading.Lock()
+        self.buffer_allocations = 0
+    
+    def acquire(self, size: int) -> bytearray:
+        """借出容量不小于 size 的缓冲区"""
+        with self._lock:
+            for i, buffer in enumerate(self._idle):
+                if len(buffer) >= size:
+                    return self._idle.pop(i)
+            if self._idle:
+                # 没有足够大的空闲缓冲区：丢弃最小的一块，按需重新分配
+                self._idle.sort(key=len)
+                self._idle.pop(0)
+        self.buffer_allocations += 1
+        # 多留 25% 余量，让后续稍大的帧也能复用
+        return bytearray(size + size // 4)
+    
+    def release(self, buffer: bytearray) -> None:
+        """归还缓冲区"""
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(buffer)
+    
+    def build_vision_body(
+        self,
+        model: str,
+        images: Sequence[Any],
+        mime_types: Sequence[str],
+        prompt: str,
+        params: Dict[str, Any]
+    ) -> VisionPayload:
+        """构造 chat/completions 视觉请求体
+        
+        Args:
+            model: 模型名称
+            images: 编码后的图像（bytes、memoryview 等支持 buffer 协议的对象）
+            mime_types: 与 images 一一对应的 MIME 类型
+            prompt: 文本提示词
+            params: 其他请求参数（temperature、max_tokens 等），须可 JSON 序列化
+        
+        Returns:
+            VisionPayload: 写入缓冲区的请求体
+        """
+        views = [memoryview(image).cast("B") for image in images]
+        
+        # 先拼出除图像数据外的固定片段，再计算总长度一次性申请缓冲区
+        head = f'{{"model":{json.dumps(model)},"messages":[{{"role":"user","content":['.encode("utf-8")
+        parts = []
+        for i, mime in enumerate(mime_types):
+            prefix = ('{"type":"image_url","image_url":{"url":"data:' + mime + ';base64,').encode("utf-8")
+            if i > 0:
+                prefix = b"," + prefix
+            parts.append(prefix)
+        image_suffix = b'"}}'
+        text_part = (
+            ("," if views else "")
+            + json.dumps({"type": "text", "text": prompt}, ensure_ascii=False)
+            + "]}]"
+        ).encode("utf-8")
+        extra = json.dumps(params, ensure_ascii=False)[1:-1]
+        tail = (("," + extra) if extra else "").encode("utf-8") + b"}"
+        
+        size = (
+            len(head) + len(text_part) + len(tail)
+            + sum(len(p) + len(image_suffix) + base64_length(len(v)) for p, v in zip(parts, views))
+        )
+        buffer = self.acquire(size)
+        out = memoryview(buffer)
+        
+        out[:len(head)] = head
+        pos = len(head)
+        for prefix, view in zip(parts, views):
+            out[pos:pos + len(prefix)] = prefix
+            pos += len(prefix)
+            # 分块编码写入缓冲区，临时对象不超过一个块的大小
+            for start in range(0, len(view), _B64_CHUNK):
+                encoded = binascii.b2a_base64(view[start:start + _B64_CHUNK], newline=False)
+                out[pos:pos + len(encoded)] = encoded
+                pos += len(encoded)
+            out[pos:pos + len(image_suffix)] = image_suffix
+            pos += len(image_suffix)
+        for piece in (text_part, tail):
+            out[pos:pos + len(piece)] = piece
+            pos += len(piece)
+        
+        return VisionPayload(self, buffer, pos)
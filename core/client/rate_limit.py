@@ -0,0 +1,333 @@
+# core/client/rate_limit.py
+"""按模型的限流与并发控制
+
+每个模型一个调度器，组合三道闸门：
+- 每秒请求数令牌桶
+- 每分钟 token 数令牌桶（按估算值预扣，完成后按实际用量校正）
+- 并发上限
+
+排队按优先级（紧急 > 常规）先到先得；收到 429 时遵守 Retry-After 暂停放行，
+并乘性降低请求速率，之后每次成功再逐步恢复（AIMD）。
+"""
+
+import asyncio
+import email.utils
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional
+
+import config
+
+EMERGENCY = "emergency"
+ROUTINE = "routine"
+PRIORITIES = {EMERGENCY: 0, ROUTINE: 1}
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """解析响应头中的重试等待时间（秒）
+    
+    支持 retry-after-ms、retry-after 秒数和 HTTP 日期三种形式，无法解析时返回 None。
+    """
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    """令牌桶"""
+    
+    def __init__(self, rate: float, capacity: float):
+        """初始化令牌桶
+        
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发量），初始为满
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+    
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def delay(self, amount: float, now: Optional[float] = None) -> float:
+        """距离可以取出 amount 个令牌还需等待的时间（秒），超过容量的请求按容量计"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else (0.0 if missing <= 0 else float("inf"))
+    
+    def consume(self, amount: float) -> None:
+        """取出令牌（调用前应确认 delay 为 0）"""
+        self.tokens -= min(amount, self.capacity)
+    
+    def adjust(self, amount: float) -> None:
+        """按实际用量校正：正数多扣（允许欠账），负数退还"""
+        self.tokens = min(self.capacity, self.tokens - amount)
+    
+    def set_rate(self, rate: float, capacity: float) -> None:
+        """调整速率和容量"""
+        self._refill(time.monotonic())
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = min(self.tokens, capacity)
+
+
+@dataclass(order=True)
+class _Waiter:
+    """排队中的请求"""
+    priority: int
+    seq: int
+    event: asyncio.Event = field(compare=False, default_factory=asyncio.Event)
+
+
+class ModelGovernor:
+    """单个模型的限流调度器"""
+    
+    def __init__(
+        self,
+        model: str,
+        rps: float = 10.0,
+        tpm: float = 1_000_000,
+        concurrency: int = 8,
+        min_rps: float = 0.5,
+        decrease: float = 0.5,
+        increase: float = 0.1,
+        max_backoff: float = 60.0
+    ):
+        """初始化调度器
+        
+        Args:
+            model: 模型名称
+            rps: 每秒请求数上限
+            tpm: 每分钟 token 数上限
+            concurrency: 最大并发请求数
+            min_rps: 429 降速后的最低请求速率
+            decrease: 每次 429 后请求速率的乘数
+            increase: 每次成功后请求速率的恢复量（次/秒）
+            max_backoff: 没有 Retry-After 时的最长暂停时间（秒）
+        """
+        self.model = model
+        self.rps = rps
+        self.tpm = tpm
+        self.concurrency = concurrency
+        self.min_rps = min(min_rps, rps)
+        self.decrease = decrease
+        self.increase = increase
+        self.max_backoff = max_backoff
+        
+        self.current_rps = rps
+        self.requests = TokenBucket(rps, max(1.0, rps))
+        self.tokens = TokenBucket(tpm / 60.0, tpm)
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._blocked_until = 0.0
+        self._consecutive_limited = 0
+        
+        # 统计计数
+        self.admitted = 0
+        self.completed = 0
+        self.rate_limited = 0
+        self.limited_ratio = 0.0  # 429 比例的指数滑动平均
+        self.queue_time: Dict[str, float] = {name: 0.0 for name in PRIORITIES}
+        self.queue_count: Dict[str, int] = {name: 0 for name in PRIORITIES}
+        self.max_queue_delay = 0.0
+        self.api_time = 0.0
+    
+    @property
+    def in_flight(self) -> int:
+        """正在执行的请求数"""
+        return self._active
+    
+    @property
+    def waiting(self) -> int:
+        """排队中的请求数"""
+        return len(self._waiters)
+    
+    async def acquire(self, tokens: float = 0.0, priority: str = ROUTINE) -> float:
+        """排队等待放行
+        
+        Args:
+            tokens: 本次请求预计消耗的 token 数
+            priority: 优先级（emergency / routine）
+        
+        Returns:
+            float: 排队等待时间（秒）
+        """
+        start = time.perf_counter()
+        waiter = _Waiter(PRIORITIES.get(priority, PRIORITIES[ROUTINE]), next(self._seq))
+        heapq.heappush(self._waiters, waiter)
+        # 新请求可能插到队首（紧急请求），唤醒队首重新判断
+        self._wake_head()
+        try:
+            while True:
+                delay = None
+                if self._waiters[0] is waiter:
+                    delay = self._admission_delay(tokens)
+                    if delay == 0.0:
+                        heapq.heappop(self._waiters)
+                        break
+                waiter.event.clear()
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            self._wake_head()
+            raise
+        
+        self._active += 1
+        self.admitted += 1
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        self._wake_head()
+        
+        queue_delay = time.perf_counter() - start
+        name = priority if priority in PRIORITIES else ROUTINE
+        self.queue_time[name] += queue_delay
+        self.queue_count[name] += 1
+        self.max_queue_delay = max(self.max_queue_delay, queue_delay)
+        return queue_delay
+    
+    def _admission_delay(self, tokens: float) -> Optional[float]:
+        """队首请求还需等待的时间；并发已满时返回 None（等待 release 唤醒）"""
+        if self._active >= self.concurrency:
+            return None
+        now = time.monotonic()
+        return max(
+            self._blocked_until - now,
+            self.requests.delay(1, now),
+            self.tokens.delay(tokens, now),
+            0.0
+        )
+    
+    def _wake_head(self) -> None:
+        if self._waiters:
+            self._waiters[0].event.set()
+    
+    def release(
+        self,
+        tokens: float = 0.0,
+        actual_tokens: Optional[float] = None,
+        latency: Optional[float] = None,
+        rate_limited: bool = False,
+        retry_after: Optional[float] = None
+    ) -> None:
+        """请求结束，归还并发名额
+        
+        Args:
+            tokens: acquire 时预扣的 token 数
+            actual_tokens: 实际消耗的 token 数，已知时用于校正 TPM 令牌桶
+            latency: API 调用耗时（秒），None 表示请求失败
+            rate_limited: 是否收到 429
+            retry_after: 服务端要求的等待时间（秒）
+        """
+        self._active -= 1
+        self.completed += 1
+        if actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - tokens)
+        if latency is not None:
+            self.api_time += latency
+        self.limited_ratio += ((1.0 if rate_limited else 0.0) - self.limited_ratio) * 0.1
+        if rate_limited:
+            self._on_rate_limited(retry_after)
+        elif latency is not None:
+            self._consecutive_limited = 0
+            if self.current_rps < self.rps:
+                self._set_rps(min(self.rps, self.current_rps + self.increase))
+        self._wake_head()
+    
+    def _on_rate_limited(self, retry_after: Optional[float]) -> None:
+        """收到 429：暂停放行并乘性降速"""
+        self.rate_limited += 1
+        self._consecutive_limited += 1
+        if retry_after is None:
+            retry_after = min(self.max_backoff, 0.5 * 2 ** (self._consecutive_limited - 1))
+        self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+        self._set_rps(max(self.min_rps, self.current_rps * self.decrease))
+        print(
+            f"[RateLimit] {self.model} rate limited, pausing {retry_after:.2f}s, "
+            f"rps -> {self.current_rps:.2f}"
+        )
+    
+    def _set_rps(self, rps: float) -> None:
+        self.current_rps = rps
+        self.requests.set_rate(rps, max(1.0, rps))
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        queued = sum(self.queue_count.values())
+        return {
+            "rps": self.current_rps,
+            "rps_limit": self.rps,
+            "tpm_limit": self.tpm,
+            "concurrency": self.concurrency,
+            "in_flight": self._active,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "rate_limited_ratio": self.limited_ratio,
+            "avg_queue_delay_ms": sum(self.queue_time.values()) / queued * 1000 if queued else 0.0,
+            "queue_delay_ms": {
+                name: self.queue_time[name] / count * 1000 if count else 0.0
+                for name, count in self.queue_count.items()
+            },
+            "max_queue_delay_ms": self.max_queue_delay * 1000,
+            "avg_api_latency_ms": self.api_time / self.completed * 1000 if self.completed else 0.0,
+        }
+
+
+class RateLimiter:
+    """按模型分配调度器"""
+    
+    def __init__(self, limits: Optional[Dict[str, Dict[str, Any]]] = None, default: Optional[Dict[str, Any]] = None):
+        """初始化
+        
+        Args:
+            limits: {模型名称: ModelGovernor 参数}
+            default: 未单独配置的模型使用的参数
+        """
+        self.limits = limits or {}
+        self.default = default or {}
+        self.governors: Dict[str, ModelGovernor] = {}
+    
+    @classmethod
+    def from_config(cls) -> "RateLimiter":
+        """按 config 中的限额创建"""
+        return cls(config.OPENAI_RATE_LIMITS, config.OPENAI_RATE_LIMIT_DEFAULT)
+    
+    def governor(self, model: str) -> ModelGovernor:
+        """获取模型的调度器，不存在时创建"""
+        governor = self.governors.get(model)
+        if governor is None:
+            governor = self.governors[model] = ModelGovernor(model, **self.limits.get(model, self.default))
+        return governor
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取各模型的统计信息"""
+        return {model: governor.stats() for model, governor in self.governors.items()}
@@ -0,0 +1,213 @@
+# core/client/registry.py
+"""进程级共享客户端注册表
+
+按 (base_url, api_key) 为所有 Action 提供同一个 httpx 连接池和 AsyncOpenAI 实例：
+- 统一配置连接池上限、keep-alive 和可选的 HTTP/2
+- 引用计数，最后一个使用者释放时真正关闭连接
+- 启动时预热连接，首个巡检周期不必再做 TCP/TLS 握手
+- 同一端点共享单飞合并器，不同 Action 同时发起的相同请求只发送一次
+- 同一端点共享按模型的限流器，所有 Action 的请求合计受同一组限额约束
+- 同一端点共享熔断器，任一 Action 发现端点不可用时其他 Action 立即感知
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+import config
+from core.client.circuit_breaker import CircuitBreaker
+from core.client.rate_limit import RateLimiter
+from core.client.single_flight import SingleFlight
+
+try:
+    import h2  # noqa: F401  HTTP/2 支持依赖 h2 包
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@dataclass
+class SharedClient:
+    """注册表中的一条共享连接"""
+    key: Tuple[str, str]
+    http_client: httpx.AsyncClient
+    openai: AsyncOpenAI
+    refs: int = 0
+    created_at: float = 0.0
+    warmed_up: bool = False
+    single_flight: SingleFlight = field(default_factory=SingleFlight)  # 同一端点所有客户端共享的请求合并器
+    rate_limiter: RateLimiter = field(default_factory=RateLimiter.from_config)  # 同一端点所有客户端共享的按模型限流器
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker.from_config)  # 同一端点所有客户端共享的熔断器
+
+
+def close_later(coro: Any) -> None:
+    """在同步上下文中执行异步关闭：有运行中的事件循环时挂到循环上，否则就地运行"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        try:
+            asyncio.run(coro)
+        except Exception as e:
+            print(f"[ClientRegistry] Error while closing client: {e}")
+        return
+    loop.create_task(coro)
+
+
+class ClientRegistry:
+    """共享客户端注册表"""
+    
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        http2: bool = False,
+        timeout: float = 30.0,
+        max_retries: int = 3
+    ):
+        """初始化注册表
+        
+        Args:
+            max_connections: 每个端点的最大连接数
+            max_keepalive_connections: 保持空闲的最大连接数
+            keepalive_expiry: 空闲连接保持时间（秒）
+            http2: 是否启用 HTTP/2（需要安装 h2，未安装时退回 HTTP/1.1）
+            timeout: 默认请求超时时间（秒）
+            max_retries: SDK 默认失败重试次数
+        """
+        if http2 and not HTTP2_AVAILABLE:
+            print("[ClientRegistry] Warning: h2 is not installed, falling back to HTTP/1.1")
+            http2 = False
+        
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._clients: Dict[Tuple[str, str], SharedClient] = {}
+        
+        # 统计计数
+        self.created = 0
+        self.closed = 0
+    
+    def acquire(self, api_key: str, base_url: str) -> SharedClient:
+        """借用共享客户端，不存在时创建
+        
+        Args:
+            api_key: API 密钥
+            base_url: API 基础 URL
+        
+        Returns:
+            SharedClient: 共享连接（引用计数加一）
+        """
+        key = (base_url.rstrip("/"), api_key)
+        shared = self._clients.get(key)
+        if shared is None:
+            http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2
+            )
+            shared = SharedClient(
+                key=key,
+                http_client=http_client,
+                openai=AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    timeout=self.timeout,
+                    max_retries=self.max_retries,
+                    http_client=http_client
+                ),
+                created_at=time.time(),
+                breaker=CircuitBreaker.from_config(key[0])
+            )
+            self._clients[key] = shared
+            self.created += 1
+            print(f"[ClientRegistry] Created shared client for {key[0]}")
+        shared.refs += 1
+        return shared
+    
+    def release(self, shared: SharedClient) -> None:
+        """归还共享客户端，引用计数归零时关闭连接池"""
+        shared.refs -= 1
+        if shared.refs > 0 or self._clients.get(shared.key) is not shared:
+            return
+        del self._clients[shared.key]
+        self.closed += 1
+        print(f"[ClientRegistry] Closing shared client for {shared.key[0]}")
+        close_later(shared.http_client.aclose())
+    
+    async def warm_up(self, path: str = "/models") -> Dict[str, Optional[float]]:
+        """预热所有共享客户端的连接
+        
+        向每个端点发一个轻量请求（默认 GET /models，不关心返回状态），提前完成
+        DNS、TCP 和 TLS 握手，连接随后留在 keep-alive 池中供首个真实请求复用。
+        
+        Returns:
+            Dict: {base_url: 耗时（秒）}，连接失败时为 None
+        """
+        async def warm(shared: SharedClient) -> Optional[float]:
+            start = time.perf_counter()
+            try:
+                await shared.http_client.get(
+                    shared.key[0] + path,
+                    headers={"Authorization": f"Bearer {shared.key[1]}"}
+                )
+            except httpx.HTTPError as e:
+                print(f"[ClientRegistry] Warm-up failed for {shared.key[0]}: {e}")
+                return None
+            shared.warmed_up = True
+            return time.perf_counter() - start
+        
+        clients = list(self._clients.values())
+        timings = await asyncio.gather(*(warm(shared) for shared in clients))
+        result = {shared.key[0]: elapsed for shared, elapsed in zip(clients, timings)}
+        print(f"[ClientRegistry] Warm-up complete: {result}")
+        return result
+    
+    async def aclose(self) -> None:
+        """关闭所有共享客户端"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for shared in clients:
+            await shared.http_client.aclose()
+        self.closed += len(clients)
+    
+    def __len__(self) -> int:
+        return len(self._clients)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "clients": len(self._clients),
+            "refs": {key[0]: shared.refs for key, shared in self._clients.items()},
+            "created": self.created,
+            "closed": self.closed,
+            "http2": self.http2,
+            "coalescing": {key[0]: shared.single_flight.stats() for key, shared in self._clients.items()},
+            "rate_limits": {key[0]: shared.rate_limiter.stats() for key, shared in self._clients.items()},
+            "circuits": {key[0]: shared.breaker.stats() for key, shared in self._clients.items()},
+        }
+
+
+_default_registry: Optional[ClientRegistry] = None
+
+
+def get_client_registry() -> ClientRegistry:
+    """获取按 config 配置的进程级默认注册表"""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ClientRegistry(
+            max_connections=config.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=config.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.OPENAI_KEEPALIVE_EXPIRY,
+            http2=config.OPENAI_HTTP2
+        )
+    return _default_registry
@@ -0,0 +1,82 @@
+# core/client/single_flight.py
+"""单飞请求合并
+
+相同键的请求在前一个尚未完成时不再重复发起，而是共享同一个进行中的任务。
+任务独立于任何一个调用方运行：某个调用方被取消不会影响其他等待者，
+所有等待者都取消后才取消任务本身（如对冲请求落败时不再继续占用连接）。
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """进行中请求的合并器"""
+    
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        
+        # 统计计数
+        self.calls = 0
+        self.coalesced = 0
+    
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """执行或加入一个请求
+        
+        Args:
+            key: 请求键，相同键的进行中请求会被合并
+            factory: 创建请求协程的函数，仅在没有进行中的同键请求时调用
+        
+        Returns:
+            Tuple: (结果, 是否复用了其他调用方发起的请求)
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._done(key, t))
+        
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if self._inflight.get(key) is task and self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+    
+    def _done(self, key: Hashable, task: asyncio.Future) -> None:
+        """任务结束后移出进行中列表"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiters[key]
+        if not task.cancelled():
+            # 所有等待者都已取消时也要取走异常，避免未处理异常的警告
+            task.exception()
+    
+    @property
+    def in_flight(self) -> int:
+        """当前进行中的请求数"""
+        return len(self._inflight)
+    
+    @property
+    def coalescing_rate(self) -> float:
+        """被合并的调用占比"""
+        return self.coalesced / self.calls if self.calls else 0.0
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight,
+            "coalescing_rate": self.coalescing_rate,
+        }
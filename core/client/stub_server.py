@@ -0,0 +1,505 @@
+# core/client/stub_server.py
+"""本地 OpenAI 兼容替身服务
+
+基于 asyncio 的最小 HTTP/1.1 服务（支持 keep-alive 和分块传输），实现：
+- POST /chat/completions：文本对话和图像理解，支持 stream=true 的 SSE 输出，
+  图像请求按脚本依次返回预设的分析结果
+- POST /audio/speech：返回与文本长度成比例的 WAV 音频，可分块流式输出
+- POST /audio/transcriptions：按脚本依次返回识别文本
+- GET /models
+
+每个接口可配置延迟分布，并可按比例或按计划注入 429 / 5xx 错误，用于在离线环境下
+对完整的客户端链路做负载和延迟测试。命令行启动：
+    
+    python -m core.client.stub_server --port 8000 --latency lognormal:1.5,0.5 --rate-limit 0.05
+
+然后把 OPENAI_BASE_URL 指向 http://127.0.0.1:8000/v1。
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+import wave
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+CHAT = "/chat/completions"
+SPEECH = "/audio/speech"
+TRANSCRIPTIONS = "/audio/transcriptions"
+MODELS = "/models"
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+            500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+DEFAULT_VISION_ANSWER = {
+    "emergency": False,
+    "objects_detected": ["chair", "table"],
+    "confidence": 0.9,
+    "description": "正常办公环境，未发现异常情况",
+}
+
+
+@dataclass
+class LatencyModel:
+    """延迟分布
+    
+    kind 与参数 (a, b) 的含义：
+    - fixed: 固定 a 秒
+    - uniform: a 到 b 秒均匀分布
+    - normal: 均值 a、标准差 b
+    - lognormal: 中位数 a、对数标准差 b（长尾）
+    - exponential: 均值 a
+    另可按 tail_probability 的概率改为 tail_latency 秒，模拟偶发的超长尾。
+    """
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+    tail_probability: float = 0.0
+    tail_latency: float = 0.0
+    
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """解析 "kind:a,b@概率=长尾延迟" 形式的描述，如 "lognormal:1.5,0.5@0.02=15"（长尾部分可省略）"""
+        tail_probability, tail_latency = 0.0, 0.0
+        if "@" in spec:
+            spec, tail = spec.split("@", 1)
+            p, latency = tail.split("=", 1)
+            tail_probability, tail_latency = float(p), float(latency)
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v] if params else []
+        values += [0.0] * (2 - len(values))
+        return cls(kind, values[0], values[1], tail_probability, tail_latency)
+    
+    def sample(self, rng: random.Random) -> float:
+        """采样一次延迟（秒）"""
+        if self.tail_probability and rng.random() < self.tail_probability:
+            return self.tail_latency
+        if self.kind == "uniform":
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == "normal":
+            value = rng.gauss(self.a, self.b)
+        elif self.kind == "lognormal":
+            value = self.a * rng.lognormvariate(0.0, self.b) if self.a > 0 else 0.0
+        elif self.kind == "exponential":
+            value = rng.expovariate(1.0 / self.a) if self.a > 0 else 0.0
+        else:
+            value = self.a
+        return max(0.0, value)
+
+
+@dataclass
+class Fault:
+    """计划注入的一次错误响应"""
+    status: int
+    retry_after: Optional[float] = None
+    route: Optional[str] = None  # 为 None 时匹配任意接口
+
+
+class StubServer:
+    """OpenAI 兼容替身服务"""
+    
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Union[LatencyModel, Dict[str, LatencyModel], None] = None,
+        rate_limit_rate: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: Optional[float] = 1.0,
+        vision_script: Optional[List[Union[str, Dict[str, Any], Callable[[Dict[str, Any]], Any]]]] = None,
+        chat_script: Optional[List[str]] = None,
+        transcripts: Optional[List[str]] = None,
+        stream_chunk_chars: int = 8,
+        stream_interval: float = 0.01,
+        audio_seconds_per_char: float = 0.15,
+        synthesis_seconds_per_char: float = 0.0,
+        sample_rate: int = 16000,
+        seed: Optional[int] = None
+    ):
+        """初始化服务
+        
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机端口
+            latency: 首字节延迟分布；可按接口路径分别配置 {路径: LatencyModel}
+            rate_limit_rate: 随机返回 429 的比例
+            error_rate: 随机返回 500 的比例
+            retry_after: 429 响应的 Retry-After（秒），None 表示不带该头
+            vision_script: 图像请求依次返回的结果（字符串原样输出，字典序列化为 JSON，
+                可调用对象以请求体为参数生成结果），用完后循环
+            chat_script: 文本对话依次返回的内容，为 None 时回显最后一条消息
+            transcripts: 语音识别依次返回的文本
+            stream_chunk_chars: 流式输出每个分块的字符数
+            stream_interval: 流式分块之间的间隔（秒）
+            audio_seconds_per_char: 合成音频每个字符的时长（秒）
+            synthesis_seconds_per_char: 合成每个字符所需的时间（秒），模拟与文本长度成比例的合成耗时
+            sample_rate: 合成音频采样率
+            seed: 随机数种子，用于复现延迟和错误序列
+        """
+        self.host = host
+        self.port = port
+        if isinstance(latency, LatencyModel) or latency is None:
+            latency = {None: latency or LatencyModel()}
+        self.latency: Dict[Optional[str], LatencyModel] = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.vision_script = list(vision_script or [DEFAULT_VISION_ANSWER])
+        self.chat_script = list(chat_script) if chat_script else None
+        self.transcripts = list(transcripts or ["你好"])
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_interval = stream_interval
+        self.audio_seconds_per_char = audio_seconds_per_char
+        self.synthesis_seconds_per_char = synthesis_seconds_per_char
+        self.sample_rate = sample_rate
+        self.rng = random.Random(seed)
+        
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._faults: Deque[Fault] = deque()
+        self._cursors: Dict[str, int] = {}
+        self._active = 0
+        self._writers: set = set()
+        
+        # 统计计数
+        self.connections = 0
+        self.requests: Dict[str, int] = {}
+        self.statuses: Dict[int, int] = {}
+        self.max_concurrency = 0
+        self.bodies: List[Tuple[str, Any]] = []  # 最近收到的 (路径, 请求体)，供测试检查
+        self.max_bodies = 100
+    
+    @property
+    def base_url(self) -> str:
+        """客户端使用的 base_url"""
+        return f"http://{self.host}:{self.port}/v1"
+    
+    async def start(self) -> str:
+        """启动服务，返回 base_url"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"[StubServer] Listening on {self.base_url}")
+        return self.base_url
+    
+    async def stop(self) -> None:
+        """停止服务"""
+        if self._server is not None:
+            self._server.close()
+            # 关闭仍保持 keep-alive 的连接，否则 wait_closed 会一直等待客户端断开
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+    
+    async def __aenter__(self) -> "StubServer":
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+    
+    def inject(self, status: int, count: int = 1, retry_after: Optional[float] = None, route: Optional[str] = None) -> None:
+        """计划接下来的请求返回错误（先于随机注入）
+        
+        Args:
+            status: HTTP 状态码（如 429、500）
+            count: 注入次数
+            retry_after: 429 的 Retry-After（秒），None 时使用服务默认值
+            route: 只对该接口生效，None 表示任意接口
+        """
+        for _ in range(count):
+            self._faults.append(Fault(status, retry_after if retry_after is not None else self.retry_after, route))
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "connections": self.connections,
+            "requests": dict(self.requests),
+            "statuses": dict(self.statuses),
+            "max_concurrency": self.max_concurrency,
+        }
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个连接上的所有请求（keep-alive）"""
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await self._read_body(reader, headers)
+                
+                self._active += 1
+                self.max_concurrency = max(self.max_concurrency, self._active)
+                try:
+                    await self._dispatch(method, target.split("?", 1)[0], headers, body, writer)
+                finally:
+                    self._active -= 1
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+    
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).strip().split(b";")[0], 16)
+                if size == 0:
+                    await reader.readuntil(b"\r\n")
+                    return b"".join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+        length = int(headers.get("content-length", 0))
+        return await reader.readexactly(length) if length else b""
+    
+    @staticmethod
+    def _head(status: int, headers: Dict[str, str]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+    
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes,
+        content_type: str = "application/json",
+        extra_headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        headers = {"Content-Type": content_type, "Content-Length": str(len(body)), **(extra_headers or {})}
+        writer.write(self._head(status, headers) + body)
+        await writer.drain()
+    
+    async def _respond_json(self, writer: asyncio.StreamWriter, status: int, payload: Any, **kwargs) -> None:
+        await self._respond(writer, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), **kwargs)
+    
+    async def _respond_chunked(
+        self,
+        writer: asyncio.StreamWriter,
+        content_type: str,
+        chunks: List[bytes],
+        interval: Optional[float] = None
+    ) -> None:
+        """分块传输，每块之间间隔 interval（默认为 stream_interval）"""
+        if interval is None:
+            interval = self.stream_interval
+        self.statuses[200] = self.statuses.get(200, 0) + 1
+        writer.write(self._head(200, {"Content-Type": content_type, "Transfer-Encoding": "chunked"}))
+        for i, chunk in enumerate(chunks):
+            if i and interval:
+                await asyncio.sleep(interval)
+            writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+    
+    async def _dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes, writer: asyncio.StreamWriter) -> None:
+        route = path[3:] if path.startswith("/v1/") else path
+        self.requests[route] = self.requests.get(route, 0) + 1
+        
+        if method == "GET" and route == MODELS:
+            await self._respond_json(writer, 200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+            return
+        if method != "POST" or route not in (CHAT, SPEECH, TRANSCRIPTIONS):
+            await self._respond_json(writer, 404, {"error": {"message": f"no route {method} {path}"}})
+            return
+        
+        payload = body
+        if headers.get("content-type", "").startswith("application/json"):
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                await self._respond_json(writer, 400, {"error": {"message": "invalid JSON body"}})
+                return
+        self.bodies.append((route, payload))
+        del self.bodies[:-self.max_bodies]
+        
+        latency = self.latency.get(route) or self.latency.get(None) or LatencyModel()
+        await asyncio.sleep(latency.sample(self.rng))
+        
+        fault = self._next_fault(route)
+        if fault is not None:
+            extra = {}
+            if fault.status == 429 and fault.retry_after is not None:
+                extra["Retry-After"] = f"{fault.retry_after:g}"
+            await self._respond_json(
+                writer, fault.status,
+                {"error": {"message": "injected fault", "type": "rate_limit" if fault.status == 429 else "server_error"}},
+                extra_headers=extra
+            )
+            return
+        
+        if route == CHAT:
+            await self._chat(payload, writer)
+        elif route == SPEECH:
+            await self._speech(payload, writer)
+        else:
+            await self._respond_json(writer, 200, {"text": self._next("transcripts", self.transcripts)})
+    
+    def _next_fault(self, route: str) -> Optional[Fault]:
+        """取出计划中的错误，没有时按比例随机注入"""
+        for fault in self._faults:
+            if fault.route is None or fault.route == route:
+                self._faults.remove(fault)
+                return fault
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            return Fault(429, self.retry_after)
+        if roll < self.rate_limit_rate + self.error_rate:
+            return Fault(500)
+        return None
+    
+    def _next(self, name: str, script: List[Any]) -> Any:
+        """按脚本顺序取下一项，用完后循环"""
+        index = self._cursors.get(name, 0)
+        self._cursors[name] = index + 1
+        return script[index % len(script)]
+    
+    @staticmethod
+    def _is_vision(payload: Dict[str, Any]) -> bool:
+        for message in payload.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+                return True
+        return False
+    
+    def _answer(self, payload: Dict[str, Any]) -> str:
+        """生成对话或图像请求的回答文本"""
+        if self._is_vision(payload):
+            answer = self._next("vision", self.vision_script)
+            if callable(answer):
+                answer = answer(payload)
+            return answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False)
+        if self.chat_script:
+            return self._next("chat", self.chat_script)
+        messages = payload.get("messages") or [{}]
+        return f"收到：{messages[-1].get('content', '')}"
+    
+    async def _chat(self, payload: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        text = self._answer(payload)
+        model = payload.get("model", "stub")
+        created = int(time.time())
+        prompt_tokens = len(json.dumps(payload.get("messages", []), ensure_ascii=False)) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(text),
+                 "total_tokens": prompt_tokens + len(text)}
+        
+        if not payload.get("stream"):
+            await self._respond_json(writer, 200, {
+                "id": f"chatcmpl-stub-{self.requests[CHAT]}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+        
+        def event(delta: Dict[str, Any], finish: Optional[str] = None, **extra) -> bytes:
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra}
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+        
+        step = max(1, self.stream_chunk_chars)
+        events = [event({"role": "assistant", "content": ""})]
+        events += [event({"content": text[i:i + step]}) for i in range(0, len(text), step)]
+        events.append(event({}, "stop", usage=usage))
+        events.append(b"data: [DONE]\n\n")
+        await self._respond_chunked(writer, "text/event-stream", events)
+    
+    def _synthesize(self, text: str) -> bytes:
+        """生成与文本长度成比例的静音 WAV"""
+        frames = int(len(text) * self.audio_seconds_per_char * self.sample_rate)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(b"\x00\x00" * frames)
+        return buffer.getvalue()
+    
+    async def _speech(self, payload: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        text = str(payload.get("input", ""))
+        audio = self._synthesize(text)
+        synthesis = len(text) * self.synthesis_seconds_per_char
+        if not payload.get("stream") and payload.get("stream_format") != "audio":
+            await asyncio.sleep(synthesis)
+            await self._respond(writer, 200, audio, content_type="audio/wav")
+            return
+        # 流式输出：约 0.1 秒音频一块，合成耗时平均分摊到每一块
+        step = max(1, self.sample_rate // 5)
+        chunks = [audio[i:i + step] for i in range(0, len(audio), step)]
+        interval = synthesis / len(chunks) if synthesis else None
+        if interval:
+            await asyncio.sleep(interval)
+        await self._respond_chunked(writer, "audio/wav", chunks, interval)
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    latency: Dict[Optional[str], LatencyModel] = {None: LatencyModel.parse(args.latency)}
+    if args.chat_latency:
+        latency[CHAT] = LatencyModel.parse(args.chat_latency)
+    if args.speech_latency:
+        latency[SPEECH] = LatencyModel.parse(args.speech_latency)
+    vision_script = None
+    if args.vision_script:
+        with open(args.vision_script, encoding="utf-8") as f:
+            vision_script = json.load(f)
+    server = StubServer(
+        host=args.host,
+        port=args.port,
+        latency=latency,
+        rate_limit_rate=args.rate_limit,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        vision_script=vision_script,
+        synthesis_seconds_per_char=args.synthesis_per_char,
+        seed=args.seed
+    )
+    async with server:
+        try:
+            while True:
+                await asyncio.sleep(60)
+                print(f"[StubServer] {server.stats()}")
+        except asyncio.CancelledError:
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", default="fixed:0", help='默认延迟分布，如 "lognormal:1.5,0.5@0.02=15"')
+    parser.add_argument("--chat-latency", help="/chat/completions（对话和图像理解）的延迟分布")
+    parser.add_argument("--speech-latency", help="/audio/speech 的延迟分布")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="随机返回 429 的比例")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 500 的比例")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After（秒）")
+    parser.add_argument("--synthesis-per-char", type=float, default=0.0, help="语音合成每个字符的耗时（秒）")
+    parser.add_argument("--vision-script", help="JSON 文件，内容为依次返回的图像分析结果列表")
+    parser.add_argument("--seed", type=int)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# core/client/tts_cache.py
+"""语音合成音频缓存
+
+以 (模型, 音色, 语速, 文本) 的摘要为键，把合成好的音频保存在磁盘目录中：
+- 每条音频一个文件，文件名即内容摘要，写入时先写临时文件再原子替换
+- 按总字节数 LRU 淘汰，命中时更新文件修改时间，重启后按修改时间恢复 LRU 顺序
+- 常用语句（如紧急播报开头）可在启动时预先合成，播报时直接读盘
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+SUFFIX = ".audio"
+
+
+class TTSAudioCache:
+    """内容寻址的磁盘音频缓存"""
+    
+    def __init__(self, directory: str, max_bytes: int = 50 * 1024 * 1024):
+        """初始化缓存，加载目录中已有的音频
+        
+        Args:
+            directory: 缓存目录，不存在时创建
+            max_bytes: 音频文件总字节数上限
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # 键 -> 文件字节数，按 LRU 顺序
+        self._total_bytes = 0
+        
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+    
+    @staticmethod
+    def key(model: str, voice: str, speed: float, text: str) -> str:
+        """计算缓存键（内容摘要）"""
+        payload = json.dumps([model, voice, float(speed), text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+    
+    def _scan(self) -> None:
+        """按修改时间从旧到新加载已有文件，超出容量时淘汰最旧的"""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name[:-len(SUFFIX)], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+        if files:
+            print(f"[TTSCache] Loaded {len(self._entries)} entries ({self._total_bytes} bytes) from {self.directory}")
+    
+    def get(self, model: str, voice: str, speed: float, text: str) -> Optional[bytes]:
+        """读取缓存的音频，未命中返回 None"""
+        key = self.key(model, voice, speed, text)
+        if key in self._entries:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+                os.utime(path)
+            except OSError:
+                # 文件被外部删除
+                self._forget(key)
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return audio
+        self.misses += 1
+        return None
+    
+    def __contains__(self, item: tuple) -> bool:
+        """(模型, 音色, 语速, 文本) 是否已缓存（不计入命中统计）"""
+        return self.key(*item) in self._entries
+    
+    def put(self, model: str, voice: str, speed: float, text: str, audio: bytes) -> None:
+        """写入音频，空音频或超过总容量的音频不缓存"""
+        size = len(audio)
+        if size == 0 or size > self.max_bytes:
+            return
+        key = self.key(model, voice, speed, text)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[TTSCache] Failed to write {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        
+        if key in self._entries:
+            self._total_bytes -= self._entries.pop(key)
+        self._entries[key] = size
+        self._total_bytes += size
+        self.writes += 1
+        self._evict()
+    
+    def _evict(self) -> None:
+        """超出容量时按 LRU 顺序删除文件"""
+        while self._total_bytes > self.max_bytes:
+            key = next(iter(self._entries))
+            self._forget(key)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self.evictions += 1
+    
+    def _forget(self, key: str) -> None:
+        self._total_bytes -= self._entries.pop(key)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @property
+    def total_bytes(self) -> int:
+        """当前缓存占用的字节数"""
+        return self._total_bytes
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取命中/未命中/淘汰统计"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
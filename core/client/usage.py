@@ -0,0 +1,286 @@
+# core/client/usage.py
+"""Token 用量与费用统计、预算控制
+
+- 每次请求成功后按模型单价记录 token 用量和费用
+- 按模型、Action、Agent 分别汇总，并维护最近 1 小时和 24 小时两个滚动窗口
+- 各窗口可设置费用预算，预算使用率接近上限时按配置逐级降级
+  （拉长巡逻间隔、降低上传分辨率、换用更便宜的视觉模型）
+
+请求归属的 Action 和 Agent 由 usage_scope 上下文设置（RobotAgent.execute_action 中设置），
+通过 contextvars 随 asyncio 任务传递，合并后的请求计在发起者名下。
+"""
+
+import contextlib
+import contextvars
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import config
+
+UNATTRIBUTED = "-"  # 不在任何 usage_scope 中发起的请求
+
+WINDOWS = {"hour": 3600.0, "day": 86400.0}
+
+_scope: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "usage_scope", default=(UNATTRIBUTED, UNATTRIBUTED)
+)
+
+
+@contextlib.contextmanager
+def usage_scope(action: Optional[str] = None, agent: Optional[str] = None) -> Iterator[None]:
+    """在此上下文中发起的请求计入指定的 Action / Agent（未指定的沿用外层设置）"""
+    outer_action, outer_agent = _scope.get()
+    token = _scope.set((action or outer_action, agent or outer_agent))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Tuple[str, str]:
+    """当前上下文的 (Action, Agent)"""
+    return _scope.get()
+
+
+@dataclass
+class UsageRecord:
+    """一次请求的用量"""
+    timestamp: float
+    model: str
+    action: str
+    agent: str
+    prompt_tokens: int
+    completion_tokens: int
+    cost: float
+    estimated: bool = False  # 响应中没有 usage，按估算值记录
+
+
+def _empty() -> Dict[str, float]:
+    return {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "estimated": 0}
+
+
+def _accumulate(totals: Dict[str, float], record: UsageRecord, sign: int = 1) -> None:
+    totals["requests"] += sign
+    totals["prompt_tokens"] += sign * record.prompt_tokens
+    totals["completion_tokens"] += sign * record.completion_tokens
+    totals["cost"] += sign * record.cost
+    totals["estimated"] += sign * int(record.estimated)
+
+
+class UsageWindow:
+    """滚动时间窗口内的用量合计（增量维护，过期记录出窗时扣减）"""
+    
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.totals = _empty()
+        self.by_model: Dict[str, Dict[str, float]] = {}
+        self.by_action: Dict[str, Dict[str, float]] = {}
+        self.by_agent: Dict[str, Dict[str, float]] = {}
+        self._records: Deque[UsageRecord] = deque()
+    
+    def add(self, record: UsageRecord) -> None:
+        self._records.append(record)
+        self._apply(record, 1)
+    
+    def expire(self, now: float) -> None:
+        """移出窗口外的记录"""
+        cutoff = now - self.seconds
+        while self._records and self._records[0].timestamp <= cutoff:
+            self._apply(self._records.popleft(), -1)
+    
+    def _apply(self, record: UsageRecord, sign: int) -> None:
+        _accumulate(self.totals, record, sign)
+        for groups, name in (
+            (self.by_model, record.model), (self.by_action, record.action), (self.by_agent, record.agent)
+        ):
+            totals = groups.setdefault(name, _empty())
+            _accumulate(totals, record, sign)
+            if totals["requests"] == 0:
+                del groups[name]
+    
+    @property
+    def cost(self) -> float:
+        # 浮点累减可能留下极小的负数
+        return max(0.0, self.totals["cost"])
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            **self.totals,
+            "cost": self.cost,
+            "by_model": {name: dict(totals) for name, totals in self.by_model.items()},
+            "by_action": {name: dict(totals) for name, totals in self.by_action.items()},
+            "by_agent": {name: dict(totals) for name, totals in self.by_agent.items()},
+        }
+
+
+@dataclass
+class Degradation:
+    """当前的降级策略"""
+    level: int = 0  # 0 为未降级，数值越大越严格
+    window: Optional[str] = None  # 触发降级的窗口
+    utilization: float = 0.0  # 触发窗口的预算使用率
+    patrol_interval_scale: float = 1.0  # 巡逻间隔倍率
+    image_scale: float = 1.0  # 上传图像长边倍率
+    vision_model: Optional[str] = None  # 替换使用的视觉模型，为 None 时不替换
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "level": self.level,
+            "window": self.window,
+            "utilization": self.utilization,
+            "patrol_interval_scale": self.patrol_interval_scale,
+            "image_scale": self.image_scale,
+            "vision_model": self.vision_model,
+        }
+
+
+class UsageTracker:
+    """用量与费用统计"""
+    
+    def __init__(
+        self,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        budgets: Optional[Dict[str, float]] = None,
+        degradation: Optional[List[Dict[str, Any]]] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        """初始化
+        
+        Args:
+            prices: {模型名称: (输入单价, 输出单价)}，单位为元/千 token；未配置的模型费用按 0 计
+            budgets: {窗口名称: 费用预算}，窗口名称为 hour / day
+            degradation: 降级策略列表，每项包含 at（预算使用率阈值）及
+                patrol_interval_scale / image_scale / vision_model 中的若干项；
+                取各窗口使用率中的最大值，按满足阈值的最高一项执行
+            clock: 时间函数（测试时可替换）
+        """
+        unknown = set(budgets or {}) - set(WINDOWS)
+        if unknown:
+            raise ValueError(f"Unknown usage windows: {sorted(unknown)}")
+        self.prices = prices or {}
+        self.budgets = budgets or {}
+        self.levels = sorted(degradation or [], key=lambda level: level["at"])
+        # 降级后的模型没有单价时，最接近预算上限时的花费会按 0 计，预算窗口低估后又会放宽降级
+        for model in sorted({level["vision_model"] for level in self.levels if level.get("vision_model")}):
+            if self.prices and model not in self.prices:
+                print(f"[Usage] Warning: degradation model {model} has no price, its usage will be counted as free")
+        self.clock = clock
+        
+        self.totals = _empty()
+        self.by_model: Dict[str, Dict[str, float]] = {}
+        self.windows = {name: UsageWindow(seconds) for name, seconds in WINDOWS.items()}
+        
+        self._level = 0
+        self.degradations = 0  # 进入（更严格的）降级的次数
+        self.recoveries = 0  # 降级解除或放宽的次数
+    
+    @classmethod
+    def from_config(cls) -> "UsageTracker":
+        """按 config 中的单价、预算和降级策略创建"""
+        return cls(config.OPENAI_PRICES, config.USAGE_BUDGETS, config.USAGE_DEGRADATION)
+    
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """按单价计算费用（元）"""
+        input_price, output_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+    
+    def record(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        estimated: bool = False,
+        action: Optional[str] = None,
+        agent: Optional[str] = None
+    ) -> UsageRecord:
+        """记录一次请求的用量，action / agent 未指定时取当前 usage_scope"""
+        scope_action, scope_agent = _scope.get()
+        record = UsageRecord(
+            timestamp=self.clock(),
+            model=model,
+            action=action or scope_action,
+            agent=agent or scope_agent,
+            prompt_tokens=int(prompt_tokens),
+            completion_tokens=int(completion_tokens),
+            cost=self.cost(model, prompt_tokens, completion_tokens),
+            estimated=estimated
+        )
+        _accumulate(self.totals, record)
+        _accumulate(self.by_model.setdefault(model, _empty()), record)
+        for window in self.windows.values():
+            window.expire(record.timestamp)
+            window.add(record)
+        return record
+    
+    def utilization(self) -> Dict[str, float]:
+        """各窗口的预算使用率（已花费 / 预算），只包含设置了预算的窗口"""
+        now = self.clock()
+        result = {}
+        for name, budget in self.budgets.items():
+            if budget is None:
+                continue
+            window = self.windows[name]
+            window.expire(now)
+            result[name] = window.cost / budget if budget > 0 else float("inf")
+        return result
+    
+    def degradation(self) -> Degradation:
+        """按当前预算使用率确定降级策略"""
+        utilization = self.utilization()
+        window, ratio = max(utilization.items(), key=lambda item: item[1], default=(None, 0.0))
+        
+        level = 0
+        for i, policy in enumerate(self.levels, 1):
+            if ratio >= policy["at"]:
+                level = i
+        if level != self._level:
+            if level > self._level:
+                self.degradations += 1
+                print(f"[Usage] {window} budget at {ratio:.0%}, degrading to level {level}")
+            else:
+                self.recoveries += 1
+                print(f"[Usage] Budget usage down to {ratio:.0%}, degradation level {level}")
+            self._level = level
+        
+        if level == 0:
+            return Degradation(window=window, utilization=ratio)
+        policy = self.levels[level - 1]
+        return Degradation(
+            level=level,
+            window=window,
+            utilization=ratio,
+            patrol_interval_scale=policy.get("patrol_interval_scale", 1.0),
+            image_scale=policy.get("image_scale", 1.0),
+            vision_model=policy.get("vision_model")
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息：累计用量、各窗口用量、预算使用率和当前降级策略"""
+        degradation = self.degradation()
+        now = self.clock()
+        for window in self.windows.values():
+            window.expire(now)
+        return {
+            **self.totals,
+            "by_model": {name: dict(totals) for name, totals in self.by_model.items()},
+            "windows": {name: window.stats() for name, window in self.windows.items()},
+            "budgets": dict(self.budgets),
+            "utilization": self.utilization(),
+            "degradation": degradation.to_dict(),
+            "degradations": self.degradations,
+            "recoveries": self.recoveries,
+        }
+
+
+_default_tracker: Optional[UsageTracker] = None
+
+
+def get_usage_tracker() -> UsageTracker:
+    """获取按 config 配置的进程级默认用量统计"""
+    global _default_tracker
+    if _default_tracker is None:
+        _default_tracker = UsageTracker.from_config()
+    return _default_tracker
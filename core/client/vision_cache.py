@@ -0,0 +1,261 @@
+# core/client/vision_cache.py
+"""视觉结果缓存
+
+以图像感知哈希 + 模型 + 提示词为键缓存视觉模型的分析结果：
+- 汉明距离容差：视觉上相近的画面可以命中同一条结果
+- 每条记录独立 TTL；未发现紧急情况的结果只短时间有效（小火苗、少量烟雾几乎不改变感知哈希，
+  不能让旧的"正常"结论长时间掩盖新出现的险情）
+- LRU 淘汰，按结果序列化后的字节数限制总容量
+- 可持久化到磁盘，重启后不必冷启动
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional, Tuple
+
+from core.vision.phash import average_hash, difference_hash, hamming_distance
+
+
+@dataclass
+class CacheEntry:
+    """缓存记录"""
+    image_hash: int
+    model: str
+    prompt_digest: str
+    result: Dict[str, Any]
+    size: int
+    created_at: float
+    expires_at: float
+
+
+class VisionResultCache:
+    """感知哈希键控的视觉结果缓存"""
+    
+    HASH_FUNCTIONS = {
+        "dhash": difference_hash,
+        "ahash": average_hash,
+    }
+    
+    def __init__(
+        self,
+        max_bytes: int = 1024 * 1024,
+        ttl: float = 600.0,
+        negative_ttl: float = 30.0,
+        max_distance: int = 4,
+        hash_method: str = "dhash",
+        persist_path: Optional[str] = None
+    ):
+        """初始化缓存
+        
+        Args:
+            max_bytes: 缓存结果的总字节数上限
+            ttl: 默认记录有效期（秒）
+            negative_ttl: emergency 不为真的结果的有效期（秒），不超过 ttl
+            max_distance: 命中允许的最大汉明距离
+            hash_method: 感知哈希算法（dhash / ahash）
+            persist_path: 持久化文件路径，为 None 时不落盘
+        """
+        if hash_method not in self.HASH_FUNCTIONS:
+            raise ValueError(f"Unknown hash method: {hash_method}")
+        
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = min(negative_ttl, ttl)
+        self.max_distance = max_distance
+        self.hash_method = hash_method
+        self.persist_path = persist_path
+        
+        self._entries: "OrderedDict[Tuple[str, str, int], CacheEntry]" = OrderedDict()
+        self._total_bytes = 0
+        
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        
+        if persist_path and os.path.exists(persist_path):
+            self.load(persist_path)
+    
+    def hash_image(self, image: Any) -> Optional[int]:
+        """计算图像的感知哈希"""
+        return self.HASH_FUNCTIONS[self.hash_method](image)
+    
+    @staticmethod
+    def _digest(prompt: str) -> str:
+        """计算提示词摘要"""
+        return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+    
+    def get(self, model: str, prompt: str, image_hash: int) -> Optional[Dict[str, Any]]:
+        """查找相近画面的缓存结果
+        
+        Args:
+            model: 模型名称
+            prompt: 提示词
+            image_hash: 图像感知哈希
+        
+        Returns:
+            Dict: 缓存结果的拷贝，未命中返回 None
+        """
+        now = time.time()
+        digest = self._digest(prompt)
+        best_key = None
+        best_distance = self.max_distance + 1
+        
+        for key, entry in list(self._entries.items()):
+            if entry.expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                continue
+            if entry.model != model or entry.prompt_digest != digest:
+                continue
+            distance = hamming_distance(entry.image_hash, image_hash)
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+                if distance == 0:
+                    break
+        
+        if best_key is None:
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(best_key)
+        self.hits += 1
+        return dict(self._entries[best_key].result)
+    
+    def put(
+        self,
+        model: str,
+        prompt: str,
+        image_hash: int,
+        result: Dict[str, Any],
+        ttl: Optional[float] = None
+    ) -> None:
+        """写入缓存结果
+        
+        Args:
+            model: 模型名称
+            prompt: 提示词
+            image_hash: 图像感知哈希
+            result: 视觉分析结果
+            ttl: 本条记录的有效期（秒），默认按结果选择：emergency 为真时使用 ttl，否则使用 negative_ttl
+        """
+        size = len(json.dumps(result, ensure_ascii=False).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        
+        key = (model, self._digest(prompt), image_hash)
+        if key in self._entries:
+            self._remove(key)
+        
+        now = time.time()
+        self._entries[key] = CacheEntry(
+            image_hash=image_hash,
+            model=model,
+            prompt_digest=key[1],
+            result=dict(result),
+            size=size,
+            created_at=now,
+            expires_at=now + (self._default_ttl(result) if ttl is None else ttl)
+        )
+        self._total_bytes += size
+        
+        # 超出容量时按 LRU 顺序淘汰
+        while self._total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+    
+    def _default_ttl(self, result: Dict[str, Any]) -> float:
+        """按结果选择有效期：只有确认存在紧急情况的结果才长时间缓存"""
+        return self.ttl if result.get("emergency") is True else self.negative_ttl
+    
+    def _remove(self, key: Tuple[str, str, int]) -> None:
+        """删除一条记录"""
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+        self._total_bytes = 0
+    
+    def save(self, path: Optional[str] = None) -> None:
+        """将未过期的记录写入磁盘（先写临时文件再原子替换）
+        
+        Args:
+            path: 文件路径，默认使用 persist_path
+        """
+        path = path or self.persist_path
+        if not path:
+            return
+        
+        now = time.time()
+        entries = [asdict(e) for e in self._entries.values() if e.expires_at > now]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"hash_method": self.hash_method, "entries": entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        print(f"[VisionCache] Saved {len(entries)} entries to {path}")
+    
+    def load(self, path: Optional[str] = None) -> None:
+        """从磁盘加载记录，跳过已过期或哈希算法不一致的数据
+        
+        Args:
+            path: 文件路径，默认使用 persist_path
+        """
+        path = path or self.persist_path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[VisionCache] Failed to load cache from {path}: {e}")
+            return
+        
+        if data.get("hash_method") != self.hash_method:
+            print(f"[VisionCache] Hash method mismatch, ignoring {path}")
+            return
+        
+        now = time.time()
+        loaded = 0
+        # 文件中按 LRU 顺序保存，依次插入即可恢复顺序
+        for item in data.get("entries", []):
+            entry = CacheEntry(**item)
+            if entry.expires_at <= now:
+                continue
+            key = (entry.model, entry.prompt_digest, entry.image_hash)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+            loaded += 1
+        
+        while self._total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        print(f"[VisionCache] Loaded {loaded} entries from {path}")
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @property
+    def total_bytes(self) -> int:
+        """当前缓存占用的字节数"""
+        return self._total_bytes
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取命中/未命中/淘汰统计"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
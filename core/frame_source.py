@@ -0,0 +1,466 @@
+# core/frame_source.py
+"""可回放的图像来源
+
+提供与 cv2.VideoCapture 相同接口（isOpened / read / release）的帧来源，
+CameraSensor 可以像使用真实摄像头一样使用它们，便于在没有摄像头的机器上
+以全速回放录制的巡检画面，用于基准测试和回归测试：
+- ImageDirectorySource: 按文件名顺序读取目录中的图片
+- VideoFileSource: 用 OpenCV 解码视频文件
+- RawFrameSource: 内存映射的原始帧转储（连续存放的 H×W×C uint8 帧）
+- SyntheticSource: 合成画面生成器，可按帧号注入事件
+
+设备描述字符串（如 config.VIDEO_DEV）可以使用以下格式，由 open_frame_source 解析：
+    dir:<目录>
+    video:<视频文件>
+    raw:<转储文件>?shape=<H>x<W>x<C>
+    synthetic:<W>x<H>
+参数以 ? 开始、以 & 分隔，如 dir:/data/patrol?fps=10、raw:frames.bin?shape=480x640x3&fps=30&loop=0：
+- fps=<帧率>：按指定帧率节流，默认不节流（全速回放）
+- loop=0：读到末尾后不再循环
+"""
+
+import os
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+class FrameSource(ABC):
+    """帧来源基类
+    
+    子类实现 _next_frame，返回下一帧（可以是内部缓冲区的视图）或 None 表示到达末尾。
+    """
+    
+    def __init__(self, loop: bool = True, fps: Optional[float] = None):
+        """初始化帧来源
+        
+        Args:
+            loop: 到达末尾后是否从头循环
+            fps: 回放帧率，为 None 时不节流（全速回放）
+        """
+        self.loop = loop
+        self.fps = fps
+        self.frames_read = 0
+        self.exhausted = False
+        self._opened = True
+        self._next_due = 0.0
+    
+    def isOpened(self) -> bool:
+        """来源是否可用"""
+        return self._opened
+    
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """读取下一帧，接口与 cv2.VideoCapture.read 一致
+        
+        Args:
+            image: 可复用的输出数组，尺寸匹配时直接写入
+        
+        Returns:
+            Tuple: (是否成功, 帧)
+        """
+        if not self._opened or self.exhausted:
+            return False, None
+        
+        self._throttle()
+        frame = self._next_frame()
+        if frame is None and self.loop and self.frames_read > 0:
+            self.rewind()
+            frame = self._next_frame()
+        if frame is None:
+            self.exhausted = True
+            return False, None
+        
+        self.frames_read += 1
+        if frame is image:
+            return True, image
+        if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+            np.copyto(image, frame)
+            return True, image
+        return True, np.array(frame, copy=True)
+    
+    def release(self) -> None:
+        """释放来源"""
+        self._opened = False
+    
+    @abstractmethod
+    def rewind(self) -> None:
+        """回到第一帧"""
+    
+    @abstractmethod
+    def _next_frame(self) -> Optional[np.ndarray]:
+        """返回下一帧，到达末尾返回 None"""
+    
+    def _throttle(self) -> None:
+        """按 fps 节流，模拟真实摄像头的出帧节奏"""
+        if not self.fps:
+            return
+        now = time.monotonic()
+        if self._next_due > now:
+            time.sleep(self._next_due - now)
+            now = self._next_due
+        self._next_due = now + 1.0 / self.fps
+
+
+class ImageDirectorySource(FrameSource):
+    """按文件名顺序读取目录中的图片"""
+    
+    def __init__(self, path: str, loop: bool = True, fps: Optional[float] = None):
+        """初始化目录来源
+        
+        Args:
+            path: 图片目录
+            loop: 到达末尾后是否从头循环
+            fps: 回放帧率，为 None 时全速回放
+        """
+        super().__init__(loop=loop, fps=fps)
+        self.path = path
+        self.files = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        ) if os.path.isdir(path) else []
+        self._opened = bool(self.files)
+        self._index = 0
+    
+    def rewind(self) -> None:
+        self._index = 0
+    
+    def _next_frame(self) -> Optional[np.ndarray]:
+        while self._index < len(self.files):
+            file_path = self.files[self._index]
+            self._index += 1
+            frame = cv2.imread(file_path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                return frame
+            print(f"[FrameSource] Cannot decode image {file_path}, skipping")
+        return None
+
+
+class VideoFileSource(FrameSource):
+    """用 OpenCV 解码视频文件"""
+    
+    def __init__(self, path: str, loop: bool = True, fps: Optional[float] = None):
+        """初始化视频来源
+        
+        Args:
+            path: 视频文件路径
+            loop: 到达末尾后是否从头循环
+            fps: 回放帧率，为 None 时全速解码
+        """
+        super().__init__(loop=loop, fps=fps)
+        self.path = path
+        self._capture = cv2.VideoCapture(path)
+        self._opened = self._capture.isOpened()
+        self._frame: Optional[np.ndarray] = None
+    
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        # 直接解码到调用方的数组中，省去一次整帧拷贝
+        self._frame = image
+        return super().read(image)
+    
+    def rewind(self) -> None:
+        self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    
+    def _next_frame(self) -> Optional[np.ndarray]:
+        if self._frame is not None:
+            ret, frame = self._capture.read(self._frame)
+        else:
+            ret, frame = self._capture.read()
+        return frame if ret else None
+    
+    def release(self) -> None:
+        super().release()
+        self._capture.release()
+
+
+class RawFrameSource(FrameSource):
+    """内存映射的原始帧转储
+    
+    文件由若干连续存放、形状相同的帧组成（如 write_raw_frames 的输出），
+    按需从页缓存读取，回放长录像时不会把整个文件载入内存。
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        shape: Sequence[int],
+        dtype: Any = np.uint8,
+        loop: bool = True,
+        fps: Optional[float] = None
+    ):
+        """初始化转储来源
+        
+        Args:
+            path: 转储文件路径
+            shape: 单帧形状，如 (480, 640, 3)
+            dtype: 像素类型
+            loop: 到达末尾后是否从头循环
+            fps: 回放帧率，为 None 时全速回放
+        """
+        super().__init__(loop=loop, fps=fps)
+        self.path = path
+        self.shape = tuple(shape)
+        frame_bytes = int(np.prod(self.shape)) * np.dtype(dtype).itemsize
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.frame_count = size // frame_bytes
+        self._frames = np.memmap(
+            path, dtype=dtype, mode="r", shape=(self.frame_count,) + self.shape
+        ) if self.frame_count else None
+        self._opened = self.frame_count > 0
+        self._index = 0
+    
+    def rewind(self) -> None:
+        self._index = 0
+    
+    def _next_frame(self) -> Optional[np.ndarray]:
+        if self._index >= self.frame_count:
+            return None
+        frame = self._frames[self._index]
+        self._index += 1
+        return frame
+    
+    def release(self) -> None:
+        super().release()
+        self._frames = None
+
+
+def write_raw_frames(path: str, frames: Sequence[np.ndarray]) -> int:
+    """把一组帧写成 RawFrameSource 可读取的转储文件
+    
+    Args:
+        path: 输出文件路径
+        frames: 形状相同的帧
+    
+    Returns:
+        int: 写入的帧数
+    """
+    count = 0
+    with open(path, "wb") as f:
+        for frame in frames:
+            f.write(np.ascontiguousarray(frame).data)
+            count += 1
+    return count
+
+
+@dataclass
+class SyntheticEvent:
+    """合成画面中注入的事件
+    
+    kind 取值：
+    - person: 从左向右移动的深色人形矩形
+    - fire: 闪烁的橙红色区域
+    - smoke: 逐渐扩大的灰色区域
+    - lights_off: 整体亮度降低
+    """
+    kind: str
+    start: int
+    end: int
+    region: Tuple[float, float, float, float] = (0.4, 0.3, 0.2, 0.5)  # (x, y, w, h)，0-1 比例
+    params: Dict[str, Any] = field(default_factory=dict)
+    
+    def active(self, index: int) -> bool:
+        return self.start <= index < self.end
+
+
+class SyntheticSource(FrameSource):
+    """合成画面生成器
+    
+    以带固定纹理的背景加轻微噪声模拟静止场景，并在指定帧号区间绘制事件，
+    同样的 seed 和事件列表总是生成同样的帧序列。
+    """
+    
+    KINDS = ("person", "fire", "smoke", "lights_off")
+    
+    def __init__(
+        self,
+        width: int = 640,
+        height: int = 480,
+        events: Optional[List[SyntheticEvent]] = None,
+        length: Optional[int] = None,
+        noise: int = 2,
+        seed: int = 0,
+        loop: bool = False,
+        fps: Optional[float] = None
+    ):
+        """初始化合成来源
+        
+        Args:
+            width: 画面宽度
+            height: 画面高度
+            events: 注入的事件列表
+            length: 总帧数，为 None 时无限生成
+            noise: 每帧像素噪声幅度，模拟传感器噪声
+            seed: 随机种子
+            loop: 到达 length 后是否从头循环
+            fps: 生成帧率，为 None 时不节流
+        """
+        super().__init__(loop=loop, fps=fps)
+        self.width = width
+        self.height = height
+        self.events: List[SyntheticEvent] = list(events or [])
+        self.length = length
+        self.noise = noise
+        self.seed = seed
+        self._index = 0
+        
+        # 背景：水平渐变加随机色块，保证画面有纹理可供变化检测
+        rng = np.random.default_rng(seed)
+        gradient = np.linspace(60, 160, width, dtype=np.float32)
+        background = np.repeat(gradient[None, :, None], 3, axis=2).repeat(height, axis=0)
+        for _ in range(6):
+            x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+            w, h = int(rng.integers(width // 10, width // 4)), int(rng.integers(height // 10, height // 4))
+            background[y:y + h, x:x + w] = rng.integers(40, 200, 3)
+        self._background = background.astype(np.uint8)
+        self._frame = np.empty_like(self._background)
+        self._noise = np.empty(self._background.shape, dtype=np.int16)
+    
+    @property
+    def index(self) -> int:
+        """下一帧的帧号"""
+        return self._index
+    
+    def inject(self, kind: str, duration: int, start: Optional[int] = None, **kwargs) -> SyntheticEvent:
+        """在运行时注入事件
+        
+        Args:
+            kind: 事件类型
+            duration: 持续帧数
+            start: 起始帧号，默认从下一帧开始
+            **kwargs: SyntheticEvent 的其他字段（region、params）
+        
+        Returns:
+            SyntheticEvent: 注入的事件
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown synthetic event: {kind}")
+        start = self._index if start is None else start
+        event = SyntheticEvent(kind=kind, start=start, end=start + duration, **kwargs)
+        self.events.append(event)
+        return event
+    
+    def active_events(self, index: Optional[int] = None) -> List[SyntheticEvent]:
+        """指定帧号（默认上一帧）上生效的事件"""
+        index = self._index - 1 if index is None else index
+        return [e for e in self.events if e.active(index)]
+    
+    def rewind(self) -> None:
+        self._index = 0
+    
+    def _next_frame(self) -> Optional[np.ndarray]:
+        if self.length is not None and self._index >= self.length:
+            return None
+        index = self._index
+        self._index += 1
+        
+        frame = self._frame
+        if self.noise:
+            # 每帧噪声由 (seed, 帧号) 决定，回放结果可复现
+            rng = np.random.default_rng((self.seed, index))
+            self._noise[:] = rng.integers(-self.noise, self.noise + 1, self._noise.shape, dtype=np.int16)
+            self._noise += self._background
+            np.clip(self._noise, 0, 255, out=self._noise)
+            frame[:] = self._noise
+        else:
+            frame[:] = self._background
+        
+        for event in self.events:
+            if event.active(index):
+                self._draw_event(frame, event, index)
+        return frame
+    
+    def _region(self, event: SyntheticEvent) -> Tuple[int, int, int, int]:
+        """将事件区域换算为像素坐标 (x0, y0, x1, y1)"""
+        x, y, w, h = event.region
+        x0, y0 = int(x * self.width), int(y * self.height)
+        return x0, y0, min(self.width, x0 + max(1, int(w * self.width))), min(self.height, y0 + max(1, int(h * self.height)))
+    
+    def _draw_event(self, frame: np.ndarray, event: SyntheticEvent, index: int) -> None:
+        """在帧上绘制事件"""
+        progress = (index - event.start) / max(1, event.end - event.start)
+        x0, y0, x1, y1 = self._region(event)
+        
+        if event.kind == "person":
+            # 人形矩形随时间横向移动
+            width = x1 - x0
+            offset = int((self.width - width) * progress) - x0
+            x0, x1 = x0 + offset, x1 + offset
+            frame[y0:y1, max(0, x0):x1] = event.params.get("color", (40, 40, 50))
+            head = max(2, width // 3)
+            cx = (x0 + x1) // 2
+            cv2.circle(frame, (cx, max(head, y0 - head)), head, event.params.get("color", (40, 40, 50)), -1)
+        elif event.kind == "fire":
+            # 橙红色区域，亮度逐帧闪烁
+            flicker = 0.75 + 0.25 * np.sin(index * 1.7)
+            color = np.array([20, 90 + 60 * flicker, 200 + 55 * flicker]).clip(0, 255)
+            frame[y0:y1, x0:x1] = color.astype(np.uint8)
+        elif event.kind == "smoke":
+            # 灰色区域逐渐扩大并与背景混合
+            grow = 0.3 + 0.7 * progress
+            y0 = int(y1 - (y1 - y0) * grow)
+            region = frame[y0:y1, x0:x1]
+            region[:] = (region.astype(np.uint16) + 170) // 2
+        elif event.kind == "lights_off":
+            factor = event.params.get("factor", 0.3)
+            frame[:] = (frame * factor).astype(np.uint8)
+
+
+def _parse_options(spec: str) -> Tuple[str, Dict[str, str]]:
+    """拆分 '<路径>?a=1&b=2' 为路径和参数字典"""
+    target, _, query = spec.partition("?")
+    options = {}
+    for item in filter(None, query.split("&")):
+        key, _, value = item.partition("=")
+        options[key] = value
+    return target, options
+
+
+def _parse_size(text: str) -> Tuple[int, ...]:
+    """解析 '640x480' 形式的尺寸"""
+    return tuple(int(v) for v in text.lower().split("x"))
+
+
+def open_frame_source(device: Any) -> Optional[FrameSource]:
+    """根据设备描述创建帧来源
+    
+    Args:
+        device: FrameSource 实例、设备描述字符串（格式见模块说明）或摄像头设备
+    
+    Returns:
+        FrameSource: 对应的帧来源；device 是真实摄像头（设备号或设备路径）时返回 None
+    """
+    if isinstance(device, FrameSource):
+        return device
+    if not isinstance(device, str):
+        return None
+    
+    scheme, sep, rest = device.partition(":")
+    if not sep:
+        # 直接给出目录时按图片目录处理
+        return ImageDirectorySource(device) if os.path.isdir(device) else None
+    
+    target, options = _parse_options(rest)
+    loop = options.get("loop", "1") not in ("0", "false")
+    fps = float(options["fps"]) if options.get("fps") else None
+    
+    if scheme == "dir":
+        return ImageDirectorySource(target, loop=loop, fps=fps)
+    if scheme == "video":
+        return VideoFileSource(target, loop=loop, fps=fps)
+    if scheme == "raw":
+        if "shape" not in options:
+            raise ValueError(f"Raw frame source requires shape: {device}")
+        return RawFrameSource(target, _parse_size(options["shape"]), loop=loop, fps=fps)
+    if scheme == "synthetic":
+        width, height = _parse_size(target) if target else (640, 480)
+        length = int(options["length"]) if options.get("length") else None
+        return SyntheticSource(
+            width, height, length=length, seed=int(options.get("seed", 0)),
+            loop=loop and length is not None, fps=fps
+        )
+    return None
@@ -0,0 +1,20 @@
+# core/mcp/__init__.py
+"""MCP 模块
+
+导出 MCP 会话和传输（本地替身服务见 core/mcp/stub_server.py）
+"""
+
+from core.mcp.transport import McpTransport, StdioTransport, SseTransport, McpTransportClosed
+from core.mcp.session import McpSession, McpError, McpConnectionError, McpToolError, tool_result_text
+
+__all__ = [
+    "McpTransport",
+    "StdioTransport",
+    "SseTransport",
+    "McpTransportClosed",
+    "McpSession",
+    "McpError",
+    "McpConnectionError",
+    "McpToolError",
+    "tool_result_text",
+]
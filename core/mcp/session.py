@@ -0,0 +1,275 @@
+# core/mcp/session.py
+"""MCP 会话
+
+在一个传输连接上完成 initialize 握手后：
+- 多个并发请求共用同一连接，按 JSON-RPC id 把响应分发给各自的调用方
+- 缓存工具列表，收到 notifications/tools/list_changed 或超过有效期时重新获取，
+  同时进行的多次获取合并为一次
+- 连接断开时所有等待中的请求立即以 McpConnectionError 失败
+"""
+
+import asyncio
+import itertools
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from core.mcp.transport import McpTransport, McpTransportClosed
+
+PROTOCOL_VERSION = "2024-11-05"
+CLIENT_INFO = {"name": "robot-agent", "version": "0.1.0"}
+
+
+class McpError(Exception):
+    """服务端返回的 JSON-RPC 错误"""
+    
+    def __init__(self, message: str, code: Optional[int] = None, data: Any = None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+class McpConnectionError(McpError):
+    """服务未连接或请求进行中连接断开"""
+
+
+class McpToolError(McpError):
+    """工具执行失败（结果中 isError 为 true）"""
+    
+    def __init__(self, message: str, result: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.result = result
+
+
+def tool_result_text(result: Dict[str, Any]) -> str:
+    """拼接工具结果中的文本内容"""
+    return "\n".join(part.get("text", "") for part in result.get("content", []) if part.get("type") == "text")
+
+
+class McpSession:
+    """一个 MCP 服务的会话"""
+    
+    def __init__(
+        self,
+        transport: McpTransport,
+        name: str = "",
+        tools_ttl: Optional[float] = 300.0,
+        request_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """初始化
+        
+        Args:
+            transport: 传输连接
+            name: 服务名称（用于日志）
+            tools_ttl: 工具列表缓存有效期（秒），None 表示只在服务通知变更时刷新
+            request_timeout: 默认请求超时时间（秒）
+            clock: 单调时钟（测试时可替换）
+        """
+        self.transport = transport
+        self.name = name
+        self.tools_ttl = tools_ttl
+        self.request_timeout = request_timeout
+        self.clock = clock
+        
+        self.server_info: Dict[str, Any] = {}
+        self.capabilities: Dict[str, Any] = {}
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader: Optional[asyncio.Task] = None
+        self._closed = asyncio.Event()
+        self._tools: Optional[List[Dict[str, Any]]] = None
+        self._tools_fetched_at = 0.0
+        self._tools_task: Optional[asyncio.Task] = None
+        
+        # 统计计数
+        self.requests = 0
+        self.max_in_flight = 0
+        self.tools_fetches = 0
+        self.tools_invalidations = 0
+    
+    async def start(self) -> None:
+        """连接并完成握手"""
+        await self.transport.connect()
+        self._reader = asyncio.create_task(self._read_loop())
+        result = await self.request("initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": CLIENT_INFO,
+        })
+        self.server_info = result.get("serverInfo", {})
+        self.capabilities = result.get("capabilities", {})
+        await self.notify("notifications/initialized")
+    
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+    
+    async def wait_closed(self) -> None:
+        """等待连接断开"""
+        await self._closed.wait()
+    
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        """发送请求并等待响应
+        
+        Raises:
+            McpConnectionError: 连接已断开
+            McpError: 服务端返回错误
+            asyncio.TimeoutError: 超时（同时通知服务端取消该请求）
+        """
+        if self.closed:
+            raise McpConnectionError(f"MCP session {self.name} is closed")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.requests += 1
+        self.max_in_flight = max(self.max_in_flight, len(self._pending))
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        try:
+            try:
+                await self.transport.send(message)
+            except McpTransportClosed as e:
+                raise McpConnectionError(str(e)) from e
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.request_timeout)
+        except asyncio.TimeoutError:
+            if not self.closed:
+                await self._notify_quietly("notifications/cancelled", {"requestId": request_id, "reason": "timeout"})
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled():
+                # 发送失败时读取器可能已让该请求以断开失败，标记为已读取
+                future.exception()
+    
+    async def notify(self, method: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """发送通知（无响应）"""
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        try:
+            await self.transport.send(message)
+        except McpTransportClosed as e:
+            raise McpConnectionError(str(e)) from e
+    
+    async def _notify_quietly(self, method: str, params: Dict[str, Any]) -> None:
+        try:
+            await self.notify(method, params)
+        except Exception:
+            pass
+    
+    async def _read_loop(self) -> None:
+        """读取并分发服务端消息，连接断开时让所有等待中的请求失败"""
+        try:
+            while True:
+                message = await self.transport.receive()
+                if message is None:
+                    break
+                if "method" not in message:
+                    self._resolve(message)
+                elif "id" in message:
+                    await self._answer(message)
+                else:
+                    self._on_notification(message)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[MCP] Session {self.name} reader failed: {e}")
+        finally:
+            self._closed.set()
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(McpConnectionError(f"MCP session {self.name} disconnected"))
+    
+    def _resolve(self, message: Dict[str, Any]) -> None:
+        future = self._pending.get(message.get("id"))
+        if future is None or future.done():
+            return
+        error = message.get("error")
+        if error is not None:
+            future.set_exception(McpError(error.get("message", "MCP error"), error.get("code"), error.get("data")))
+        else:
+            future.set_result(message.get("result"))
+    
+    async def _answer(self, message: Dict[str, Any]) -> None:
+        """回应服务端发起的请求（只支持 ping）"""
+        if message["method"] == "ping":
+            reply = {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+        else:
+            reply = {"jsonrpc": "2.0", "id": message["id"],
+                     "error": {"code": -32601, "message": f"Method not found: {message['method']}"}}
+        try:
+            await self.transport.send(reply)
+        except McpTransportClosed:
+            pass
+    
+    def _on_notification(self, message: Dict[str, Any]) -> None:
+        if message["method"] == "notifications/tools/list_changed":
+            print(f"[MCP] Tool list of {self.name} changed")
+            self.invalidate_tools()
+    
+    def invalidate_tools(self) -> None:
+        """使工具列表缓存失效"""
+        self._tools = None
+        self.tools_invalidations += 1
+    
+    async def list_tools(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """获取工具列表（优先使用缓存）
+        
+        Args:
+            refresh: 是否忽略缓存重新获取
+        """
+        expired = self.tools_ttl is not None and self.clock() - self._tools_fetched_at >= self.tools_ttl
+        if self._tools is not None and not refresh and not expired:
+            return self._tools
+        if self._tools_task is None or self._tools_task.done():
+            self._tools_task = asyncio.create_task(self._fetch_tools())
+        return await asyncio.shield(self._tools_task)
+    
+    async def _fetch_tools(self) -> List[Dict[str, Any]]:
+        fetched_at = self.clock()
+        tools: List[Dict[str, Any]] = []
+        cursor = None
+        while True:
+            result = await self.request("tools/list", {"cursor": cursor} if cursor else None)
+            tools.extend(result.get("tools", []))
+            cursor = result.get("nextCursor")
+            if not cursor:
+                break
+        self.tools_fetches += 1
+        self._tools = tools
+        self._tools_fetched_at = fetched_at
+        return tools
+    
+    @property
+    def cached_tools(self) -> Optional[List[Dict[str, Any]]]:
+        """缓存中的工具列表（未获取或已失效时为 None）"""
+        return self._tools
+    
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """调用工具
+        
+        Returns:
+            Dict: 工具结果（content 等）
+        
+        Raises:
+            McpToolError: 工具执行失败
+        """
+        result = await self.request("tools/call", {"name": name, "arguments": arguments or {}}, timeout)
+        if result.get("isError"):
+            raise McpToolError(tool_result_text(result) or f"Tool {name} failed", result)
+        return result
+    
+    async def close(self) -> None:
+        """关闭会话"""
+        await self.transport.close()
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        self._closed.set()
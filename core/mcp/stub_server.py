@@ -0,0 +1,372 @@
+# core/mcp/stub_server.py
+"""本地 MCP 替身服务
+
+实现 MCP 的 initialize / ping / tools/list（支持分页）/ tools/call，内置几个应急相关的工具，
+可配置每次工具调用的延迟；每个请求在独立任务中处理，同一连接上的并发调用互不阻塞。
+支持两种传输：
+- stdio：作为子进程按行收发 JSON（日志写 stderr）
+- SSE：GET /sse 建立事件流，POST /messages?session_id=... 发送消息
+
+测试中可以动态增删工具（向所有连接广播 notifications/tools/list_changed）、
+主动断开连接，或让 stdio 服务在若干次调用后退出，用于验证缓存失效和重连。命令行启动：
+    
+    python -m core.mcp.stub_server --stdio --latency 0.05
+    python -m core.mcp.stub_server --port 8765
+
+然后把 MCP_SERVERS 配置为 {"stub": {"command": [...]}} 或 {"stub": {"url": "http://127.0.0.1:8765/sse"}}。
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+from core.mcp.session import PROTOCOL_VERSION
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+@dataclass
+class StubTool:
+    """替身服务中的一个工具"""
+    name: str
+    description: str
+    handler: Callable[[Dict[str, Any]], Any]  # 参数为调用参数，返回文本；可以是协程函数，抛出异常表示执行失败
+    input_schema: Dict[str, Any] = field(default_factory=lambda: {"type": "object"})
+    
+    def describe(self) -> Dict[str, Any]:
+        return {"name": self.name, "description": self.description, "inputSchema": self.input_schema}
+
+
+class StubMcpServer:
+    """MCP 替身服务"""
+    
+    def __init__(
+        self,
+        name: str = "stub-mcp",
+        latency: float = 0.0,
+        page_size: Optional[int] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        exit_after_calls: Optional[int] = None
+    ):
+        """初始化服务
+        
+        Args:
+            name: 服务名称（serverInfo.name）
+            latency: 每次工具调用的延迟（秒）
+            page_size: tools/list 每页工具数，None 表示不分页
+            host: SSE 监听地址
+            port: SSE 监听端口，0 表示随机端口
+            exit_after_calls: stdio 模式下完成多少次工具调用后退出进程（模拟服务崩溃）
+        """
+        self.name = name
+        self.latency = latency
+        self.page_size = page_size
+        self.host = host
+        self.port = port
+        self.exit_after_calls = exit_after_calls
+        
+        self.tools: Dict[str, StubTool] = {}
+        self._peers: Set[Send] = set()
+        self._sessions: Dict[str, asyncio.Queue] = {}
+        self._session_ids = itertools.count(1)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: set = set()
+        self._active_calls = 0
+        
+        # 统计计数
+        self.requests: Dict[str, int] = {}
+        self.sessions_opened = 0
+        self.max_concurrent_calls = 0
+        self.dispatched: List[Dict[str, Any]] = []  # emergency_call 收到的事件（按幂等键去重）
+        self.duplicates = 0  # 幂等键重复的调用次数
+        self._tickets: Dict[str, int] = {}
+        
+        self.add_tool("emergency_call", "通知应急中心并派单，参数 event 为事件详情，idempotency_key 为幂等键（可选）", self._emergency_call, notify=False)
+        self.add_tool("notify_security", "向安保人员发送消息，参数 message 为消息内容",
+                      lambda args: f"已通知安保：{args.get('message', '')}", notify=False)
+        self.add_tool("echo", "原样返回参数 text", lambda args: str(args.get("text", "")), notify=False)
+    
+    @property
+    def url(self) -> str:
+        """SSE 地址"""
+        return f"http://{self.host}:{self.port}/sse"
+    
+    def add_tool(self, name: str, description: str, handler: Callable[[Dict[str, Any]], Any], notify: bool = True) -> None:
+        """添加（或替换）工具，默认通知所有连接工具列表已变更"""
+        self.tools[name] = StubTool(name, description, handler)
+        if notify:
+            self._broadcast_list_changed()
+    
+    def remove_tool(self, name: str) -> None:
+        """删除工具并通知所有连接"""
+        self.tools.pop(name, None)
+        self._broadcast_list_changed()
+    
+    def _broadcast_list_changed(self) -> None:
+        message = {"jsonrpc": "2.0", "method": "notifications/tools/list_changed"}
+        for send in list(self._peers):
+            asyncio.create_task(send(message))
+    
+    def _emergency_call(self, arguments: Dict[str, Any]) -> str:
+        # 带幂等键的重复调用返回原工单，不重复派单
+        key = arguments.get("idempotency_key")
+        if key is not None and key in self._tickets:
+            self.duplicates += 1
+            return f"应急中心已受理，工单号 {self._tickets[key]}"
+        self.dispatched.append(arguments.get("event", {}))
+        if key is not None:
+            self._tickets[key] = len(self.dispatched)
+        return f"应急中心已受理，工单号 {len(self.dispatched)}"
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "requests": dict(self.requests),
+            "sessions_opened": self.sessions_opened,
+            "max_concurrent_calls": self.max_concurrent_calls,
+            "dispatched": len(self.dispatched),
+            "duplicates": self.duplicates,
+        }
+    
+    async def handle(self, message: Dict[str, Any], send: Send) -> None:
+        """处理一条客户端消息，请求的响应经 send 发回"""
+        method = message.get("method")
+        if method is None:
+            return  # 客户端对服务端请求的响应
+        self.requests[method] = self.requests.get(method, 0) + 1
+        if "id" not in message:
+            return  # 通知（initialized、cancelled）无需响应
+        try:
+            result = await self._dispatch(method, message.get("params") or {})
+            reply = {"jsonrpc": "2.0", "id": message["id"], "result": result}
+        except LookupError as e:
+            reply = {"jsonrpc": "2.0", "id": message["id"], "error": {"code": -32601, "message": str(e)}}
+        await send(reply)
+    
+    async def _dispatch(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if method == "initialize":
+            return {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {"tools": {"listChanged": True}},
+                "serverInfo": {"name": self.name, "version": "0.1.0"},
+            }
+        if method == "ping":
+            return {}
+        if method == "tools/list":
+            tools = [tool.describe() for tool in self.tools.values()]
+            if not self.page_size:
+                return {"tools": tools}
+            start = int(params.get("cursor") or 0)
+            page = {"tools": tools[start:start + self.page_size]}
+            if start + self.page_size < len(tools):
+                page["nextCursor"] = str(start + self.page_size)
+            return page
+        if method == "tools/call":
+            return await self._call(params.get("name"), params.get("arguments") or {})
+        raise LookupError(f"Method not found: {method}")
+    
+    async def _call(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        tool = self.tools.get(name)
+        if tool is None:
+            return {"content": [{"type": "text", "text": f"Unknown tool: {name}"}], "isError": True}
+        self._active_calls += 1
+        self.max_concurrent_calls = max(self.max_concurrent_calls, self._active_calls)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            text = tool.handler(arguments)
+            if asyncio.iscoroutine(text):
+                text = await text
+            return {"content": [{"type": "text", "text": str(text)}], "isError": False}
+        except Exception as e:
+            return {"content": [{"type": "text", "text": f"{type(e).__name__}: {e}"}], "isError": True}
+        finally:
+            self._active_calls -= 1
+    
+    # ---- stdio ----
+    
+    async def serve_stdio(self) -> None:
+        """在 stdin/stdout 上提供服务，直到 stdin 关闭"""
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=16 * 1024 * 1024)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        out = sys.stdout.buffer
+        calls = 0
+        
+        async def send(message: Dict[str, Any]) -> None:
+            nonlocal calls
+            out.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+            out.flush()
+            if "result" in message and "content" in message["result"]:
+                calls += 1
+                if self.exit_after_calls is not None and calls >= self.exit_after_calls:
+                    print(f"[StubMcpServer] Exiting after {calls} tool calls", file=sys.stderr)
+                    os._exit(0)
+        
+        self._peers.add(send)
+        self.sessions_opened += 1
+        tasks = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.create_task(self.handle(json.loads(line), send))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # ---- SSE ----
+    
+    async def start(self) -> str:
+        """启动 SSE 服务，返回 SSE 地址"""
+        self._server = await asyncio.start_server(self._handle_http, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"[StubMcpServer] Listening on {self.url}")
+        return self.url
+    
+    async def stop(self) -> None:
+        """停止 SSE 服务"""
+        if self._server is not None:
+            self._server.close()
+            self.drop_connections()
+            await self._server.wait_closed()
+            self._server = None
+    
+    async def __aenter__(self) -> "StubMcpServer":
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+    
+    def drop_connections(self) -> None:
+        """断开所有 SSE 连接（模拟服务重启或网络中断）"""
+        for queue in self._sessions.values():
+            queue.put_nowait(None)
+        for writer in list(self._writers):
+            writer.close()
+    
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+                url = urlsplit(target)
+                if method == "GET" and url.path == "/sse":
+                    await self._stream_events(writer)
+                    break
+                if method == "POST" and url.path == "/messages":
+                    session_id = parse_qs(url.query).get("session_id", [""])[0]
+                    await self._post_message(session_id, body, writer)
+                else:
+                    self._respond(writer, 404, b"not found")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+    
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: int, body: bytes) -> None:
+        reason = {202: "Accepted", 400: "Bad Request", 404: "Not Found"}.get(status, "OK")
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\n\r\n"
+                     .encode("latin-1") + body)
+    
+    async def _stream_events(self, writer: asyncio.StreamWriter) -> None:
+        """SSE 事件流：先发送 endpoint 事件，之后转发该会话的所有消息"""
+        session_id = str(next(self._session_ids))
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def send(message: Dict[str, Any]) -> None:
+            queue.put_nowait(message)
+        
+        def chunk(event: str, data: str) -> bytes:
+            payload = f"event: {event}\ndata: {data}\n\n".encode("utf-8")
+            return f"{len(payload):x}\r\n".encode("latin-1") + payload + b"\r\n"
+        
+        self._sessions[session_id] = queue
+        self._peers.add(send)
+        self.sessions_opened += 1
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n")
+            writer.write(chunk("endpoint", f"/messages?session_id={session_id}"))
+            await writer.drain()
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                writer.write(chunk("message", json.dumps(message, ensure_ascii=False)))
+                await writer.drain()
+        finally:
+            self._peers.discard(send)
+            self._sessions.pop(session_id, None)
+    
+    async def _post_message(self, session_id: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        queue = self._sessions.get(session_id)
+        if queue is None:
+            self._respond(writer, 404, b"unknown session")
+            return
+        try:
+            message = json.loads(body)
+        except ValueError:
+            self._respond(writer, 400, b"invalid JSON")
+            return
+        self._respond(writer, 202, b"accepted")
+        
+        async def send(reply: Dict[str, Any]) -> None:
+            queue.put_nowait(reply)
+        
+        asyncio.create_task(self.handle(message, send))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local MCP stand-in server")
+    parser.add_argument("--stdio", action="store_true", help="在 stdin/stdout 上提供服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每次工具调用的延迟（秒）")
+    parser.add_argument("--page-size", type=int, help="tools/list 每页工具数")
+    parser.add_argument("--exit-after", type=int, help="stdio 模式下完成多少次工具调用后退出")
+    args = parser.parse_args()
+    server = StubMcpServer(latency=args.latency, page_size=args.page_size, host=args.host, port=args.port,
+                           exit_after_calls=args.exit_after)
+    
+    async def serve() -> None:
+        if args.stdio:
+            await server.serve_stdio()
+            return
+        async with server:
+            await asyncio.Event().wait()
+    
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
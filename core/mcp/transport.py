@@ -0,0 +1,199 @@
+# core/mcp/transport.py
+"""MCP 传输层
+
+每条消息是一个 JSON-RPC 2.0 对象：
+- StdioTransport：启动服务进程，经 stdin/stdout 按行收发 JSON
+- SseTransport：GET SSE 地址建立事件流，服务端先发送 endpoint 事件告知消息地址，
+  之后客户端把消息 POST 到该地址，响应和通知以 message 事件从事件流返回
+"""
+
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import httpx
+
+
+class McpTransportClosed(ConnectionError):
+    """传输已关闭或连接断开"""
+
+
+class McpTransport(ABC):
+    """传输基类"""
+    
+    @abstractmethod
+    async def connect(self) -> None:
+        """建立连接"""
+    
+    @abstractmethod
+    async def send(self, message: Dict[str, Any]) -> None:
+        """发送一条消息
+        
+        Raises:
+            McpTransportClosed: 连接已关闭或消息无法送达
+        """
+    
+    @abstractmethod
+    async def receive(self) -> Optional[Dict[str, Any]]:
+        """接收下一条消息，连接关闭时返回 None"""
+    
+    async def close(self) -> None:
+        """关闭连接"""
+
+
+class StdioTransport(McpTransport):
+    """子进程 stdio 传输"""
+    
+    def __init__(self, command: List[str], env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None):
+        """初始化
+        
+        Args:
+            command: 服务启动命令（程序及参数）
+            env: 追加的环境变量
+            cwd: 工作目录
+        """
+        self.command = list(command)
+        self.env = env
+        self.cwd = cwd
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._write_lock = asyncio.Lock()
+    
+    async def connect(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env={**os.environ, **self.env} if self.env else None,
+            cwd=self.cwd,
+            limit=16 * 1024 * 1024  # 单条消息（如工具列表）可能较长
+        )
+    
+    async def send(self, message: Dict[str, Any]) -> None:
+        if self.process is None or self.process.stdin.is_closing():
+            raise McpTransportClosed("stdio transport is closed")
+        line = json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+        async with self._write_lock:
+            try:
+                self.process.stdin.write(line)
+                await self.process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError) as e:
+                raise McpTransportClosed(f"stdio transport is closed: {e}") from e
+    
+    async def receive(self) -> Optional[Dict[str, Any]]:
+        if self.process is None:
+            return None
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                return json.loads(line)
+            except ValueError:
+                # 服务误把日志写到 stdout 时跳过
+                print(f"[MCP] Ignoring non-JSON line from {self.command[0]}: {line[:80]!r}")
+    
+    async def close(self) -> None:
+        process, self.process = self.process, None
+        if process is None or process.returncode is not None:
+            return
+        # 先关闭 stdin 让服务自行退出，超时再终止
+        process.stdin.close()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=2.0)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+class SseTransport(McpTransport):
+    """HTTP + SSE 传输"""
+    
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 10.0):
+        """初始化
+        
+        Args:
+            url: SSE 地址（如 http://127.0.0.1:8765/sse）
+            headers: 附加的请求头
+            timeout: 建立连接和 POST 消息的超时时间（秒）
+        """
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.endpoint: Optional[str] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._response: Optional[httpx.Response] = None
+        self._events: Optional[AsyncIterator[Tuple[str, str]]] = None
+    
+    async def connect(self) -> None:
+        # 事件流可能长时间没有消息，读取不设超时
+        self._client = httpx.AsyncClient(headers=self.headers, timeout=httpx.Timeout(self.timeout, read=None))
+        try:
+            request = self._client.build_request("GET", self.url, headers={"Accept": "text/event-stream"})
+            self._response = await self._client.send(request, stream=True)
+            self._response.raise_for_status()
+            self._events = self._iter_events()
+            async for event, data in self._events:
+                if event == "endpoint":
+                    self.endpoint = urljoin(self.url, data.strip())
+                    return
+            raise McpTransportClosed("SSE stream closed before endpoint event")
+        except Exception:
+            await self.close()
+            raise
+    
+    async def _iter_events(self) -> AsyncIterator[Tuple[str, str]]:
+        """解析事件流，逐个产出 (事件名, 数据)"""
+        event, data = "message", []
+        async for line in self._response.aiter_lines():
+            if not line:
+                if data:
+                    yield event, "\n".join(data)
+                event, data = "message", []
+            elif line.startswith(":"):
+                continue
+            else:
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+    
+    async def send(self, message: Dict[str, Any]) -> None:
+        if self._client is None or self.endpoint is None:
+            raise McpTransportClosed("SSE transport is closed")
+        try:
+            response = await self._client.post(self.endpoint, json=message)
+            response.raise_for_status()
+        except httpx.TransportError as e:
+            raise McpTransportClosed(f"SSE transport is closed: {e}") from e
+        except httpx.HTTPStatusError as e:
+            # 会话已失效或服务端出错：按连接断开处理，由调用方等待重连后重试
+            raise McpTransportClosed(f"SSE message rejected: HTTP {e.response.status_code}") from e
+    
+    async def receive(self) -> Optional[Dict[str, Any]]:
+        if self._events is None:
+            return None
+        try:
+            async for event, data in self._events:
+                if event == "message":
+                    return json.loads(data)
+        except (httpx.TransportError, httpx.StreamError):
+            pass
+        return None
+    
+    async def close(self) -> None:
+        self._events = None
+        self.endpoint = None
+        response, self._response = self._response, None
+        client, self._client = self._client, None
+        if response is not None:
+            await response.aclose()
+        if client is not None:
+            await client.aclose()
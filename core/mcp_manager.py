@@ -1,14 +1,382 @@
-"""todo:
-    这里不应该是一个 MCP Tool Caller， 而是一个 MCP Server 的调用器。可以管理 Agent 连接的 Server 连接。
+# core/mcp_manager.py
+"""MCP 服务管理器
+
+管理 Agent 连接的多个 MCP 服务（stdio 子进程或本地 SSE 服务）：
+- 每个服务保持一个持久会话，并发的工具调用在同一会话上复用
+- 缓存各服务的工具列表，服务通知变更或超过有效期时刷新；按工具名查找所在服务
+- 连接断开或建立失败时按指数退避（带抖动）自动重连，调用方在超时时间内等待重连
+- 按 服务/工具 统计调用延迟直方图和错误数
+
+没有配置任何服务时 call_emergency_service 退化为只打印日志的模拟调用。
 """
+
 import asyncio
-from typing import Dict, Any
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+from core.client.hedging import LatencyHistogram
+from core.client.registry import close_later
+from core.mcp.session import McpConnectionError, McpSession, tool_result_text
+from core.mcp.transport import McpTransport, SseTransport, StdioTransport
+import config
+
+
+@dataclass
+class McpServerConfig:
+    """一个 MCP 服务的连接配置（command 与 url 二选一）"""
+    name: str
+    command: Optional[List[str]] = None  # stdio：启动命令
+    url: Optional[str] = None  # SSE：事件流地址
+    env: Optional[Dict[str, str]] = None
+    cwd: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    
+    @classmethod
+    def from_dict(cls, name: str, options: Dict[str, Any]) -> "McpServerConfig":
+        command = options.get("command")
+        if isinstance(command, str):
+            command = command.split()
+        server = cls(name, command, options.get("url"), options.get("env"), options.get("cwd"), options.get("headers") or {})
+        if bool(server.command) == bool(server.url):
+            raise ValueError(f"MCP server {name} needs exactly one of command or url")
+        return server
+    
+    def transport(self) -> McpTransport:
+        """创建传输连接"""
+        if self.command:
+            return StdioTransport(self.command, self.env, self.cwd)
+        return SseTransport(self.url, self.headers)
+
+
+@dataclass
+class ServerState:
+    """一个服务的连接状态"""
+    config: McpServerConfig
+    session: Optional[McpSession] = None
+    connected: asyncio.Event = field(default_factory=asyncio.Event)
+    attempted: asyncio.Event = field(default_factory=asyncio.Event)  # 至少尝试过一次连接
+    supervisor: Optional[asyncio.Task] = None
+    connects: int = 0
+    disconnects: int = 0
+    failures: int = 0  # 连续连接失败次数
+    last_error: Optional[str] = None
+
 
 class McpManager:
-    """MCP工具调用器"""
+    """MCP 服务管理器"""
+    
+    def __init__(
+        self,
+        servers: Union[Dict[str, Dict[str, Any]], List[McpServerConfig], None] = None,
+        call_timeout: float = None,
+        connect_timeout: float = None,
+        tools_ttl: Optional[float] = None,
+        reconnect_base_delay: float = None,
+        reconnect_max_delay: float = None,
+        emergency_tool: str = None
+    ):
+        """初始化管理器
+        
+        Args:
+            servers: {名称: {"command": [...]} 或 {"url": "..."}} 或 McpServerConfig 列表，默认为 config.MCP_SERVERS
+            call_timeout: 工具调用超时时间（秒），包括等待重连的时间
+            connect_timeout: 启动时等待首次连接的时间（秒）
+            tools_ttl: 工具列表缓存有效期（秒）
+            reconnect_base_delay: 重连等待时间初值（秒），连续失败时翻倍
+            reconnect_max_delay: 重连等待时间上限（秒）
+            emergency_tool: call_emergency_service 调用的工具名
+        """
+        if servers is None:
+            servers = config.MCP_SERVERS
+        if isinstance(servers, dict):
+            servers = [McpServerConfig.from_dict(name, options) for name, options in servers.items()]
+        self.servers: Dict[str, ServerState] = {server.name: ServerState(server) for server in servers}
+        self.call_timeout = call_timeout or config.MCP_CALL_TIMEOUT
+        self.connect_timeout = connect_timeout or config.MCP_CONNECT_TIMEOUT
+        self.tools_ttl = tools_ttl if tools_ttl is not None else config.MCP_TOOLS_CACHE_TTL
+        self.reconnect_base_delay = reconnect_base_delay or config.MCP_RECONNECT_BASE_DELAY
+        self.reconnect_max_delay = reconnect_max_delay or config.MCP_RECONNECT_MAX_DELAY
+        self.emergency_tool = emergency_tool or config.MCP_EMERGENCY_TOOL
+        
+        self._start_task: Optional[asyncio.Task] = None
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self._errors: Dict[str, int] = {}
+    
+    async def start(self) -> None:
+        """连接所有服务（后台保持连接），等待首次连接尝试完成或超时
+        
+        并发调用共用同一次启动，都在首次连接尝试完成后返回
+        """
+        if self._start_task is None:
+            self._start_task = asyncio.create_task(self._start())
+        await asyncio.shield(self._start_task)
+    
+    async def _start(self) -> None:
+        for state in self.servers.values():
+            state.supervisor = asyncio.create_task(self._supervise(state))
+        if self.servers:
+            waiters = [asyncio.create_task(state.attempted.wait()) for state in self.servers.values()]
+            try:
+                await asyncio.wait(waiters, timeout=self.connect_timeout)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+        connected = [name for name, state in self.servers.items() if state.connected.is_set()]
+        print(f"[MCP] Connected to {len(connected)}/{len(self.servers)} servers: {connected}")
+    
+    async def _supervise(self, state: ServerState) -> None:
+        """保持与一个服务的连接，断开后按指数退避重连"""
+        name = state.config.name
+        while True:
+            session = McpSession(state.config.transport(), name, tools_ttl=self.tools_ttl, request_timeout=self.call_timeout)
+            try:
+                await asyncio.wait_for(session.start(), self.connect_timeout)
+                # 连接后立即获取工具列表，按工具名查找时无需等待
+                await session.list_tools()
+            except asyncio.CancelledError:
+                await session.close()
+                raise
+            except Exception as e:
+                await session.close()
+                state.failures += 1
+                state.last_error = f"{type(e).__name__}: {e}"
+                print(f"[MCP] Failed to connect to {name}: {state.last_error}")
+                state.attempted.set()
+            else:
+                state.session = session
+                state.connects += 1
+                state.failures = 0
+                state.connected.set()
+                state.attempted.set()
+                print(f"[MCP] Connected to {name} ({session.server_info.get('name', 'unknown')}, "
+                      f"{len(session.cached_tools or [])} tools)")
+                try:
+                    await session.wait_closed()
+                finally:
+                    state.connected.clear()
+                    state.session = None
+                    await session.close()
+                state.disconnects += 1
+                print(f"[MCP] Disconnected from {name}, reconnecting")
+            
+            # 成功后断开立即按初值重连；连续失败时翻倍，抖动避免多个 Agent 同时重连
+            delay = min(self.reconnect_max_delay, self.reconnect_base_delay * 2 ** max(0, state.failures - 1))
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+    
+    async def session(self, server: str, timeout: Optional[float] = None) -> McpSession:
+        """获取服务的会话，未连接时等待重连
+        
+        Raises:
+            McpConnectionError: 服务未配置或超时仍未连接
+        """
+        state = self.servers.get(server)
+        if state is None:
+            raise McpConnectionError(f"Unknown MCP server: {server}")
+        await self.start()
+        deadline = time.monotonic() + (timeout if timeout is not None else self.call_timeout)
+        while True:
+            try:
+                await asyncio.wait_for(state.connected.wait(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise McpConnectionError(f"MCP server {server} is not connected ({state.last_error})") from None
+            session = state.session
+            if session is not None and not session.closed:
+                return session
+            # 会话刚断开，等待后台任务更新连接状态
+            await asyncio.sleep(0.01)
+    
+    async def list_tools(self, server: Optional[str] = None, refresh: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """获取工具列表
+        
+        Args:
+            server: 服务名称，None 表示所有已连接的服务
+            refresh: 是否忽略缓存
+        
+        Returns:
+            Dict: {服务名称: 工具列表}
+        """
+        if server is not None:
+            session = await self.session(server)
+            return {server: await session.list_tools(refresh)}
+        await self.start()
+        catalogs = {}
+        for name, state in self.servers.items():
+            if state.session is not None and not state.session.closed:
+                catalogs[name] = await state.session.list_tools(refresh)
+        return catalogs
+    
+    def invalidate_tools(self, server: Optional[str] = None) -> None:
+        """使工具列表缓存失效"""
+        for name, state in self.servers.items():
+            if (server is None or name == server) and state.session is not None:
+                state.session.invalidate_tools()
+    
+    async def find_server(self, tool: str, timeout: Optional[float] = None) -> Optional[str]:
+        """查找提供该工具的服务
+        
+        已连接的服务都不提供该工具且有服务正在重连时，等待重连后再查找
+        
+        Args:
+            tool: 工具名
+            timeout: 等待重连的最长时间（秒）
+        
+        Returns:
+            Optional[str]: 服务名称，超时仍未找到时为 None
+        """
+        deadline = time.monotonic() + (timeout if timeout is not None else self.call_timeout)
+        while True:
+            try:
+                catalogs = await self.list_tools()
+            except McpConnectionError:
+                catalogs = {}  # 获取工具列表时会话断开，按重连处理
+            for name, tools in catalogs.items():
+                if any(item.get("name") == tool for item in tools):
+                    return name
+            reconnecting = [state for state in self.servers.values() if state.session is None or state.session.closed]
+            remaining = deadline - time.monotonic()
+            if not reconnecting or remaining <= 0:
+                return None
+            waiters = [asyncio.create_task(state.connected.wait()) for state in reconnecting if not state.connected.is_set()]
+            if not waiters:
+                # 会话刚断开，等待后台任务更新连接状态
+                await asyncio.sleep(min(0.01, remaining))
+                continue
+            try:
+                await asyncio.wait(waiters, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+    
+    async def call_tool(
+        self,
+        tool: str,
+        arguments: Optional[Dict[str, Any]] = None,
+        server: Optional[str] = None,
+        timeout: Optional[float] = None,
+        retries: int = 0
+    ) -> Dict[str, Any]:
+        """调用工具
+        
+        Args:
+            tool: 工具名
+            arguments: 调用参数
+            server: 服务名称，None 时按工具名查找
+            timeout: 超时时间（秒），包括等待重连的时间
+            retries: 调用中连接断开时，等待重连后重新调用的次数；服务可能已执行了
+                断开前的调用，只用于幂等或允许重复执行的工具
+        
+        Returns:
+            Dict: 工具结果
+        
+        Raises:
+            McpConnectionError: 服务未连接或调用中断开
+            McpToolError: 工具执行失败
+            McpError: 服务端返回错误
+            asyncio.TimeoutError: 调用超时
+        """
+        timeout = timeout if timeout is not None else self.call_timeout
+        deadline = time.monotonic() + timeout
+        if server is None:
+            server = await self.find_server(tool, timeout)
+            if server is None:
+                raise McpConnectionError(f"No connected MCP server provides tool {tool}")
+        key = f"{server}/{tool}"
+        start = time.perf_counter()
+        try:
+            while True:
+                session = await self.session(server, max(0.0, deadline - time.monotonic()))
+                try:
+                    result = await session.call_tool(tool, arguments, max(0.0, deadline - time.monotonic()))
+                    break
+                except McpConnectionError:
+                    if retries <= 0:
+                        raise
+                    retries -= 1
+                    print(f"[MCP] Connection to {server} lost during {tool}, retrying after reconnect")
+        except Exception:
+            self._errors[key] = self._errors.get(key, 0) + 1
+            raise
+        finally:
+            self._latency.setdefault(key, LatencyHistogram()).observe(time.perf_counter() - start)
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        servers = {}
+        for name, state in self.servers.items():
+            session = state.session
+            servers[name] = {
+                "connected": state.connected.is_set(),
+                "connects": state.connects,
+                "disconnects": state.disconnects,
+                "failures": state.failures,
+                "last_error": state.last_error,
+                "tools": len(session.cached_tools or []) if session is not None else 0,
+                "tools_fetches": session.tools_fetches if session is not None else 0,
+                "max_in_flight": session.max_in_flight if session is not None else 0,
+            }
+        tools = {key: {**histogram.stats(), "errors": self._errors.get(key, 0)} for key, histogram in self._latency.items()}
+        return {"servers": servers, "tools": tools}
     
     async def call_emergency_service(self, event_details: Dict[str, Any]) -> bool:
         """调用紧急服务"""
         print(f"[MCP] Calling emergency service for: {event_details}")
-        await asyncio.sleep(0.5)
-        return True
\ No newline at end of file
+        if not self.servers:
+            # 未配置 MCP 服务：模拟调用
+            await asyncio.sleep(0.5)
+            return True
+        try:
+            # 宁可重复派单也不能漏报：连接断开时重连后重新调用一次
+            result = await self.call_tool(self.emergency_tool, {"event": event_details}, retries=1)
+            print(f"[MCP] Emergency service responded: {tool_result_text(result)}")
+            return True
+        except Exception as e:
+            print(f"[MCP] Emergency service call failed: {type(e).__name__}: {e}")
+            return False
+    
+    async def deliver_alerts(self, entries: List[Any]) -> List[str]:
+        """批量投递告警（供告警发件箱使用）
+        
+        同一批告警在会话上并发调用应急工具，每条带上幂等键 idempotency_key，
+        重试或重放时由服务端去重。未配置服务时模拟投递。
+        
+        Args:
+            entries: 告警条目（含 id 和 event）
+        
+        Returns:
+            List[str]: 投递成功的告警 id
+        """
+        if not self.servers:
+            print(f"[MCP] Simulated delivery of {len(entries)} alerts")
+            return [entry.id for entry in entries]
+        results = await asyncio.gather(*(
+            self.call_tool(self.emergency_tool, {"event": entry.event, "idempotency_key": entry.id})
+            for entry in entries
+        ), return_exceptions=True)
+        failed = [r for r in results if isinstance(r, BaseException)]
+        if failed:
+            print(f"[MCP] {len(failed)}/{len(entries)} alerts not delivered: {type(failed[0]).__name__}: {failed[0]}")
+        return [entry.id for entry, result in zip(entries, results) if not isinstance(result, BaseException)]
+    
+    async def aclose(self) -> None:
+        """断开所有服务"""
+        for state in self.servers.values():
+            supervisor, state.supervisor = state.supervisor, None
+            if supervisor is not None:
+                supervisor.cancel()
+                try:
+                    await supervisor
+                except asyncio.CancelledError:
+                    pass
+            if state.session is not None:
+                await state.session.close()
+                state.session = None
+            state.connected.clear()
+        self._start_task = None
+    
+    def close(self) -> None:
+        """在同步上下文中断开所有服务"""
+        if self._start_task is not None:
+            close_later(self.aclose())
@@ -0,0 +1,183 @@
+# core/motion_trigger.py
+"""运动触发巡检
+
+后台持续从连续采集的摄像头取最新帧做本地运动检测，检测到明显运动时立即
+唤醒巡检；两次触发之间有冷却时间，安静时段由较长的心跳间隔兜底。
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from core.camera import CameraSensor
+from core.vision.motion import MotionDetector
+
+
+class MotionTrigger:
+    """运动触发器"""
+    
+    MOTION = "motion"
+    HEARTBEAT = "heartbeat"
+    
+    def __init__(
+        self,
+        cameras: Dict[str, CameraSensor],
+        cooldown: float = 5.0,
+        sample_interval: float = 0.1,
+        threshold: float = 0.01,
+        pixel_threshold: int = 25
+    ):
+        """初始化触发器
+        
+        Args:
+            cameras: 需要监视的摄像头 {camera_id: CameraSensor}，须为连续采集模式
+            cooldown: 两次运动触发之间的最短间隔（秒）
+            sample_interval: 取帧检测的间隔（秒）
+            threshold: 前景像素占比阈值
+            pixel_threshold: 单像素灰度差阈值
+        """
+        self.cameras = cameras
+        self.cooldown = cooldown
+        self.sample_interval = sample_interval
+        self.detectors = {
+            camera_id: MotionDetector(threshold=threshold, pixel_threshold=pixel_threshold)
+            for camera_id in cameras
+        }
+        
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._buffers: Dict[str, np.ndarray] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._last_trigger = 0.0
+        self._pending: Optional[tuple] = None  # 冷却期内检测到、尚未触发的运动
+        
+        # 触发信息和统计计数
+        self.motion_at = 0.0  # 最近一次触发对应帧的采集时间
+        self.motion_camera: Optional[str] = None
+        self.samples = 0
+        self.motion_events = 0
+        self.triggers = 0
+        self.suppressed = 0
+        self.heartbeats = 0
+    
+    @property
+    def is_running(self) -> bool:
+        """监视任务是否在运行"""
+        return self._task is not None and not self._task.done()
+    
+    def start(self) -> None:
+        """启动监视任务（重复调用无副作用）"""
+        if self.is_running:
+            return
+        for camera in self.cameras.values():
+            camera.start()
+        self._task = asyncio.create_task(self._monitor_loop())
+        print(f"[MotionTrigger] Monitoring {list(self.cameras)} (cooldown={self.cooldown}s)")
+    
+    def stop(self) -> None:
+        """停止监视任务"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def wait(self, timeout: float) -> str:
+        """等待下一次巡检时机
+        
+        Args:
+            timeout: 心跳间隔（秒），期间没有运动时到时返回
+        
+        Returns:
+            str: 触发原因（motion / heartbeat）
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.heartbeats += 1
+            return self.HEARTBEAT
+        self._event.clear()
+        return self.MOTION
+    
+    async def _monitor_loop(self) -> None:
+        """监视循环：取各路最新帧检测运动"""
+        try:
+            while True:
+                if self._pending is not None and self._cooldown_elapsed():
+                    # 冷却期内发生过运动：冷却结束后补发一次触发
+                    self._fire(*self._pending)
+                
+                for camera_id, camera in self.cameras.items():
+                    timestamp = camera.latest_timestamp
+                    if not timestamp or timestamp == self._last_seen.get(camera_id):
+                        continue
+                    # 整帧拷贝和检测都在线程中进行，不阻塞事件循环
+                    sample = await asyncio.to_thread(self._sample, camera_id, camera)
+                    if sample is None:
+                        continue
+                    motion, score, timestamp = sample
+                    self._last_seen[camera_id] = timestamp
+                    self.samples += 1
+                    if motion:
+                        self._on_motion(camera_id, score, timestamp)
+                
+                await asyncio.sleep(self.sample_interval)
+        
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[MotionTrigger] Error in monitor loop: {e}")
+    
+    def _sample(self, camera_id: str, camera: CameraSensor) -> Optional[Tuple[bool, float, float]]:
+        """取一路最新帧并检测运动（在线程中运行）
+        
+        复用每路的帧缓冲区，不为检测单独分配整帧；取帧不计为已读取，不影响摄像头的丢帧统计
+        
+        Returns:
+            Tuple: (是否有运动, 前景像素占比, 帧采集时间戳)，无可用帧时为 None
+        """
+        frame, timestamp = camera.get_latest_frame(self._buffers.get(camera_id), consume=False)
+        if frame is None:
+            return None
+        self._buffers[camera_id] = frame
+        motion, score = self.detectors[camera_id].update(frame)
+        return motion, score, timestamp
+    
+    def _cooldown_elapsed(self) -> bool:
+        """距上次触发已超过冷却时间，且上次唤醒已被处理"""
+        if self._event.is_set():
+            return False
+        return self.triggers == 0 or time.monotonic() - self._last_trigger >= self.cooldown
+    
+    def _on_motion(self, camera_id: str, score: float, timestamp: float) -> None:
+        """处理一次运动检测结果，冷却期内只记录不触发"""
+        self.motion_events += 1
+        if not self._cooldown_elapsed():
+            self.suppressed += 1
+            # 已有未处理的唤醒时不再补发；仅在冷却期内记录一次待触发的运动
+            if self._pending is None and not self._event.is_set():
+                self._pending = (camera_id, score, timestamp)
+            return
+        self._fire(camera_id, score, timestamp)
+    
+    def _fire(self, camera_id: str, score: float, timestamp: float) -> None:
+        """唤醒巡检"""
+        self._pending = None
+        self._last_trigger = time.monotonic()
+        self.motion_at = timestamp
+        self.motion_camera = camera_id
+        self.triggers += 1
+        print(f"[MotionTrigger] Motion on {camera_id} (score={score:.4f}), waking patrol")
+        self._event.set()
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "running": self.is_running,
+            "samples": self.samples,
+            "motion_events": self.motion_events,
+            "triggers": self.triggers,
+            "suppressed": self.suppressed,
+            "heartbeats": self.heartbeats,
+            "last_score": {camera_id: d.last_score for camera_id, d in self.detectors.items()},
+        }
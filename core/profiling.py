@@ -0,0 +1,59 @@
+# core/profiling.py
+"""单周期内存统计
+
+基于 tracemalloc 统计一次巡检周期内的峰值内存增量和新增内存块数。
+tracemalloc 会拖慢所有分配，因此只在显式开启时使用；统计范围是整个进程，
+并发运行的其他任务也会计入。
+"""
+
+import sys
+import tracemalloc
+from typing import Any, Dict
+
+
+class CycleMemoryProfiler:
+    """巡检周期内存统计器"""
+    
+    def __init__(self, enabled: bool = False):
+        """初始化统计器
+        
+        Args:
+            enabled: 是否启用 tracemalloc 统计
+        """
+        self.enabled = enabled
+        self._started_tracing = False
+        self._base_current = 0
+        self._base_blocks = 0
+    
+    def start(self) -> None:
+        """开始一个统计周期"""
+        if not self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._base_current, _ = tracemalloc.get_traced_memory()
+        self._base_blocks = sys.getallocatedblocks()
+    
+    def stop(self) -> Dict[str, Any]:
+        """结束统计周期
+        
+        Returns:
+            Dict: peak_bytes（周期内峰值相对起点的增量）、retained_bytes（周期结束时
+                仍未释放的增量）、net_blocks（新增的 Python 内存块数）；未启用时为空字典
+        """
+        if not self.enabled or not tracemalloc.is_tracing():
+            return {}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "peak_bytes": peak - self._base_current,
+            "retained_bytes": current - self._base_current,
+            "net_blocks": sys.getallocatedblocks() - self._base_blocks,
+        }
+    
+    def close(self) -> None:
+        """停止由本统计器开启的 tracemalloc"""
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
@@ -0,0 +1,27 @@
+# core/vision/__init__.py
+"""本地视觉处理模块
+
+导出在调用云端视觉模型之前运行的本地图像处理组件
+"""
+
+from core.vision.scene_change import SceneChangeDetector
+from core.vision.motion import MotionDetector
+from core.vision.phash import average_hash, difference_hash, hamming_distance
+from core.vision.preprocess import ImagePreprocessor, PreprocessResult
+from core.vision.cascade import DetectorCascade, CascadeResult
+from core.vision.analysis import VisionAnalysis, VISION_RESULT_SCHEMA, response_format
+
+__all__ = [
+    "SceneChangeDetector",
+    "MotionDetector",
+    "average_hash",
+    "difference_hash",
+    "hamming_distance",
+    "ImagePreprocessor",
+    "PreprocessResult",
+    "DetectorCascade",
+    "CascadeResult",
+    "VisionAnalysis",
+    "VISION_RESULT_SCHEMA",
+    "response_format",
+]
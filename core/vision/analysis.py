@@ -0,0 +1,126 @@
+# core/vision/analysis.py
+"""视觉分析结果的结构定义与校验
+
+把模型返回的字典校验并规整为带类型的 VisionAnalysis：缺失字段取默认值，
+可以无损转换的值（如 "true"、"0.8"、单个字符串形式的物体）做类型转换，
+无法转换的字段取默认值并记录在 errors 中。
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# 结构化输出（response_format=json_schema）使用的结果结构
+VISION_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "emergency": {"type": "boolean"},
+        "objects_detected": {"type": "array", "items": {"type": "string"}},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        "description": {"type": "string"},
+        "cameras": {"type": "object"},
+    },
+    "required": ["emergency", "objects_detected", "confidence", "description"],
+}
+
+_FIELDS = ("emergency", "objects_detected", "confidence", "description")
+_TRUE = {"true", "yes", "1", "是", "有"}
+_FALSE = {"false", "no", "0", "否", "无", ""}
+
+
+def response_format(mode: Optional[str]) -> Optional[Dict[str, Any]]:
+    """构造请求的 response_format 参数
+    
+    Args:
+        mode: json_object（JSON 模式）/ json_schema（按 VISION_RESULT_SCHEMA 约束）/ None（不指定）
+    """
+    if mode == "json_object":
+        return {"type": "json_object"}
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "vision_analysis", "schema": VISION_RESULT_SCHEMA},
+        }
+    return None
+
+
+@dataclass
+class VisionAnalysis:
+    """校验后的视觉分析结果"""
+    emergency: bool = False
+    objects_detected: List[str] = field(default_factory=list)
+    confidence: float = 0.0
+    description: str = "无描述"
+    extra: Dict[str, Any] = field(default_factory=dict)  # 结构之外的字段（如 cameras、source），原样保留
+    errors: List[str] = field(default_factory=list)  # 校验问题
+    
+    @property
+    def valid(self) -> bool:
+        """是否通过校验"""
+        return not self.errors
+    
+    @classmethod
+    def from_dict(cls, data: Any) -> "VisionAnalysis":
+        """校验模型返回的结果
+        
+        Args:
+            data: 解析后的 JSON 值，不是对象时视为校验失败
+        """
+        if not isinstance(data, dict):
+            return cls(errors=[f"result is {type(data).__name__}, expected object"])
+        
+        result = cls(extra={k: v for k, v in data.items() if k not in _FIELDS})
+        if data.get("raw_response"):
+            result.errors.append("response is not JSON")
+        
+        if "emergency" in data:
+            result.emergency = result._to_bool("emergency", data["emergency"])
+        if "objects_detected" in data:
+            result.objects_detected = result._to_list("objects_detected", data["objects_detected"])
+        if "confidence" in data:
+            result.confidence = result._to_confidence(data["confidence"])
+        if data.get("description") is not None:
+            result.description = str(data["description"])
+        return result
+    
+    def _to_bool(self, name: str, value: Any) -> bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float)):
+            return bool(value)
+        if isinstance(value, str) and value.strip().lower() in _TRUE | _FALSE:
+            return value.strip().lower() in _TRUE
+        self.errors.append(f"{name}: cannot interpret {value!r} as boolean")
+        return False
+    
+    def _to_list(self, name: str, value: Any) -> List[str]:
+        if isinstance(value, str):
+            return [value] if value else []
+        if isinstance(value, list):
+            # 元素为对象时取其名称字段（如 {"name": "person", "count": 2}）
+            return [
+                str(item.get("name", item.get("label", item))) if isinstance(item, dict) else str(item)
+                for item in value if item is not None
+            ]
+        self.errors.append(f"{name}: expected array, got {type(value).__name__}")
+        return []
+    
+    def _to_confidence(self, value: Any) -> float:
+        try:
+            confidence = float(value)
+        except (TypeError, ValueError):
+            self.errors.append(f"confidence: cannot interpret {value!r} as number")
+            return 0.0
+        if confidence > 1.0 and confidence <= 100.0:
+            # 按百分数返回的置信度
+            confidence /= 100.0
+        return min(1.0, max(0.0, confidence))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为下游使用的结果字典（附加字段原样保留）"""
+        return {
+            **self.extra,
+            "emergency": self.emergency,
+            "objects_detected": list(self.objects_detected),
+            "confidence": self.confidence,
+            "description": self.description,
+        }
@@ -0,0 +1,309 @@
+# core/vision/cascade.py
+"""本地一级检测级联
+
+在调用云端视觉模型之前，用廉价的本地检测判断画面是否可疑：
+1. OpenCV HOG 行人检测
+2. HSV 颜色启发式：火焰（高饱和高亮度的红橙色）和烟雾（低饱和的灰白色），
+   按相对各路画面基线的增量判断，场景中固有的红色物体或灰墙不会反复触发
+3. 帧差得分（来自场景变化检测）
+
+明显正常的画面直接以本地结果返回，可疑画面升级到云端模型，并把本地证据附在提示词中。
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class CascadeResult:
+    """级联判定结果"""
+    escalate: bool
+    reasons: List[str]
+    persons: int = 0
+    person_boxes: List[Tuple[int, int, int, int]] = field(default_factory=list)
+    fire_ratio: float = 0.0
+    fire_increase: float = 0.0
+    smoke_ratio: float = 0.0
+    smoke_increase: float = 0.0
+    change_score: Optional[float] = None
+    elapsed: float = 0.0
+    
+    def to_metadata(self) -> Dict[str, Any]:
+        """转换为 ActionResult.metadata 中使用的字典"""
+        return {
+            "escalate": self.escalate,
+            "reasons": list(self.reasons),
+            "persons": self.persons,
+            "fire_ratio": self.fire_ratio,
+            "smoke_ratio": self.smoke_ratio,
+            "change_score": self.change_score,
+            "elapsed_ms": self.elapsed * 1000,
+        }
+    
+    def describe(self) -> str:
+        """生成附加在提示词中的本地证据说明"""
+        lines = []
+        if self.persons:
+            lines.append(f"- 行人检测器发现 {self.persons} 个疑似人形目标，位置（x, y, w, h，像素）：{self.person_boxes}")
+        lines.append(f"- 火焰颜色像素占比 {self.fire_ratio:.2%}（较基线增加 {self.fire_increase:.2%}）")
+        lines.append(f"- 烟雾颜色像素占比 {self.smoke_ratio:.2%}（较基线增加 {self.smoke_increase:.2%}）")
+        if self.change_score is not None:
+            lines.append(f"- 与上次分析画面相比变化像素占比 {self.change_score:.2%}")
+        return "\n".join(lines)
+
+
+class DetectorCascade:
+    """本地一级检测级联"""
+    
+    EVIDENCE_PROMPT = """
+本地初筛因以下原因将画面升级分析：{reasons}。本地检测证据：
+{evidence}
+请结合证据重点核实，证据仅供参考，以画面实际内容为准。
+"""
+    
+    def __init__(
+        self,
+        person_enabled: bool = True,
+        person_min_weight: float = 0.5,
+        fire_threshold: float = 0.005,
+        smoke_threshold: float = 0.05,
+        change_threshold: float = 0.15,
+        max_skip_age: float = 300.0,
+        detect_width: int = 400,
+        baseline_rate: float = 0.05
+    ):
+        """初始化级联
+        
+        Args:
+            person_enabled: 是否运行 HOG 行人检测
+            person_min_weight: 行人检测最低置信权重
+            fire_threshold: 火焰颜色像素占比相对基线的增量阈值
+            smoke_threshold: 烟雾颜色像素占比相对基线的增量阈值
+            change_threshold: 帧差得分阈值，超过即升级（大幅变化交给云端判断）
+            max_skip_age: 最长连续短路时间（秒），超时后强制升级一次
+            detect_width: 检测前将画面缩放到的宽度（像素）
+            baseline_rate: 颜色基线的更新速率
+        """
+        self.person_enabled = person_enabled
+        self.person_min_weight = person_min_weight
+        self.fire_threshold = fire_threshold
+        self.smoke_threshold = smoke_threshold
+        self.change_threshold = change_threshold
+        self.max_skip_age = max_skip_age
+        self.detect_width = detect_width
+        self.baseline_rate = baseline_rate
+        
+        # HOG 检测器不保证线程安全，每个线程各持有一个
+        self._local = threading.local()
+        self._baselines: Dict[str, np.ndarray] = {}  # stream -> [火焰占比, 烟雾占比]
+        self._last_escalation = 0.0
+        
+        # 统计计数
+        self.frames_total = 0
+        self.escalated = 0
+        self.local_time = 0.0
+        self.cloud_calls = 0
+        self.cloud_time = 0.0
+        self.reason_counts: Dict[str, int] = {}
+    
+    def _hog(self) -> cv2.HOGDescriptor:
+        """获取当前线程的 HOG 检测器"""
+        hog = getattr(self._local, "hog", None)
+        if hog is None:
+            hog = cv2.HOGDescriptor()
+            hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+            self._local.hog = hog
+        return hog
+    
+    def _downscale(self, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        """缩放到检测宽度，返回 (图像, 缩放比例)"""
+        width = frame.shape[1]
+        if width <= self.detect_width:
+            return frame, 1.0
+        scale = self.detect_width / width
+        size = (self.detect_width, max(1, int(frame.shape[0] * scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA), scale
+    
+    def detect_persons(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """HOG 行人检测，返回 (x, y, w, h) 列表"""
+        if image.shape[0] < 128 or image.shape[1] < 64:
+            return []
+        rects, weights = self._hog().detectMultiScale(image, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        return [
+            tuple(int(v) for v in rect)
+            for rect, weight in zip(rects, np.ravel(weights))
+            if weight >= self.person_min_weight
+        ]
+    
+    @staticmethod
+    def color_ratios(image: np.ndarray) -> Tuple[float, float]:
+        """计算火焰和烟雾颜色像素占比
+        
+        Returns:
+            Tuple: (火焰占比, 烟雾占比)
+        """
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+        fire = ((h <= 25) | (h >= 170)) & (s >= 120) & (v >= 180)
+        smoke = (s <= 40) & (v >= 120) & (v <= 230)
+        total = h.size
+        return float(np.count_nonzero(fire)) / total, float(np.count_nonzero(smoke)) / total
+    
+    def evaluate(
+        self,
+        frame: np.ndarray,
+        change_score: Optional[float] = None,
+        stream: str = "default"
+    ) -> CascadeResult:
+        """对单帧运行级联
+        
+        Args:
+            frame: BGR 原始帧
+            change_score: 场景变化检测得到的帧差得分
+            stream: 画面来源标识，烟雾基线按来源分别维护
+        
+        Returns:
+            CascadeResult: 判定结果和本地证据
+        """
+        start = time.perf_counter()
+        image, scale = self._downscale(frame)
+        reasons = []
+        
+        boxes = self.detect_persons(image) if self.person_enabled else []
+        if boxes:
+            reasons.append("person")
+            boxes = [tuple(int(v / scale) for v in box) for box in boxes]
+        
+        ratios = np.array(self.color_ratios(image))
+        baseline = self._baselines.get(stream)
+        if baseline is None:
+            # 首帧作为基线（首帧总会因 max_skip_age 升级，由云端模型确认）
+            baseline = self._baselines[stream] = ratios.copy()
+        fire_increase, smoke_increase = ratios - baseline
+        if fire_increase > self.fire_threshold:
+            reasons.append("fire")
+        if smoke_increase > self.smoke_threshold:
+            reasons.append("smoke")
+        if "fire" not in reasons and "smoke" not in reasons:
+            # 只用正常画面更新基线，避免火焰、烟雾逐渐扩散时被吸收
+            baseline += (ratios - baseline) * self.baseline_rate
+        
+        if change_score is not None and change_score > self.change_threshold:
+            reasons.append("change")
+        
+        return CascadeResult(
+            escalate=bool(reasons),
+            reasons=reasons,
+            persons=len(boxes),
+            person_boxes=boxes,
+            fire_ratio=float(ratios[0]),
+            fire_increase=float(fire_increase),
+            smoke_ratio=float(ratios[1]),
+            smoke_increase=float(smoke_increase),
+            change_score=change_score,
+            elapsed=time.perf_counter() - start
+        )
+    
+    def decide(self, results: List[CascadeResult]) -> Tuple[bool, List[str]]:
+        """汇总一组画面（多摄像头）的结果并记录统计
+        
+        Returns:
+            Tuple: (是否升级, 升级原因)
+        """
+        reasons = []
+        for result in results:
+            reasons.extend(r for r in result.reasons if r not in reasons)
+        
+        now = time.time()
+        if not reasons and now - self._last_escalation > self.max_skip_age:
+            # 长时间（包括启动后首帧）未经云端确认：强制升级一次，防止本地漏报持续累积
+            reasons.append("max_skip_age")
+        
+        self.frames_total += 1
+        self.local_time += sum(r.elapsed for r in results)
+        if reasons:
+            self.escalated += 1
+            self._last_escalation = now
+            for reason in reasons:
+                self.reason_counts[reason] = self.reason_counts.get(reason, 0) + 1
+        return bool(reasons), reasons
+    
+    def evidence_prompt(self, results: Dict[str, CascadeResult], reasons: List[str]) -> str:
+        """生成附加在提示词末尾的本地证据"""
+        if len(results) == 1:
+            evidence = next(iter(results.values())).describe()
+        else:
+            evidence = "\n".join(
+                f"[{camera_id}]\n{result.describe()}" for camera_id, result in results.items()
+            )
+        return self.EVIDENCE_PROMPT.format(reasons="、".join(reasons), evidence=evidence)
+    
+    def record_cloud_latency(self, seconds: float) -> None:
+        """记录一次云端视觉调用耗时，用于估算短路节省的时间"""
+        self.cloud_calls += 1
+        self.cloud_time += seconds
+    
+    @staticmethod
+    def benign_result() -> Dict[str, Any]:
+        """短路时返回的本地分析结果"""
+        return {
+            "objects_detected": [],
+            "emergency": False,
+            "confidence": 0.5,
+            "description": "本地初筛未发现人员、火焰或烟雾，未调用视觉模型",
+            "source": "local",
+        }
+    
+    @staticmethod
+    def local_result(results: Dict[str, CascadeResult]) -> Dict[str, Any]:
+        """视觉模型不可用时仅凭本地检测给出的分析结果，发现火焰或烟雾即判为紧急
+        
+        Args:
+            results: {camera_id: 级联判定结果}
+        """
+        persons = sum(r.persons for r in results.values())
+        reasons = {reason for r in results.values() for reason in r.reasons}
+        objects = []
+        findings = []
+        if persons:
+            objects.append("person")
+            findings.append(f"{persons} 个疑似人员")
+        for name, label in (("fire", "火焰"), ("smoke", "烟雾")):
+            if name in reasons:
+                objects.append(name)
+                findings.append(f"疑似{label}")
+        
+        return {
+            "objects_detected": objects,
+            "emergency": "fire" in reasons or "smoke" in reasons,
+            "confidence": 0.5 if findings else 0.3,
+            "description": "视觉模型暂不可用，仅本地检测：" + ("、".join(findings) if findings else "未发现人员、火焰或烟雾"),
+            "source": "local_only",
+        }
+    
+    def report(self) -> Dict[str, Any]:
+        """级联效果报告
+        
+        Returns:
+            Dict: 升级率、各原因计数、本地检测平均耗时、云端调用平均耗时，
+                以及按云端平均耗时估算的短路节省时间
+        """
+        short_circuited = self.frames_total - self.escalated
+        avg_local = self.local_time / self.frames_total if self.frames_total else 0.0
+        avg_cloud = self.cloud_time / self.cloud_calls if self.cloud_calls else 0.0
+        return {
+            "frames_total": self.frames_total,
+            "escalated": self.escalated,
+            "short_circuited": short_circuited,
+            "escalation_rate": self.escalated / self.frames_total if self.frames_total else 0.0,
+            "reasons": dict(self.reason_counts),
+            "avg_local_ms": avg_local * 1000,
+            "avg_cloud_ms": avg_cloud * 1000,
+            # 短路的帧省下一次云端调用；所有帧都要付出本地检测的耗时
+            "latency_saved_s": short_circuited * avg_cloud - self.local_time,
+        }
@@ -0,0 +1,95 @@
+# core/vision/motion.py
+"""本地运动检测
+
+在灰度缩略图上维护滑动平均背景，前景像素占比超过阈值即认为有运动。
+每帧只处理几千个像素，可以在巡检间隙持续运行，用来决定何时唤醒视觉分析。
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class MotionDetector:
+    """基于滑动平均背景差分的运动检测器"""
+    
+    def __init__(
+        self,
+        threshold: float = 0.01,
+        pixel_threshold: int = 25,
+        size: Tuple[int, int] = (64, 48),
+        learning_rate: float = 0.1,
+        normalize_brightness: bool = True
+    ):
+        """初始化检测器
+        
+        Args:
+            threshold: 前景像素占比阈值，超过即认为有运动
+            pixel_threshold: 单个像素与背景的灰度差阈值（0-255）
+            size: 缩略图尺寸 (宽, 高)
+            learning_rate: 背景更新速率（0-1），越大越快吸收静止下来的变化
+            normalize_brightness: 是否先减去整体亮度均值，抑制自动曝光带来的误判
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self.learning_rate = learning_rate
+        self.normalize_brightness = normalize_brightness
+        
+        self._background: Optional[np.ndarray] = None
+        self._diff = np.empty((size[1], size[0]), dtype=np.float32)
+        
+        # 统计计数
+        self.frames_total = 0
+        self.motion_frames = 0
+        self.last_score = 0.0
+    
+    def prepare(self, frame: np.ndarray) -> np.ndarray:
+        """生成 float32 灰度缩略图"""
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA).astype(np.float32)
+        if self.normalize_brightness:
+            thumb -= thumb.mean()
+        return thumb
+    
+    def update(self, frame: np.ndarray) -> Tuple[bool, float]:
+        """检测当前帧并更新背景
+        
+        Args:
+            frame: BGR 或灰度图像
+        
+        Returns:
+            Tuple: (是否有运动, 前景像素占比)，第一帧只用于初始化背景
+        """
+        thumb = self.prepare(frame)
+        self.frames_total += 1
+        
+        if self._background is None or self._background.shape != thumb.shape:
+            self._background = thumb
+            self.last_score = 0.0
+            return False, 0.0
+        
+        np.subtract(thumb, self._background, out=self._diff)
+        np.abs(self._diff, out=self._diff)
+        score = float(np.count_nonzero(self._diff > self.pixel_threshold)) / self._diff.size
+        cv2.accumulateWeighted(thumb, self._background, self.learning_rate)
+        
+        self.last_score = score
+        motion = score > self.threshold
+        if motion:
+            self.motion_frames += 1
+        return motion, score
+    
+    def reset(self) -> None:
+        """清除背景，下一帧重新初始化"""
+        self._background = None
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "frames_total": self.frames_total,
+            "motion_frames": self.motion_frames,
+            "last_score": self.last_score,
+        }
@@ -0,0 +1,65 @@
+# core/vision/phash.py
+"""感知哈希
+
+提供 aHash / dHash 两种 64 位感知哈希，用于识别视觉上相近的画面
+"""
+
+from typing import Optional, Union
+
+import cv2
+import numpy as np
+
+
+def _to_gray(image: Union[bytes, np.ndarray]) -> Optional[np.ndarray]:
+    """将编码后的图像字节或 BGR 帧转换为灰度图"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        buffer = np.frombuffer(image, dtype=np.uint8)
+        # 以 1/8 分辨率解码，只需要极小的缩略图
+        return cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    """将布尔矩阵打包为整数"""
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def average_hash(image: Union[bytes, np.ndarray], hash_size: int = 8) -> Optional[int]:
+    """计算 aHash：缩略图像素与均值比较
+    
+    Args:
+        image: JPEG/PNG 字节数据或 BGR 帧
+        hash_size: 缩略图边长，哈希位数为 hash_size ** 2
+    
+    Returns:
+        int: 哈希值，图像无法解码时返回 None
+    """
+    gray = _to_gray(image)
+    if gray is None:
+        return None
+    thumb = cv2.resize(gray, (hash_size, hash_size), interpolation=cv2.INTER_AREA)
+    return _pack_bits(thumb > thumb.mean())
+
+
+def difference_hash(image: Union[bytes, np.ndarray], hash_size: int = 8) -> Optional[int]:
+    """计算 dHash：缩略图相邻像素的水平梯度符号
+    
+    Args:
+        image: JPEG/PNG 字节数据或 BGR 帧
+        hash_size: 缩略图高度，哈希位数为 hash_size ** 2
+    
+    Returns:
+        int: 哈希值，图像无法解码时返回 None
+    """
+    gray = _to_gray(image)
+    if gray is None:
+        return None
+    thumb = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return _pack_bits(thumb[:, 1:] > thumb[:, :-1])
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """计算两个哈希值的汉明距离"""
+    return (a ^ b).bit_count()
@@ -0,0 +1,233 @@
+# core/vision/preprocess.py
+"""上传前图像预处理
+
+在采集和视觉 API 之间缩小上传体积：
+1. 可选裁剪感兴趣区域（ROI）
+2. 按目标长边等比缩放
+3. 以 JPEG 或 WebP 编码，并可按每帧字节预算自动调节质量
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class PreprocessResult:
+    """预处理结果
+    
+    data 为编码缓冲区的 memoryview（不额外拷贝成 bytes），可直接计算长度、
+    切片或传给 base64/哈希等接受 buffer 协议的函数。
+    """
+    data: Union[bytes, memoryview]
+    mime_type: str
+    width: int
+    height: int
+    quality: int
+    attempts: int
+    within_budget: bool
+    timings: Dict[str, float] = field(default_factory=dict)
+    
+    def to_metadata(self) -> Dict[str, Any]:
+        """转换为 ActionResult.metadata 中使用的字典"""
+        return {
+            "output_bytes": len(self.data),
+            "mime_type": self.mime_type,
+            "width": self.width,
+            "height": self.height,
+            "quality": self.quality,
+            "encode_attempts": self.attempts,
+            "within_budget": self.within_budget,
+            "timings_ms": dict(self.timings),
+        }
+
+
+class ImagePreprocessor:
+    """自适应图像预处理流水线"""
+    
+    FORMATS = {
+        "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, "image/jpeg"),
+        "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, "image/webp"),
+    }
+    
+    def __init__(
+        self,
+        max_long_edge: Optional[int] = 1280,
+        roi: Optional[Tuple[float, float, float, float]] = None,
+        image_format: str = "jpeg",
+        quality: int = 85,
+        byte_budget: Optional[int] = None,
+        min_quality: int = 30,
+        max_attempts: int = 6,
+        max_downscale_steps: int = 3,
+        downscale_factor: float = 0.75
+    ):
+        """初始化预处理流水线
+        
+        Args:
+            max_long_edge: 输出图像长边上限（像素），为 None 时不缩放
+            roi: 感兴趣区域 (x, y, w, h)，取值为相对原图的 0-1 比例
+            image_format: 输出格式（jpeg / webp）
+            quality: 编码质量上限
+            byte_budget: 每帧字节预算，为 None 时按固定质量编码
+            min_quality: 自动调节时允许的最低质量
+            max_attempts: 每个尺寸下最多尝试编码次数
+            max_downscale_steps: 最低质量仍超预算时继续缩小的最多次数
+            downscale_factor: 每次继续缩小的比例
+        """
+        if image_format not in self.FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        
+        self.max_long_edge = max_long_edge
+        self.roi = roi
+        self.image_format = image_format
+        self.quality = quality
+        self.byte_budget = byte_budget
+        self.min_quality = min(min_quality, quality)
+        self.max_attempts = max_attempts
+        self.max_downscale_steps = max_downscale_steps
+        self.downscale_factor = downscale_factor
+        
+        # 按画面来源（stream）分别记录：上一帧最终采用的质量（作为下一帧搜索的起点）
+        # 和可复用的缩放输出缓冲区。不同 stream 可在不同线程中并发处理
+        self._last_quality: Dict[str, int] = {}
+        self._resize_buffers: Dict[str, np.ndarray] = {}
+        self.buffer_allocations = 0
+    
+    @property
+    def mime_type(self) -> str:
+        """输出图像的 MIME 类型"""
+        return self.FORMATS[self.image_format][2]
+    
+    def process(self, frame: np.ndarray, stream: str = "default") -> PreprocessResult:
+        """执行裁剪、缩放和编码
+        
+        Args:
+            frame: BGR 原始帧
+            stream: 画面来源标识（如摄像头 ID），同一 stream 不可并发处理
+        
+        Returns:
+            PreprocessResult: 编码结果及各阶段耗时（毫秒）
+        """
+        timings = {}
+        
+        start = time.perf_counter()
+        image = self.crop(frame)
+        timings["crop"] = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        image = self._resize_reuse(image, stream)
+        timings["resize"] = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        data, quality, attempts, image = self._encode_within_budget(image, stream)
+        timings["encode"] = (time.perf_counter() - start) * 1000
+        
+        within_budget = self.byte_budget is None or len(data) <= self.byte_budget
+        height, width = image.shape[:2]
+        return PreprocessResult(
+            data=data,
+            mime_type=self.mime_type,
+            width=width,
+            height=height,
+            quality=quality,
+            attempts=attempts,
+            within_budget=within_budget,
+            timings=timings
+        )
+    
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """按 ROI 裁剪（返回视图，不拷贝像素）"""
+        if self.roi is None:
+            return frame
+        height, width = frame.shape[:2]
+        x, y, w, h = self.roi
+        x0 = int(round(x * width))
+        y0 = int(round(y * height))
+        x1 = min(width, x0 + max(1, int(round(w * width))))
+        y1 = min(height, y0 + max(1, int(round(h * height))))
+        return frame[y0:y1, x0:x1]
+    
+    def resize(self, image: np.ndarray, long_edge: Optional[int] = None) -> np.ndarray:
+        """等比缩放到目标长边，不放大"""
+        long_edge = long_edge or self.max_long_edge
+        if not long_edge:
+            return image
+        height, width = image.shape[:2]
+        scale = long_edge / max(height, width)
+        if scale >= 1.0:
+            return image
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    
+    def _resize_reuse(self, image: np.ndarray, stream: str) -> np.ndarray:
+        """按 max_long_edge 缩放到该 stream 复用的输出缓冲区"""
+        if not self.max_long_edge:
+            return image
+        height, width = image.shape[:2]
+        scale = self.max_long_edge / max(height, width)
+        if scale >= 1.0:
+            return image
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        shape = (size[1], size[0]) + image.shape[2:]
+        
+        buffer = self._resize_buffers.get(stream)
+        if buffer is None or buffer.shape != shape or buffer.dtype != image.dtype:
+            buffer = np.empty(shape, dtype=image.dtype)
+            self._resize_buffers[stream] = buffer
+            self.buffer_allocations += 1
+        return cv2.resize(image, size, dst=buffer, interpolation=cv2.INTER_AREA)
+    
+    def encode(self, image: np.ndarray, quality: int) -> memoryview:
+        """按指定质量编码，返回编码缓冲区的 memoryview"""
+        ext, flag, _ = self.FORMATS[self.image_format]
+        ok, buffer = cv2.imencode(ext, image, [flag, int(quality)])
+        if not ok:
+            raise RuntimeError(f"Failed to encode image as {self.image_format}")
+        return memoryview(buffer.reshape(-1))
+    
+    def _encode_within_budget(self, image: np.ndarray, stream: str) -> Tuple[memoryview, int, int, np.ndarray]:
+        """在字节预算内寻找最高质量的编码结果
+        
+        以上一帧的质量为起点二分搜索；最低质量仍超出预算时逐步缩小尺寸。
+        
+        Returns:
+            Tuple: (编码数据, 质量, 编码次数, 最终图像)
+        """
+        if self.byte_budget is None:
+            return self.encode(image, self.quality), self.quality, 1, image
+        
+        attempts = 0
+        smallest = None
+        for _ in range(self.max_downscale_steps + 1):
+            lo, hi = self.min_quality, self.quality
+            probe = min(max(self._last_quality.get(stream, hi), lo), hi)
+            best = None
+            tries = 0
+            while lo <= hi and tries < self.max_attempts:
+                data = self.encode(image, probe)
+                attempts += 1
+                tries += 1
+                if len(data) <= self.byte_budget:
+                    best = (data, probe)
+                    lo = probe + 1
+                else:
+                    if smallest is None or len(data) < len(smallest[0]):
+                        smallest = (data, probe, image)
+                    hi = probe - 1
+                probe = (lo + hi) // 2
+            
+            if best is not None:
+                self._last_quality[stream] = best[1]
+                return best[0], best[1], attempts, image
+            
+            height, width = image.shape[:2]
+            image = self.resize(image, int(max(height, width) * self.downscale_factor))
+        
+        # 已缩到最小仍超预算：返回体积最小的结果
+        self._last_quality[stream] = self.min_quality
+        data, quality, image = smallest
+        return data, quality, attempts, image
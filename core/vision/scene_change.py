@@ -0,0 +1,134 @@
+# core/vision/scene_change.py
+"""场景变化检测
+
+将当前帧缩小为灰度缩略图，与上一次送去分析的帧做向量化差分，
+画面没有明显变化时跳过视觉模型调用
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class SceneChangeDetector:
+    """基于灰度缩略图差分的场景变化检测器"""
+    
+    def __init__(
+        self,
+        threshold: float = 0.02,
+        pixel_threshold: int = 25,
+        size: Tuple[int, int] = (64, 48),
+        normalize_brightness: bool = True,
+        max_reuse_age: float = 300.0
+    ):
+        """初始化检测器
+        
+        Args:
+            threshold: 变化像素占比阈值，超过即认为场景变化
+            pixel_threshold: 单个像素灰度差阈值（0-255）
+            size: 缩略图尺寸 (宽, 高)
+            normalize_brightness: 是否先减去整体亮度均值，抑制自动曝光带来的误判
+            max_reuse_age: 参考帧最长复用时间（秒），超时后强制重新分析
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self.normalize_brightness = normalize_brightness
+        self.max_reuse_age = max_reuse_age
+        
+        self._reference: Optional[np.ndarray] = None
+        self._reference_time = 0.0
+        
+        # 统计计数
+        self.frames_total = 0
+        self.frames_skipped = 0
+    
+    def prepare(self, frame: np.ndarray) -> np.ndarray:
+        """生成用于比较的灰度缩略图
+        
+        Args:
+            frame: BGR 或灰度图像
+            
+        Returns:
+            np.ndarray: int16 灰度缩略图
+        """
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+        if self.normalize_brightness:
+            thumb -= np.int16(thumb.mean())
+        return thumb
+    
+    def score(self, thumb: np.ndarray) -> float:
+        """计算缩略图相对参考帧的变化像素占比
+        
+        Args:
+            thumb: prepare 生成的缩略图
+            
+        Returns:
+            float: 变化像素占比（0-1），没有参考帧时返回 1.0
+        """
+        if self._reference is None or self._reference.shape != thumb.shape:
+            return 1.0
+        changed = np.abs(thumb - self._reference) > self.pixel_threshold
+        return float(np.count_nonzero(changed)) / changed.size
+    
+    def check(self, frame: np.ndarray) -> Tuple[bool, float, np.ndarray]:
+        """判断当前帧相对上一次分析的帧是否发生变化
+        
+        Args:
+            frame: 当前帧
+            
+        Returns:
+            Tuple: (是否变化, 变化得分, 缩略图)
+        """
+        return self._check_thumb(self.prepare(frame))
+    
+    def check_many(self, frames: List[np.ndarray]) -> Tuple[bool, float, np.ndarray]:
+        """多摄像头版本：将各路缩略图横向拼接后整体比较
+        
+        Args:
+            frames: 按固定顺序排列的多路帧
+            
+        Returns:
+            Tuple: (是否变化, 变化得分, 拼接后的缩略图)
+        """
+        return self._check_thumb(np.hstack([self.prepare(frame) for frame in frames]))
+    
+    def _check_thumb(self, thumb: np.ndarray) -> Tuple[bool, float, np.ndarray]:
+        """比较缩略图与参考帧"""
+        self.frames_total += 1
+        change_score = self.score(thumb)
+        
+        expired = time.time() - self._reference_time > self.max_reuse_age
+        changed = change_score > self.threshold or expired
+        return changed, change_score, thumb
+    
+    def update_reference(self, thumb: np.ndarray) -> None:
+        """记录已送去分析的帧作为新的参考帧"""
+        self._reference = thumb
+        self._reference_time = time.time()
+    
+    def reset(self) -> None:
+        """清除参考帧，下一帧必定被视为变化"""
+        self._reference = None
+        self._reference_time = 0.0
+    
+    def mark_skipped(self) -> None:
+        """记录一次复用上次结果、跳过视觉调用的帧"""
+        self.frames_skipped += 1
+    
+    @property
+    def skip_rate(self) -> float:
+        """跳过视觉调用的帧占比"""
+        return self.frames_skipped / self.frames_total if self.frames_total else 0.0
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "frames_total": self.frames_total,
+            "frames_skipped": self.frames_skipped,
+            "skip_rate": self.skip_rate,
+        }
@@ -0,0 +1,15 @@
+# test/conftest.py
+"""测试公共配置"""
+
+import pytest
+import config
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """把告警发件箱和 TTS 缓存的默认路径指向临时目录
+    
+    测试告警不会留在真实发件箱中等待投递，测试音频也不会写入真实缓存目录
+    """
+    monkeypatch.setattr(config, "ALERT_OUTBOX_PATH", str(tmp_path / "state" / "alerts.log"))
+    monkeypatch.setattr(config, "TTS_CACHE_DIR", str(tmp_path / "cache" / "tts"))
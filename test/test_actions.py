@@ -11,8 +11,10 @@ from core.action import (
     WatchAction,
     SpeakAction,
     AlertAction,
+    ListenAction,
 )
 from core.agent import RobotAgent, AgentState
+from core.audio import AudioSink, NullSink
 
 
 class TestActionBase:
@@ -145,6 +147,58 @@ class TestSpeakAction:
         assert result.success
         assert "audio_bytes" in result.output
         assert result.output["text"] == "测试文本"
+    
+    @pytest.mark.asyncio
+    async def test_speak_action_mock_does_not_play(self, monkeypatch):
+        """没有 API key 时模拟数据只写入 NullSink，不送往默认的扬声器输出"""
+        monkeypatch.setattr("config.OPENAI_API_KEY", "")
+        action = SpeakAction()
+        action.initialize({"audio_sink": "device"})
+        
+        result = await action.execute(ActionContext(agent_state=AgentState.IDLE, input_data="测试文本"))
+        
+        assert result.success and action.openai_client is None
+        assert isinstance(action.sink, NullSink)
+        assert action.sink.bytes_written == len(b"mock_audio_data")
+    
+    @pytest.mark.asyncio
+    async def test_speak_action_segments_play_in_order(self):
+        """分句并行合成（不超过并发上限），先合成完的后段也要等前段播放后才播放"""
+        class FakeClient:
+            tts_cache = None
+            active = 0
+            max_active = 0
+            
+            async def tts_completion(self, model, text, voice, speed, priority):
+                FakeClient.active += 1
+                FakeClient.max_active = max(FakeClient.max_active, FakeClient.active)
+                await asyncio.sleep(0.05 if text.startswith("第一") else 0.01)
+                FakeClient.active -= 1
+                return text.encode()
+            
+            def close(self):
+                pass
+        
+        class RecordingSink(AudioSink):
+            def __init__(self):
+                self.chunks = []
+            
+            async def write(self, chunk):
+                self.chunks.append(chunk.decode())
+        
+        sink = RecordingSink()
+        action = SpeakAction()
+        action.initialize({"audio_sink": sink, "streaming": False, "segment_concurrency": 2, "tts_cache": False})
+        action.openai_client = FakeClient()
+        text = "第一段内容较长。第二段内容。第三段内容。第四段内容。"
+        
+        result = await action.execute(ActionContext(agent_state=AgentState.RESPONDING, input_data=text))
+        
+        assert result.success
+        assert result.metadata["segments"] == 4
+        assert sink.chunks == ["第一段内容较长。", "第二段内容。", "第三段内容。", "第四段内容。"]
+        assert FakeClient.max_active == 2
+        assert result.output["audio_bytes"].decode() == text
 
 
 class TestAlertAction:
@@ -188,6 +242,48 @@ class TestAlertAction:
         assert result.output["service_called"]
 
 
+class TestListenAction:
+    """测试 ListenAction"""
+    
+    def test_listen_action_metadata(self):
+        """测试 ListenAction 元信息"""
+        action = ListenAction()
+        metadata = action.get_metadata()
+        
+        assert metadata.name == "listen"
+        assert "vad" in metadata.capabilities
+    
+    @pytest.mark.asyncio
+    async def test_listen_action_voice_commands_queued(self):
+        """识别出的语音指令加入 Agent 的任务队列，执行后记录到共享上下文"""
+        class FakeClient:
+            uploads = []
+            
+            async def asr_completion(self, model, audio, language, filename, priority):
+                FakeClient.uploads.append(audio)
+                return "回到充电桩"
+            
+            def close(self):
+                pass
+        
+        agent = RobotAgent()
+        agent.register_action("listen", ListenAction(), {"audio_source": "synthetic:0.4s,0.8v,0.6s"})
+        agent.actions["listen"].openai_client = FakeClient()
+        
+        result = await agent.execute_action("listen", config_dict={"duration": 1.0})
+        
+        assert result.success
+        assert result.output["text"] == "回到充电桩"
+        assert result.metadata["audio_seconds"] == pytest.approx(1.0)
+        assert len(FakeClient.uploads) == 1 and FakeClient.uploads[0].startswith(b"RIFF")
+        assert [task.name for task in agent.task_queue] == ["voice_command: 回到充电桩"]
+        
+        await agent._process_task_queue()
+        await asyncio.gather(*agent.running_tasks.values())
+        assert agent.shared_context["voice_commands"][0]["text"] == "回到充电桩"
+        agent.stop()
+
+
 class TestRobotAgentActions:
     """测试 RobotAgent 的 Action 机制"""
     
@@ -276,5 +372,97 @@ class TestRobotAgentActions:
         assert agent.shared_context["last_vision_result"] == result.output
 
 
+class TestEarlyAlert:
+    """测试流式视觉结果触发的提前报警"""
+    
+    @pytest.mark.asyncio
+    async def test_alert_started_once(self):
+        """emergency 回调只启动一次 alert，紧急处理复用其结果"""
+        agent = RobotAgent()
+        agent.register_action("alert", AlertAction())
+        early_alert = {}
+        on_emergency = agent._early_alert_callback(early_alert)
+        
+        on_emergency({"emergency": True})
+        on_emergency({"emergency": True, "objects_detected": ["fire"]})
+        task = early_alert["alert"]
+        result = await task
+        
+        assert result.output["event_details"]["early"] is True
+        assert list(early_alert) == ["alert"]
+        agent.unregister_action("alert")
+    
+    @pytest.mark.asyncio
+    async def test_final_analysis_follows_early_alert(self):
+        """紧急处理在提前报警之后补发最终描述和置信度"""
+        agent = RobotAgent()
+        agent.register_action("alert", AlertAction())
+        events = []
+        execute = agent.actions["alert"].execute
+        
+        async def record(context):
+            events.append(context.input_data)
+            return await execute(context)
+        
+        agent.actions["alert"].execute = record
+        early_alert = {}
+        agent._early_alert_callback(early_alert)({"emergency": True})
+        handling = asyncio.create_task(agent._handle_emergency(
+            {"emergency": True, "description": "仓库起火", "confidence": 0.9, "objects_detected": ["fire"]},
+            early_alert["alert"]
+        ))
+        try:
+            for _ in range(100):
+                if len(events) == 2:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            handling.cancel()
+            agent.unregister_action("alert")
+        
+        early, final = events
+        assert early["early"] is True and early["confidence"] == 0.0
+        assert final["description"] == "仓库起火" and final["confidence"] == 0.9
+        assert final["follow_up_of"] == (await early_alert["alert"]).output["alert_id"]
+    
+    @pytest.mark.asyncio
+    async def test_early_alert_settled_without_emergency(self):
+        """最终结果不是紧急情况时等待提前报警完成，不留下未等待的任务"""
+        agent = RobotAgent()
+        agent.register_action("alert", AlertAction())
+        early_alert = {}
+        agent._early_alert_callback(early_alert)({"emergency": True})
+        
+        await agent._handle_analysis_result({"emergency": False}, early_alert["alert"])
+        
+        assert early_alert["alert"].done()
+        assert agent.state == AgentState.IDLE
+        agent.unregister_action("alert")
+    
+    @pytest.mark.asyncio
+    async def test_queued_alert_not_reported_as_called(self, capsys):
+        """告警只进入发件箱、未在等待时间内送达时，不记录为已呼叫应急服务"""
+        agent = RobotAgent()
+        agent.register_action("alert", AlertAction())
+        
+        async def queued(context):
+            return ActionResult(success=True, output={"service_called": False, "queued": True, "alert_id": "a1"})
+        
+        agent.actions["alert"].execute = queued
+        handling = asyncio.create_task(agent._handle_emergency({"emergency": True, "description": "仓库起火"}))
+        try:
+            for _ in range(100):
+                if agent.state == AgentState.RESPONDING:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            handling.cancel()
+            agent.unregister_action("alert")
+        
+        out = capsys.readouterr().out
+        assert "Emergency alert queued in outbox as a1" in out
+        assert "called successfully" not in out
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,198 @@
+# test/test_alert_outbox.py
+"""测试告警发件箱（预写日志、批量投递、重试和重放）"""
+
+import pytest
+import asyncio
+import json
+import time
+from core.action import ActionContext, AlertAction
+from core.agent import AgentState
+from core.alert_outbox import AlertOutbox, OutboxEntry
+from core.mcp.stub_server import StubMcpServer
+
+
+class Receiver:
+    """记录投递的告警，可以让前若干次投递失败"""
+    
+    def __init__(self, fail_batches: int = 0, delay: float = 0.0):
+        self.fail_batches = fail_batches
+        self.delay = delay
+        self.batches = []
+        self.received = {}  # 幂等键 -> 告警
+    
+    async def __call__(self, entries):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail_batches > 0:
+            self.fail_batches -= 1
+            raise ConnectionError("应急中心不可达")
+        self.batches.append(len(entries))
+        for entry in entries:
+            self.received.setdefault(entry.id, entry.event)
+        return [entry.id for entry in entries]
+
+
+def read_log(path):
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f]
+
+
+class TestAlertOutbox:
+    """测试 AlertOutbox"""
+    
+    @pytest.mark.asyncio
+    async def test_append_is_durable_before_delivery(self, tmp_path):
+        """追加返回时记录已写入日志，投递后写入确认记录"""
+        path = tmp_path / "alerts.log"
+        receiver = Receiver()
+        outbox = AlertOutbox(str(path), receiver)
+        try:
+            entry = await outbox.append({"type": "fire"})
+            assert read_log(path)[0] == {"op": "append", "id": entry.id, "created_at": entry.created_at, "event": {"type": "fire"}}
+            assert await outbox.wait_delivered(entry.id, timeout=1.0)
+        finally:
+            await outbox.aclose()
+        
+        assert receiver.received == {entry.id: {"type": "fire"}}
+        assert read_log(path)[-1] == {"op": "ack", "ids": [entry.id]}
+        assert outbox.stats()["pending"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_group_commit(self, tmp_path):
+        """同时追加的告警合并为少数几次 fsync"""
+        outbox = AlertOutbox(str(tmp_path / "alerts.log"), Receiver(fail_batches=1000), retry_base_delay=10.0)
+        try:
+            await asyncio.gather(*(outbox.append({"n": i}) for i in range(200)))
+        finally:
+            await outbox.aclose()
+        
+        assert outbox.appended == 200
+        assert outbox.fsyncs <= 3
+    
+    @pytest.mark.asyncio
+    async def test_retry_with_backoff(self, tmp_path):
+        """投递失败时按退避重试，成功后只确认一次"""
+        receiver = Receiver(fail_batches=2)
+        outbox = AlertOutbox(str(tmp_path / "alerts.log"), receiver, retry_base_delay=0.01)
+        try:
+            entry = await outbox.append({"type": "smoke"})
+            assert await outbox.wait_delivered(entry.id, timeout=2.0)
+        finally:
+            await outbox.aclose()
+        
+        stats = outbox.stats()
+        assert stats["failed_batches"] == 2 and stats["retries"] == 2
+        assert stats["delivered"] == 1 and receiver.batches == [1]
+    
+    @pytest.mark.asyncio
+    async def test_replay_after_crash(self, tmp_path):
+        """进程在投递前退出：重启后重放未确认的告警（幂等键不变），已确认的不再投递"""
+        path = str(tmp_path / "alerts.log")
+        first = Receiver()
+        outbox = AlertOutbox(path, first)
+        delivered = await outbox.append({"n": 0})
+        await outbox.wait_delivered(delivered.id, timeout=1.0)
+        outbox.deliver = Receiver(fail_batches=1000)
+        outbox.retry_base_delay = 10.0
+        lost = [await outbox.append({"n": i}) for i in (1, 2)]
+        await outbox.aclose()
+        # 模拟写了一半的记录
+        with open(path, "ab") as f:
+            f.write(b'{"op":"append","id":"torn"')
+        
+        second = Receiver()
+        replayed = AlertOutbox(path, second)
+        try:
+            assert replayed.replayed == 2
+            assert await replayed.drain(timeout=1.0)
+        finally:
+            await replayed.aclose()
+        
+        assert list(second.received) == [entry.id for entry in lost]
+        assert [record["id"] for record in read_log(path) if record["op"] == "append"] == [entry.id for entry in lost]
+    
+    @pytest.mark.asyncio
+    async def test_compaction(self, tmp_path):
+        """已确认的记录超过阈值后压缩日志"""
+        path = tmp_path / "alerts.log"
+        outbox = AlertOutbox(str(path), Receiver(), compact_bytes=4096, fsync_interval=0.001)
+        try:
+            for i in range(20):
+                await asyncio.gather(*(outbox.append({"n": i, "k": k, "text": "x" * 50}) for k in range(10)))
+                await outbox.drain(timeout=1.0)
+        finally:
+            await outbox.aclose()
+        
+        assert outbox.compactions >= 1
+        assert path.stat().st_size < 4096 * 2
+        assert AlertOutbox(str(path), Receiver()).replayed == 0
+    
+    @pytest.mark.asyncio
+    async def test_burst_throughput_and_latency(self, tmp_path):
+        """10000 条告警突发：全部落盘并恰好投递一次，报告吞吐量和投递延迟"""
+        count = 10000
+        receiver = Receiver(delay=0.002)
+        outbox = AlertOutbox(str(tmp_path / "alerts.log"), receiver, batch_size=200)
+        try:
+            start = time.perf_counter()
+            entries = await asyncio.gather(*(
+                outbox.append({"type": "intrusion", "camera": i % 4, "seq": i}) for i in range(count)
+            ))
+            appended = time.perf_counter() - start
+            assert await outbox.drain(timeout=60.0)
+            elapsed = time.perf_counter() - start
+        finally:
+            await outbox.aclose()
+        
+        stats = outbox.stats()
+        latency = stats["delivery_latency"]
+        print(f"\n[Burst] {count} alerts: appended in {appended:.2f}s ({count / appended:.0f}/s, "
+              f"{stats['fsyncs']} fsyncs), delivered in {elapsed:.2f}s ({count / elapsed:.0f}/s), "
+              f"latency p50={latency['p50_ms']:.0f}ms p95={latency['p95_ms']:.0f}ms p99={latency['p99_ms']:.0f}ms")
+        
+        assert len(receiver.received) == count and sum(receiver.batches) == count
+        assert [receiver.received[e.id]["seq"] for e in entries] == list(range(count))
+        assert stats["fsyncs"] < count / 20
+        assert count / elapsed > 1000
+        assert latency["p99_ms"] < elapsed * 1000
+
+
+class TestAlertActionOutbox:
+    """测试 AlertAction 经发件箱投递"""
+    
+    @pytest.mark.asyncio
+    async def test_alert_survives_outage(self, tmp_path):
+        """应急服务不可达时告警留在发件箱，服务恢复后以相同幂等键投递，重放不会重复派单"""
+        path = str(tmp_path / "alerts.log")
+        async with StubMcpServer() as server:
+            url = server.url
+        
+        action = AlertAction()
+        action.initialize({
+            "mcp_servers": {"dispatch": {"url": url}},
+            "call_timeout": 0.2,
+            "outbox_path": path,
+            "retry_base_delay": 0.05,
+            "delivery_wait": 0.3,
+        })
+        context = ActionContext(agent_state=AgentState.ALERT, input_data={"type": "fire", "description": "仓库起火"})
+        try:
+            queued = await action.execute(context)
+            assert queued.success and queued.output["queued"] and not queued.output["service_called"]
+            
+            # 服务在原端口恢复
+            server = StubMcpServer(port=int(url.rsplit(":", 1)[1].split("/")[0]))
+            async with server:
+                assert await action.outbox.wait_delivered(queued.output["alert_id"], timeout=5.0)
+                # 模拟确认记录丢失后的重放：相同幂等键再次投递
+                redelivered = await action.mcp_manager.deliver_alerts(
+                    [OutboxEntry(queued.output["alert_id"], context.input_data, 0.0)]
+                )
+        finally:
+            await action.outbox.aclose()
+            await action.mcp_manager.aclose()
+            action.cleanup()
+        
+        assert server.dispatched == [{"type": "fire", "description": "仓库起火"}]
+        assert server.duplicates == 1 and redelivered == [queued.output["alert_id"]]
+        assert queued.metadata["outbox"]["pending"] == 1
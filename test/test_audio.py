@@ -0,0 +1,368 @@
+# test/test_audio.py
+"""测试语音播放流水线、音频输出和输入、语音活动检测"""
+
+import pytest
+import asyncio
+import io
+import struct
+import wave
+import numpy as np
+from core.audio import (
+    AudioSink,
+    NullSink,
+    WavFileSink,
+    StreamingPlayback,
+    concat_wav,
+    create_sink,
+    parse_wav_header,
+    split_sentences,
+    SpeechPreempted,
+    SpeechScheduler,
+    EnergyVAD,
+    SpeechSegmenter,
+    SyntheticSpeechSource,
+    WavFileSource,
+    open_audio_source,
+)
+from core.audio.source import SILENCE, SPEECH, AudioSource, parse_synthetic_script
+from core.client.rate_limit import EMERGENCY, ROUTINE
+
+
+def make_wav(frames: int = 1600, sample_rate: int = 16000) -> bytes:
+    """生成 16 位单声道静音 WAV"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\x00\x00" * frames)
+    return buffer.getvalue()
+
+
+class SlowSink(AudioSink):
+    """每块写入耗时固定的输出，模拟实时播放"""
+    
+    def __init__(self, delay: float = 0.02, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.chunks = []
+    
+    async def write(self, chunk: bytes) -> None:
+        if self.fail:
+            raise OSError("device unplugged")
+        await asyncio.sleep(self.delay)
+        self.chunks.append(chunk)
+
+
+class TestAudioSink:
+    """测试音频输出"""
+    
+    def test_parse_wav_header(self):
+        """解析采样格式，数据不足或不是 WAV 时返回 None"""
+        audio = make_wav(sample_rate=24000)
+        
+        assert parse_wav_header(audio) == (1, 2, 24000, 44)
+        assert parse_wav_header(audio[:30]) is None
+        assert parse_wav_header(b"mock_audio_data") is None
+    
+    @pytest.mark.asyncio
+    async def test_wav_file_sink_fixes_streamed_sizes(self, tmp_path):
+        """流式 WAV 头中的占位长度在写完后按实际长度修正"""
+        audio = bytearray(make_wav(frames=800))
+        struct.pack_into("<I", audio, 4, 0xFFFFFFFF)
+        struct.pack_into("<I", audio, 40, 0xFFFFFFFF)
+        sink = WavFileSink(str(tmp_path))
+        
+        for _ in range(2):
+            await sink.open()
+            for i in range(0, len(audio), 100):
+                await sink.write(bytes(audio[i:i + 100]))
+            await sink.close()
+        
+        assert len(sink.paths) == 2
+        with wave.open(sink.paths[1]) as wav:
+            assert wav.getnframes() == 800
+    
+    def test_concat_wav(self):
+        """拼接多段 WAV 时只保留第一段的头，长度字段按总长度修正"""
+        audio = concat_wav([make_wav(frames=100), b"", make_wav(frames=300)])
+        
+        with wave.open(io.BytesIO(audio)) as wav:
+            assert wav.getnframes() == 400
+    
+    def test_create_sink(self, tmp_path):
+        """按名称创建输出，未知名称报错"""
+        assert isinstance(create_sink("null"), NullSink)
+        assert isinstance(create_sink("wav", str(tmp_path)), WavFileSink)
+        with pytest.raises(ValueError):
+            create_sink("speaker")
+
+
+class TestStreamingPlayback:
+    """测试边合成边播放"""
+    
+    @pytest.mark.asyncio
+    async def test_playback_starts_with_first_chunk(self):
+        """第一块到达即开始播放，不等待合成结束"""
+        sink = SlowSink(delay=0.0)
+        async with StreamingPlayback(sink) as playback:
+            await playback.feed(b"first")
+            await asyncio.sleep(0.01)
+            played_before_end = list(sink.chunks)
+            await asyncio.sleep(0.1)
+            await playback.feed(b"second")
+        
+        assert played_before_end == [b"first"]
+        assert playback.stats.time_to_first_audio < 0.05
+        assert playback.stats.elapsed >= 0.1
+        assert (playback.stats.chunks, playback.stats.bytes) == (2, 11)
+    
+    @pytest.mark.asyncio
+    async def test_bounded_queue_backpressure(self):
+        """播放跟不上时合成端等待，积压不超过队列容量"""
+        sink = SlowSink(delay=0.01)
+        async with StreamingPlayback(sink, max_queued_chunks=2) as playback:
+            for i in range(10):
+                await playback.feed(bytes([i]))
+        
+        assert len(sink.chunks) == 10
+        assert playback.stats.max_queue_depth <= 2
+        assert playback.stats.elapsed >= 0.1
+    
+    @pytest.mark.asyncio
+    async def test_sink_failure_does_not_block_synthesis(self):
+        """输出失败时丢弃音频并记录原因，合成端不会被阻塞"""
+        async with StreamingPlayback(SlowSink(fail=True), max_queued_chunks=1) as playback:
+            for i in range(5):
+                await asyncio.wait_for(playback.feed(b"x"), timeout=1.0)
+        
+        assert playback.stats.error == "device unplugged"
+        assert playback.stats.chunks == 0
+    
+    @pytest.mark.asyncio
+    async def test_abort_on_error(self):
+        """合成出错时丢弃未播放的音频并关闭输出"""
+        sink = SlowSink(delay=1.0)
+        with pytest.raises(RuntimeError):
+            async with StreamingPlayback(sink) as playback:
+                await playback.feed(b"x")
+                raise RuntimeError("synthesis failed")
+        
+        assert sink.chunks == []
+        assert playback.stats.elapsed < 0.5
+
+
+class TestSplitSentences:
+    """测试播报文本分句"""
+    
+    def test_chinese_and_english_boundaries(self):
+        """按中英文句末标点切分，小数点和引号不会被切开"""
+        text = "走廊出现明火。请立即撤离！温度已达 38.5 度？Fire detected. Please leave now!"
+        
+        assert split_sentences(text) == [
+            "走廊出现明火。", "请立即撤离！", "温度已达 38.5 度？", "Fire detected.", "Please leave now!"
+        ]
+        assert split_sentences("他说：“快跑！”然后离开了。") == ["他说：“快跑！”", "然后离开了。"]
+    
+    def test_merge_short_and_split_long(self):
+        """过短的片段并入相邻片段，过长的句子按逗号切分"""
+        assert split_sentences("好。走廊出现明火。好的") == ["好。走廊出现明火。好的"]
+        
+        long = "，".join(["前方区域检测到烟雾"] * 6) + "。"
+        segments = split_sentences(long, max_chars=25)
+        assert len(segments) == 3
+        assert all(len(segment) <= 25 for segment in segments)
+        assert "".join(segments) == long
+    
+    def test_single_sentence(self):
+        """没有句末标点时整段作为一个片段"""
+        assert split_sentences("巡检开始") == ["巡检开始"]
+        assert split_sentences("  ") == []
+
+
+class TestSpeechScheduler:
+    """测试播报调度"""
+    
+    @staticmethod
+    def make_scheduler(delay: float = 0.05, **kwargs):
+        spoken = []
+        
+        async def speak(request):
+            await asyncio.sleep(delay)
+            spoken.append(request.text)
+            return request.text
+        
+        return SpeechScheduler(speak, **kwargs), spoken
+    
+    @pytest.mark.asyncio
+    async def test_priority_lanes(self):
+        """一次只播放一条，紧急播报排在日常播报之前，同一优先级先进先出"""
+        scheduler, spoken = self.make_scheduler()
+        futures = [
+            scheduler.submit("紧急一", EMERGENCY),
+            scheduler.submit("日常一", ROUTINE),
+            scheduler.submit("日常二", ROUTINE),
+            scheduler.submit("紧急二", EMERGENCY),
+        ]
+        await asyncio.sleep(0)
+        depth = scheduler.depth
+        
+        assert await asyncio.gather(*futures) == ["紧急一", "日常一", "日常二", "紧急二"]
+        assert spoken == ["紧急一", "紧急二", "日常一", "日常二"]
+        assert depth == {EMERGENCY: 1, ROUTINE: 2}
+        assert scheduler.stats()["max_wait"] >= 0.1
+        scheduler.close()
+    
+    @pytest.mark.asyncio
+    async def test_emergency_preempts_routine(self):
+        """紧急播报打断正在播放的日常播报，被打断的不再补播"""
+        scheduler, spoken = self.make_scheduler(delay=0.2)
+        routine = scheduler.submit("巡检中", ROUTINE)
+        await asyncio.sleep(0.01)
+        start = asyncio.get_running_loop().time()
+        emergency = await scheduler.speak_now("起火了", EMERGENCY)
+        
+        assert emergency == "起火了"
+        assert asyncio.get_running_loop().time() - start < 0.3
+        with pytest.raises(SpeechPreempted):
+            routine.result()
+        assert spoken == ["起火了"]
+        assert scheduler.stats()["preempted"] == 1
+        scheduler.close()
+    
+    @pytest.mark.asyncio
+    async def test_duplicate_suppression(self):
+        """窗口时间内重复的文本被抑制，更高优先级或窗口过后不抑制"""
+        now = [0.0]
+        scheduler, spoken = self.make_scheduler(delay=0.0, dedup_window=10.0, clock=lambda: now[0])
+        first = scheduler.submit("请离开", ROUTINE)
+        
+        assert scheduler.submit("请离开", ROUTINE) is first
+        await first
+        assert scheduler.submit("请离开", ROUTINE) is first
+        urgent = scheduler.submit("请离开", EMERGENCY)
+        now[0] = 11.0
+        later = scheduler.submit("请离开", EMERGENCY)
+        await asyncio.gather(urgent, later)
+        
+        assert spoken == ["请离开"] * 3
+        assert scheduler.stats()["suppressed"] == 2
+        scheduler.close()
+    
+    @pytest.mark.asyncio
+    async def test_close_cancels_pending(self):
+        """停止调度时未播放的播报被取消"""
+        scheduler, spoken = self.make_scheduler(delay=1.0)
+        current = scheduler.submit("一", ROUTINE)
+        pending = scheduler.submit("二", ROUTINE)
+        await asyncio.sleep(0.01)
+        scheduler.close()
+        await asyncio.sleep(0)
+        
+        assert current.cancelled() and pending.cancelled()
+        assert spoken == []
+
+
+class TestVoiceActivityDetection:
+    """测试音频输入和语音活动检测"""
+    
+    @staticmethod
+    async def segment_all(source, block: int = 1600):
+        segmenter = SpeechSegmenter(EnergyVAD(source.sample_rate))
+        segments = []
+        while True:
+            samples = await source.read(block)
+            if samples is None:
+                break
+            segments.extend(segmenter.feed(samples))
+        segments.extend(segmenter.flush())
+        return segmenter, segments
+    
+    def test_parse_synthetic_script(self):
+        """synthetic 描述解析为静音/语音片段"""
+        assert parse_synthetic_script("0.5s, 1.2v,0.8s") == [(SILENCE, 0.5), (SPEECH, 1.2), (SILENCE, 0.8)]
+        with pytest.raises(ValueError):
+            parse_synthetic_script("1.0x")
+        with pytest.raises(ValueError):
+            open_audio_source("tape:1")
+    
+    def test_vad_frame_decisions(self):
+        """语音帧判为语音，背景噪声帧判为静音"""
+        source = SyntheticSpeechSource([(SILENCE, 0.6), (SPEECH, 0.6)])
+        vad = EnergyVAD(16000, frame_ms=30)
+        count = len(source.samples) // vad.frame_size
+        frames = source.samples[:count * vad.frame_size].reshape(count, vad.frame_size)
+        speech = vad.features(frames).speech
+        
+        half = count // 2
+        assert not speech[:half - 1].any()
+        assert speech[half + 1:].mean() > 0.9
+    
+    @pytest.mark.asyncio
+    async def test_segments_match_speech_intervals(self):
+        """逐块输入时切出的片段与脚本中的语音段对齐（误差在前导缓冲和一块之内）"""
+        source = open_audio_source("synthetic:0.5s,1.0v,0.8s,1.2v,0.6s")
+        segmenter, segments = await self.segment_all(source)
+        
+        assert len(segments) == 2
+        for segment, (start, end) in zip(segments, source.speech_intervals):
+            assert segment.start == pytest.approx(start, abs=0.2)
+            assert segment.end == pytest.approx(end, abs=0.2)
+            assert segment.duration == pytest.approx(segment.end - segment.start)
+        speech_seconds = sum(segment.duration for segment in segments)
+        assert speech_seconds < 0.7 * source.position
+        assert segmenter.stats()["segments"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_short_clicks_dropped(self):
+        """短于最短语音时长的声音不产出片段"""
+        source = SyntheticSpeechSource([(SILENCE, 0.5), (SPEECH, 0.06), (SILENCE, 0.8)])
+        segmenter, segments = await self.segment_all(source)
+        
+        assert segments == []
+        assert segmenter.stats()["dropped"] == 1
+    
+    def test_long_speech_truncated(self):
+        """超过最长时长的语音被强制切断"""
+        source = SyntheticSpeechSource([(SPEECH, 2.5), (SILENCE, 0.5)])
+        segmenter = SpeechSegmenter(EnergyVAD(16000), max_segment_s=1.0)
+        segments = segmenter.feed(source.samples) + segmenter.flush()
+        
+        assert [segment.truncated for segment in segments][:2] == [True, True]
+        assert all(segment.duration <= 1.0 for segment in segments)
+    
+    @pytest.mark.asyncio
+    async def test_wav_file_source_round_trip(self, tmp_path):
+        """语音片段编码的 WAV 可以作为文件输入读回"""
+        source = SyntheticSpeechSource([(SILENCE, 0.3), (SPEECH, 0.8), (SILENCE, 0.5)])
+        _, segments = await self.segment_all(source)
+        path = tmp_path / "speech.wav"
+        path.write_bytes(segments[0].to_wav())
+        
+        wav_source = WavFileSource(str(path))
+        try:
+            chunks = []
+            while (samples := await wav_source.read(4000)) is not None:
+                chunks.append(samples)
+        finally:
+            wav_source.close()
+        
+        assert np.array_equal(np.concatenate(chunks), segments[0].samples)
+        assert wav_source.position == pytest.approx(segments[0].duration)
+    
+    def test_wav_file_source_rejects_24_bit(self, tmp_path):
+        """不支持的采样位宽在打开时报错，而不是读出噪声"""
+        path = tmp_path / "24bit.wav"
+        with wave.open(str(path), "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(3)
+            f.setframerate(16000)
+            f.writeframes(b"\x00" * 3 * 160)
+        
+        with pytest.raises(ValueError, match="24 bits"):
+            WavFileSource(str(path))
+    
+    def test_audio_source_is_abstract(self):
+        """音频源基类不能直接实例化，子类须实现 _read"""
+        with pytest.raises(TypeError):
+            AudioSource()
@@ -2,7 +2,10 @@
 import pytest
 from unittest.mock import patch, Mock
 import asyncio
+import time
+import numpy as np
 from core.camera import CameraSensor
+from core.camera_group import CameraGroup
 
 @patch('core.camera.cv2')
 def test_camera_initialization(mock_cv2):
@@ -40,4 +43,110 @@ async def test_capture_image_failure(mock_cv2):
     camera = CameraSensor()
     result = await camera.capture_image()
     
-    assert result is None
\ No newline at end of file
+    assert result is None
+
+class _FakeCapture:
+    """模拟持续出帧的摄像头设备"""
+    
+    def __init__(self, shape=(48, 64, 3)):
+        self.shape = shape
+        self.count = 0
+    
+    def isOpened(self):
+        return True
+    
+    def read(self, image=None):
+        time.sleep(0.001)
+        self.count += 1
+        if image is None:
+            image = np.empty(self.shape, dtype=np.uint8)
+        image[...] = self.count % 256
+        return True, image
+    
+    def release(self):
+        pass
+
+@pytest.mark.asyncio
+@patch('core.camera.cv2')
+async def test_continuous_capture_returns_latest_frame(mock_cv2):
+    """测试连续模式从环形缓冲区获取最新帧"""
+    fake_cap = _FakeCapture()
+    mock_cv2.VideoCapture.return_value = fake_cap
+    
+    camera = CameraSensor(continuous=True, buffer_size=3)
+    try:
+        frame = await camera.capture_frame()
+        assert frame is not None
+        assert frame.shape == fake_cap.shape
+        
+        # 等待采集线程继续写入，最新帧应当比首帧更新
+        await asyncio.sleep(0.05)
+        newer, timestamp = camera.get_latest_frame()
+        assert newer[0, 0, 0] != frame[0, 0, 0]
+        
+        # 传入可复用数组时直接写入，不再分配
+        reused = await camera.capture_frame(out=frame)
+        assert reused is frame
+        assert timestamp > 0
+        assert camera.frame_age is not None and camera.frame_age < 1.0
+        
+        stats = camera.stats()
+        assert stats["running"]
+        assert stats["frames_captured"] > 1
+        assert stats["frames_dropped"] > 0
+        assert 0 < stats["frames_read"] <= 3
+        # 只打开一次设备，不会每次采集都走线程池重新读取
+        mock_cv2.VideoCapture.assert_called_once()
+    finally:
+        camera.stop()
+    
+    assert not camera.is_running
+
+@pytest.mark.asyncio
+@patch('core.camera.cv2')
+async def test_continuous_capture_device_unavailable(mock_cv2):
+    """测试连续模式下设备无法打开"""
+    mock_cap = Mock()
+    mock_cap.isOpened.return_value = False
+    mock_cv2.VideoCapture.return_value = mock_cap
+    
+    camera = CameraSensor(continuous=True)
+    result = await camera.capture_image()
+    
+    assert result is None
+    camera.stop()
+
+@pytest.mark.asyncio
+@patch('core.camera.cv2')
+async def test_camera_group_aligned_capture(mock_cv2):
+    """测试多摄像头连续模式下并发采集并按时间戳对齐"""
+    mock_cv2.VideoCapture.side_effect = lambda device: _FakeCapture()
+    
+    group = CameraGroup({"front": 0, "left": 1, "right": 2}, continuous=True)
+    try:
+        frames = await group.capture_frames()
+        
+        assert [f.camera_id for f in frames] == ["front", "left", "right"]
+        assert all(f.frame.shape == (48, 64, 3) for f in frames)
+        assert group.last_skew < 0.05
+        assert group.last_missing == []
+        assert mock_cv2.VideoCapture.call_count == 3
+    finally:
+        group.stop()
+
+@pytest.mark.asyncio
+@patch('core.camera.cv2')
+async def test_camera_group_partial_failure(mock_cv2):
+    """测试部分摄像头失败时返回其余画面"""
+    def open_device(device):
+        cap = _FakeCapture()
+        if device == 1:
+            cap.isOpened = lambda: False
+        return cap
+    mock_cv2.VideoCapture.side_effect = open_device
+    
+    group = CameraGroup([0, 1])
+    frames = await group.capture_frames()
+    
+    assert [f.camera_id for f in frames] == ["cam0"]
+    assert group.last_missing == ["cam1"]
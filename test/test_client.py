@@ -0,0 +1,1135 @@
+# test/test_client.py
+"""测试 API 客户端组件"""
+
+import pytest
+import asyncio
+import time
+import json
+import base64
+import cv2
+import httpx
+import openai
+from types import SimpleNamespace
+import numpy as np
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from core.client import OpenAIClient, VisionResultCache, ClientRegistry
+from core.client.payload import PayloadBufferPool
+from core.client.json_stream import IncrementalJSONParser
+from core.client.rate_limit import EMERGENCY, ModelGovernor, parse_retry_after
+from core.client.hedging import Endpoint, HedgedRouter, LatencyHistogram
+from core.client.json_extract import ParseStats, extract_json
+from core.client.usage import UsageTracker, usage_scope
+from core.client.circuit_breaker import CircuitBreaker, CircuitOpenError, is_endpoint_failure
+from core.client.tts_cache import TTSAudioCache
+from core.vision import difference_hash, hamming_distance
+
+
+def make_scene(seed: int = 0, noise: int = 0) -> bytes:
+    """生成带纹理的测试画面并编码为 JPEG"""
+    rng = np.random.default_rng(seed)
+    frame = cv2.resize(
+        rng.integers(0, 255, (6, 8, 3), dtype=np.uint8), (320, 240), interpolation=cv2.INTER_LINEAR
+    )
+    if noise:
+        jitter = np.random.default_rng(seed + 1000).integers(-noise, noise, frame.shape)
+        frame = np.clip(frame.astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+    _, buffer = cv2.imencode('.jpg', frame)
+    return buffer.tobytes()
+
+
+def make_completion(content: str):
+    """构造 chat.completions.create 的返回值"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=None
+    )
+
+
+class TestPerceptualHash:
+    """测试感知哈希"""
+    
+    def test_similar_images_close(self):
+        """带噪声的同一画面哈希距离很小"""
+        a = difference_hash(make_scene(1))
+        b = difference_hash(make_scene(1, noise=6))
+        
+        assert hamming_distance(a, b) <= 4
+    
+    def test_different_images_far(self):
+        """不同画面哈希距离较大"""
+        a = difference_hash(make_scene(1))
+        b = difference_hash(make_scene(2))
+        
+        assert hamming_distance(a, b) > 10
+    
+    def test_undecodable_image(self):
+        """无法解码的数据返回 None"""
+        assert difference_hash(b"not an image") is None
+
+
+class TestVisionResultCache:
+    """测试视觉结果缓存"""
+    
+    def test_hit_within_tolerance(self):
+        """相近画面命中，不同提示词不命中"""
+        cache = VisionResultCache(max_distance=4)
+        cache.put("vl", "prompt", cache.hash_image(make_scene(1)), {"emergency": False})
+        
+        assert cache.get("vl", "prompt", cache.hash_image(make_scene(1, noise=6))) == {"emergency": False}
+        assert cache.get("vl", "other prompt", cache.hash_image(make_scene(1))) is None
+        assert cache.get("vl", "prompt", cache.hash_image(make_scene(2))) is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+    
+    def test_ttl_expiry(self):
+        """记录过期后不再命中"""
+        cache = VisionResultCache()
+        cache.put("vl", "p", 0b1010, {"a": 1}, ttl=0.01)
+        time.sleep(0.02)
+        
+        assert cache.get("vl", "p", 0b1010) is None
+        assert cache.stats()["expirations"] == 1
+        assert len(cache) == 0
+    
+    def test_negative_results_expire_sooner(self):
+        """未发现紧急情况的结果只短时间有效，紧急结果按默认 TTL 保留"""
+        cache = VisionResultCache(ttl=600.0, negative_ttl=0.01, max_distance=0)
+        cache.put("vl", "p", 1, {"emergency": False})
+        cache.put("vl", "p", 2, {"emergency": True})
+        time.sleep(0.02)
+        
+        assert cache.get("vl", "p", 1) is None
+        assert cache.get("vl", "p", 2) == {"emergency": True}
+    
+    def test_lru_eviction_by_bytes(self):
+        """超出字节上限时淘汰最久未使用的记录"""
+        cache = VisionResultCache(max_bytes=60, max_distance=0)
+        cache.put("vl", "p", 1, {"description": "a" * 10})
+        cache.put("vl", "p", 2, {"description": "b" * 10})
+        cache.get("vl", "p", 1)
+        cache.put("vl", "p", 4, {"description": "c" * 10})
+        
+        assert cache.get("vl", "p", 1) is not None
+        assert cache.get("vl", "p", 2) is None
+        assert cache.stats()["evictions"] == 1
+        assert cache.total_bytes <= 60
+    
+    def test_persistence_roundtrip(self, tmp_path):
+        """保存后重新加载可以直接命中"""
+        path = str(tmp_path / "vision_cache.json")
+        cache = VisionResultCache(persist_path=path)
+        cache.put("vl", "p", 12345, {"description": "走廊"})
+        cache.save()
+        
+        restored = VisionResultCache(persist_path=path)
+        
+        assert restored.get("vl", "p", 12345) == {"description": "走廊"}
+
+
+class TestOpenAIClientVisionCache:
+    """测试 OpenAIClient 接入视觉缓存"""
+    
+    @pytest.mark.asyncio
+    async def test_vision_completion_uses_cache(self):
+        """相近画面第二次调用直接命中缓存"""
+        client = OpenAIClient(api_key="test", vision_cache=VisionResultCache())
+        client.client.chat.completions.create = AsyncMock(
+            return_value=make_completion('{"emergency": false, "description": "走廊"}')
+        )
+        
+        first = await client.vision_completion(model="vl", image=make_scene(3), prompt="p")
+        second = await client.vision_completion(model="vl", image=make_scene(3, noise=6), prompt="p")
+        
+        assert first == second == {"emergency": False, "description": "走廊"}
+        assert client.client.chat.completions.create.await_count == 1
+        assert client.vision_cache.stats()["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_emergency_priority_skips_cache(self):
+        """紧急优先级的请求不复用缓存中的旧结论"""
+        client = OpenAIClient(api_key="test", vision_cache=VisionResultCache())
+        client.client.chat.completions.create = AsyncMock(side_effect=[
+            make_completion('{"emergency": false, "description": "走廊"}'),
+            make_completion('{"emergency": true, "description": "角落起火"}'),
+        ])
+        
+        await client.vision_completion(model="vl", image=make_scene(3), prompt="p")
+        result = await client.vision_completion(model="vl", image=make_scene(3, noise=6), prompt="p", priority=EMERGENCY)
+        
+        assert result["emergency"] is True
+        assert client.client.chat.completions.create.await_count == 2
+        assert client.vision_cache.stats()["hits"] == 0
+
+
+class TestVisionPayload:
+    """测试零拷贝视觉请求体"""
+    
+    def test_body_is_valid_json(self):
+        """请求体是合法 JSON，图像数据可还原"""
+        image = make_scene(4)
+        pool = PayloadBufferPool()
+        payload = pool.build_vision_body(
+            "vl", [memoryview(image), b"xyz"], ["image/jpeg", "image/webp"], "提示\"词\"", {"max_tokens": 10}
+        )
+        
+        body = json.loads(bytes(payload.view))
+        content = body["messages"][0]["content"]
+        
+        assert body["model"] == "vl"
+        assert body["max_tokens"] == 10
+        assert base64.b64decode(content[0]["image_url"]["url"].split(",", 1)[1]) == image
+        assert content[1]["image_url"]["url"] == "data:image/webp;base64,eHl6"
+        assert content[2] == {"type": "text", "text": "提示\"词\""}
+        payload.release()
+    
+    def test_buffer_reused_across_cycles(self):
+        """稳态下缓冲区只分配一次"""
+        pool = PayloadBufferPool()
+        for seed in range(5):
+            payload = pool.build_vision_body("vl", [make_scene(seed)], ["image/jpeg"], "p", {})
+            payload.release()
+        
+        assert pool.buffer_allocations == 1
+    
+    @pytest.mark.asyncio
+    async def test_zero_copy_vision_completion(self):
+        """零拷贝模式直接通过 httpx 发送请求体"""
+        seen = {}
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen["body"] = json.loads(request.content)
+            seen["auth"] = request.headers["Authorization"]
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": '{"emergency": true}'}}]
+            })
+        
+        client = OpenAIClient(api_key="test-key", base_url="http://stub/v1", zero_copy=True)
+        client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        result = await client.vision_completion(model="vl", image=memoryview(make_scene(5)), prompt="p")
+        
+        assert result == {"emergency": True}
+        assert seen["auth"] == "Bearer test-key"
+        assert seen["body"]["messages"][0]["content"][1]["text"] == "p"
+        assert client.payload_pool.buffer_allocations == 1
+
+
+
+async def start_http_stub():
+    """启动只返回 404 的 keep-alive HTTP 服务，记录建立的连接数"""
+    connections = []
+    
+    async def handle(reader, writer):
+        connections.append(writer)
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                if not request:
+                    break
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/v1", connections
+
+
+class TestClientRegistry:
+    """测试共享客户端注册表"""
+    
+    @pytest.mark.asyncio
+    async def test_clients_share_pool_per_endpoint(self):
+        """同一 (base_url, api_key) 共用连接池，最后一个使用者归还时关闭"""
+        registry = ClientRegistry()
+        watch = OpenAIClient(api_key="k1", base_url="http://stub/v1", registry=registry)
+        speak = OpenAIClient(api_key="k1", base_url="http://stub/v1/", registry=registry, timeout=5)
+        other = OpenAIClient(api_key="k2", base_url="http://stub/v1", registry=registry)
+        
+        assert watch.http_client is speak.http_client
+        assert watch.http_client is not other.http_client
+        assert speak.client.timeout == 5
+        assert len(registry) == 2
+        
+        http_client = watch.http_client
+        watch.close()
+        assert not http_client.is_closed
+        speak.close()
+        await asyncio.sleep(0)
+        assert http_client.is_closed
+        assert registry.stats()["closed"] == 1
+        
+        await other.aclose()
+        await asyncio.sleep(0)
+        assert len(registry) == 0
+    
+    @pytest.mark.asyncio
+    async def test_warm_up_keeps_connection_alive(self):
+        """预热建立的连接被后续请求复用"""
+        server, base_url, connections = await start_http_stub()
+        registry = ClientRegistry(keepalive_expiry=30.0)
+        client = OpenAIClient(api_key="k", base_url=base_url, registry=registry)
+        
+        try:
+            timings = await registry.warm_up()
+            await client.http_client.get(base_url + "/models")
+            
+            assert timings[base_url] is not None
+            assert len(connections) == 1
+        finally:
+            await client.aclose()
+            await asyncio.sleep(0)
+            server.close()
+    
+    @pytest.mark.asyncio
+    async def test_warm_up_failure_reported(self):
+        """端点不可达时预热返回 None，不抛出异常"""
+        registry = ClientRegistry()
+        registry.acquire("k", "http://127.0.0.1:9/v1")
+        
+        timings = await registry.warm_up()
+        await registry.aclose()
+        
+        assert timings == {"http://127.0.0.1:9/v1": None}
+    
+    @pytest.mark.asyncio
+    async def test_close_without_registry(self):
+        """未使用注册表时 close 关闭自身的连接池"""
+        client = OpenAIClient(api_key="k", base_url="http://stub/v1", zero_copy=True)
+        http_client = client.http_client
+        
+        await client.aclose()
+        
+        assert http_client.is_closed
+
+
+class TestIncrementalJSONParser:
+    """测试增量 JSON 解析"""
+    
+    def test_fields_emitted_as_they_complete(self):
+        """逐字符输入时，每个字段在其结束符到达时解析出来"""
+        text = '```json\n{"emergency": true, "objects_detected": ["a,b", {"x": "}"}], "description": "引号\\"和{括号"}\n```'
+        parser = IncrementalJSONParser()
+        events = []
+        for i, c in enumerate(text):
+            for key, value in parser.feed(c):
+                events.append((key, value, i))
+        
+        assert [e[0] for e in events] == ["emergency", "objects_detected", "description"]
+        assert events[0][1] is True
+        assert events[0][2] == text.index(', "objects')
+        assert events[1][1] == ["a,b", {"x": "}"}]
+        assert events[2][1] == '引号"和{括号'
+        assert parser.done
+    
+    def test_incomplete_object(self):
+        """未结束的对象只返回已完整的字段"""
+        parser = IncrementalJSONParser()
+        
+        assert parser.feed('{"emergency": false, "descr') == [("emergency", False)]
+        assert not parser.done
+
+
+def make_stream_chunk(text):
+    """构造 SDK 流式响应块"""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class TestVisionStreaming:
+    """测试流式视觉结果"""
+    
+    @pytest.mark.asyncio
+    async def test_sdk_stream_reports_emergency_early(self):
+        """emergency 字段在描述生成完成之前回调"""
+        pieces = ['{"emergency": tr', 'ue, "description": "', '起火', '"}']
+        seen = []
+        
+        async def fake_stream():
+            for i, piece in enumerate(pieces):
+                seen.append(("chunk", i))
+                yield make_stream_chunk(piece)
+        
+        client = OpenAIClient(api_key="test-key")
+        client.client.chat.completions.create = AsyncMock(return_value=fake_stream())
+        
+        async def on_field(key, value):
+            seen.append((key, value))
+        
+        result = await client.vision_completion(model="vl", image=b"img", prompt="p", on_field=on_field)
+        
+        assert result == {"emergency": True, "description": "起火"}
+        assert seen.index(("emergency", True)) < seen.index(("chunk", 2))
+        assert client.client.chat.completions.create.call_args.kwargs["stream"] is True
+    
+    @pytest.mark.asyncio
+    async def test_zero_copy_sse_stream(self):
+        """零拷贝模式解析 SSE 流"""
+        events = [
+            {"choices": [{"delta": {"content": '{"emergency": false,'}}]},
+            {"choices": [{"delta": {"content": ' "confidence": 0.8}'}}]},
+        ]
+        body = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+        requests = []
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(json.loads(request.content))
+            return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+        
+        client = OpenAIClient(api_key="test-key", base_url="http://stub/v1", zero_copy=True)
+        client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        fields = []
+        
+        result = await client.vision_completion(
+            model="vl", image=b"img", prompt="p", on_field=lambda k, v: fields.append(k)
+        )
+        
+        assert result == {"emergency": False, "confidence": 0.8}
+        assert fields == ["emergency", "confidence"]
+        assert requests[0]["stream"] is True
+
+
+def delayed(value, delay: float = 0.05):
+    """构造延迟返回的 AsyncMock"""
+    async def respond(*args, **kwargs):
+        await asyncio.sleep(delay)
+        return value
+    return AsyncMock(side_effect=respond)
+
+
+class TestSingleFlight:
+    """测试进行中请求的合并"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_chat_sends_once(self):
+        """并发的相同对话请求只发送一次，参数不同的请求各自发送"""
+        client = OpenAIClient(api_key="test-key")
+        client.client.chat.completions.create = delayed(make_completion("ok"))
+        messages = [{"role": "user", "content": "hi"}]
+        
+        results = await asyncio.gather(
+            *(client.chat_completion(model="max", messages=messages) for _ in range(5)),
+            client.chat_completion(model="max", messages=messages, temperature=0.1)
+        )
+        
+        assert results == ["ok"] * 6
+        assert client.client.chat.completions.create.await_count == 2
+        stats = client.coalescing_stats()
+        assert stats["coalesced"] == 4
+        assert stats["coalescing_rate"] == pytest.approx(4 / 6)
+        assert stats["in_flight"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_vision_followers_get_independent_copies(self):
+        """加入进行中视觉请求的调用方拿到独立副本，并收到字段回调"""
+        client = OpenAIClient(api_key="test-key")
+        client.client.chat.completions.create = delayed(make_completion('{"emergency": false, "objects_detected": []}'))
+        fields = []
+        
+        first, second = await asyncio.gather(
+            client.vision_completion(model="vl", image=b"img", prompt="p"),
+            client.vision_completion(model="vl", image=b"img", prompt="p", on_field=lambda k, v: fields.append(k))
+        )
+        first["objects_detected"].append("person")
+        
+        assert client.client.chat.completions.create.await_count == 1
+        assert second == {"emergency": False, "objects_detected": []}
+        assert fields == ["emergency", "objects_detected"]
+    
+    @pytest.mark.asyncio
+    async def test_different_images_not_coalesced(self):
+        """图像内容不同的请求不合并"""
+        client = OpenAIClient(api_key="test-key")
+        client.client.chat.completions.create = delayed(make_completion('{"emergency": false}'))
+        
+        await asyncio.gather(
+            client.vision_completion(model="vl", image=b"img-a", prompt="p"),
+            client.vision_completion(model="vl", image=b"img-b", prompt="p")
+        )
+        
+        assert client.client.chat.completions.create.await_count == 2
+        assert client.coalescing_stats()["coalesced"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_tts_shared_across_registry_clients(self):
+        """同一端点的不同客户端共享合并器"""
+        registry = ClientRegistry()
+        watch = OpenAIClient(api_key="k", base_url="http://stub/v1", registry=registry)
+        speak = OpenAIClient(api_key="k", base_url="http://stub/v1", registry=registry)
+        create = delayed(SimpleNamespace(content=b"audio"))
+        watch.client.audio.speech.create = create
+        speak.client.audio.speech.create = create
+        
+        try:
+            results = await asyncio.gather(
+                watch.tts_completion(model="omni", text="注意安全"),
+                speak.tts_completion(model="omni", text="注意安全")
+            )
+            
+            assert results == [b"audio", b"audio"]
+            assert create.await_count == 1
+            assert registry.stats()["coalescing"]["http://stub/v1"]["coalesced"] == 1
+        finally:
+            await watch.aclose()
+            await speak.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_followers(self):
+        """发起请求的调用方被取消时，其他等待者仍拿到结果"""
+        client = OpenAIClient(api_key="test-key")
+        client.client.chat.completions.create = delayed(make_completion("ok"), delay=0.1)
+        messages = [{"role": "user", "content": "hi"}]
+        
+        leader = asyncio.create_task(client.chat_completion(model="max", messages=messages))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(client.chat_completion(model="max", messages=messages))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        
+        assert await follower == "ok"
+        assert client.client.chat.completions.create.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_request_cancelled_when_all_callers_cancelled(self):
+        """所有调用方都取消后，进行中的请求也被取消"""
+        client = OpenAIClient(api_key="test-key")
+        cancelled = asyncio.Event()
+        
+        async def slow(*args, **kwargs):
+            try:
+                await asyncio.sleep(1.0)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        client.client.chat.completions.create = AsyncMock(side_effect=slow)
+        caller = asyncio.create_task(client.chat_completion(model="max", messages=[{"role": "user", "content": "hi"}]))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        
+        await asyncio.wait_for(cancelled.wait(), 0.5)
+        await asyncio.sleep(0)
+        assert client.coalescing_stats()["in_flight"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_errors_propagate_and_disable(self):
+        """请求失败时所有等待者都收到异常；关闭合并后每次都发送"""
+        client = OpenAIClient(api_key="test-key", coalesce=False)
+        client.client.chat.completions.create = delayed(make_completion("ok"))
+        messages = [{"role": "user", "content": "hi"}]
+        
+        await asyncio.gather(*(client.chat_completion(model="max", messages=messages) for _ in range(3)))
+        assert client.client.chat.completions.create.await_count == 3
+        
+        client.coalesce = True
+        client.client.chat.completions.create = AsyncMock(side_effect=RuntimeError("boom"))
+        results = await asyncio.gather(
+            *(client.chat_completion(model="max", messages=messages) for _ in range(2)),
+            return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert client.client.chat.completions.create.await_count == 1
+
+
+
+def rate_limit_error(retry_after: str = None):
+    """构造 SDK 的 429 异常"""
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "http://stub/v1/chat/completions"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class TestRateLimiter:
+    """测试按模型限流"""
+    
+    def test_parse_retry_after(self):
+        """支持毫秒、秒和 HTTP 日期三种形式"""
+        assert parse_retry_after({"retry-after-ms": "250"}) == 0.25
+        assert parse_retry_after({"retry-after": "2"}) == 2.0
+        assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+        assert parse_retry_after({"retry-after": "soon"}) is None
+        assert parse_retry_after(None) is None
+    
+    @pytest.mark.asyncio
+    async def test_request_rate_paced(self):
+        """超过突发量后按请求速率放行"""
+        governor = ModelGovernor("m", rps=4.0, concurrency=10)
+        start = time.perf_counter()
+        for _ in range(5):
+            await governor.acquire()
+            governor.release(latency=0.0)
+        
+        assert time.perf_counter() - start >= 0.2
+    
+    @pytest.mark.asyncio
+    async def test_token_budget_paced(self):
+        """预扣 token 超出每分钟额度时等待补充"""
+        governor = ModelGovernor("m", rps=100.0, tpm=600, concurrency=10)
+        await governor.acquire(600)
+        governor.release(600, latency=0.0)
+        
+        delay = await governor.acquire(5)
+        
+        assert delay >= 0.4
+    
+    @pytest.mark.asyncio
+    async def test_emergency_admitted_before_routine(self):
+        """并发已满时，紧急请求先于更早排队的常规请求放行"""
+        governor = ModelGovernor("m", rps=100.0, concurrency=1)
+        await governor.acquire()
+        order = []
+        
+        async def call(name, priority):
+            await governor.acquire(priority=priority)
+            order.append(name)
+            governor.release(latency=0.0)
+        
+        routine = asyncio.create_task(call("routine", "routine"))
+        await asyncio.sleep(0.01)
+        emergency = asyncio.create_task(call("emergency", "emergency"))
+        await asyncio.sleep(0.01)
+        assert governor.waiting == 2
+        
+        governor.release(latency=0.0)
+        await asyncio.gather(routine, emergency)
+        
+        assert order == ["emergency", "routine"]
+        assert governor.queue_count == {"emergency": 1, "routine": 2}
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        """排队中被取消的请求不占用队列"""
+        governor = ModelGovernor("m", concurrency=1)
+        await governor.acquire()
+        waiter = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        
+        assert governor.waiting == 0
+        governor.release(latency=0.0)
+        await asyncio.wait_for(governor.acquire(), 1.0)
+    
+    @pytest.mark.asyncio
+    async def test_retry_after_honored_and_rate_reduced(self):
+        """429 后按 Retry-After 暂停、降低速率并重试，排队与 API 耗时分开记录"""
+        client = OpenAIClient(api_key="test-key")
+        client.client.chat.completions.create = AsyncMock(
+            side_effect=[rate_limit_error("0.2"), make_completion("ok")]
+        )
+        
+        start = time.perf_counter()
+        result = await client.chat_completion(model="max", messages=[{"role": "user", "content": "hi"}])
+        
+        assert result == "ok"
+        assert time.perf_counter() - start >= 0.2
+        assert client.client.max_retries == 0
+        stats = client.rate_limit_stats()["max"]
+        assert stats["rate_limited"] == 1
+        assert stats["rps"] < stats["rps_limit"]
+        assert client.last_timing["attempts"] == 2
+        assert client.last_timing["queue_delay"] >= 0.2
+        assert client.last_timing["api_latency"] < 0.2
+    
+    @pytest.mark.asyncio
+    async def test_rate_recovers_after_success(self):
+        """降速后每次成功逐步恢复速率"""
+        governor = ModelGovernor("m", rps=4.0, increase=1.0)
+        await governor.acquire()
+        governor.release(rate_limited=True, retry_after=0.0)
+        assert governor.current_rps == 2.0
+        
+        await governor.acquire()
+        governor.release(latency=0.01)
+        
+        assert governor.current_rps == 3.0
+    
+    @pytest.mark.asyncio
+    async def test_zero_copy_429_goes_through_governor(self):
+        """零拷贝请求的 429 由限流器处理"""
+        responses = [
+            httpx.Response(429, headers={"retry-after-ms": "100"}, json={"error": "busy"}),
+            httpx.Response(200, json={"choices": [{"message": {"content": '{"emergency": false}'}}]}),
+        ]
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            return responses.pop(0)
+        
+        client = OpenAIClient(api_key="test-key", base_url="http://stub/v1", zero_copy=True)
+        client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        result = await client.vision_completion(model="vl", image=b"img", prompt="p")
+        
+        assert result == {"emergency": False}
+        assert client.rate_limit_stats()["vl"]["rate_limited"] == 1
+        assert client.last_timing["queue_delay"] >= 0.1
+
+
+
+def vision_endpoint(name: str, delay: float, content: str = '{"emergency": false}', error: Exception = None):
+    """构造响应延迟可控的视觉端点"""
+    client = OpenAIClient(api_key="test-key", rate_limit=False)
+    
+    async def respond(*args, **kwargs):
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return make_completion(content)
+    
+    client.client.chat.completions.create = AsyncMock(side_effect=respond)
+    return Endpoint(name, client, "vl-" + name)
+
+
+class TestHedgedRouter:
+    """测试多端点对冲与故障切换"""
+    
+    @pytest.mark.asyncio
+    async def test_slow_primary_hedged(self):
+        """首选端点超过对冲等待时间时发出对冲请求，先返回者胜出，落败请求被取消"""
+        primary = vision_endpoint("primary", 0.5, '{"from": "primary"}')
+        backup = vision_endpoint("backup", 0.02, '{"from": "backup"}')
+        router = HedgedRouter([primary, backup], default_delay=0.05, min_delay=0.01)
+        
+        start = time.perf_counter()
+        result = await router.vision_completion(image=b"img", prompt="p")
+        
+        assert result == {"from": "backup"}
+        assert time.perf_counter() - start < 0.3
+        assert router.stats()["hedges"] == 1
+        assert router.stats()["hedge_wins"] == 1
+        assert primary.cancelled == 1
+        assert router.last_endpoint is backup
+        assert backup.client.client.chat.completions.create.call_args.kwargs["model"] == "vl-backup"
+        # 胜出端点的 EWMA 更低，下次排在首位
+        assert router.ranked()[0] is backup
+    
+    @pytest.mark.asyncio
+    async def test_fast_primary_not_hedged(self):
+        """首选端点及时返回时不发出对冲请求"""
+        primary = vision_endpoint("primary", 0.01)
+        backup = vision_endpoint("backup", 0.01)
+        router = HedgedRouter([primary, backup], default_delay=0.2, min_delay=0.01)
+        
+        await router.vision_completion(image=b"img", prompt="p")
+        
+        assert router.hedges == 0
+        assert backup.calls == 0
+        assert primary.histogram.count == 1
+    
+    @pytest.mark.asyncio
+    async def test_failover_on_error(self):
+        """首选端点出错时立即切换，全部出错时抛出异常"""
+        primary = vision_endpoint("primary", 0.0, error=ValueError("bad gateway"))
+        backup = vision_endpoint("backup", 0.01, '{"from": "backup"}')
+        router = HedgedRouter([primary, backup], default_delay=5.0)
+        
+        assert await router.vision_completion(image=b"img", prompt="p") == {"from": "backup"}
+        assert router.failovers == 1
+        assert primary.errors == 1
+        assert router.last_endpoint is backup
+        
+        backup.client.client.chat.completions.create.side_effect = ValueError("backup down")
+        with pytest.raises(ValueError):
+            await router.vision_completion(image=b"img", prompt="p")
+        # 失败的调用不保留上一次胜出的端点
+        assert router.last_endpoint is None
+        
+        broken = HedgedRouter([vision_endpoint("a", 0.0, error=ValueError("a")), vision_endpoint("b", 0.0, error=ValueError("b"))])
+        with pytest.raises(ValueError):
+            await broken.vision_completion(image=b"img", prompt="p")
+    
+    @pytest.mark.asyncio
+    async def test_stream_fields_forwarded_once(self):
+        """对冲的两个请求都流式返回时，字段只转发一次"""
+        primary = vision_endpoint("primary", 0.1)
+        backup = vision_endpoint("backup", 0.1)
+        fields = []
+        router = HedgedRouter([primary, backup], default_delay=0.01, min_delay=0.01)
+        
+        async def request(endpoint, callback):
+            await asyncio.sleep(0.02)
+            await callback("emergency", True)
+            return {"emergency": True, "from": endpoint.name}
+        
+        await router.call(request, on_field=lambda k, v: fields.append(k))
+        
+        assert fields == ["emergency"]
+    
+    def test_hedge_delay_from_p95(self):
+        """样本足够时对冲等待时间取 p95，并限制在上下限之间"""
+        endpoint = vision_endpoint("primary", 0.0)
+        router = HedgedRouter([endpoint], default_delay=8.0, min_delay=0.5, max_delay=10.0, min_samples=20)
+        assert router.hedge_delay(endpoint) == 8.0
+        
+        for i in range(100):
+            endpoint.histogram.observe(1.0 + i * 0.02)
+        assert router.hedge_delay(endpoint) == pytest.approx(2.9)
+        
+        for _ in range(200):
+            endpoint.histogram.observe(30.0)
+        assert router.hedge_delay(endpoint) == 10.0
+    
+    def test_histogram_buckets(self):
+        """直方图按桶上界计数"""
+        histogram = LatencyHistogram()
+        for seconds in (0.05, 0.3, 0.3, 3.0, 40.0):
+            histogram.observe(seconds)
+        
+        stats = histogram.stats()
+        assert stats["count"] == 5
+        assert stats["buckets"]["<=0.1s"] == 1
+        assert stats["buckets"]["<=0.5s"] == 2
+        assert stats["buckets"]["<=4s"] == 1
+        assert stats["buckets"][">32s"] == 1
+        assert stats["p50_ms"] == pytest.approx(300.0)
+
+
+class TestJsonExtract:
+    """测试容错 JSON 提取"""
+    
+    @pytest.mark.parametrize("text,method", [
+        ('{"emergency": true}', "direct"),
+        ('```json\n{"emergency": true}\n```', "fenced"),
+        ('```\n{"emergency": true}', "fenced"),
+        ('分析结果如下：{"emergency": true} 以上。', "embedded"),
+        ('{"emergency": true, "description": "画面中出现明', "partial"),
+    ])
+    def test_extraction_methods(self, text, method):
+        """代码块、前后说明文字和截断对象都能提取出 emergency"""
+        value, used = extract_json(text)
+        
+        assert used == method
+        assert value["emergency"] is True
+    
+    def test_failure(self):
+        """没有 JSON 对象时返回 failed"""
+        assert extract_json("画面正常，无异常") == (None, "failed")
+    
+    def test_stats(self):
+        """统计各提取方式和失败率"""
+        stats = ParseStats()
+        for method in ("direct", "fenced", "failed", "direct"):
+            stats.record(method)
+        
+        merged = ParseStats.combine([stats, stats]).stats()
+        
+        assert merged["total"] == 8
+        assert merged["failure_rate"] == 0.25
+        assert merged["repair_rate"] == 0.25
+    
+    @pytest.mark.asyncio
+    async def test_fenced_vision_result_parsed(self):
+        """视觉结果包在代码块中时仍解析为对象，不再退化为 raw_response"""
+        client = OpenAIClient(api_key="test-key")
+        client.client.chat.completions.create = AsyncMock(
+            return_value=make_completion('```json\n{"emergency": true, "description": "起火"}\n```')
+        )
+        
+        result = await client.vision_completion(model="vl", image=b"img", prompt="p")
+        
+        assert result == {"emergency": True, "description": "起火"}
+        assert client.parse_stats.counts["fenced"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_response_format_fallback(self):
+        """模型拒绝 response_format 时去掉该参数重试，并记住不再发送"""
+        requests = []
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            body = json.loads(request.content)
+            requests.append(body)
+            if "response_format" in body:
+                return httpx.Response(400, json={"error": {"message": "response_format is not supported"}})
+            return httpx.Response(200, json={"choices": [{"message": {"content": '{"emergency": false}'}}]})
+        
+        client = OpenAIClient(api_key="test-key", base_url="http://stub/v1", zero_copy=True)
+        client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        for seed in range(2):
+            result = await client.vision_completion(
+                model="vl", image=bytes([seed]), prompt="p", response_format={"type": "json_object"}
+            )
+            assert result == {"emergency": False}
+        
+        assert ["response_format" in body for body in requests] == [True, False, False]
+        assert client.unsupported_response_format == {"vl"}
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestUsageTracker:
+    """测试用量与费用统计、预算降级"""
+    
+    def test_unpriced_degradation_model_warns(self, capsys):
+        """降级目标模型没有单价时提示，默认配置中的降级模型都有单价"""
+        UsageTracker(prices={"vl": (1.0, 2.0)}, degradation=[{"at": 0.9, "vision_model": "vl-lite"}])
+        assert "vl-lite has no price" in capsys.readouterr().out
+        
+        UsageTracker.from_config()
+        assert "has no price" not in capsys.readouterr().out
+    
+    def test_cost_and_attribution(self):
+        """按单价计费，并按模型、Action、Agent 分别汇总"""
+        tracker = UsageTracker(prices={"vl": (1.0, 2.0)})
+        with usage_scope(action="watch", agent="robot"):
+            tracker.record("vl", 1000, 500)
+            with usage_scope(action="alert"):
+                tracker.record("max", 100, 100)
+        tracker.record("vl", 0, 1000)
+        
+        hour = tracker.stats()["windows"]["hour"]
+        
+        assert tracker.totals["cost"] == 4.0
+        assert hour["by_model"]["vl"]["cost"] == 4.0
+        assert hour["by_model"]["max"]["cost"] == 0.0
+        assert hour["by_action"]["watch"]["prompt_tokens"] == 1000
+        assert hour["by_action"]["alert"]["requests"] == 1
+        assert hour["by_agent"]["robot"]["requests"] == 2
+        assert hour["by_agent"]["-"]["requests"] == 1
+    
+    def test_rolling_windows(self):
+        """超过窗口时长的记录移出窗口，累计值保留"""
+        clock = FakeClock()
+        tracker = UsageTracker(prices={"vl": (1.0, 0.0)}, clock=clock)
+        tracker.record("vl", 1000, 0)
+        clock.now += 3601
+        tracker.record("vl", 2000, 0)
+        
+        stats = tracker.stats()
+        
+        assert stats["windows"]["hour"]["cost"] == 2.0
+        assert stats["windows"]["hour"]["by_model"]["vl"]["requests"] == 1
+        assert stats["windows"]["day"]["cost"] == 3.0
+        assert stats["cost"] == 3.0
+    
+    def test_degradation_levels(self):
+        """预算使用率越过阈值时逐级降级，窗口滚出后恢复"""
+        clock = FakeClock()
+        tracker = UsageTracker(
+            prices={"vl": (1.0, 0.0)},
+            budgets={"hour": 10.0, "day": 100.0},
+            degradation=[
+                {"at": 0.5, "patrol_interval_scale": 2.0},
+                {"at": 0.9, "patrol_interval_scale": 4.0, "image_scale": 0.5, "vision_model": "cheap"},
+            ],
+            clock=clock
+        )
+        assert tracker.degradation().level == 0
+        
+        tracker.record("vl", 6000, 0)
+        first = tracker.degradation()
+        tracker.record("vl", 3000, 0)
+        second = tracker.degradation()
+        clock.now += 3601
+        recovered = tracker.degradation()
+        
+        assert (first.level, first.window, first.patrol_interval_scale, first.image_scale) == (1, "hour", 2.0, 1.0)
+        assert (second.level, second.image_scale, second.vision_model) == (2, 0.5, "cheap")
+        assert (recovered.level, recovered.window, recovered.utilization) == (0, "day", 0.09)
+        assert (tracker.degradations, tracker.recoveries) == (2, 1)
+    
+    def test_unknown_window_rejected(self):
+        """预算只能设置在已知窗口上"""
+        with pytest.raises(ValueError):
+            UsageTracker(budgets={"week": 1.0})
+    
+    @pytest.mark.asyncio
+    async def test_client_records_response_usage(self):
+        """对话请求按响应中的 usage 记录，视觉流式请求取最后一个分块中的 usage"""
+        events = [
+            {"choices": [{"delta": {"content": '{"emergency": false}'}}]},
+            {"choices": [], "usage": {"prompt_tokens": 1200, "completion_tokens": 30, "total_tokens": 1230}},
+        ]
+        sse = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+        requests = []
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            body = json.loads(request.content)
+            requests.append(body)
+            if body.get("stream"):
+                return httpx.Response(200, text=sse, headers={"Content-Type": "text/event-stream"})
+            return httpx.Response(200, json={
+                "id": "c", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "好"}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+            })
+        
+        tracker = UsageTracker(prices={"vl": (1.0, 1.0)})
+        client = OpenAIClient(api_key="test-key", base_url="http://stub/v1", zero_copy=True, usage_tracker=tracker)
+        client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client.client = openai.AsyncOpenAI(api_key="test-key", base_url="http://stub/v1", http_client=client.http_client)
+        
+        with usage_scope(action="watch"):
+            await client.vision_completion(model="vl", image=b"img", prompt="p", on_field=lambda k, v: None)
+        await client.chat_completion(model="max", messages=[{"role": "user", "content": "hi"}])
+        
+        assert requests[0]["stream_options"] == {"include_usage": True}
+        assert tracker.by_model["vl"]["prompt_tokens"] == 1200
+        assert tracker.by_model["vl"]["cost"] == pytest.approx(1.23)
+        assert tracker.by_model["max"]["completion_tokens"] == 2
+        assert tracker.totals["estimated"] == 0
+        assert tracker.windows["hour"].by_action["watch"]["requests"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_missing_usage_estimated(self):
+        """响应中没有 usage 时按估算值记录"""
+        tracker = UsageTracker()
+        client = OpenAIClient(api_key="test-key", usage_tracker=tracker)
+        client.client.chat.completions.create = AsyncMock(return_value=make_completion('{"emergency": false}'))
+        
+        await client.vision_completion(model="vl", image=b"img", prompt="p", max_tokens=100)
+        
+        assert tracker.totals["estimated"] == 1
+        assert tracker.totals["prompt_tokens"] >= 100 + OpenAIClient.IMAGE_TOKENS
+
+
+class TestCircuitBreaker:
+    """测试端点熔断"""
+    
+    def test_state_transitions(self):
+        """连续失败后断开，到期后半开只放行一个探测，探测失败时等待时间翻倍，成功后闭合"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("ep", failure_threshold=2, recovery_timeout=10.0, max_recovery_timeout=15.0, clock=clock)
+        
+        breaker.record_failure()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            breaker.check()
+        
+        clock.now += 10
+        assert breaker.state == "half_open"
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+        breaker.record_failure()
+        assert (breaker.state, breaker.retry_in) == ("open", 15.0)
+        
+        clock.now += 15
+        assert breaker.allow() is True
+        breaker.record_success()
+        
+        assert breaker.state == "closed"
+        assert breaker.stats()["opened"] == 2
+        assert breaker.stats()["recovered"] == 1
+    
+    def test_success_resets_failure_count(self):
+        """只统计连续失败"""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        
+        assert breaker.state == "closed"
+    
+    def test_failure_classification(self):
+        """连接错误、超时和 5xx 计为端点失败，4xx 不计"""
+        request = httpx.Request("POST", "http://stub/v1/chat/completions")
+        
+        assert is_endpoint_failure(httpx.ConnectError("down"))
+        assert is_endpoint_failure(openai.APITimeoutError(request=request))
+        assert is_endpoint_failure(httpx.HTTPStatusError("503", request=request, response=httpx.Response(503)))
+        assert not is_endpoint_failure(rate_limit_error())
+        assert not is_endpoint_failure(ValueError("bad json"))
+    
+    @pytest.mark.asyncio
+    async def test_client_fails_fast_when_open(self):
+        """熔断后请求不再发出，也不等待重试；探测成功后恢复"""
+        attempts = []
+        down = [True]
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            attempts.append(request.url.path)
+            if down[0]:
+                raise httpx.ConnectError("connection refused")
+            if request.url.path.endswith("/models"):
+                return httpx.Response(200, json={"object": "list", "data": []})
+            return httpx.Response(200, json={"choices": [{"message": {"content": '{"emergency": false}'}}]})
+        
+        client = OpenAIClient(api_key="test-key", base_url="http://stub/v1", zero_copy=True, max_retries=5)
+        client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client.client = openai.AsyncOpenAI(api_key="test-key", base_url="http://stub/v1", http_client=client.http_client, max_retries=0)
+        client.breaker = CircuitBreaker("stub", failure_threshold=2, recovery_timeout=0.05)
+        
+        with pytest.raises(httpx.ConnectError):
+            await client.vision_completion(model="vl", image=b"a", prompt="p")
+        assert len(attempts) == 2
+        assert not client.endpoint_available
+        
+        start = time.perf_counter()
+        with pytest.raises(CircuitOpenError):
+            await client.vision_completion(model="vl", image=b"b", prompt="p")
+        assert time.perf_counter() - start < 0.05
+        assert len(attempts) == 2
+        
+        await asyncio.sleep(0.06)
+        down[0] = False
+        assert await client.probe_endpoint() is True
+        result = await client.vision_completion(model="vl", image=b"c", prompt="p")
+        
+        assert result == {"emergency": False}
+        assert client.circuit_stats()["state"] == "closed"
+        assert attempts[2:] == ["/v1/models", "/v1/chat/completions"]
+
+
+class TestTTSAudioCache:
+    """测试语音合成音频缓存"""
+    
+    def test_hit_and_miss(self, tmp_path):
+        """按 (模型, 音色, 语速, 文本) 命中，任一项不同即未命中"""
+        cache = TTSAudioCache(str(tmp_path))
+        cache.put("omni", "default", 1.0, "注意安全", b"audio")
+        
+        assert cache.get("omni", "default", 1.0, "注意安全") == b"audio"
+        assert cache.get("omni", "default", 1.2, "注意安全") is None
+        assert ("omni", "default", 1, "注意安全") in cache
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    
+    def test_lru_eviction_by_bytes(self, tmp_path):
+        """超过总字节数时淘汰最久未使用的音频文件"""
+        cache = TTSAudioCache(str(tmp_path), max_bytes=10)
+        cache.put("m", "v", 1.0, "a", b"1111")
+        cache.put("m", "v", 1.0, "b", b"2222")
+        cache.get("m", "v", 1.0, "a")
+        cache.put("m", "v", 1.0, "c", b"3333")
+        
+        assert ("m", "v", 1.0, "a") in cache
+        assert ("m", "v", 1.0, "b") not in cache
+        assert cache.total_bytes == 8
+        assert len(list(tmp_path.iterdir())) == 2
+        assert cache.stats()["evictions"] == 1
+    
+    def test_persistence_and_skip_empty(self, tmp_path):
+        """重新创建时加载已有文件，空音频不缓存"""
+        cache = TTSAudioCache(str(tmp_path))
+        cache.put("m", "v", 1.0, "a", b"1111")
+        cache.put("m", "v", 1.0, "empty", b"")
+        
+        reloaded = TTSAudioCache(str(tmp_path))
+        assert len(reloaded) == 1
+        assert reloaded.get("m", "v", 1.0, "a") == b"1111"
+        assert reloaded.get("m", "v", 1.0, "empty") is None
+    
+    def test_failed_write_leaves_no_temp_file(self, tmp_path, monkeypatch):
+        """写入失败时删除临时文件，不计入缓存"""
+        cache = TTSAudioCache(str(tmp_path))
+        
+        def fail(src, dst):
+            raise OSError("磁盘已满")
+        
+        monkeypatch.setattr("core.client.tts_cache.os.replace", fail)
+        cache.put("m", "v", 1.0, "a", b"1111")
+        
+        assert list(tmp_path.iterdir()) == []
+        assert len(cache) == 0 and cache.stats()["writes"] == 0
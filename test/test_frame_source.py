@@ -0,0 +1,150 @@
+# test/test_frame_source.py
+import pytest
+import os
+import cv2
+import numpy as np
+from core.camera import CameraSensor
+from core.frame_source import (
+    FrameSource,
+    ImageDirectorySource,
+    VideoFileSource,
+    RawFrameSource,
+    SyntheticSource,
+    open_frame_source,
+    write_raw_frames,
+)
+
+
+def make_frames(count=3, shape=(48, 64, 3), step=40):
+    """生成逐帧亮度递增的测试帧"""
+    return [np.full(shape, step * (i + 1), dtype=np.uint8) for i in range(count)]
+
+
+class TestFrameSources:
+    """测试各类回放来源"""
+    
+    def test_image_directory(self, tmp_path):
+        """按文件名顺序读取，循环回放"""
+        for i, frame in enumerate(make_frames()):
+            cv2.imwrite(str(tmp_path / f"{i:03d}.png"), frame)
+        (tmp_path / "notes.txt").write_text("ignored")
+        
+        source = ImageDirectorySource(str(tmp_path))
+        values = [int(source.read()[1][0, 0, 0]) for _ in range(4)]
+        
+        assert source.isOpened()
+        assert values == [40, 80, 120, 40]
+    
+    def test_raw_dump_reuses_output(self, tmp_path):
+        """内存映射转储直接写入调用方数组，不循环时读完即结束"""
+        path = str(tmp_path / "patrol.raw")
+        assert write_raw_frames(path, make_frames()) == 3
+        
+        source = RawFrameSource(path, (48, 64, 3), loop=False)
+        out = np.empty((48, 64, 3), dtype=np.uint8)
+        values = []
+        while True:
+            ret, frame = source.read(out)
+            if not ret:
+                break
+            assert frame is out
+            values.append(int(frame[0, 0, 0]))
+        
+        assert source.frame_count == 3
+        assert values == [40, 80, 120]
+        assert source.exhausted
+    
+    def test_video_file(self, tmp_path):
+        """解码视频文件"""
+        path = str(tmp_path / "patrol.avi")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+        if not writer.isOpened():
+            pytest.skip("No video encoder available")
+        for frame in make_frames(5):
+            writer.write(frame)
+        writer.release()
+        
+        source = VideoFileSource(path, loop=False)
+        count = 0
+        while source.read()[0]:
+            count += 1
+        source.release()
+        
+        assert count == 5
+    
+    def test_synthetic_is_deterministic(self):
+        """相同 seed 和事件生成相同的帧序列"""
+        a = SyntheticSource(64, 48, seed=3)
+        b = SyntheticSource(64, 48, seed=3)
+        a.inject("fire", duration=2, start=1)
+        b.inject("fire", duration=2, start=1)
+        
+        for _ in range(4):
+            assert np.array_equal(a.read()[1], b.read()[1])
+    
+    def test_synthetic_events(self):
+        """注入的事件只在指定帧区间内改变画面"""
+        source = SyntheticSource(64, 48, noise=0, length=6)
+        source.inject("person", duration=2, start=2)
+        
+        frames = [source.read()[1] for _ in range(6)]
+        
+        assert np.array_equal(frames[0], frames[1])
+        assert not np.array_equal(frames[1], frames[2])
+        assert np.array_equal(frames[1], frames[4])
+        assert not source.read()[0]
+        with pytest.raises(ValueError):
+            source.inject("meteor", duration=1)
+    
+    def test_open_frame_source(self, tmp_path):
+        """解析设备描述字符串"""
+        path = str(tmp_path / "dump.raw")
+        write_raw_frames(path, make_frames(2))
+        
+        raw = open_frame_source(f"raw:{path}?shape=48x64x3&loop=0")
+        synthetic = open_frame_source("synthetic:32x24?length=5&fps=30")
+        
+        assert isinstance(raw, RawFrameSource) and not raw.loop
+        assert synthetic.read()[1].shape == (24, 32, 3)
+        assert synthetic.fps == 30.0
+        assert isinstance(open_frame_source(str(tmp_path)), ImageDirectorySource)
+        assert open_frame_source("/dev/video0") is None
+        assert open_frame_source(0) is None
+    
+    def test_base_class_is_abstract(self):
+        """基类不能直接实例化，子类须实现 rewind 和 _next_frame"""
+        with pytest.raises(TypeError):
+            FrameSource()
+
+
+class TestCameraReplay:
+    """测试 CameraSensor 使用回放来源"""
+    
+    @pytest.mark.asyncio
+    async def test_capture_image_from_synthetic(self):
+        """按需模式下 capture_image 返回 JPEG 数据"""
+        camera = CameraSensor(device="synthetic:64x48")
+        
+        image = await camera.capture_image()
+        
+        assert image[:2] == b"\xff\xd8"
+        assert cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR).shape == (48, 64, 3)
+    
+    @pytest.mark.asyncio
+    async def test_continuous_replay_at_full_speed(self, tmp_path):
+        """连续模式全速回放转储，读完后采集线程自动结束"""
+        path = str(tmp_path / "patrol.raw")
+        write_raw_frames(path, make_frames(50, step=5))
+        camera = CameraSensor(continuous=True, device=RawFrameSource(path, (48, 64, 3), loop=False))
+        
+        try:
+            assert await camera.wait_for_frame(timeout=2.0)
+            camera._grabber.join(timeout=2.0)
+            frame, _ = camera.get_latest_frame()
+            
+            assert not camera.is_running
+            assert camera.frames_captured == 50
+            assert camera.read_failures == 0
+            assert frame[0, 0, 0] == 250
+        finally:
+            camera.stop()
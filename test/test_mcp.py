@@ -0,0 +1,221 @@
+# test/test_mcp.py
+"""测试 MCP 会话管理（通过本地替身服务，覆盖 stdio 和 SSE 两种传输）"""
+
+import pytest
+import pytest_asyncio
+import asyncio
+import os
+import sys
+import time
+from core.action import ActionContext, AlertAction
+from core.agent import AgentState
+from core.mcp import McpConnectionError, McpToolError, McpTransport, McpTransportClosed, SseTransport
+from core.mcp.stub_server import StubMcpServer
+from core.mcp_manager import McpManager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def stdio_server(*args: str) -> dict:
+    """以子进程方式启动替身服务的配置"""
+    return {"command": [sys.executable, "-m", "core.mcp.stub_server", "--stdio", *args], "cwd": ROOT}
+
+
+@pytest_asyncio.fixture
+async def server():
+    stub = StubMcpServer(page_size=2)
+    await stub.start()
+    yield stub
+    await stub.stop()
+
+
+class TestMcpManager:
+    """测试 McpManager"""
+    
+    @pytest.mark.asyncio
+    async def test_stdio_calls_multiplexed(self):
+        """stdio 服务上的并发调用共用一个会话，总耗时接近单次调用"""
+        manager = McpManager({"local": stdio_server("--latency", "0.3")}, reconnect_base_delay=0.05)
+        try:
+            await manager.start()
+            start = time.perf_counter()
+            results = await asyncio.gather(*(
+                manager.call_tool("echo", {"text": f"第{i}次"}) for i in range(8)
+            ))
+            elapsed = time.perf_counter() - start
+            stats = manager.stats()
+        finally:
+            await manager.aclose()
+        
+        assert [r["content"][0]["text"] for r in results] == [f"第{i}次" for i in range(8)]
+        assert elapsed < 0.3 * 3
+        assert stats["servers"]["local"]["connects"] == 1
+        assert stats["servers"]["local"]["max_in_flight"] == 8
+        assert stats["tools"]["local/echo"]["count"] == 8
+        assert stats["tools"]["local/echo"]["p50_ms"] >= 300
+    
+    @pytest.mark.asyncio
+    async def test_tool_catalog_cached_and_invalidated(self, server):
+        """工具列表分页获取后缓存，服务通知变更后重新获取"""
+        manager = McpManager({"sse": {"url": server.url}}, reconnect_base_delay=0.05)
+        try:
+            await manager.start()
+            first = await manager.list_tools()
+            await manager.list_tools()
+            assert server.requests["tools/list"] == 2  # 3 个工具，每页 2 个
+            
+            server.add_tool("patrol_report", "提交巡检报告", lambda args: "ok")
+            for _ in range(50):
+                if manager.servers["sse"].session.cached_tools is None:
+                    break
+                await asyncio.sleep(0.01)
+            second = await manager.list_tools()
+            result = await manager.call_tool("patrol_report", {})
+        finally:
+            await manager.aclose()
+        
+        assert [t["name"] for t in first["sse"]] == ["emergency_call", "notify_security", "echo"]
+        assert [t["name"] for t in second["sse"]][-1] == "patrol_report"
+        assert server.requests["tools/list"] == 4
+        assert result["content"][0]["text"] == "ok"
+    
+    @pytest.mark.asyncio
+    async def test_sse_reconnects_after_drop(self, server):
+        """SSE 连接断开后自动重连，之后的调用等待重连完成"""
+        manager = McpManager({"sse": {"url": server.url}}, reconnect_base_delay=0.05)
+        try:
+            await manager.start()
+            await manager.call_tool("echo", {"text": "1"})
+            server.drop_connections()
+            result = await manager.call_tool("echo", {"text": "2"}, server="sse", timeout=5.0, retries=1)
+        finally:
+            await manager.aclose()
+        
+        assert result["content"][0]["text"] == "2"
+        assert server.sessions_opened == 2
+        stats = manager.stats()["servers"]["sse"]
+        assert stats["connects"] == 2 and stats["disconnects"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_tool_lookup_waits_for_reconnect(self, server):
+        """按工具名调用时服务正在重连，等待重连完成后调用，不立即失败"""
+        manager = McpManager({"sse": {"url": server.url}}, reconnect_base_delay=0.2)
+        try:
+            await manager.start()
+            server.drop_connections()
+            for _ in range(100):
+                if manager.servers["sse"].session is None:
+                    break
+                await asyncio.sleep(0.01)
+            assert manager.servers["sse"].session is None
+            ok = await manager.call_emergency_service({"type": "fire"})
+        finally:
+            await manager.aclose()
+        
+        assert ok and server.dispatched == [{"type": "fire"}]
+        assert server.sessions_opened == 2
+    
+    @pytest.mark.asyncio
+    async def test_stdio_reconnects_after_crash(self):
+        """服务进程退出后重新启动；进行中的调用立即以连接错误失败，允许重试的调用在重连后完成"""
+        manager = McpManager({"local": stdio_server("--exit-after", "1", "--latency", "0.2")}, reconnect_base_delay=0.05)
+        try:
+            await manager.start()
+            first = asyncio.create_task(manager.call_tool("echo", {"text": "1"}, server="local"))
+            in_flight = asyncio.create_task(manager.call_tool("echo", {"text": "2"}, server="local", timeout=10.0))
+            await first
+            with pytest.raises(McpConnectionError):
+                await in_flight
+            result = await manager.call_tool("echo", {"text": "3"}, server="local", timeout=10.0, retries=1)
+            stats = manager.stats()
+        finally:
+            await manager.aclose()
+        
+        assert result["content"][0]["text"] == "3"
+        assert stats["servers"]["local"]["connects"] == 2
+        assert stats["tools"]["local/echo"]["errors"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_unreachable_server_backs_off(self, server):
+        """无法连接的服务按退避重试，调用在超时后以连接错误失败，不影响其他服务"""
+        await server.stop()
+        down_url = server.url
+        async with StubMcpServer() as healthy:
+            manager = McpManager(
+                {"down": {"url": down_url}, "up": {"url": healthy.url}},
+                connect_timeout=1.0,
+                reconnect_base_delay=0.02,
+                reconnect_max_delay=0.1
+            )
+            try:
+                await manager.start()
+                with pytest.raises(McpConnectionError):
+                    await manager.call_tool("echo", {}, server="down", timeout=0.3)
+                ok = await manager.call_emergency_service({"type": "fire"})
+            finally:
+                await manager.aclose()
+        
+        stats = manager.stats()["servers"]
+        assert stats["down"]["failures"] >= 3 and not stats["down"]["connected"]
+        assert ok and healthy.dispatched == [{"type": "fire"}]
+    
+    @pytest.mark.asyncio
+    async def test_tool_errors(self, server):
+        """工具执行失败和未知工具以 McpToolError 返回并计入错误数"""
+        def broken(args):
+            raise RuntimeError("电话线路故障")
+        
+        server.add_tool("broken", "总是失败", broken, notify=False)
+        manager = McpManager({"sse": {"url": server.url}})
+        try:
+            with pytest.raises(McpToolError, match="电话线路故障"):
+                await manager.call_tool("broken", {}, server="sse")
+            with pytest.raises(McpToolError):
+                await manager.call_tool("missing", {}, server="sse")
+            with pytest.raises(McpConnectionError):
+                await manager.call_tool("missing", {})
+        finally:
+            await manager.aclose()
+        
+        assert manager.stats()["tools"]["sse/broken"]["errors"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_rejected_post_is_connection_error(self, server):
+        """消息 POST 返回错误状态时按连接断开处理，可由 retries 重试；传输基类不能直接实例化"""
+        transport = SseTransport(server.url)
+        await transport.connect()
+        try:
+            transport.endpoint = transport.endpoint.split("?")[0] + "?session_id=stale"
+            with pytest.raises(McpTransportClosed, match="HTTP 404"):
+                await transport.send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        finally:
+            await transport.close()
+        
+        with pytest.raises(TypeError):
+            McpTransport()
+
+
+class TestAlertActionMcp:
+    """测试 AlertAction 通过 MCP 调用应急服务"""
+    
+    @pytest.mark.asyncio
+    async def test_alert_action_dispatches_through_mcp(self, server, tmp_path):
+        """应急事件经 emergency_call 工具送达服务，结果附带调用延迟统计"""
+        action = AlertAction()
+        action.initialize({
+            "mcp_servers": {"dispatch": {"url": server.url}},
+            "outbox_path": str(tmp_path / "alerts.log")
+        })
+        try:
+            result = await action.execute(ActionContext(
+                agent_state=AgentState.ALERT,
+                input_data={"type": "fire", "description": "走廊起火"}
+            ))
+        finally:
+            await action.outbox.aclose()
+            await action.mcp_manager.aclose()
+            action.cleanup()
+        
+        assert result.success and result.output["service_called"]
+        assert server.dispatched == [{"type": "fire", "description": "走廊起火"}]
+        assert result.metadata["mcp"]["tools"]["dispatch/emergency_call"]["count"] == 1
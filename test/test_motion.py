@@ -0,0 +1,126 @@
+# test/test_motion.py
+import pytest
+import asyncio
+import numpy as np
+from unittest.mock import Mock
+from core.camera import CameraSensor
+from core.frame_source import SyntheticSource
+from core.motion_trigger import MotionTrigger
+from core.vision import MotionDetector
+from core.agent import RobotAgent
+
+
+class TestMotionDetector:
+    """测试本地运动检测"""
+    
+    def test_static_scene_has_no_motion(self):
+        """静止画面（含传感器噪声）不触发"""
+        source = SyntheticSource(160, 120, noise=3, seed=1)
+        detector = MotionDetector()
+        
+        results = [detector.update(source.read()[1]) for _ in range(10)]
+        
+        assert not any(motion for motion, _ in results)
+        assert detector.motion_frames == 0
+    
+    def test_moving_object_detected(self):
+        """移动的物体触发运动，停下后逐渐被背景吸收"""
+        source = SyntheticSource(160, 120, noise=0, seed=1)
+        detector = MotionDetector(learning_rate=0.5)
+        detector.update(source.read()[1])
+        
+        source.inject("person", duration=3)
+        motion, score = detector.update(source.read()[1])
+        
+        assert motion and score > detector.threshold
+        
+        # 事件结束后画面恢复静止
+        for _ in range(12):
+            motion, _ = detector.update(source.read()[1])
+        assert not motion
+
+
+def make_camera(source):
+    """以合成画面为来源的连续采集摄像头"""
+    return CameraSensor(continuous=True, device=source)
+
+
+class TestMotionTrigger:
+    """测试运动触发器"""
+    
+    @pytest.mark.asyncio
+    async def test_motion_wakes_before_heartbeat(self):
+        """检测到运动时立即唤醒，否则按心跳返回"""
+        source = SyntheticSource(160, 120, seed=2, fps=100)
+        camera = make_camera(source)
+        trigger = MotionTrigger({"default": camera}, cooldown=0.0, sample_interval=0.01)
+        trigger.start()
+        
+        try:
+            assert await trigger.wait(0.3) == MotionTrigger.HEARTBEAT
+            
+            source.inject("person", duration=10000)
+            assert await trigger.wait(3.0) == MotionTrigger.MOTION
+            assert trigger.motion_camera == "default"
+            assert trigger.motion_at > 0
+        finally:
+            trigger.stop()
+            camera.stop()
+        
+        assert trigger.triggers >= 1
+        assert trigger.heartbeats == 1
+        # 运动检测的取帧不计为读取
+        assert trigger.samples > 0 and camera.frames_read == 0
+    
+    @pytest.mark.asyncio
+    async def test_cooldown_suppresses_repeated_triggers(self):
+        """冷却期内的持续运动只触发一次"""
+        source = SyntheticSource(160, 120, seed=3, fps=100)
+        source.inject("person", duration=10000, start=5)
+        camera = make_camera(source)
+        trigger = MotionTrigger({"default": camera}, cooldown=60.0, sample_interval=0.01)
+        trigger.start()
+        
+        try:
+            assert await trigger.wait(3.0) == MotionTrigger.MOTION
+            assert await trigger.wait(0.3) == MotionTrigger.HEARTBEAT
+        finally:
+            trigger.stop()
+            camera.stop()
+        
+        assert trigger.triggers == 1
+        assert trigger.suppressed > 0
+
+
+class TestMotionPatrol:
+    """测试运动触发巡逻模式"""
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_without_continuous_capture(self):
+        """watch 不是连续采集时退回固定间隔模式"""
+        agent = RobotAgent(patrol_interval=0.01, patrol_mode="motion")
+        agent.actions["watch"] = Mock(camera_sensors={"default": CameraSensor(continuous=False)})
+        
+        assert await agent._wait_next_patrol() == "interval"
+        assert agent.patrol_mode == "interval"
+    
+    @pytest.mark.asyncio
+    async def test_motion_patrol_wait(self):
+        """运动触发模式下按心跳或运动返回"""
+        source = SyntheticSource(160, 120, seed=4, fps=100)
+        camera = make_camera(source)
+        agent = RobotAgent(patrol_mode="motion", heartbeat_interval=0.2)
+        agent.actions["watch"] = Mock(camera_sensors={"default": camera})
+        
+        try:
+            assert await agent._wait_next_patrol() == "heartbeat"
+            source.inject("fire", duration=10000)
+            agent.motion_trigger.sample_interval = 0.01
+            agent.heartbeat_interval = 3.0
+            assert await agent._wait_next_patrol() == "motion"
+            assert agent.shared_context["motion_latency"] >= 0
+        finally:
+            agent._stop_patrol_routine()
+            camera.stop()
+        
+        assert agent.motion_trigger is None
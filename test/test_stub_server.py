@@ -0,0 +1,430 @@
+# test/test_stub_server.py
+"""测试本地 OpenAI 兼容替身服务，并通过它端到端测试真实的客户端链路"""
+
+import pytest
+import pytest_asyncio
+import asyncio
+import io
+import random
+import time
+import wave
+from core.action import ActionContext, WatchAction, SpeakAction, ListenAction
+from core.agent import AgentState
+from core.client import OpenAIClient
+from core.client.stub_server import StubServer, LatencyModel, SPEECH, TRANSCRIPTIONS
+from core.client.circuit_breaker import CircuitBreaker
+from core.client.usage import UsageTracker
+
+
+@pytest_asyncio.fixture
+async def stub():
+    server = StubServer(seed=0, stream_interval=0.0)
+    await server.start()
+    yield server
+    await server.stop()
+
+
+class TestLatencyModel:
+    """测试延迟分布"""
+    
+    def test_parse(self):
+        """解析分布描述和长尾设置"""
+        model = LatencyModel.parse("lognormal:1.5,0.5@0.02=15")
+        
+        assert (model.kind, model.a, model.b) == ("lognormal", 1.5, 0.5)
+        assert (model.tail_probability, model.tail_latency) == (0.02, 15.0)
+        assert LatencyModel.parse("fixed:0.2").sample(random.Random(0)) == 0.2
+    
+    def test_distribution(self):
+        """采样结果符合分布参数，长尾按概率出现"""
+        rng = random.Random(1)
+        uniform = [LatencyModel("uniform", 0.1, 0.3).sample(rng) for _ in range(1000)]
+        tail = [LatencyModel("fixed", 0.1, 0.0, 0.1, 20.0).sample(rng) for _ in range(1000)]
+        
+        assert 0.1 <= min(uniform) and max(uniform) <= 0.3
+        assert 0.05 < tail.count(20.0) / len(tail) < 0.15
+
+
+class TestStubServer:
+    """通过替身服务测试 OpenAIClient"""
+    
+    @pytest.mark.asyncio
+    async def test_chat_and_models(self, stub):
+        """文本对话回显消息，/models 可用于连接预热"""
+        client = OpenAIClient(api_key="k", base_url=stub.base_url)
+        try:
+            result = await client.chat_completion(model="max", messages=[{"role": "user", "content": "你好"}])
+            models = await client.client.models.list()
+        finally:
+            await client.aclose()
+        
+        assert result == "收到：你好"
+        assert models.data[0].id == "stub"
+        assert stub.stats()["statuses"] == {200: 2}
+    
+    @pytest.mark.asyncio
+    async def test_scripted_vision(self):
+        """图像请求按脚本依次返回，代码块包裹的结果也能解析"""
+        script = [
+            {"emergency": False, "description": "正常"},
+            '```json\n{"emergency": true, "description": "起火"}\n```',
+        ]
+        async with StubServer(vision_script=script) as server:
+            client = OpenAIClient(api_key="k", base_url=server.base_url, coalesce=False)
+            try:
+                first = await client.vision_completion(model="vl", image=b"a", prompt="p")
+                second = await client.vision_completion(model="vl", image=b"b", prompt="p")
+            finally:
+                await client.aclose()
+        
+        assert first == {"emergency": False, "description": "正常"}
+        assert second == {"emergency": True, "description": "起火"}
+        assert server.bodies[0][1]["messages"][0]["content"][0]["type"] == "image_url"
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("zero_copy", [False, True])
+    async def test_streaming_vision(self, zero_copy):
+        """SDK 和零拷贝两条路径都能流式接收字段"""
+        script = [{"emergency": True, "description": "走廊出现明火，需要立即处理"}]
+        async with StubServer(vision_script=script, stream_chunk_chars=4, stream_interval=0.01) as server:
+            client = OpenAIClient(api_key="k", base_url=server.base_url, zero_copy=zero_copy)
+            fields = []
+            try:
+                result = await client.vision_completion(
+                    model="vl", image=b"img", prompt="p", on_field=lambda k, v: fields.append((k, v))
+                )
+            finally:
+                await client.aclose()
+        
+        assert result == script[0]
+        assert fields[0] == ("emergency", True)
+        assert server.bodies[0][1]["stream"] is True
+    
+    @pytest.mark.asyncio
+    async def test_speech_and_transcription(self):
+        """TTS 返回与文本长度成比例的 WAV，ASR 按脚本返回文本"""
+        async with StubServer(transcripts=["打开灯"], audio_seconds_per_char=0.1) as server:
+            client = OpenAIClient(api_key="k", base_url=server.base_url)
+            try:
+                audio = await client.tts_completion(model="omni", text="注意安全")
+                text = await client.asr_completion(model="omni", audio=audio)
+            finally:
+                await client.aclose()
+        
+        with wave.open(io.BytesIO(audio)) as wav:
+            assert wav.getnframes() == 4 * 0.1 * 16000
+        assert text == "打开灯"
+    
+    @pytest.mark.asyncio
+    async def test_injected_429_honored(self):
+        """注入的 429 经限流器按 Retry-After 重试"""
+        async with StubServer() as server:
+            server.inject(429, retry_after=0.2)
+            client = OpenAIClient(api_key="k", base_url=server.base_url)
+            try:
+                start = time.perf_counter()
+                result = await client.chat_completion(model="max", messages=[{"role": "user", "content": "hi"}])
+                elapsed = time.perf_counter() - start
+            finally:
+                await client.aclose()
+        
+        assert result == "收到：hi"
+        assert elapsed >= 0.2
+        assert server.stats()["statuses"] == {429: 1, 200: 1}
+        assert client.rate_limit_stats()["max"]["rate_limited"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_latency_and_keep_alive_under_load(self):
+        """并发请求按配置的延迟返回，并复用连接"""
+        async with StubServer(latency=LatencyModel("fixed", 0.1), seed=0) as server:
+            client = OpenAIClient(api_key="k", base_url=server.base_url, coalesce=False)
+            try:
+                start = time.perf_counter()
+                await asyncio.gather(*(
+                    client.chat_completion(model="max", messages=[{"role": "user", "content": str(i)}])
+                    for i in range(8)
+                ))
+                elapsed = time.perf_counter() - start
+                await client.chat_completion(model="max", messages=[{"role": "user", "content": "again"}])
+            finally:
+                await client.aclose()
+        
+        assert 0.1 <= elapsed < 0.5
+        assert server.stats()["max_concurrency"] == 8
+        assert server.stats()["connections"] <= 8
+
+
+class TestActionsAgainstStub:
+    """通过替身服务端到端测试 Action"""
+    
+    @pytest.mark.asyncio
+    async def test_watch_action_end_to_end(self, stub):
+        """合成画面经预处理、真实 HTTP 请求和结果校验完成一次巡检"""
+        stub.vision_script = [{"emergency": True, "objects_detected": ["fire"], "confidence": 0.9, "description": "起火"}]
+        action = WatchAction()
+        action.initialize({
+            "api_key": "k",
+            "base_url": stub.base_url,
+            "camera_devices": ["synthetic:320x240?seed=1"],
+            "shared_client": False,
+            "change_detection": False,
+            "cascade": False,
+            "vision_cache": False,
+        })
+        try:
+            result = await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data={}))
+        finally:
+            action.cleanup()
+        
+        assert result.success
+        assert result.output["emergency"] is True
+        assert result.metadata["timing"]["api_latency"] > 0
+        assert stub.requests["/chat/completions"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_watch_action_budget_degradation(self, stub):
+        """预算接近上限时降低上传分辨率并换用便宜模型，用量计入 watch"""
+        tracker = UsageTracker(
+            prices={"vl-plus": (1.0, 1.0)},
+            budgets={"hour": 1.0},
+            degradation=[{"at": 0.5, "image_scale": 0.5, "vision_model": "vl-cheap"}]
+        )
+        action = WatchAction()
+        action.initialize({
+            "api_key": "k",
+            "base_url": stub.base_url,
+            "camera_devices": ["synthetic:640x480"],
+            "shared_client": False,
+            "change_detection": False,
+            "vision_cache": False,
+            "model_name": "vl-plus",
+            "image_max_long_edge": 320,
+            "usage_tracker": tracker,
+        })
+        try:
+            context = ActionContext(agent_state=AgentState.PATROLLING, shared_data={})
+            first = await action.execute(context)
+            tracker.record("vl-plus", 1000, 0)
+            second = await action.execute(context)
+        finally:
+            action.cleanup()
+        
+        assert first.metadata["model"] == "vl-plus"
+        assert first.metadata["preprocess"]["width"] == 320
+        assert second.metadata["budget"]["level"] == 1
+        assert second.metadata["model"] == "vl-cheap"
+        assert second.metadata["preprocess"]["width"] == 160
+        assert [body["model"] for _, body in stub.bodies] == ["vl-plus", "vl-cheap"]
+        assert tracker.by_model["vl-cheap"]["requests"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_watch_action_local_only_while_circuit_open(self, stub):
+        """端点熔断期间只做本地分析且不发请求，半开时后台探测，恢复后重新调用视觉模型"""
+        action = WatchAction()
+        action.initialize({
+            "api_key": "k",
+            "base_url": stub.base_url,
+            "camera_devices": ["synthetic:320x240"],
+            "shared_client": False,
+            "change_detection": False,
+            "vision_cache": False,
+        })
+        action.openai_client.breaker = CircuitBreaker("stub", failure_threshold=1, recovery_timeout=0.2)
+        context = ActionContext(agent_state=AgentState.PATROLLING, shared_data={})
+        stub.inject(503)
+        try:
+            failed_over = await action.execute(context)
+            local = await action.execute(context)
+            await asyncio.sleep(0.25)
+            probing = await action.execute(context)
+            await action._probe_task
+            recovered = await action.execute(context)
+        finally:
+            action.cleanup()
+        
+        assert failed_over.success and failed_over.metadata["local_only"]
+        assert local.metadata["local_only"] and local.metadata["elapsed_time"] < 0.2
+        assert probing.metadata["local_only"]
+        assert local.output["source"] == "local_only"
+        assert recovered.metadata["local_only"] is False
+        assert recovered.output["emergency"] is False
+        assert stub.requests["/chat/completions"] == 2
+        assert stub.requests["/models"] == 1
+        assert "last_vision_result" in context.shared_data
+    
+    @pytest.mark.asyncio
+    async def test_speak_action_end_to_end(self, stub):
+        """SpeakAction 经真实 HTTP 请求取得音频"""
+        action = SpeakAction()
+        action.initialize({
+            "api_key": "k",
+            "base_url": stub.base_url,
+            "shared_client": False,
+            "auto_play": False,
+            "tts_cache": False,
+        })
+        try:
+            result = await action.execute(ActionContext(agent_state=AgentState.RESPONDING, input_data="请离开"))
+        finally:
+            action.cleanup()
+        
+        assert result.success
+        assert result.metadata["audio_size"] > 44
+        assert stub.requests[SPEECH] == 1
+    
+    @pytest.mark.asyncio
+    async def test_speak_action_warm_up_and_cache(self, stub, tmp_path):
+        """预热后播报常用语句不再请求合成，重启后缓存仍然有效"""
+        config_dict = {
+            "api_key": "k",
+            "base_url": stub.base_url,
+            "shared_client": False,
+            "auto_play": False,
+            "tts_cache_dir": str(tmp_path),
+            "prewarm_phrases": ["检测到紧急情况", "请离开"],
+        }
+        action = SpeakAction()
+        action.initialize(config_dict)
+        try:
+            warmed = await action.warm_up()
+            result = await action.execute(ActionContext(agent_state=AgentState.RESPONDING, input_data="检测到紧急情况"))
+        finally:
+            action.cleanup()
+        
+        restarted = SpeakAction()
+        restarted.initialize(config_dict)
+        try:
+            rewarmed = await restarted.warm_up()
+        finally:
+            restarted.cleanup()
+        
+        assert warmed == {"synthesized": 2, "cached": 0, "failed": 0}
+        assert result.success and result.metadata["tts_cache"]["hits"] == 1
+        assert rewarmed == {"synthesized": 0, "cached": 2, "failed": 0}
+        assert stub.requests[SPEECH] == 2
+    
+    @pytest.mark.asyncio
+    async def test_speak_action_streaming_playback(self, tmp_path):
+        """边合成边播放：第一块音频到达即写入输出，首音延迟远小于合成总耗时"""
+        async with StubServer(audio_seconds_per_char=0.2, stream_interval=0.05) as server:
+            action = SpeakAction()
+            action.initialize({
+                "api_key": "k",
+                "base_url": server.base_url,
+                "shared_client": False,
+                "tts_cache": False,
+                "audio_sink": "wav",
+                "wav_dir": str(tmp_path),
+            })
+            try:
+                result = await action.execute(ActionContext(agent_state=AgentState.RESPONDING, input_data="请立即离开这里"))
+            finally:
+                action.cleanup()
+        
+        playback = result.metadata["playback"]
+        assert result.success
+        assert playback["chunks"] > 1
+        assert playback["time_to_first_audio"] < playback["elapsed"] / 2
+        assert server.bodies[0][1]["stream_format"] == "audio"
+        with wave.open(action.sink.paths[0]) as wav:
+            assert wav.getnframes() == 22400
+        assert result.output["duration"] == pytest.approx(1.4)
+    
+    @pytest.mark.asyncio
+    async def test_speak_action_segmented_synthesis(self):
+        """长文本分句并行合成：首音延迟和总耗时随片段数下降，拼接后的音频完整"""
+        text = "走廊东侧出现明火。请附近人员立即撤离。消防通道保持畅通。安保人员正在赶来。"
+        results = {}
+        async with StubServer(synthesis_seconds_per_char=0.02, stream_interval=0.0) as server:
+            for segmented in (False, True):
+                action = SpeakAction()
+                action.initialize({
+                    "api_key": "k",
+                    "base_url": server.base_url,
+                    "shared_client": False,
+                    "tts_cache": False,
+                    "streaming": False,
+                    "audio_sink": "null",
+                    "segmented": segmented,
+                    "segment_concurrency": 4,
+                })
+                try:
+                    results[segmented] = await action.execute(
+                        ActionContext(agent_state=AgentState.RESPONDING, input_data=text)
+                    )
+                finally:
+                    action.cleanup()
+        
+        serial, parallel = results[False].metadata, results[True].metadata
+        assert parallel["segments"] == 4
+        assert parallel["playback"]["time_to_first_audio"] < serial["playback"]["time_to_first_audio"] / 2
+        assert parallel["elapsed_time"] < serial["elapsed_time"] / 2
+        assert results[True].output["duration"] == pytest.approx(results[False].output["duration"], abs=1e-3)
+        with wave.open(io.BytesIO(results[True].output["audio_bytes"])) as wav:
+            assert wav.getnframes() == pytest.approx(len(text) * 0.15 * 16000, abs=4)
+        assert server.requests[SPEECH] == 5
+    
+    @pytest.mark.asyncio
+    async def test_speak_action_emergency_preempts_routine(self, tmp_path):
+        """紧急播报打断正在合成播放的日常播报，只入队的调用立即返回，重复的紧急播报被抑制"""
+        async with StubServer(synthesis_seconds_per_char=0.05, stream_interval=0.0) as server:
+            action = SpeakAction()
+            action.initialize({
+                "api_key": "k",
+                "base_url": server.base_url,
+                "shared_client": False,
+                "tts_cache": False,
+                "audio_sink": "wav",
+                "wav_dir": str(tmp_path),
+            })
+            try:
+                routine = asyncio.create_task(action.execute(ActionContext(
+                    agent_state=AgentState.PATROLLING, input_data="第三巡检点一切正常，继续前往下一个巡检点"
+                )))
+                await asyncio.sleep(0.1)
+                emergency = {"priority": "emergency", "wait": False}
+                queued = await action.execute(ActionContext(agent_state=AgentState.RESPONDING, input_data="起火了", config=emergency))
+                repeated = await action.execute(ActionContext(agent_state=AgentState.RESPONDING, input_data="起火了", config=emergency))
+                preempted = await routine
+                spoken = await action.scheduler.speak_now("起火了", "emergency")
+            finally:
+                action.cleanup()
+        
+        assert queued.output["queued"] and queued.metadata["elapsed_time"] < 0.05
+        assert repeated.metadata["suppressed"] and not repeated.output["queued"]
+        assert preempted.metadata["preempted"] and not preempted.success
+        assert spoken.success and spoken.output["text"] == "起火了"
+        assert len(action.sink.paths) == 2
+    
+    @pytest.mark.asyncio
+    async def test_listen_action_uploads_only_speech(self):
+        """只上传检测到的语音片段，每句结束即开始识别（并行），结果按时间顺序排列"""
+        heard = []
+        async with StubServer(transcripts=["前往三号门", "停止巡逻"], stream_interval=0.0) as server:
+            action = ListenAction()
+            action.initialize({
+                "api_key": "k",
+                "base_url": server.base_url,
+                "shared_client": False,
+                "audio_source": "synthetic:0.5s,1.0v,0.8s,1.2v,0.6s",
+                "on_transcript": lambda text, segment: heard.append((text, segment.start)),
+            })
+            try:
+                context = ActionContext(agent_state=AgentState.IDLE)
+                result = await action.execute(context)
+            finally:
+                action.cleanup()
+        
+        assert result.success
+        utterances = result.output["utterances"]
+        # 两段并行识别，替身服务按到达顺序分配文本，因此只比较集合
+        assert sorted(u["text"] for u in utterances) == sorted(["前往三号门", "停止巡逻"])
+        assert utterances[0]["start"] < utterances[1]["start"]
+        assert sorted(heard) == sorted((u["text"], u["start"]) for u in utterances)
+        assert context.shared_data["last_transcript"] == utterances[1]["text"]
+        assert server.requests[TRANSCRIPTIONS] == 2
+        metadata = result.metadata
+        assert metadata["audio_seconds"] == pytest.approx(4.1)
+        assert metadata["uploaded_bytes"] < 0.7 * metadata["audio_bytes"]
+        assert metadata["vad"]["segments"] == 2
+        assert b"RIFF" in server.bodies[0][1]
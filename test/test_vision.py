@@ -0,0 +1,462 @@
+# test/test_vision.py
+"""测试本地视觉处理组件"""
+
+import pytest
+import numpy as np
+from unittest.mock import AsyncMock, Mock
+from core.action import ActionContext, WatchAction
+from core.agent import AgentState
+from core.client.usage import UsageTracker
+from core.vision import SceneChangeDetector, ImagePreprocessor, DetectorCascade, VisionAnalysis
+from core.frame_source import SyntheticSource
+
+
+def make_frame(value: int = 100, shape=(240, 320, 3)) -> np.ndarray:
+    """生成纯色测试帧"""
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def make_noisy_frame(shape=(720, 1280, 3), seed: int = 0) -> np.ndarray:
+    """生成难以压缩的噪声帧"""
+    return np.random.default_rng(seed).integers(0, 255, shape, dtype=np.uint8)
+
+
+class StubCamera:
+    """按顺序返回预设帧的摄像头替身"""
+    
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.continuous = False
+        self.frames_dropped = 0
+        self.frame_age = None
+    
+    async def capture_frame(self, out=None):
+        return self.frames.pop(0) if self.frames else None
+    
+    def encode_frame(self, frame):
+        return frame.tobytes()
+    
+    def stop(self):
+        pass
+
+
+class TestSceneChangeDetector:
+    """测试场景变化检测"""
+    
+    def test_first_frame_is_changed(self):
+        """没有参考帧时必定判定为变化"""
+        detector = SceneChangeDetector()
+        changed, score, _ = detector.check(make_frame())
+        
+        assert changed
+        assert score == 1.0
+    
+    def test_identical_frame_unchanged(self):
+        """相同画面不触发变化"""
+        detector = SceneChangeDetector()
+        _, _, thumb = detector.check(make_frame())
+        detector.update_reference(thumb)
+        
+        changed, score, _ = detector.check(make_frame())
+        
+        assert not changed
+        assert score == 0.0
+    
+    def test_global_brightness_shift_ignored(self):
+        """整体亮度变化（自动曝光）不触发变化"""
+        detector = SceneChangeDetector()
+        frame = make_frame(80)
+        frame[:, :160] = 160
+        _, _, thumb = detector.check(frame)
+        detector.update_reference(thumb)
+        
+        changed, _, _ = detector.check(np.clip(frame.astype(np.int16) + 40, 0, 255).astype(np.uint8))
+        
+        assert not changed
+    
+    def test_local_change_detected(self):
+        """局部出现物体时触发变化"""
+        detector = SceneChangeDetector(threshold=0.02)
+        _, _, thumb = detector.check(make_frame())
+        detector.update_reference(thumb)
+        
+        frame = make_frame()
+        frame[60:180, 100:220] = 250
+        changed, score, _ = detector.check(frame)
+        
+        assert changed
+        assert score > 0.02
+    
+    def test_reference_expires(self):
+        """参考帧超过最长复用时间后强制重新分析"""
+        detector = SceneChangeDetector(max_reuse_age=0.0)
+        _, _, thumb = detector.check(make_frame())
+        detector.update_reference(thumb)
+        
+        changed, _, _ = detector.check(make_frame())
+        
+        assert changed
+
+
+class TestImagePreprocessor:
+    """测试上传图像预处理"""
+    
+    def test_resize_to_long_edge(self):
+        """按长边等比缩放"""
+        result = ImagePreprocessor(max_long_edge=640).process(make_frame(shape=(720, 1280, 3)))
+        
+        assert (result.width, result.height) == (640, 360)
+        assert result.mime_type == "image/jpeg"
+        assert set(result.timings) == {"crop", "resize", "encode"}
+    
+    def test_no_upscale(self):
+        """小图不放大"""
+        result = ImagePreprocessor(max_long_edge=1280).process(make_frame())
+        
+        assert (result.width, result.height) == (320, 240)
+    
+    def test_roi_crop(self):
+        """按比例裁剪感兴趣区域"""
+        preprocessor = ImagePreprocessor(max_long_edge=None, roi=(0.5, 0.0, 0.5, 0.5))
+        result = preprocessor.process(make_frame(shape=(480, 640, 3)))
+        
+        assert (result.width, result.height) == (320, 240)
+    
+    def test_webp_output(self):
+        """WebP 编码"""
+        result = ImagePreprocessor(image_format="webp").process(make_frame())
+        
+        assert result.mime_type == "image/webp"
+        assert result.data[:4] == b"RIFF"
+    
+    def test_quality_tuned_to_budget(self):
+        """自动降低质量以满足字节预算"""
+        frame = make_noisy_frame(shape=(240, 320, 3))
+        unbounded = ImagePreprocessor(quality=85).process(frame)
+        budget = len(unbounded.data) // 2
+        
+        result = ImagePreprocessor(quality=85, byte_budget=budget).process(frame)
+        
+        assert result.within_budget
+        assert len(result.data) <= budget
+        assert result.quality < 85
+        assert (result.width, result.height) == (320, 240)
+    
+    def test_downscale_when_quality_not_enough(self):
+        """最低质量仍超预算时继续缩小尺寸"""
+        frame = make_noisy_frame()
+        
+        result = ImagePreprocessor(max_long_edge=1280, byte_budget=20 * 1024).process(frame)
+        
+        assert result.within_budget
+        assert result.width < 1280
+    
+    def test_buffers_reused(self):
+        """相同尺寸的帧复用缩放缓冲区，输出为 memoryview"""
+        preprocessor = ImagePreprocessor(max_long_edge=640)
+        for _ in range(3):
+            result = preprocessor.process(make_frame(shape=(720, 1280, 3)))
+        
+        assert isinstance(result.data, memoryview)
+        assert preprocessor.buffer_allocations == 1
+    
+    def test_invalid_format(self):
+        """不支持的格式抛出异常"""
+        with pytest.raises(ValueError):
+            ImagePreprocessor(image_format="gif")
+
+
+class TestWatchActionSceneGate:
+    """测试 WatchAction 的场景变化门控"""
+    
+    def _make_action(self, frames):
+        action = WatchAction()
+        action.initialize({})
+        action.camera = StubCamera(frames)
+        action.openai_client = Mock()
+        action.openai_client.vision_completion = AsyncMock(return_value={
+            "objects_detected": ["chair"],
+            "emergency": False,
+            "confidence": 0.9,
+            "description": "空房间"
+        })
+        return action
+    
+    @pytest.mark.asyncio
+    async def test_unchanged_frame_reuses_result(self):
+        """画面未变化时复用上次结果，不调用视觉模型"""
+        action = self._make_action([make_frame(), make_frame()])
+        shared = {}
+        
+        first = await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data=shared))
+        second = await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data=shared))
+        
+        assert first.success and second.success
+        assert first.output["reused"] is False
+        assert second.output["reused"] is True
+        assert second.output["description"] == "空房间"
+        assert second.metadata["vision_reused"]
+        assert second.metadata["frames_skipped"] == 1
+        assert second.metadata["skip_rate"] == 0.5
+        assert first.metadata["preprocess"]["output_bytes"] > 0
+        assert action.openai_client.vision_completion.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_changed_frame_calls_vision(self):
+        """画面变化时重新调用视觉模型"""
+        changed = make_frame()
+        changed[:120] = 250
+        action = self._make_action([make_frame(), changed])
+        shared = {}
+        
+        await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data=shared))
+        result = await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data=shared))
+        
+        assert result.success
+        assert result.metadata["vision_reused"] is False
+        assert action.openai_client.vision_completion.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_memory_metrics_reported(self):
+        """开启内存统计后报告峰值内存和缓冲区分配次数"""
+        action = self._make_action([make_noisy_frame(seed=1), make_noisy_frame(seed=2)])
+        action.memory_profiler.enabled = True
+        shared = {}
+        
+        first = await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data=shared))
+        second = await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data=shared))
+        action.cleanup()
+        
+        assert first.metadata["memory"]["peak_bytes"] > 0
+        assert "net_blocks" in second.metadata["memory"]
+        assert second.metadata["memory"]["buffer_allocations"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_gate_disabled(self):
+        """关闭场景检测后每次都调用视觉模型"""
+        action = self._make_action([make_frame(), make_frame()])
+        action.scene_detector = None
+        shared = {}
+        
+        await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data=shared))
+        await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data=shared))
+        
+        assert action.openai_client.vision_completion.await_count == 2
+
+
+class TestWatchActionMultiCamera:
+    """测试 WatchAction 多摄像头单请求分析"""
+    
+    @pytest.mark.asyncio
+    async def test_single_request_mapped_per_camera(self):
+        """多路画面合并为一次视觉请求，结果映射回各摄像头"""
+        action = WatchAction()
+        action.initialize({"camera_devices": {"front": 0, "rear": 1}})
+        action.camera_group.cameras = {
+            "front": StubCamera([make_frame(50)]),
+            "rear": StubCamera([make_frame(200)]),
+        }
+        action.openai_client = Mock()
+        action.openai_client.vision_completion = AsyncMock(return_value={
+            "objects_detected": [],
+            "emergency": False,
+            "confidence": 0.8,
+            "description": "后门有烟雾",
+            "cameras": {
+                "front": {"objects_detected": ["door"], "emergency": False, "description": "正常"},
+                "rear": {"objects_detected": ["smoke"], "emergency": True, "description": "烟雾"}
+            }
+        })
+        
+        result = await action.execute(ActionContext(agent_state=AgentState.PATROLLING))
+        
+        assert result.success
+        call = action.openai_client.vision_completion.await_args
+        assert action.openai_client.vision_completion.await_count == 1
+        assert len(call.kwargs["image"]) == 2
+        assert "front、rear" in call.kwargs["prompt"]
+        assert result.output["emergency"] is True
+        assert result.output["cameras"]["rear"]["objects_detected"] == ["smoke"]
+        assert result.output["objects_detected"] == ["door", "smoke"]
+        assert result.metadata["cameras"] == ["front", "rear"]
+        assert set(result.metadata["preprocess"]["cameras"]) == {"front", "rear"}
+        
+        action.cleanup()
+        assert action.camera_group is None
+    
+    def test_map_camera_results_from_list(self):
+        """模型按图像顺序返回数组时同样可以映射"""
+        result = {"objects_detected": [], "emergency": False}
+        WatchAction._map_camera_results(result, ["a", "b"])
+        assert result["cameras"]["a"] == {"objects_detected": [], "emergency": False, "description": ""}
+        
+        result = {"objects_detected": ["x"], "emergency": False, "cameras": [{"emergency": True}, {}]}
+        WatchAction._map_camera_results(result, ["a", "b"])
+        assert result["cameras"]["a"]["emergency"] is True
+        assert result["emergency"] is True
+
+
+class TestDetectorCascade:
+    """测试本地一级检测级联"""
+    
+    def test_benign_frame_short_circuits(self):
+        """首帧强制升级一次，之后正常画面不升级"""
+        cascade = DetectorCascade()
+        source = SyntheticSource(320, 240, seed=1)
+        
+        first = cascade.decide([cascade.evaluate(source.read()[1])])
+        second = cascade.decide([cascade.evaluate(source.read()[1], change_score=0.01)])
+        
+        assert first == (True, ["max_skip_age"])
+        assert second == (False, [])
+        assert cascade.report()["escalation_rate"] == 0.5
+    
+    def test_fire_and_change_escalate(self):
+        """火焰颜色和大幅帧差触发升级，证据写入提示词"""
+        cascade = DetectorCascade(person_enabled=False)
+        source = SyntheticSource(320, 240, seed=2)
+        source.inject("fire", duration=1, start=1)
+        cascade.evaluate(source.read()[1])
+        
+        result = cascade.evaluate(source.read()[1], change_score=0.5)
+        prompt = cascade.evidence_prompt({"default": result}, result.reasons)
+        
+        assert result.reasons == ["fire", "change"]
+        assert result.fire_increase > cascade.fire_threshold
+        assert "火焰颜色像素占比" in prompt
+    
+    def test_smoke_relative_to_baseline(self):
+        """烟雾按相对基线的增量判断"""
+        cascade = DetectorCascade(person_enabled=False)
+        source = SyntheticSource(320, 240, seed=3, noise=0)
+        for _ in range(3):
+            assert cascade.evaluate(source.read()[1]).reasons == []
+        
+        source.inject("smoke", duration=20, region=(0.1, 0.1, 0.8, 0.8))
+        reasons = [cascade.evaluate(source.read()[1]).reasons for _ in range(20)]
+        
+        assert ["smoke"] in reasons
+    
+    def test_latency_saved_report(self):
+        """按云端平均耗时估算短路节省的时间"""
+        cascade = DetectorCascade(person_enabled=False, max_skip_age=1e9)
+        cascade._last_escalation = 1e12
+        source = SyntheticSource(160, 120, seed=4)
+        for _ in range(4):
+            cascade.decide([cascade.evaluate(source.read()[1])])
+        cascade.record_cloud_latency(2.0)
+        
+        report = cascade.report()
+        
+        assert report["short_circuited"] == 4
+        assert report["avg_cloud_ms"] == 2000.0
+        assert 7.0 < report["latency_saved_s"] <= 8.0
+
+
+class TestWatchActionCascade:
+    """测试 WatchAction 接入本地级联"""
+    
+    @pytest.mark.asyncio
+    async def test_cascade_gates_vision_calls(self):
+        """正常画面短路，火焰画面带着本地证据升级"""
+        source = SyntheticSource(320, 240, seed=5)
+        frames = [source.read()[1].copy() for _ in range(2)]
+        source.inject("fire", duration=1)
+        frames.append(source.read()[1].copy())
+        
+        action = WatchAction()
+        action.initialize({"cascade": True, "change_detection": False, "cascade_person_detection": False})
+        action.camera = StubCamera(frames)
+        action.openai_client = Mock()
+        action.openai_client.vision_completion = AsyncMock(return_value={"emergency": True})
+        shared = {}
+        
+        results = [
+            await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data=shared))
+            for _ in range(3)
+        ]
+        
+        assert [r.metadata["cascade"]["escalate"] for r in results] == [True, False, True]
+        assert results[1].output["source"] == "local"
+        assert action.openai_client.vision_completion.await_count == 2
+        assert "本地初筛因以下原因将画面升级分析：fire" in action.openai_client.vision_completion.call_args.kwargs["prompt"]
+        assert results[2].output["emergency"] is True
+        assert results[2].metadata["cascade"]["report"]["escalation_rate"] == pytest.approx(2 / 3)
+        action.cleanup()
+
+
+class TestVisionAnalysis:
+    """测试视觉结果结构校验"""
+    
+    def test_defaults_for_missing_fields(self):
+        """缺失字段取默认值，不算校验失败"""
+        analysis = VisionAnalysis.from_dict({"description": "走廊"})
+        
+        assert analysis.valid
+        assert analysis.to_dict() == {
+            "emergency": False, "objects_detected": [], "confidence": 0.0, "description": "走廊"
+        }
+    
+    def test_coercion(self):
+        """可无损转换的值做类型转换，附加字段原样保留"""
+        analysis = VisionAnalysis.from_dict({
+            "emergency": "true",
+            "objects_detected": [{"name": "person"}, "smoke"],
+            "confidence": "85",
+            "cameras": {"front": {}},
+        })
+        
+        assert analysis.valid
+        assert analysis.emergency is True
+        assert analysis.objects_detected == ["person", "smoke"]
+        assert analysis.confidence == 0.85
+        assert analysis.to_dict()["cameras"] == {"front": {}}
+    
+    def test_invalid_values(self):
+        """无法转换的字段取默认值并记录问题"""
+        analysis = VisionAnalysis.from_dict({"emergency": "maybe", "confidence": "high", "objects_detected": 3})
+        
+        assert not analysis.valid
+        assert len(analysis.errors) == 3
+        assert analysis.emergency is False
+        assert not VisionAnalysis.from_dict(["not", "an", "object"]).valid
+        assert not VisionAnalysis.from_dict({"description": "文本", "raw_response": True}).valid
+    
+    @pytest.mark.asyncio
+    async def test_watch_action_validates_result(self):
+        """WatchAction 输出规整后的结果并统计校验失败"""
+        action = WatchAction()
+        action.initialize({"response_format": None})
+        action.camera = StubCamera([make_frame()])
+        action.openai_client = Mock()
+        action.openai_client.vision_completion = AsyncMock(return_value={"emergency": "是", "confidence": "bad"})
+        
+        result = await action.execute(ActionContext(agent_state=AgentState.PATROLLING, shared_data={}))
+        
+        assert result.success
+        assert result.output["emergency"] is True
+        assert result.output["confidence"] == 0.0
+        assert result.output["description"] == "无描述"
+        assert result.metadata["parse"]["invalid"] == 1
+        assert "response_format" not in action.openai_client.vision_completion.await_args.kwargs
+
+
+class TestWatchActionVisionRouter:
+    """测试 WatchAction 的多端点对冲配置"""
+    
+    def test_backup_endpoints_share_usage_tracker(self):
+        """备用端点与主端点使用同一用量统计器和熔断开关，对冲调用计入预算降级"""
+        tracker = UsageTracker()
+        action = WatchAction()
+        action.initialize({
+            "api_key": "test-key",
+            "usage_tracker": tracker,
+            "vision_endpoints": [{"name": "backup", "model": "vl-backup", "base_url": "http://backup/v1"}]
+        })
+        try:
+            clients = [endpoint.client for endpoint in action.vision_router.endpoints]
+            assert len(clients) == 2
+            assert all(client.usage_tracker is tracker for client in clients)
+            assert all(client.circuit_breaker == action.openai_client.circuit_breaker for client in clients)
+        finally:
+            action.cleanup()